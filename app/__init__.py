@@ -1,5 +1,5 @@
 from flask import Flask
-from app.config import Config
+from app.config import Config, ensure_directories
 from app.extensions import db, migrate
 from app.routes import register_blueprints
 from flask_restx import Api
@@ -16,6 +16,8 @@ def create_app():
     template_dir = current_dir / 'templates'
     static_dir = current_dir / 'static'
     
+    ensure_directories()
+
     app = Flask(__name__, 
                 template_folder=str(template_dir), 
                 static_folder=str(static_dir))
@@ -48,20 +48,25 @@ class Config:
     LOGS_DIR = BASE_DIR / 'logs'
     CONFIG_DIR = BASE_DIR / 'config'
     
-    # 确保目录存在
-    DATA_DIR.mkdir(exist_ok=True)
-    LOGS_DIR.mkdir(exist_ok=True)
-    # CONFIG_DIR.mkdir(exist_ok=True)
-    
     # 任务配置
     MAX_CONCURRENT_TASKS = int(os.environ.get('MAX_CONCURRENT_TASKS', 5))
     TASK_TIMEOUT = int(os.environ.get('TASK_TIMEOUT', 3600))  # 1小时
+    # 任务执行引擎：thread 每个任务一个线程；async 所有任务共用一个事件循环（需安装httpx）
+    EXECUTION_ENGINE = os.environ.get('EXECUTION_ENGINE', 'thread')
+    ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 100))  # 异步引擎HTTP连接池上限
+    ASYNC_MAX_CONCURRENT_EVALUATIONS = int(os.environ.get('ASYNC_MAX_CONCURRENT_EVALUATIONS', 200))  # 同时计算的组合数上限
     
     # 日志配置
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_FILE = LOGS_DIR / 'app.log'
     
 
+def ensure_directories():
+    """确保数据和日志目录存在，由create_app调用，导入配置模块本身不触碰文件系统"""
+    Config.DATA_DIR.mkdir(exist_ok=True)
+    Config.LOGS_DIR.mkdir(exist_ok=True)
+
+
 def init_config():
     from app.services.config_manager import get_config_manager
     from app.models import SystemConfig
@@ -74,19 +79,44 @@ def init_config():
         'sheet_name': 'data',
         'token_file': 'data/token.json',
         'proxy_url': None,
-        'max_concurrent_tasks': 5,
+        'max_concurrent_tasks': 5,  # 所有工作进程合计的最大并发任务数
+        'max_tasks_per_spreadsheet': 0,  # 同一电子表格最大并发任务数（所有工作进程合计），0表示不限制
+        'dispatcher_interval': 5,  # 队列调度器轮询间隔（秒）
         'task_timeout': 36000,
-        'task_status_check_timeout': 600,  # 10分钟，任务状态检查超时
+        'task_status_check_timeout': 600,  # 10分钟，任务心跳超时，超时视为挂死
+        'heartbeat_interval': 15,  # 执行器心跳写入最小间隔（秒）
+        'watchdog_interval': 60,  # 看门狗扫描间隔（秒）
+        'watchdog_max_requeues': 3,  # 挂死任务自动重排队最大次数，超过后标记为错误
+        'watchdog_backoff_base': 60,  # 自动重排队退避基数（秒），按次数指数增长
+        'pipeline_workers': 2,  # 参数组合后处理线程数（保存结果/推送上游/通知前端），0表示同步执行
+        'combination_dedup': True,  # 同一表格模型上并发任务的相同参数组合只计算一次，其他任务复用结果
         'execution_delay_min': 20,  # 执行延迟最小值（秒）
         'execution_delay_max': 30,  # 执行延迟最大值（秒）
         'api_retry_max_attempts': 10,  # API重试最大次数
         'api_retry_delay': 30,  # API重试延迟（秒）
+        'combination_time_budget': 5400,  # 单个参数组合的总时间预算（秒，含轮询与重试），0表示不限制
+        'retry_policies': {},  # 按操作覆盖重试策略，例如 {"stock_api_write": {"max_attempts": 5, "deadline": 300}}
         'frontend_polling_interval': 15000,  # 前端轮询间隔（毫秒）
         'dashboard_refresh_interval': 30000,  # 仪表板刷新间隔（毫秒）
+        'task_stats_ttl': 10,  # 仪表板任务统计缓存时间（秒）
+        'archive_retention_days': 0,  # 任务结束超过该天数后日志和结果移入 data/archive/，0表示不归档（默认关闭）
+        'archive_batch_size': 500,  # 归档后每批删除的数据库记录数
+        'archive_interval': 3600,  # 归档扫描间隔（秒）
+        'delete_batch_size': 1000,  # 删除任务时每批删除的日志/结果数
+        'delete_batch_pause': 0.05,  # 删除批次之间的等待时间（秒），让运行中任务的提交获取写锁
+        'reaper_interval': 30,  # 删除回收器扫描间隔（秒）
+        'campaign_max_stocks': 500,  # 单个批量任务最多包含的股票数
+        'stock_param_refresh_interval': 300,  # 刷新排队任务所需股票模板参数的间隔（秒）
+        'stock_param_bulk_threshold': 50,  # 需要刷新的股票数达到该值时分页批量拉取，否则逐个获取
+        'stock_param_page_size': 500,  # 批量拉取股票模板参数的每页条数
+        'stock_param_cache_ttl': 300,  # 股票模板参数缓存的新鲜期（秒）
+        'stock_param_stale_seconds': 3600,  # 新鲜期过后仍返回旧值并在后台刷新的时长（秒）
         'detail_refresh_interval': 60000,  # 详情页刷新间隔（毫秒）
         'log_polling_interval': 3000,  # 日志轮询间隔（毫秒）
         'log_realtime_interval': 3000,  # 日志实时更新间隔（毫秒）
         'tasks_admin_refresh_interval': 30000,  # 管理页面任务刷新间隔（毫秒）
+        'event_hub_interval': 2,  # /api/events 检查任务变化的间隔（秒），每个任务每个间隔最多推送一次进度
+        'event_stream_max_seconds': 55,  # 单个事件流连接的最长时间（秒），需小于gunicorn超时，浏览器会自动重连
         'parameter_positions': [
             'B6',
             'B7',
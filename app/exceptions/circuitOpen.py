@@ -0,0 +1,9 @@
+
+
+class CircuitOpenError(Exception):
+    """依赖服务的熔断器处于打开状态，调用未发出"""
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} 熔断中，{retry_after:.0f}秒后再试")
+        self.dependency = dependency
+        self.retry_after = retry_after
@@ -0,0 +1,5 @@
+
+
+class CombinationRejected(Exception):
+    """参数组合结果不满足任务的结果规则，属于确定性结果，不重试"""
+    pass
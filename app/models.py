@@ -9,11 +9,24 @@ class Task(db.Model):
     id = db.Column(db.String(36), primary_key=True)  # UUID
     name = db.Column(db.String(255), nullable=False)  # 任务名称
     description = db.Column(db.Text)  # 任务描述
-    status = db.Column(db.String(20), default='pending')  # pending, running, completed, cancelled, error
+    status = db.Column(db.String(20), default='pending')  # pending, queued, running, completed, cancelled, error
     task_type = db.Column(db.String(50), default='google_sheet')  # 任务类型
     
+    # 调度信息
+    priority = db.Column(db.Integer, default=0)  # 优先级，数值越大越优先
+    submitter = db.Column(db.String(100))  # 提交者，用于公平轮转调度
+    queued_at = db.Column(db.DateTime)  # 进入队列时间（自动重排队时为退避结束后的可调度时间）
+    spreadsheet_id = db.Column(db.String(100))  # 启动时占用的电子表格，调度器按此统计各电子表格的运行任务数
+    
+    # 心跳信息
+    last_heartbeat = db.Column(db.DateTime)  # 执行器最近一次心跳时间
+    run_token = db.Column(db.String(36))  # 当前执行器标识，用于识别被接管后恢复的旧执行线程
+    restart_count = db.Column(db.Integer, default=0)  # 看门狗自动重排队次数
+    
     # 配置信息
     config = db.Column(db.Text)  # JSON格式的配置
+    # 所属批量任务，参数网格等共享配置保存在campaigns表，config只保存任务自己的覆盖项
+    campaign_id = db.Column(db.String(36), db.ForeignKey('campaigns.id'), index=True)
     
     # 执行信息
     start_time = db.Column(db.DateTime)
@@ -21,6 +34,8 @@ class Task(db.Model):
     current_step = db.Column(db.Integer, default=0)
     total_steps = db.Column(db.Integer, default=0)
     error_message = db.Column(db.Text)
+    # 日志和结果已移入 data/archive/ 的时间，见task_archive
+    archived_at = db.Column(db.DateTime)
     
     # 时间戳
     created_at = db.Column(db.DateTime, default=datetime.now)
@@ -30,6 +45,13 @@ class Task(db.Model):
     logs = db.relationship('TaskLog', backref='task', lazy=True, cascade='all, delete-orphan')
     results = db.relationship('TaskResult', backref='task', lazy=True, cascade='all, delete-orphan')
     
+    __table_args__ = (
+        # 看门狗按状态+心跳时间扫描挂死任务
+        db.Index('ix_tasks_status_heartbeat', 'status', 'last_heartbeat'),
+        # 调度器按状态+电子表格统计运行任务数
+        db.Index('ix_tasks_status_spreadsheet', 'status', 'spreadsheet_id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -37,16 +59,31 @@ class Task(db.Model):
             'description': self.description,
             'status': self.status,
             'task_type': self.task_type,
-            'config': json.loads(self.config) if self.config else {},
+            'priority': self.priority,
+            'submitter': self.submitter,
+            'queued_at': self.queued_at.isoformat() if self.queued_at else None,
+            'config': self.resolved_config(),
+            'campaign_id': self.campaign_id,
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
             'current_step': self.current_step,
             'total_steps': self.total_steps,
             'error_message': self.error_message,
+            'last_heartbeat': self.last_heartbeat.isoformat() if self.last_heartbeat else None,
+            'restart_count': self.restart_count or 0,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
     
+    def resolved_config(self):
+        """任务配置；批量任务中的任务只保存自己的覆盖项，合并所属批量任务的共享配置（参数网格、表格配置等）"""
+        config = json.loads(self.config) if self.config else {}
+        if not self.campaign_id:
+            return config
+        from app.services.campaign_service import resolve_task_config
+        return resolve_task_config(config, self.campaign_id)
+
     def get_progress_percentage(self):
         if self.total_steps == 0:
             return 0
@@ -62,6 +99,9 @@ class TaskLog(db.Model):
     message = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.now)
     
+    # 增量轮询按 task_id + id 游标查询
+    __table_args__ = (db.Index('ix_task_logs_task_id_id', 'task_id', 'id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -81,8 +121,16 @@ class TaskResult(db.Model):
     result = db.Column(db.Text)  # JSON格式的结果
     success = db.Column(db.Boolean, default=True)
     error_message = db.Column(db.Text)
+    timing = db.Column(db.Text)  # JSON格式的耗时分解（毫秒），见combination_timing
     timestamp = db.Column(db.DateTime, default=datetime.now)
     
+    __table_args__ = (
+        # 增量轮询按 task_id + step_index 游标查询
+        db.Index('ix_task_results_task_id_step', 'task_id', 'step_index'),
+        # 仪表盘按时间窗口统计吞吐量
+        db.Index('ix_task_results_timestamp', 'timestamp'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -91,6 +139,7 @@ class TaskResult(db.Model):
             'result': json.loads(self.result) if self.result else {},
             'success': self.success,
             'error_message': self.error_message,
+            'timing': json.loads(self.timing) if self.timing else None,
             'timestamp': self.timestamp.isoformat()
         }
 
@@ -115,6 +164,34 @@ class TaskTemplate(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+class Campaign(db.Model):
+    """批量任务模型：同一参数网格在多只股票上执行，每只股票一个任务"""
+    __tablename__ = 'campaigns'
+    
+    id = db.Column(db.String(36), primary_key=True)  # UUID
+    name = db.Column(db.String(255), nullable=False)
+    description = db.Column(db.Text)
+    config = db.Column(db.Text)  # JSON格式的共享配置（参数网格、表格配置等）
+    stock_nos = db.Column(db.Text)  # JSON格式的股票编号列表
+    priority = db.Column(db.Integer, default=0)
+    submitter = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    tasks = db.relationship('Task', backref='campaign', lazy=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'stock_nos': json.loads(self.stock_nos) if self.stock_nos else [],
+            'priority': self.priority,
+            'submitter': self.submitter,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
 class SystemConfig(db.Model):
     """系统配置模型"""
     __tablename__ = 'system_configs'
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from app.services.task_manager import task_manager
 from app.services.config_manager import get_config_manager
 from app.models import Task, TaskLog, db
+from app.services.task_stats import task_stats
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -11,20 +12,19 @@ admin_bp = Blueprint('admin', __name__)
 @admin_bp.route('/')
 def dashboard():
     """管理面板首页"""
-    # 获取任务统计
-    total_tasks = Task.query.count()
-    completed_tasks = Task.query.filter_by(status='completed').count()
-    running_tasks = Task.query.filter_by(status='running').count()
-    error_tasks = Task.query.filter_by(status='error').count()
+    # 获取任务统计（按状态一次聚合查询，短时间缓存）
+    stats = task_stats.get()
+    counts = stats['counts']
     
     # 获取最近的任务
     recent_tasks = Task.query.order_by(Task.created_at.desc()).limit(10).all()
     
     return render_template('admin/dashboard.html', 
-                         total_tasks=total_tasks,
-                         completed_tasks=completed_tasks,
-                         running_tasks=running_tasks,
-                         error_tasks=error_tasks,
+                         total_tasks=counts['total'],
+                         completed_tasks=counts['completed'],
+                         running_tasks=counts['running'],
+                         error_tasks=counts['error'],
+                         stats=stats,
                          recent_tasks=recent_tasks)
 
 @admin_bp.route('/tasks')
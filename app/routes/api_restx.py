@@ -1,9 +1,20 @@
 from flask_restx import Namespace, Resource, fields
-from flask import request, Response
-from app.services.task_manager import task_manager
+from flask import current_app, request, Response
+from app.services.task_manager import SUPPORTED_TASK_TYPES, task_manager
 from app.services.config_manager import get_config_manager
+from app.services import campaign_service, task_archive
+from app.services.task_stats import task_stats
+from app.services.event_hub import event_hub
 from app.models import Task, TaskLog, TaskTemplate, TaskResult, db
+from app.utils.circuit_breaker import breaker_snapshots, breakers
+from app.utils.profiler import format_collapsed
 import json
+import os
+import time
+from datetime import datetime
+
+# 采样剖析最长时长（秒），需小于gunicorn请求超时
+MAX_PROFILE_SECONDS = 60
 
 # 通用响应结构
 resp_success = {'status': fields.String, 'message': fields.String}
@@ -20,7 +31,19 @@ task_input = {
     'name': fields.String(required=True, description='任务名称', example='校验Sheet配置'),
     'description': fields.String(description='任务描述', example='批量校验A项目配置'),
     'task_type': fields.String(description='任务类型', example='google_sheet'),
-    'config': fields.Raw(required=True, description='任务配置', example={'spreadsheet_id': '1AbcXYZ...', 'worksheet': 'Sheet1'})
+    'config': fields.Raw(required=True, description='任务配置', example={'spreadsheet_id': '1AbcXYZ...', 'worksheet': 'Sheet1'}),
+    'priority': fields.Integer(description='优先级，数值越大越优先调度', example=0),
+    'submitter': fields.String(description='提交者，同优先级任务在提交者之间轮转调度', example='alice')
+}
+campaign_input = {
+    'name': fields.String(required=True, description='批量任务名称', example='均线参数扫描'),
+    'description': fields.String(description='批量任务描述'),
+    'stock_nos': fields.List(fields.String, required=True, description='股票编号列表，每只股票一个任务',
+                             example=['600000', '000001']),
+    'config': fields.Raw(required=True, description='共享配置（含参数网格parameters），所有任务共用一份',
+                         example={'spreadsheet_id': '1AbcXYZ...', 'parameters': [[5, 10], [20, 30]]}),
+    'priority': fields.Integer(description='优先级，数值越大越优先调度', example=0),
+    'submitter': fields.String(description='提交者', example='alice')
 }
 
 api_ns = Namespace('任务管理', description='任务相关API')
@@ -42,15 +65,88 @@ class TaskListResource(Resource):
     @api_ns.doc('create_task')
     @api_ns.expect(api_ns.model('NewTask', task_input), validate=True)
     def post(self):
-        """创建新任务（示例请求：{'name':'校验Sheet配置','config':{'spreadsheet_id':'1AbcXYZ...'}}）"""
+        """创建新任务并加入调度队列（示例请求：{'name':'校验Sheet配置','priority':1,'config':{'spreadsheet_id':'1AbcXYZ...'}}）"""
         data = request.get_json()
         name = data.get('name')
         description = data.get('description')
         task_type = data.get('task_type', 'google_sheet')
+        if task_type not in SUPPORTED_TASK_TYPES:
+            return {'status': 'error', 'message': f"不支持的任务类型: {task_type}"}, 400
         config = data.get('config')
-        task_id = task_manager.create_task(name, description, task_type, config)
-        started = task_manager.start_task(task_id)
-        return {'status': 'success' if started else 'error', 'task_id': task_id}
+        priority = int(data.get('priority') or 0)
+        submitter = data.get('submitter') or request.remote_addr
+        task_id = task_manager.create_task(name, description, task_type, config, priority=priority, submitter=submitter)
+        queued = task_manager.enqueue_task(task_id)
+        return {
+            'status': 'success' if queued else 'error',
+            'task_id': task_id,
+            'message': '任务创建成功，已加入队列' if queued else '任务创建成功，但加入队列失败'
+        }
+
+@api_ns.route('/campaigns')
+class CampaignListResource(Resource):
+    def get(self):
+        """获取所有批量任务及其各状态任务数"""
+        return {'status': 'success', 'campaigns': campaign_service.list_campaigns()}
+
+    @api_ns.expect(api_ns.model('NewCampaign', campaign_input), validate=True)
+    def post(self):
+        """为多只股票批量创建同一参数网格的任务并加入调度队列（示例请求：{'name':'扫描','stock_nos':['600000'],'config':{...}}）"""
+        data = request.get_json()
+        try:
+            created = campaign_service.create_campaign(
+                data.get('name'),
+                data.get('stock_nos'),
+                data.get('config'),
+                description=data.get('description'),
+                priority=int(data.get('priority') or 0),
+                submitter=data.get('submitter') or request.remote_addr
+            )
+        except ValueError as e:
+            return {'status': 'error', 'message': str(e)}, 400
+        task_manager.start_background_workers(current_app._get_current_object())
+        task_manager.dispatcher.wake()
+        return dict(created, status='success', message=f"已创建 {len(created['tasks'])} 个任务并加入队列")
+
+@api_ns.route('/campaigns/<string:campaign_id>')
+@api_ns.param('campaign_id', '批量任务ID')
+class CampaignResource(Resource):
+    def get(self, campaign_id):
+        """获取批量任务详情和各任务进度"""
+        campaign = campaign_service.get_campaign(campaign_id)
+        if not campaign:
+            return {'status': 'error', 'message': '批量任务不存在'}, 404
+        return {'status': 'success', 'campaign': campaign}
+
+@api_ns.route('/tasks/queue')
+class TaskQueueResource(Resource):
+    def get(self):
+        """获取排队中的任务（按调度顺序）"""
+        return {'status': 'success', 'tasks': task_manager.get_queued_tasks()}
+
+@api_ns.route('/tasks/stats')
+class TaskStatsResource(Resource):
+    @api_ns.param('refresh', '为true时忽略缓存重新统计')
+    def get(self):
+        """任务统计：各状态任务数、近1小时/24小时吞吐量和平均单步耗时（短时间缓存）"""
+        force = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        return {'status': 'success', 'stats': task_stats.get(force=force)}
+
+@api_ns.route('/circuit-breakers')
+class CircuitBreakerListResource(Resource):
+    def get(self):
+        """获取依赖服务熔断器状态（本进程）"""
+        return {'status': 'success', 'breakers': breaker_snapshots()}
+
+@api_ns.route('/circuit-breakers/<string:dependency>/reset')
+@api_ns.param('dependency', '依赖名（google_sheets/stock_api）')
+class CircuitBreakerResetResource(Resource):
+    def post(self, dependency):
+        """手动关闭熔断器，暂停中的任务在下一次检查时恢复"""
+        if dependency not in breakers:
+            return {'status': 'error', 'message': f'未知的依赖: {dependency}'}, 404
+        breakers[dependency].reset()
+        return {'status': 'success', 'message': f'{dependency} 熔断器已关闭'}
 
 @api_ns.route('/tasks/<string:task_id>')
 @api_ns.param('task_id', '任务ID')
@@ -80,18 +176,69 @@ class TaskCancelResource(Resource):
 @api_ns.route('/tasks/<string:task_id>/results')
 @api_ns.param('task_id', '任务ID')
 class TaskResultsResource(Resource):
+    @api_ns.param('since_step', '只返回step_index大于该值的结果（增量轮询）', type=int)
     def get(self, task_id):
-        """获取任务结果"""
-        results = task_manager.get_task_results(task_id)
-        return {'status': 'success', 'results': results}
+        """获取任务结果（示例：/tasks/{task_id}/results?since_step=120）"""
+        since_step = request.args.get('since_step', type=int)
+        results = task_manager.get_task_results(task_id, since_step=since_step)
+        last_step = results[-1]['step_index'] if results else since_step
+        return {'status': 'success', 'results': results, 'last_step': last_step}
 
 @api_ns.route('/tasks/<string:task_id>/logs')
 @api_ns.param('task_id', '任务ID')
 class TaskLogsResource(Resource):
+    @api_ns.param('since_id', '只返回id大于该值的日志（增量轮询）', type=int)
+    @api_ns.param('limit', '最多返回条数', type=int)
     def get(self, task_id):
-        """获取任务日志"""
-        logs = task_manager.get_task_logs(task_id)
-        return {'status': 'success', 'logs': logs}
+        """获取任务日志（示例：/tasks/{task_id}/logs?since_id=3050&limit=500）"""
+        since_id = request.args.get('since_id', type=int)
+        limit = request.args.get('limit', type=int)
+        logs = task_manager.get_task_logs(task_id, since_id=since_id, limit=limit)
+        last_id = max((log['id'] for log in logs), default=since_id)
+        return {'status': 'success', 'logs': logs, 'last_id': last_id}
+
+@api_ns.route('/tasks/<string:task_id>/progress')
+@api_ns.param('task_id', '任务ID')
+class TaskProgressResource(Resource):
+    def get(self, task_id):
+        """获取任务进度快照（状态、步数、速率、预计剩余时间）"""
+        progress = task_manager.get_task_progress(task_id)
+        if not progress:
+            return {'status': 'error', 'message': '任务不存在'}, 404
+        return {'status': 'success', 'progress': progress}
+
+@api_ns.route('/tasks/<string:task_id>/profile')
+@api_ns.param('task_id', '任务ID')
+class TaskProfileResource(Resource):
+    def get(self, task_id):
+        """获取任务耗时分析（写入/等待/读取/校验/推送/保存耗时占比和浪费的轮询次数）"""
+        profile = task_manager.get_task_profile(task_id)
+        if not profile:
+            return {'status': 'error', 'message': '任务不存在'}, 404
+        return {'status': 'success', 'profile': profile}
+
+    @api_ns.param('seconds', '采样时长（秒），默认30，最长60')
+    def post(self, task_id):
+        """采样正在执行的任务的调用栈，返回collapsed格式（可直接生成火焰图）"""
+        seconds = min(max(request.args.get('seconds', 30, type=float), 1), MAX_PROFILE_SECONDS)
+        counts = task_manager.sample_task_stacks(task_id, seconds)
+        if counts is None:
+            # 采样只能在执行任务的工作进程内进行，请求被分配到其他进程时不转发
+            status = db.session.query(Task.status).filter(Task.id == task_id).scalar()
+            if status is None:
+                return {'status': 'error', 'message': '任务不存在'}, 404
+            if status != 'running':
+                return {'status': 'error', 'reason': 'not_running', 'message': f'任务未在执行（状态: {status}）'}, 409
+            return {
+                'status': 'error',
+                'reason': 'other_worker',
+                'worker_pid': os.getpid(),
+                'message': '任务在其他工作进程中执行，采样只能在执行任务的进程内进行；'
+                           '请重试（请求随机分配到工作进程）或在任务配置中使用cprofile'
+            }, 409
+        response = Response(format_collapsed(counts), mimetype='text/plain')
+        response.headers['X-Profile-Samples'] = str(sum(counts.values()))
+        return response
 
 @api_ns.route('/tasks/<string:task_id>/status-check')
 @api_ns.param('task_id', '任务ID')
@@ -126,13 +273,13 @@ confirm_input = api_ns.model('ConfirmInput', {
 @api_ns.param('task_id', '任务ID')
 class TaskCreateRestartResource(Resource):
     def post(self, task_id):
-        """基于原任务创建新的重启任务并尝试启动"""
+        """基于原任务创建新的重启任务并加入调度队列"""
         new_task_id = task_manager.create_restart_task(task_id)
-        started = task_manager.start_task(new_task_id)
+        queued = task_manager.enqueue_task(new_task_id)
         return {
             'status': 'success',
             'new_task_id': new_task_id,
-            'message': '重启任务创建并启动成功' if started else '重启任务创建成功，但启动失败'
+            'message': '重启任务创建成功，已加入队列' if queued else '重启任务创建成功，但加入队列失败'
         }
 
 @api_ns.route('/tasks/<string:task_id>/confirm')
@@ -172,6 +319,46 @@ class TaskEventsStream(Resource):
                     break
         return Response(event_stream(), mimetype='text/event-stream')
 
+@api_ns.route('/events')
+class EventsStream(Resource):
+    @api_ns.param('tasks', '逗号分隔的任务ID，all表示全部任务（默认）')
+    @api_ns.param('logs', '为true时同时推送任务日志')
+    def get(self):
+        """多任务SSE事件流：status/progress/log/deleted事件（示例：/events?tasks=all 或 /events?tasks=id1,id2&logs=true）"""
+        # 长连接会占住单线程的工作进程（gunicorn sync worker），此时拒绝连接，页面退回定时轮询
+        if not request.environ.get('wsgi.multithread'):
+            return {'status': 'error', 'message': '事件流需要多线程工作进程（gunicorn gthread/gevent），请使用定时轮询'}, 503
+        tasks_arg = request.args.get('tasks', 'all').strip()
+        task_ids = None if tasks_arg in ('', 'all') else {task_id.strip() for task_id in tasks_arg.split(',') if task_id.strip()}
+        include_logs = request.args.get('logs', '').lower() in ('1', 'true', 'yes')
+        # 浏览器重连时带上最后收到的事件ID（轮询时间），据此补发断线期间有变化的任务状态
+        try:
+            since = datetime.fromisoformat(request.headers.get('Last-Event-ID', ''))
+        except ValueError:
+            since = None
+
+        config_manager = get_config_manager()
+        # 连接定时结束，由浏览器自动重连，避免长时间占用工作线程
+        max_seconds = float(config_manager.get_config('event_stream_max_seconds', 55))
+        heartbeat_seconds = 15
+        subscription = event_hub.subscribe(current_app._get_current_object(), task_ids, include_logs, since)
+
+        def event_stream():
+            deadline = time.monotonic() + max_seconds
+            try:
+                yield f"retry: 1000\ndata: {json.dumps({'type': 'ready', 'data': {'resumed': since is not None}})}\n\n"
+                while time.monotonic() < deadline:
+                    events = subscription.drain(timeout=min(heartbeat_seconds, max(deadline - time.monotonic(), 0)))
+                    if not events:
+                        yield "data: {\"type\": \"heartbeat\"}\n\n"
+                    for event in events:
+                        prefix = f"id: {event['id']}\n" if event.get('id') else ''
+                        yield f"{prefix}data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            finally:
+                event_hub.unsubscribe(subscription)
+
+        return Response(event_stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 # 系统配置
 config_update_model = config_ns.model('ConfigUpdate', {
     'any_key': fields.Raw(description='配置键值（示例）', example={'LOG_LEVEL': 'INFO'})
@@ -333,6 +520,16 @@ class ResultsListResource(Resource):
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         task_id = request.args.get('task_id')
+        if task_id and task_archive.is_archived(Task.query.get(task_id)):
+            # 已归档任务的结果从归档文件还原后分页
+            archived = sorted(task_archive.archived_results(task_id), key=lambda r: r.timestamp, reverse=True)
+            start = (max(page, 1) - 1) * per_page
+            return {
+                'results': [r.to_dict() for r in archived[start:start + per_page]],
+                'total': len(archived),
+                'pages': (len(archived) + per_page - 1) // per_page if per_page > 0 else 0,
+                'current_page': page
+            }
         query = TaskResult.query
         if task_id:
             query = query.filter_by(task_id=task_id)
@@ -0,0 +1,18 @@
+from flask import Blueprint, Response
+from app.services.task_manager import task_manager
+from app.utils.logger import get_logger
+from app.utils.metrics import generate_metrics
+
+logger = get_logger(__name__)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus指标（多进程模式下汇总所有worker）"""
+    try:
+        task_manager.update_metrics()
+    except Exception as e:
+        logger.warning(f"刷新队列深度指标失败: {str(e)}")
+    content, content_type = generate_metrics()
+    return Response(content, mimetype=content_type)
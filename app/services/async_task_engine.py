@@ -0,0 +1,93 @@
+"""
+异步任务执行引擎
+在单独线程中运行一个事件循环，用协程驱动大量并发的工作表计算，
+共享有界的HTTP连接池，并用信号量限制同时进行的组合计算数
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+import httpx
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncTaskRun:
+    """异步任务的运行句柄，存放在TaskManager.running_tasks中代替线程对象"""
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.future: Optional[Future] = None
+        # 任务协程，采样剖析时沿其cr_await链读取挂起位置
+        self.coro = None
+
+
+class AsyncTaskEngine:
+    """异步任务执行引擎"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._clients: Dict[Optional[str], httpx.AsyncClient] = {}
+        self._evaluation_slots: Optional[asyncio.Semaphore] = None
+        self.max_connections = 100
+        self.max_concurrent_evaluations = 200
+
+    def start(self, max_connections: int = 100, max_concurrent_evaluations: int = 200):
+        """启动事件循环线程（线程不能跨fork继承，每个进程各自启动）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self.max_connections = max_connections
+            self.max_concurrent_evaluations = max_concurrent_evaluations
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                self._evaluation_slots = asyncio.Semaphore(self.max_concurrent_evaluations)
+                ready.set()
+                loop.run_forever()
+
+            thread = threading.Thread(target=run_loop, name='async-task-engine')
+            thread.daemon = True
+            self._loop = loop
+            self._clients = {}
+            self._thread = thread
+            thread.start()
+            ready.wait()
+            logger.info(f"异步任务执行引擎已启动，最大连接数: {max_connections}, "
+                        f"最大并发计算数: {max_concurrent_evaluations}")
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def submit(self, coro) -> Future:
+        """从任意线程提交协程到事件循环执行"""
+        if not self.is_running():
+            raise RuntimeError("异步任务执行引擎未启动")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    @property
+    def evaluation_slots(self) -> asyncio.Semaphore:
+        """限制同时进行的工作表计算数，只能在事件循环中使用"""
+        return self._evaluation_slots
+
+    def get_http_client(self, proxy_url: Optional[str] = None) -> httpx.AsyncClient:
+        """按代理地址获取共享的HTTP客户端，只能在事件循环中调用"""
+        client = self._clients.get(proxy_url)
+        if client is None or client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            client = httpx.AsyncClient(proxy=proxy_url, limits=limits,
+                                       timeout=httpx.Timeout(30.0, connect=10.0))
+            self._clients[proxy_url] = client
+        return client
+
+
+# 全局异步执行引擎实例
+async_engine = AsyncTaskEngine()
@@ -0,0 +1,199 @@
+"""
+批量任务（campaign）模块
+一次请求为多只股票创建同一参数网格的任务：
+
+- 参数网格和表格配置只在campaigns表保存一份，任务的config只保存自己的覆盖项，
+  执行器和调度器通过campaign_id合并共享配置，共享配置每个进程只解析一次
+- 任务和入队日志一次批量插入（PostgreSQL下为COPY）并直接进入队列，
+  由调度器按max_concurrent_tasks和电子表格并发限制（spreadsheet_concurrency / max_tasks_per_spreadsheet）逐步启动；
+  所有股票在同一个工作表写入参数、读取结果，未指定spreadsheet_concurrency时同一电子表格同时只运行一个任务
+- 创建后在后台批量预取各股票的模板参数，见stock_param_cache；预取只唤醒本进程的刷新器（尽力而为），
+  其他工作进程按各自的刷新间隔拉取，缓存未命中时由执行器同步获取
+"""
+import json
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+
+from app.models import Campaign, Task, TaskLog, db
+from app.services.persistence import get_persistence_backend
+from app.services.stock_param_cache import stock_param_cache
+from app.utils.db_retry import safe_db_operation
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_STOCKS = 500
+
+_config_cache: Dict[str, Dict[str, Any]] = {}
+_config_cache_lock = threading.Lock()
+
+
+def campaign_config(campaign_id: Optional[str]) -> Dict[str, Any]:
+    """
+    批量任务的共享配置（只读），创建后不再修改，按ID缓存解析结果
+
+    调度器每轮都要读取排队任务的配置，大参数网格不再逐个任务重复解析
+    """
+    if not campaign_id:
+        return {}
+    with _config_cache_lock:
+        cached = _config_cache.get(campaign_id)
+    if cached is not None:
+        return cached
+
+    raw = db.session.query(Campaign.config).filter(Campaign.id == campaign_id).scalar()
+    try:
+        config = json.loads(raw) if raw else {}
+    except (json.JSONDecodeError, TypeError):
+        logger.error(f"批量任务 {campaign_id} 配置解析失败")
+        config = {}
+    with _config_cache_lock:
+        _config_cache[campaign_id] = config
+    return config
+
+
+def resolve_task_config(task_config: Dict[str, Any], campaign_id: Optional[str]) -> Dict[str, Any]:
+    """任务配置合并所属批量任务的共享配置，任务自己的配置优先"""
+    if not campaign_id:
+        return task_config
+    return {**campaign_config(campaign_id), **task_config}
+
+
+def _normalize_stock_nos(stock_nos) -> List[str]:
+    """去掉空值和重复的股票编号，保持提交顺序"""
+    if not isinstance(stock_nos, list):
+        raise ValueError("stock_nos必须是股票编号列表")
+    normalized = []
+    seen = set()
+    for stock_no in stock_nos:
+        stock_no = str(stock_no).strip() if stock_no is not None else ''
+        if stock_no and stock_no not in seen:
+            seen.add(stock_no)
+            normalized.append(stock_no)
+    return normalized
+
+
+def create_campaign(name: str, stock_nos: List[str], config: Dict[str, Any], description: Optional[str] = None,
+                    priority: int = 0, submitter: Optional[str] = None) -> Dict[str, Any]:
+    """
+    创建批量任务：一条campaign记录加每只股票一个排队任务，在同一个事务中批量插入
+
+    Returns:
+        批量任务信息，含各股票的任务ID
+
+    Raises:
+        ValueError: 股票列表或参数网格无效
+    """
+    from app.services.config_manager import get_config_manager
+
+    stock_nos = _normalize_stock_nos(stock_nos)
+    if not stock_nos:
+        raise ValueError("股票编号列表为空")
+    max_stocks = int(get_config_manager().get_config('campaign_max_stocks', DEFAULT_MAX_STOCKS))
+    if len(stock_nos) > max_stocks:
+        raise ValueError(f"股票数量 {len(stock_nos)} 超过上限 {max_stocks}")
+    if not isinstance(config, dict) or not config.get('parameters'):
+        raise ValueError("缺少参数网格配置parameters")
+
+    # 各股票共用同一个工作表，并发执行会读到其他股票的计算结果
+    config = dict(config)
+    config.setdefault('spreadsheet_concurrency', 1)
+
+    campaign_id = str(uuid.uuid4())
+    now = datetime.now()
+    config_str = json.dumps(config)
+    task_ids = {stock_no: str(uuid.uuid4()) for stock_no in stock_nos}
+    # 执行器按任务名称获取股票模板参数，任务名称即股票编号
+    task_rows = [{
+        'id': task_id,
+        'name': stock_no,
+        'description': f"批量任务 {name}",
+        'task_type': 'google_sheet',
+        'config': '{}',
+        'campaign_id': campaign_id,
+        'status': 'queued',
+        'priority': priority,
+        'submitter': submitter,
+        'queued_at': now,
+        'current_step': 0,
+        'total_steps': 0,
+        'restart_count': 0,
+        'created_at': now,
+        'updated_at': now
+    } for stock_no, task_id in task_ids.items()]
+    log_rows = [{
+        'task_id': task_id,
+        'level': 'info',
+        'message': f'任务已加入队列（批量任务 {name}），优先级: {priority}',
+        'timestamp': now
+    } for task_id in task_ids.values()]
+
+    def insert_operation():
+        db.session.add(Campaign(
+            id=campaign_id,
+            name=name,
+            description=description,
+            config=config_str,
+            stock_nos=json.dumps(stock_nos),
+            priority=priority,
+            submitter=submitter,
+            created_at=now,
+            updated_at=now
+        ))
+        db.session.flush()
+        backend = get_persistence_backend()
+        backend.copy_rows(Task, task_rows)
+        backend.copy_rows(TaskLog, log_rows)
+        db.session.commit()
+
+    safe_db_operation(insert_operation)
+    with _config_cache_lock:
+        _config_cache[campaign_id] = config
+
+    stock_param_cache.prefetch(stock_nos)
+
+    logger.info(f"创建批量任务: {campaign_id} - {name}，{len(stock_nos)} 只股票")
+    return {'campaign_id': campaign_id, 'tasks': task_ids}
+
+
+def _status_counts(campaign_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    """按批量任务和状态统计任务数，一次GROUP BY查询"""
+    counts: Dict[str, Dict[str, int]] = {campaign_id: {} for campaign_id in campaign_ids}
+    if not campaign_ids:
+        return counts
+    rows = db.session.query(Task.campaign_id, Task.status, func.count(Task.id)).filter(
+        Task.campaign_id.in_(campaign_ids)
+    ).group_by(Task.campaign_id, Task.status).all()
+    for campaign_id, status, count in rows:
+        counts[campaign_id][status or 'pending'] = count
+    return counts
+
+
+def list_campaigns() -> List[Dict[str, Any]]:
+    campaigns = Campaign.query.order_by(Campaign.created_at.desc()).all()
+    counts = _status_counts([campaign.id for campaign in campaigns])
+    return [dict(campaign.to_dict(), status_counts=counts[campaign.id]) for campaign in campaigns]
+
+
+def get_campaign(campaign_id: str) -> Optional[Dict[str, Any]]:
+    """批量任务详情，含各任务的状态和进度"""
+    campaign = Campaign.query.get(campaign_id)
+    if not campaign:
+        return None
+    rows = db.session.query(
+        Task.id, Task.name, Task.status, Task.current_step, Task.total_steps, Task.error_message
+    ).filter(Task.campaign_id == campaign_id).order_by(Task.created_at.asc(), Task.name.asc()).all()
+    tasks = [{
+        'id': row.id,
+        'stock_no': row.name,
+        'status': row.status,
+        'current_step': row.current_step or 0,
+        'total_steps': row.total_steps or 0,
+        'error_message': row.error_message
+    } for row in rows]
+    return dict(campaign.to_dict(), config=campaign_config(campaign_id), tasks=tasks,
+                status_counts=_status_counts([campaign_id])[campaign_id])
@@ -0,0 +1,80 @@
+"""
+参数组合去重模块
+同一股票在同一表格模型上的同一参数组合正在被某个任务计算时，其他任务等待同一个Future共享结果，不再重复写入和轮询表格。
+共享的是计算方读到的原始单元格值，结果规则、允许为0的结果和结果校验由各任务按自己的配置处理。
+登记表在进程内存中，只对同一进程内（线程引擎或异步引擎）并发执行的任务生效
+"""
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 决定参数写到哪里、结果从哪里读取的配置项，不同的任务只有这些全部相同时才共享计算
+LAYOUT_KEYS = ('parameter_positions', 'check_positions', 'result_positions', 'nonce_cell', 'sentinel_cell')
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def build_dedup_key(config_data: Dict[str, Any], combination: List,
+                    stock_no: Optional[str]) -> Tuple[str, Optional[str], Tuple, Tuple[str, ...]]:
+    """
+    去重键：(表格模型, 股票编号, 单元格布局, 参数组合)
+
+    表格模型默认为 电子表格ID/工作表名，多个电子表格是同一模型的副本时可在任务配置中用model_key指定相同的值；
+    计算结果取决于股票，不同股票的任务（例如同一批量任务中的各股票）即使模型和参数组合相同也不共享；
+    单元格布局为参数、检查、结果位置和哨兵单元格，结果规则和允许为0的结果由各任务自行处理，不进入键
+    """
+    model = config_data.get('model_key') or f"{config_data.get('spreadsheet_id')}/{config_data.get('sheet_name')}"
+    layout = tuple(_freeze(config_data.get(key)) for key in LAYOUT_KEYS)
+    return model, stock_no, layout, tuple(str(value) for value in combination)
+
+
+class InflightCombinations:
+    """正在计算的参数组合登记表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+
+    def acquire(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        登记参数组合
+
+        Returns:
+            (future, owner)，owner为True时调用方负责计算并调用finish，否则等待future
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def finish(self, key: Hashable, future: Future, outcome: Any = None, error: BaseException = None):
+        """计算结束，唤醒等待者并注销"""
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(outcome)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+
+# 全局登记表实例
+inflight_combinations = InflightCombinations()
@@ -0,0 +1,321 @@
+"""
+参数组合流水线模块
+第i个参数组合的结果持久化、上游推送和前端通知在小线程池中执行，
+主线程同时开始写入第i+1个参数组合，并统计各阶段的忙碌与空闲时间
+
+后处理中用 pipeline_turn() 包住的部分（上游推送）按提交顺序依次执行，前面的组合在该部分失败后，
+后面的组合不再进入；断点只推进到最早的未完成后处理（low_water），进程中途退出时不会越过未推送的组合
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Deque, Set, Tuple
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PipelineStageError(Exception):
+    """后处理阶段失败，携带失败的组合序号"""
+
+    def __init__(self, step_index: int, error: Exception):
+        super().__init__(f"第 {step_index + 1} 个参数组合后处理失败: {str(error)}")
+        self.step_index = step_index
+        self.error = error
+
+
+class PipelineAborted(Exception):
+    """更早提交的组合在顺序执行部分失败，本组合不再进入"""
+
+    def __init__(self):
+        super().__init__("之前的参数组合后处理失败，本组合未推送")
+
+
+class _TurnSequencer:
+    """按提交序号轮流进入顺序执行部分"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._allocated = 0
+        self._turn = 0
+        self._released: Set[int] = set()
+        self._failed = False
+
+    def allocate(self) -> int:
+        with self._cond:
+            seq = self._allocated
+            self._allocated += 1
+            return seq
+
+    def wait_turn(self, seq: int):
+        with self._cond:
+            while self._turn < seq and not self._failed:
+                self._cond.wait()
+            if self._failed:
+                raise PipelineAborted()
+
+    def release(self, seq: int, failed: bool = False):
+        """序号seq让出顺序（可重复调用），failed时后面的序号不再进入"""
+        with self._cond:
+            if failed:
+                self._failed = True
+            self._released.add(seq)
+            while self._turn in self._released:
+                self._released.discard(self._turn)
+                self._turn += 1
+            self._cond.notify_all()
+
+
+# 当前线程正在执行的后处理对应的 (顺序器, 提交序号)
+_turn_local = threading.local()
+
+
+@contextmanager
+def pipeline_turn():
+    """
+    按提交顺序执行的后处理部分：等待更早提交的组合完成该部分后再进入，
+    更早的组合在该部分失败时抛出PipelineAborted；不在流水线中（同步执行、分片执行）时直接执行
+    """
+    turn = getattr(_turn_local, 'turn', None)
+    if turn is None:
+        yield
+        return
+    sequencer, seq = turn
+    sequencer.wait_turn(seq)
+    try:
+        yield
+    except BaseException:
+        sequencer.release(seq, failed=True)
+        raise
+    sequencer.release(seq)
+
+
+def _run_with_turn(app, sequencer: _TurnSequencer, seq: int, fn: Callable, *args, **kwargs):
+    _turn_local.turn = (sequencer, seq)
+    try:
+        with app.app_context():
+            return fn(*args, **kwargs)
+    finally:
+        _turn_local.turn = None
+        # 没有进入顺序执行部分的后处理也要让出顺序
+        sequencer.release(seq)
+
+
+class PipelineStats:
+    """流水线各阶段耗时统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started_at = time.monotonic()
+        self._busy: Dict[str, float] = {}
+        self._count: Dict[str, int] = {}
+        # 主线程因后台阶段积压而阻塞等待的时间
+        self.backpressure_seconds = 0.0
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._busy[stage] = self._busy.get(stage, 0.0) + seconds
+            self._count[stage] = self._count.get(stage, 0) + 1
+
+    @contextmanager
+    def measure(self, stage: str):
+        """统计一个阶段的执行耗时"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取统计快照
+
+        Returns:
+            {'wall_ms', 'backpressure_ms', 'stages': {阶段: {'count', 'busy_ms', 'idle_ms'}}}，
+            idle_ms为流水线运行期间该阶段没有工作可做的时间
+        """
+        with self._lock:
+            wall = time.monotonic() - self._started_at
+            stages = {
+                stage: {
+                    'count': self._count[stage],
+                    'busy_ms': round(busy * 1000),
+                    'idle_ms': round(max(wall - busy, 0.0) * 1000)
+                }
+                for stage, busy in self._busy.items()
+            }
+            return {
+                'wall_ms': round(wall * 1000),
+                'backpressure_ms': round(self.backpressure_seconds * 1000),
+                'stages': stages
+            }
+
+    def summary(self) -> str:
+        """格式化为一行日志"""
+        snapshot = self.snapshot()
+        parts = [
+            f"{stage} 忙碌{data['busy_ms'] / 1000:.1f}s/空闲{data['idle_ms'] / 1000:.1f}s({data['count']}次)"
+            for stage, data in snapshot['stages'].items()
+        ]
+        return (f"流水线统计：总耗时{snapshot['wall_ms'] / 1000:.1f}s，"
+                f"主线程等待后台阶段{snapshot['backpressure_ms'] / 1000:.1f}s；" + "，".join(parts))
+
+
+class CombinationPipeline:
+    """
+    参数组合后处理流水线
+
+    submit 提交的后处理在线程池中执行，未完成的数量超过 max_pending 时主线程阻塞等待最早的一个。
+    后处理抛出的异常在下一次 submit 或 drain 时于主线程以 PipelineStageError 重新抛出。
+    """
+
+    def __init__(self, app, workers: int = 2, max_pending: int = None, stats: PipelineStats = None):
+        """
+        Args:
+            app: Flask应用实例，后处理在其应用上下文中执行
+            workers: 线程池大小
+            max_pending: 允许未完成的后处理数量，默认等于workers
+        """
+        self.app = app
+        self.max_pending = max(1, max_pending or workers)
+        self.stats = stats or PipelineStats()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='combination-pipeline')
+        self._pending: Deque[Tuple[int, Future]] = deque()
+        self._sequencer = _TurnSequencer()
+
+    def submit(self, step_index: int, fn: Callable, *args, **kwargs):
+        """提交第step_index个组合的后处理"""
+        self._collect(wait_all=False)
+        future = self._executor.submit(_run_with_turn, self.app, self._sequencer, self._sequencer.allocate(),
+                                       fn, *args, **kwargs)
+        self._pending.append((step_index, future))
+
+        if len(self._pending) > self.max_pending:
+            started = time.monotonic()
+            try:
+                self._wait_oldest()
+            finally:
+                self.stats.backpressure_seconds += time.monotonic() - started
+
+    def low_water(self, default: int) -> int:
+        """最早的未完成（或失败）后处理的组合序号，都已完成时返回default"""
+        for step_index, future in list(self._pending):
+            if not future.done() or future.exception() is not None:
+                return min(step_index, default)
+        return default
+
+    def drain(self):
+        """等待所有后处理完成，有失败时抛出最早的异常"""
+        started = time.monotonic()
+        try:
+            self._collect(wait_all=True)
+        finally:
+            self.stats.backpressure_seconds += time.monotonic() - started
+
+    def shutdown(self):
+        """等待已提交的后处理结束并关闭线程池，异常只记录不抛出"""
+        try:
+            self.drain()
+        except Exception as e:
+            logger.error(f"流水线后处理失败: {str(e)}")
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _wait_oldest(self):
+        step_index, oldest = self._pending.popleft()
+        error = oldest.exception()
+        if error is not None:
+            self._discard_pending()
+            raise PipelineStageError(step_index, error) from error
+
+    def _discard_pending(self):
+        """丢弃其余未回收的结果，等待其执行完毕"""
+        for _, rest in self._pending:
+            rest.exception()
+        self._pending.clear()
+
+    def _collect(self, wait_all: bool):
+        """回收已完成的后处理，按提交顺序抛出第一个异常"""
+        while self._pending:
+            step_index, future = self._pending[0]
+            if not wait_all and not future.done():
+                return
+            self._pending.popleft()
+            error = future.exception()
+            if error is not None:
+                self._discard_pending()
+                raise PipelineStageError(step_index, error) from error
+
+
+class AsyncCombinationPipeline:
+    """
+    参数组合后处理流水线（协程版）
+
+    后处理仍是同步的数据库与HTTP调用，在线程中执行，不阻塞事件循环；
+    语义与 CombinationPipeline 相同。
+    """
+
+    def __init__(self, app, max_pending: int = 2, stats: PipelineStats = None):
+        self.app = app
+        self.max_pending = max(1, max_pending)
+        self.stats = stats or PipelineStats()
+        self._pending: Deque[Tuple[int, asyncio.Task]] = deque()
+        self._sequencer = _TurnSequencer()
+
+    async def submit(self, step_index: int, fn: Callable, *args, **kwargs):
+        """提交第step_index个组合的后处理"""
+        self._collect()
+        task = asyncio.ensure_future(asyncio.to_thread(
+            _run_with_turn, self.app, self._sequencer, self._sequencer.allocate(), fn, *args, **kwargs
+        ))
+        self._pending.append((step_index, task))
+
+        if len(self._pending) > self.max_pending:
+            started = time.monotonic()
+            try:
+                step_index, oldest = self._pending[0]
+                await asyncio.wait([oldest])
+                self._collect()
+            finally:
+                self.stats.backpressure_seconds += time.monotonic() - started
+
+    def low_water(self, default: int) -> int:
+        """最早的未完成（或失败）后处理的组合序号，都已完成时返回default"""
+        for step_index, task in list(self._pending):
+            if not task.done() or task.exception() is not None:
+                return min(step_index, default)
+        return default
+
+    async def drain(self):
+        """等待所有后处理完成，有失败时抛出最早的异常"""
+        started = time.monotonic()
+        try:
+            if self._pending:
+                await asyncio.wait([task for _, task in self._pending])
+            self._collect()
+        finally:
+            self.stats.backpressure_seconds += time.monotonic() - started
+
+    async def shutdown(self):
+        """等待已提交的后处理结束，异常只记录不抛出"""
+        try:
+            await self.drain()
+        except Exception as e:
+            logger.error(f"流水线后处理失败: {str(e)}")
+
+    def _collect(self):
+        """回收已完成的后处理，按提交顺序抛出第一个异常"""
+        while self._pending:
+            step_index, task = self._pending[0]
+            if not task.done():
+                return
+            self._pending.popleft()
+            error = task.exception()
+            if error is not None:
+                # 其余后处理继续在线程中执行完毕，结果不再回收
+                self._pending.clear()
+                raise PipelineStageError(step_index, error) from error
@@ -0,0 +1,154 @@
+"""
+参数组合分片模块
+任务配置了多个目标（电子表格/工作表/认证文件/代理）时，把待执行的组合序号按目标切成连续的分片，
+每个目标一个执行者；执行者做完自己的分片后从剩余最多的分片尾部窃取一半，
+变慢或被限流的目标因此自然把剩余组合让给其他目标，退出的目标的剩余组合也由其他目标接手
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+
+
+class TargetStats:
+    """单个目标的执行统计"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.completed = 0
+        self.failed = 0
+        self.stolen = 0
+        self.busy_seconds = 0.0
+        self.retired = False
+        self._started_at = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started_at
+        return {
+            'target': self.label,
+            'completed': self.completed,
+            'failed': self.failed,
+            'stolen': self.stolen,
+            'busy_ms': round(self.busy_seconds * 1000),
+            'per_hour': round(self.completed * 3600 / elapsed, 1) if elapsed > 0 else 0,
+            'retired': self.retired
+        }
+
+
+class ShardQueue:
+    """
+    可窃取的组合序号队列，线程安全
+
+    各分片的deque保持升序：执行者从自己分片的头部取，窃取时拿走其他分片尾部的一半，
+    放回的序号一定小于分片当前头部，因此low_water只需比较各分片头部和执行中的序号
+    """
+
+    def __init__(self, indices: Iterable[int], labels: List[str]):
+        indices = sorted(indices)
+        shard_count = len(labels)
+        size, extra = divmod(len(indices), shard_count)
+        self._shards: List[Deque[int]] = []
+        position = 0
+        for shard in range(shard_count):
+            length = size + (1 if shard < extra else 0)
+            self._shards.append(deque(indices[position:position + length]))
+            position += length
+        self.stats = [TargetStats(label) for label in labels]
+        self._inflight: Set[int] = set()
+        self._lock = threading.Lock()
+        # 非None时所有执行者停止取新组合，值为任务最终状态
+        self.stop_status: Optional[str] = None
+        self.stop_error: Optional[Exception] = None
+
+    def next(self, shard: int) -> Optional[int]:
+        """取下一个组合序号，自己的分片为空时窃取；已停止、已退出或没有剩余组合时返回None"""
+        with self._lock:
+            if self.stop_status or self.stats[shard].retired:
+                return None
+            own = self._shards[shard]
+            if not own:
+                self._steal(shard)
+            if not own:
+                return None
+            index = own.popleft()
+            self._inflight.add(index)
+            return index
+
+    def should_wait(self, shard: int) -> bool:
+        """没有可取的组合但其他目标仍有执行中的组合，它们失败放回后还需要有人接手"""
+        with self._lock:
+            return not self.stop_status and not self.stats[shard].retired and bool(self._inflight)
+
+    def _steal(self, shard: int):
+        """从剩余最多的分片尾部拿走一半（至少一个），调用方持有锁"""
+        victim = max(range(len(self._shards)), key=lambda other: len(self._shards[other]))
+        remaining = len(self._shards[victim])
+        if victim == shard or remaining == 0:
+            return
+        count = max(remaining // 2, 1)
+        stolen = [self._shards[victim].pop() for _ in range(count)]
+        stolen.reverse()
+        self._shards[shard].extend(stolen)
+        self.stats[shard].stolen += count
+
+    def complete(self, shard: int, index: int, seconds: float):
+        with self._lock:
+            self._inflight.discard(index)
+            self.stats[shard].completed += 1
+            self.stats[shard].busy_seconds += seconds
+
+    def release(self, shard: int, index: int, seconds: float = 0.0, failed: bool = True):
+        """组合未完成，放回分片头部由其他目标重试；failed为False时不计入失败（例如任务被取消）"""
+        with self._lock:
+            self._inflight.discard(index)
+            self._shards[shard].appendleft(index)
+            if failed:
+                self.stats[shard].failed += 1
+            self.stats[shard].busy_seconds += seconds
+
+    def retire(self, shard: int):
+        """目标退出，剩余组合留在分片中由其他目标窃取"""
+        with self._lock:
+            self.stats[shard].retired = True
+
+    def stop(self, status: str, error: Exception = None):
+        """停止所有执行者，只记录第一次停止的原因"""
+        with self._lock:
+            if not self.stop_status:
+                self.stop_status = status
+                self.stop_error = error
+
+    def remaining(self) -> int:
+        """尚未完成的组合数（含执行中）"""
+        with self._lock:
+            return sum(len(shard) for shard in self._shards) + len(self._inflight)
+
+    def low_water(self) -> Optional[int]:
+        """最小的未完成组合序号，断点只能推进到这里；全部完成时返回None"""
+        with self._lock:
+            candidates = [shard[0] for shard in self._shards if shard]
+            if self._inflight:
+                candidates.append(min(self._inflight))
+            return min(candidates) if candidates else None
+
+    def completed(self) -> int:
+        with self._lock:
+            return sum(stats.completed for stats in self.stats)
+
+    def failed(self) -> int:
+        with self._lock:
+            return sum(stats.failed for stats in self.stats)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """各目标的吞吐统计"""
+        with self._lock:
+            return [stats.to_dict() for stats in self.stats]
+
+    def summary(self) -> str:
+        """格式化为一行日志"""
+        parts = [
+            f"{data['target']} 完成{data['completed']}个/失败{data['failed']}个/窃取{data['stolen']}个，"
+            f"{data['per_hour']}个/小时{'（已退出）' if data['retired'] else ''}"
+            for data in self.snapshot()
+        ]
+        return "分片统计：" + "；".join(parts)
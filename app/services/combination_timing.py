@@ -0,0 +1,97 @@
+"""
+参数组合耗时分解模块
+记录单个参数组合在写入、等待重新计算、读取、校验、推送上游和保存结果上各花了多少时间，
+随TaskResult一起保存，任务耗时分析按任务汇总这些记录
+"""
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, Optional
+
+# 计时片段（毫秒）
+SPANS = ('write', 'wait', 'read', 'validate', 'upstream', 'persist')
+# 表格阶段中单独计时的片段，其余时间计为other（重试退避、心跳等）
+SHEET_SPANS = ('write', 'wait', 'read', 'validate')
+
+
+class CombinationTiming:
+    """单个参数组合的耗时分解，跨重试累计"""
+
+    def __init__(self):
+        self._seconds: Dict[str, float] = {}
+        self.polls = 0
+        self.attempts = 0
+        # 结果是否复用自其他任务的同一计算
+        self.shared = False
+        # 表格阶段总耗时（含重试退避），由调用方测量
+        self.sheet_seconds = 0.0
+
+    def add(self, span: str, seconds: float):
+        self._seconds[span] = self._seconds.get(span, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, span: str):
+        """统计一个片段的耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(span, time.perf_counter() - started)
+
+    def to_dict(self) -> Dict[str, int]:
+        """转换为紧凑字典，耗时取整到毫秒，省略未发生的片段"""
+        data = {span: round(seconds * 1000) for span, seconds in self._seconds.items()}
+        if self.sheet_seconds:
+            data['sheet'] = round(self.sheet_seconds * 1000)
+        data['polls'] = self.polls
+        data['attempts'] = self.attempts
+        if self.shared:
+            data['shared'] = 1
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+def summarize_timings(timings: Iterable[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    汇总任务各参数组合的耗时分解
+
+    Returns:
+        {'combinations', 'wall_ms', 'spans': {片段: {'total_ms', 'avg_ms', 'share'}},
+         'polls', 'wasted_polls', 'attempts', 'retries', 'shared'}，
+        wall_ms为表格阶段、推送上游和保存结果的总和，share为各片段占wall_ms的比例；
+        每次尝试最后一次轮询取得结果，其余轮询计为wasted_polls；shared为复用其他任务计算结果的组合数
+    """
+    totals = dict.fromkeys(SPANS + ('other',), 0)
+    count = polls = attempts = shared = 0
+    for timing in timings:
+        if not timing:
+            continue
+        count += 1
+        for span in SPANS:
+            totals[span] += timing.get(span, 0)
+        sheet_ms = timing.get('sheet', 0)
+        totals['other'] += max(sheet_ms - sum(timing.get(span, 0) for span in SHEET_SPANS), 0)
+        polls += timing.get('polls', 0)
+        attempts += timing.get('attempts', 0)
+        shared += timing.get('shared', 0)
+
+    wall_ms = sum(totals.values())
+    return {
+        'combinations': count,
+        'wall_ms': wall_ms,
+        'spans': {
+            span: {
+                'total_ms': total,
+                'avg_ms': round(total / count) if count else 0,
+                'share': round(total / wall_ms, 3) if wall_ms else 0
+            }
+            for span, total in totals.items()
+        },
+        'polls': polls,
+        'wasted_polls': max(polls - attempts, 0),
+        'attempts': attempts,
+        'retries': max(attempts - count + shared, 0),
+        'shared': shared
+    }
@@ -0,0 +1,260 @@
+"""
+任务事件中心
+/api/events 在一个SSE连接上推送多个任务（或全部任务）的状态、进度和日志事件，管理页面不再各自定时轮询。
+
+每个进程一个轮询线程，只在有订阅者时按 event_hub_interval 查询一次数据库（有变化的任务行、新增的任务日志），
+再分发给本进程的所有订阅者。任务可能在其他工作进程中执行，所以以数据库为准，不依赖本进程的事件队列。
+订阅者缓冲区内同一任务的状态/进度只保留最新一条，每个任务每个轮询间隔最多推送一次进度，慢客户端也不会积压
+"""
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, or_
+
+from app.models import Task, TaskLog, db
+from app.services.task_progress import build_rates, task_progress
+from app.utils.background import PeriodicWorker
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 无论updated_at是否变化都要检查的状态（执行器心跳等更新不经过ORM）
+ACTIVE_STATUSES = ('pending', 'queued', 'running', 'deleting')
+# 按updated_at查询变化时向前多看的秒数，覆盖查询时尚未提交的事务，重复行按状态比较去重
+CHANGE_SLACK_SECONDS = 5
+# 每轮最多读取的新日志数，积压时下一轮继续
+LOG_BATCH_LIMIT = 500
+# 每个订阅者最多缓冲的日志数，超出时丢弃最旧的并通知客户端
+SUBSCRIBER_LOG_BUFFER = 500
+
+# 状态事件携带的任务字段
+STATUS_FIELDS = ('status', 'current_step', 'total_steps', 'error_message', 'start_time', 'end_time')
+# 进度事件携带的字段（与进度接口一致）
+PROGRESS_FIELDS = ('current_step', 'total_steps', 'percent', 'avg_step_seconds', 'steps_per_hour', 'eta_seconds')
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class Subscription:
+    """单个SSE连接的订阅"""
+
+    def __init__(self, task_ids: Optional[Set[str]] = None, include_logs: bool = False):
+        """
+        Args:
+            task_ids: 订阅的任务ID，None表示全部任务
+            include_logs: 是否推送任务日志
+        """
+        self.task_ids = task_ids
+        self.include_logs = include_logs
+        self._cond = threading.Condition()
+        self._latest: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+        self._logs: Deque[Dict[str, Any]] = deque(maxlen=SUBSCRIBER_LOG_BUFFER)
+        self._dropped_logs = 0
+
+    def wants(self, task_id: str) -> bool:
+        return self.task_ids is None or task_id in self.task_ids
+
+    def publish(self, event: Dict[str, Any]):
+        with self._cond:
+            if event['type'] == 'log':
+                if len(self._logs) == self._logs.maxlen:
+                    self._dropped_logs += 1
+                self._logs.append(event)
+            else:
+                # 同一任务未发送的状态/进度事件合并为最新一条
+                key = (event['type'], event.get('task_id'))
+                self._latest.pop(key, None)
+                self._latest[key] = event
+            self._cond.notify()
+
+    def drain(self, timeout: float) -> List[Dict[str, Any]]:
+        """取出所有待发送事件，没有事件时最多等待timeout秒"""
+        with self._cond:
+            if not self._latest and not self._logs:
+                self._cond.wait(timeout)
+            events = list(self._latest.values()) + list(self._logs)
+            if self._dropped_logs:
+                events.append({'type': 'logs_dropped', 'data': {'count': self._dropped_logs}})
+            self._latest.clear()
+            self._logs.clear()
+            self._dropped_logs = 0
+            return events
+
+
+class EventHub(PeriodicWorker):
+    """轮询任务变化并分发给本进程的订阅者，第一个订阅者连接时启动"""
+
+    name = 'event-hub'
+    default_interval = 2
+
+    def __init__(self):
+        super().__init__()
+        self._subscribers_lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._states: Dict[str, Tuple] = {}
+        self._known_ids: Optional[Set[str]] = None
+        self._since: Optional[datetime] = None
+        self._last_log_id: Optional[int] = None
+        self.last_poll_at: Optional[datetime] = None
+
+    def get_interval(self) -> float:
+        from app.services.config_manager import get_config_manager
+        return get_config_manager().get_config('event_hub_interval', self.default_interval)
+
+    def subscribe(self, app, task_ids: Optional[Set[str]] = None, include_logs: bool = False,
+                  since: Optional[datetime] = None) -> Subscription:
+        """
+        注册订阅，since不为空时（客户端断线重连）补发此后有变化的任务状态
+
+        补发在注册之后进行，与轮询线程重复推送的事件由客户端按最新值覆盖
+        """
+        subscription = Subscription(task_ids, include_logs)
+        with self._subscribers_lock:
+            self._subscribers.add(subscription)
+        self.start(app)
+        if since is not None:
+            for row in self._query_tasks(since - timedelta(seconds=CHANGE_SLACK_SECONDS), task_ids):
+                subscription.publish(self._status_event(row))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._subscribers_lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._subscribers_lock:
+            return len(self._subscribers)
+
+    def run_once(self):
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            # 没有订阅者时不查询数据库，下一个订阅者连接时重新建立基线
+            self._states.clear()
+            self._known_ids = None
+            self._since = None
+            self._last_log_id = None
+            return
+        self.poll(subscribers)
+
+    def poll(self, subscribers: List[Subscription]):
+        """查询一轮变化并分发"""
+        started_at = datetime.now()
+        self.last_poll_at = started_at
+        task_filter = self._task_filter(subscribers)
+
+        # 第一轮没有上一轮的状态，活动任务和刚变化的任务都按新任务推送，覆盖客户端加载列表与本轮查询之间的变化
+        since = self._since or started_at - timedelta(seconds=CHANGE_SLACK_SECONDS)
+        events = self._deleted_tasks(task_filter)
+        events.extend(self._diff_tasks(self._query_tasks(since, task_filter)))
+        self._dispatch(subscribers, events)
+
+        log_subscribers = [subscriber for subscriber in subscribers if subscriber.include_logs]
+        if log_subscribers:
+            self._dispatch(log_subscribers, self._new_logs())
+        else:
+            self._last_log_id = None
+
+        self._since = started_at - timedelta(seconds=CHANGE_SLACK_SECONDS)
+
+    @staticmethod
+    def _task_filter(subscribers: Iterable[Subscription]) -> Optional[Set[str]]:
+        """所有订阅者关心的任务ID并集，有订阅全部任务的订阅者时返回None"""
+        task_ids: Set[str] = set()
+        for subscriber in subscribers:
+            if subscriber.task_ids is None:
+                return None
+            task_ids |= subscriber.task_ids
+        return task_ids
+
+    @staticmethod
+    def _query_tasks(since: datetime, task_ids: Optional[Set[str]]):
+        """查询since之后有变化的任务和所有活动任务，只取推送需要的列"""
+        query = db.session.query(Task.id, *(getattr(Task, field) for field in STATUS_FIELDS)).filter(
+            or_(Task.updated_at >= since, Task.status.in_(ACTIVE_STATUSES))
+        )
+        if task_ids is not None:
+            query = query.filter(Task.id.in_(task_ids))
+        return query.all()
+
+    @staticmethod
+    def _state(row) -> Tuple:
+        return tuple(getattr(row, field) for field in STATUS_FIELDS)
+
+    @staticmethod
+    def _status_event(row) -> Dict[str, Any]:
+        data = {field: _isoformat(getattr(row, field)) for field in STATUS_FIELDS}
+        return {'type': 'status', 'task_id': row.id, 'data': data}
+
+    @staticmethod
+    def _progress_event(row) -> Dict[str, Any]:
+        """进度事件，任务在本进程执行时带速率和预计剩余时间"""
+        snapshot = task_progress.get(row.id)
+        if snapshot and snapshot.get('status') == 'running':
+            data = {key: snapshot.get(key) for key in PROGRESS_FIELDS}
+        else:
+            data = {'current_step': row.current_step or 0, 'total_steps': row.total_steps or 0}
+            data.update(build_rates(data['current_step'], data['total_steps'], None))
+        return {'type': 'progress', 'task_id': row.id, 'data': data}
+
+    def _diff_tasks(self, rows) -> List[Dict[str, Any]]:
+        """与上一轮比较：状态变化推送status，只有步数变化推送progress"""
+        events = []
+        seen = set()
+        for row in rows:
+            seen.add(row.id)
+            self._known_ids.add(row.id)
+            state = self._state(row)
+            previous = self._states.get(row.id)
+            self._states[row.id] = state
+            if previous == state:
+                continue
+            if previous is None or previous[0] != state[0] or previous[3:] != state[3:]:
+                events.append(self._status_event(row))
+            else:
+                events.append(self._progress_event(row))
+
+        # 未变化的已结束任务不再跟踪，之后再变化时按新任务推送status
+        for task_id in set(self._states) - seen:
+            del self._states[task_id]
+        return events
+
+    def _deleted_tasks(self, task_ids: Optional[Set[str]]) -> List[Dict[str, Any]]:
+        """
+        已删除的任务：每轮只查询任务数，少于已知任务数时才查询全部ID比对
+
+        回收器可能在一个轮询间隔内删完小任务，deleting状态不一定能被观察到，所以不能只靠状态变化判断
+        """
+        def scoped(query):
+            return query.filter(Task.id.in_(task_ids)) if task_ids is not None else query
+
+        if self._known_ids is not None and scoped(db.session.query(func.count(Task.id))).scalar() == len(self._known_ids):
+            return []
+        current = {task_id for (task_id,) in scoped(db.session.query(Task.id))}
+        deleted = self._known_ids - current if self._known_ids is not None else set()
+        self._known_ids = current
+        return [{'type': 'deleted', 'task_id': task_id} for task_id in deleted]
+
+    def _new_logs(self) -> List[Dict[str, Any]]:
+        if self._last_log_id is None:
+            self._last_log_id = db.session.query(func.max(TaskLog.id)).scalar() or 0
+            return []
+        logs = TaskLog.query.filter(TaskLog.id > self._last_log_id).order_by(TaskLog.id.asc()).limit(LOG_BATCH_LIMIT).all()
+        if logs:
+            self._last_log_id = logs[-1].id
+        return [{'type': 'log', 'task_id': log.task_id, 'data': log.to_dict()} for log in logs]
+
+    def _dispatch(self, subscribers: List[Subscription], events: List[Dict[str, Any]]):
+        for event in events:
+            event['id'] = self.last_poll_at.isoformat()
+            for subscriber in subscribers:
+                if subscriber.wants(event.get('task_id')):
+                    subscriber.publish(event)
+
+
+# 全局事件中心实例
+event_hub = EventHub()
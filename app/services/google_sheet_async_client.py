@@ -0,0 +1,163 @@
+"""
+Google Sheet异步客户端
+基于httpx直接调用Sheets v4 REST API，与同步客户端使用同一份OAuth凭证
+"""
+import asyncio
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+import httpx
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.services.google_sheet_client import first_value
+from app.utils.circuit_breaker import GOOGLE_SHEETS, get_breaker
+from app.utils.logger import get_logger
+from app.utils.metrics import SHEET_WRITE_SECONDS, SHEET_READ_SECONDS
+
+logger = get_logger(__name__)
+sheets_breaker = get_breaker(GOOGLE_SHEETS)
+
+SHEETS_API_BASE = "https://sheets.googleapis.com/v4/spreadsheets"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+
+class AsyncGoogleSheet:
+    """Google Sheet异步客户端类，接口与GoogleSheet中任务执行用到的方法保持一致"""
+
+    def __init__(self, http_client: httpx.AsyncClient, spreadsheet_id: str, sheet_name: str,
+                 token_file: str = "data/token.json"):
+        """
+        Args:
+            http_client: 共享的httpx异步客户端（由异步执行引擎管理连接池）
+            spreadsheet_id: 电子表格ID
+            sheet_name: 工作表名称
+            token_file: 认证文件路径
+        """
+        self.http = http_client
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.worksheet = None
+        self.creds = Credentials.from_authorized_user_file(token_file, scopes=SCOPES)
+        self._refresh_lock = asyncio.Lock()
+
+    async def open(self):
+        """校验电子表格和工作表是否存在"""
+        data = await self._request(
+            'GET', f"{SHEETS_API_BASE}/{self.spreadsheet_id}", 'open',
+            params={'fields': 'sheets.properties.title'}
+        )
+        titles = [sheet['properties']['title'] for sheet in data.get('sheets', [])]
+        if self.sheet_name not in titles:
+            raise ValueError(f"工作表不存在: {self.sheet_name}")
+        self.worksheet = self.sheet_name
+        logger.info(f"Google Sheet异步连接成功: {self.spreadsheet_id}/{self.sheet_name}")
+        return self
+
+    def _range(self, cell_ref: str) -> str:
+        """单元格地址转换为带工作表名的A1范围"""
+        sheet = self.sheet_name.replace("'", "''")
+        return f"'{sheet}'!{cell_ref}"
+
+    async def _auth_headers(self, force_refresh: bool = False) -> Dict[str, str]:
+        """获取授权请求头，令牌过期时在线程中刷新，避免阻塞事件循环"""
+        if force_refresh or not self.creds.valid:
+            async with self._refresh_lock:
+                if force_refresh or not self.creds.valid:
+                    await asyncio.to_thread(self.creds.refresh, Request())
+        headers: Dict[str, str] = {}
+        self.creds.apply(headers)
+        return headers
+
+    async def _request(self, method: str, url: str, op: str, **kwargs) -> Dict[str, Any]:
+        histogram = SHEET_READ_SECONDS if method == 'GET' else SHEET_WRITE_SECONDS
+        headers = await self._auth_headers()
+        # 与同步客户端共用同一个熔断器，HTTP错误在guard内抛出才会计入失败
+        with sheets_breaker.guard():
+            with histogram.labels(op).time():
+                response = await self.http.request(method, url, headers=headers, **kwargs)
+                if response.status_code == 401:
+                    # 令牌被提前吊销或过期，强制刷新后重试一次
+                    headers = await self._auth_headers(force_refresh=True)
+                    response = await self.http.request(method, url, headers=headers, **kwargs)
+            response.raise_for_status()
+        return response.json() if response.content else {}
+
+    async def update_jumped_cells(self, cell_updates: Dict[str, Any]):
+        """
+        更新跳跃的单元格
+
+        Args:
+            cell_updates: 字典，格式为 {单元格地址: 新值}
+        """
+        if not self.worksheet:
+            raise Exception("请先选择工作表")
+
+        if not cell_updates:
+            logger.warning("cell_updates为空，跳过更新操作")
+            return None
+
+        data = [
+            {'range': self._range(cell_address), 'values': [[value]]}
+            for cell_address, value in cell_updates.items()
+            if cell_address and isinstance(cell_address, str)
+        ]
+        if not data:
+            logger.warning("没有有效的单元格需要更新")
+            return None
+
+        try:
+            return await self._request(
+                'POST', f"{SHEETS_API_BASE}/{self.spreadsheet_id}/values:batchUpdate", 'update_cells',
+                json={'valueInputOption': 'RAW', 'data': data}
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"更新跳跃单元格失败: {e}", exc_info=True)
+            return None
+
+    async def update_cell(self, cell_address: str, cell_value: Any):
+        """更新单个单元格"""
+        return await self._request(
+            'PUT', f"{SHEETS_API_BASE}/{self.spreadsheet_id}/values/{quote(self._range(cell_address))}", 'update_cell',
+            params={'valueInputOption': 'RAW'},
+            json={'values': [[cell_value]]}
+        )
+
+    async def get_cell(self, cell_ref: str) -> Any:
+        """获取指定单元格的值，空单元格返回空字符串"""
+        data = await self._request(
+            'GET', f"{SHEETS_API_BASE}/{self.spreadsheet_id}/values/{quote(self._range(cell_ref))}", 'get'
+        )
+        return first_value(data.get('values'))
+
+    async def get_cells_batch(self, cell_refs: List[str]) -> Dict[str, Any]:
+        """
+        批量获取多个单元格的值
+
+        Args:
+            cell_refs: 单元格引用列表，例如 ['A1', 'B2', 'C3']
+
+        Returns:
+            字典，格式为 {单元格地址: 值}，取不到的单元格为空字符串
+        """
+        if not self.worksheet:
+            raise Exception("请先选择工作表")
+
+        if not cell_refs:
+            logger.warning("cell_refs为空，返回空字典")
+            return {}
+
+        data = await self._request(
+            'GET', f"{SHEETS_API_BASE}/{self.spreadsheet_id}/values:batchGet", 'batch_get',
+            params=[('ranges', self._range(ref)) for ref in cell_refs]
+        )
+        value_ranges = data.get('valueRanges', [])
+
+        results = {}
+        for i, cell_ref in enumerate(cell_refs):
+            values: Optional[List[List[Any]]] = value_ranges[i].get('values') if i < len(value_ranges) else None
+            results[cell_ref] = first_value(values)
+        return results
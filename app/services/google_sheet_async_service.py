@@ -0,0 +1,504 @@
+"""
+Google Sheet服务（协程版）
+由异步执行引擎的事件循环驱动：等待与Sheets请求不占用线程，
+数据库和股票API等同步调用放到线程中执行，业务规则与同步版共用
+"""
+import asyncio
+import copy
+import random
+import time
+import traceback
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.exceptions.checkForErrors import checkForErrors
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.exceptions.combinationRejected import CombinationRejected
+from app.services.async_task_engine import async_engine
+from app.services.combination_dedup import build_dedup_key, inflight_combinations
+from app.services.combination_pipeline import AsyncCombinationPipeline, PipelineStageError, PipelineStats
+from app.services.combination_shards import ShardQueue
+from app.services.combination_timing import CombinationTiming
+from app.services.config_manager import get_config_manager
+from app.services.google_sheet_async_client import AsyncGoogleSheet
+from app.services.google_sheet_service import GoogleSheetService, RESULT_NONE_VALUES, MAX_POLL_ATTEMPTS, SHARD_IDLE_SECONDS
+from app.services.task_progress import task_progress
+from app.utils.circuit_breaker import get_breaker
+from app.utils.metrics import COMBINATIONS_TOTAL, RECALC_WAIT_SECONDS
+from app.utils.result_validator import validate_result_dict
+from app.utils.retry_policy import budget_exhausted, cap_to_budget, combination_budget, with_retry_policy
+
+
+class AsyncGoogleSheetService(GoogleSheetService):
+    """Google Sheet服务（协程版）"""
+
+    def __init__(self, config: Dict[str, Any], task_id: str, event_queue=None, app=None, run_token: str = None,
+                 engine=None):
+        super().__init__(config, task_id, event_queue, app, run_token=run_token)
+        self.engine = engine or async_engine
+        self._sheet_config: Dict[str, Any] = {}
+
+    async def execute_task_async(self):
+        """执行Google Sheet任务（协程版），返回值与execute_task相同"""
+        try:
+            with self.app.app_context():
+                prepared = await asyncio.to_thread(self._prepare_execution)
+                if isinstance(prepared, str):
+                    return prepared
+                task, name, parameters, config_data, stock_param, index_z = prepared
+
+                await self._open_google_sheet()
+                success_count, failed_count, task_status = await self.get_bdl_async(
+                    task, name, parameters, config_data, index_z
+                )
+                return await asyncio.to_thread(
+                    self._finish_execution, task, stock_param, success_count, failed_count, task_status
+                )
+
+        except Exception as e:
+            with self.app.app_context():
+                return await asyncio.to_thread(self._handle_execution_error, e)
+
+    def _init_google_sheet(self, config_data: Dict[str, Any]):
+        """异步模式下只记录连接参数，连接在事件循环中建立"""
+        if not all(target['spreadsheet_id'] for target in self._get_targets(config_data)):
+            error_msg = "缺少spreadsheet_id配置"
+            self._log_error(error_msg)
+            raise ValueError(error_msg)
+        self._sheet_config = config_data
+
+    async def _open_google_sheet(self):
+        """建立Google Sheet异步连接（多目标时连接第一个目标）"""
+        try:
+            self._log_info("开始初始化Google Sheet异步连接")
+            self.google_sheet = await self._open_target_async(self._get_targets(self._sheet_config)[0])
+            self._log_info("Google Sheet异步连接初始化成功")
+        except Exception as e:
+            self._log_error(f"初始化Google Sheet异步连接失败: {str(e)}")
+            raise
+
+    async def _open_target_async(self, target: Dict[str, Any]) -> AsyncGoogleSheet:
+        """连接一个目标的工作表（协程版）"""
+        self._log_info(f"连接参数 - Spreadsheet ID: {target['spreadsheet_id']}, Sheet: {target['sheet_name']}, "
+                       f"Token: {target['token_file']}")
+        if target['proxy_url']:
+            self._log_info(f"使用代理: {target['proxy_url']}")
+
+        http_client = self.engine.get_http_client(target['proxy_url'])
+        return await AsyncGoogleSheet(http_client, target['spreadsheet_id'], target['sheet_name'],
+                                      target['token_file']).open()
+
+    async def get_bdl_async(self, task, name, parameters, config_data, index_z=0):
+        """执行批量数据处理（协程版）"""
+        success_count = 0
+        failed_count = 0
+        try:
+            total_combinations, start_index = await asyncio.to_thread(self._start_batch, task, parameters, index_z)
+            if start_index is None:
+                return 0, 0, 'completed'
+
+            targets = self._get_targets(config_data)
+            if len(targets) > 1:
+                self.pipeline_stats = PipelineStats()
+                return await self._run_sharded_async(
+                    task, name, parameters, config_data, start_index, total_combinations, targets
+                )
+
+            pipeline_workers = int(get_config_manager().get_config('pipeline_workers', 2))
+            self.pipeline_stats = PipelineStats()
+            pipeline = None
+            if pipeline_workers > 0:
+                pipeline = AsyncCombinationPipeline(self.app, pipeline_workers, stats=self.pipeline_stats)
+
+            try:
+                return await self._run_combinations_async(
+                    task, name, parameters, config_data, start_index, total_combinations, pipeline
+                )
+            finally:
+                if pipeline:
+                    await pipeline.shutdown()
+                self._log_info(self.pipeline_stats.summary())
+
+        except Exception as e:
+            # 检查是否是任务被取消导致的异常
+            if await asyncio.to_thread(self._is_cancelled):
+                self._log_info(f'批量数据处理中断（任务被取消）: {str(e)}')
+                return success_count, failed_count, 'cancelled'
+
+            self._log_error(f"批量数据处理失败: {traceback.format_exc()}")
+            return 0, 1, 'error'
+
+    async def _run_combinations_async(self, task, name, parameters, config_data, start_index, total_combinations,
+                                      pipeline=None):
+        """按顺序执行参数组合（协程版）"""
+        success_count = start_index
+        failed_count = 0
+        rejected_count = 0
+        try:
+            for i in range(start_index, total_combinations):
+                self._log_step(i + 1, total_combinations, "开始执行参数组合")
+                combination = self._get_parameter_combination_by_index(parameters, i)
+
+                run_state = await asyncio.to_thread(self._check_run_state)
+                if run_state:
+                    return success_count, failed_count, run_state
+
+                self._log_info(f'正在执行第 {i + 1}/{total_combinations} 个参数组合 {combination}')
+                await asyncio.to_thread(self._mark_step, task, i, pipeline.low_water(i) if pipeline else None)
+
+                try:
+                    timing = CombinationTiming()
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            with self.pipeline_stats.measure('sheet'):
+                                success, result = await self._execute_deduplicated_async(combination, config_data,
+                                                                                         timing)
+                            break
+                        except CircuitOpenError as e:
+                            run_state = await self._wait_for_circuit_async(e)
+                            if run_state:
+                                return success_count, failed_count, run_state
+                    timing.sheet_seconds = time.perf_counter() - started
+
+                    if success:
+                        success_count += 1
+                        COMBINATIONS_TOTAL.labels('success').inc()
+                        self._log_info(f'第 {i + 1} 个参数组合执行成功，{result}')
+                    else:
+                        self._log_warning(f'第 {i + 1} 个参数组合执行失败')
+                        failed_count += 1
+                        COMBINATIONS_TOTAL.labels('failed').inc()
+                        return success_count, failed_count, 'error'
+
+                    param_load = self._build_param_load(name, i, result)
+
+                    if pipeline:
+                        await pipeline.submit(i, self._finalize_combination, i, combination, result, success, param_load,
+                                              timing)
+                    else:
+                        await asyncio.to_thread(self._finalize_combination, i, combination, result, success, param_load,
+                                                timing)
+
+                except CombinationRejected as e:
+                    rejected_count += 1
+                    COMBINATIONS_TOTAL.labels('rejected').inc()
+                    self._log_info(f'第 {i + 1} 个参数组合被结果规则淘汰: {str(e)}')
+                except (checkForErrors, PipelineStageError):
+                    raise
+                except Exception as e:
+                    failed_count += 1
+                    COMBINATIONS_TOTAL.labels('failed').inc()
+                    task.error = e
+                    if await asyncio.to_thread(self._is_cancelled):
+                        self._log_info(f'第 {i + 1} 个参数组合执行中断（任务被取消）: {str(e)}')
+                        break
+
+                    self._log_error(f'第 {i + 1} 个参数组合执行出错: {str(e)}')
+                    return success_count, failed_count, 'error'
+
+                task_progress.update(self.task_id, success_count=success_count, failed_count=failed_count)
+                self._log_info(f"第 {i + 1} 个参数组合执行完成，成功: {success_count}, 失败: {failed_count}")
+
+            if pipeline:
+                await pipeline.drain()
+                await asyncio.to_thread(self._mark_step, task, total_combinations - 1)
+
+            self._log_info(f"批量数据处理完成，总成功: {success_count}, 总失败: {failed_count}, 淘汰: {rejected_count}")
+            return success_count, failed_count, 'completed'
+
+        except checkForErrors as e:
+            self._log_error(str(e))
+            task.error = e
+            return success_count, failed_count, 'error'
+        except PipelineStageError as e:
+            await asyncio.to_thread(self._rewind_checkpoint, task, e)
+            return success_count - 1, failed_count + 1, 'error'
+
+    async def _run_sharded_async(self, task, name, parameters, config_data, start_index, total_combinations,
+                                 targets):
+        """多目标分片执行（协程版），每个目标一个协程，语义与_run_sharded相同"""
+        shards, success_count = await asyncio.to_thread(
+            self._prepare_shards, task, start_index, total_combinations, targets
+        )
+        workers = [
+            asyncio.ensure_future(self._run_shard_worker_async(
+                shards, shard, target, name, parameters, config_data, total_combinations
+            ))
+            for shard, target in enumerate(targets)
+        ]
+
+        pending = set(workers)
+        try:
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=self._heartbeat_interval)
+                await asyncio.to_thread(self._checkpoint_shards, task, shards, total_combinations)
+        finally:
+            for worker in pending:
+                worker.cancel()
+
+        for worker in workers:
+            if worker.exception() is not None:
+                shards.stop('error', worker.exception())
+        return await asyncio.to_thread(self._finish_shards, task, shards, success_count)
+
+    async def _run_shard_worker_async(self, shards: ShardQueue, shard: int, target: Dict[str, Any], name,
+                                      parameters, config_data, total_combinations):
+        """单个目标的执行协程，使用服务的浅拷贝，只替换工作表连接"""
+        worker = copy.copy(self)
+        label = target['label']
+        try:
+            worker.google_sheet = self.google_sheet if shard == 0 else await self._open_target_async(target)
+        except Exception as e:
+            self._log_warning(f"[{label}] 连接失败，目标退出: {str(e)}")
+            shards.retire(shard)
+            return
+
+        while True:
+            i = shards.next(shard)
+            if i is None:
+                if shards.should_wait(shard):
+                    await asyncio.sleep(SHARD_IDLE_SECONDS)
+                    continue
+                return
+            run_state = await asyncio.to_thread(worker._check_run_state)
+            if run_state:
+                shards.release(shard, i, failed=False)
+                shards.stop(run_state)
+                return
+
+            combination = worker._get_parameter_combination_by_index(parameters, i)
+            worker._log_info(f'[{label}] 正在执行第 {i + 1}/{total_combinations} 个参数组合 {combination}')
+            timing = CombinationTiming()
+            started = time.perf_counter()
+            try:
+                with self.pipeline_stats.measure('sheet'):
+                    success, result = await worker._execute_deduplicated_async(combination, config_data, timing)
+            except CircuitOpenError as e:
+                shards.release(shard, i, time.perf_counter() - started, failed=False)
+                run_state = await worker._wait_for_circuit_async(e)
+                if run_state:
+                    shards.stop(run_state)
+                    return
+                continue
+            except CombinationRejected as e:
+                COMBINATIONS_TOTAL.labels('rejected').inc()
+                shards.complete(shard, i, time.perf_counter() - started)
+                worker._log_info(f'[{label}] 第 {i + 1} 个参数组合被结果规则淘汰: {str(e)}')
+                continue
+            except checkForErrors as e:
+                shards.release(shard, i, time.perf_counter() - started)
+                shards.stop('error', e)
+                return
+            except Exception as e:
+                success, result = False, {}
+                worker._log_warning(f'[{label}] 第 {i + 1} 个参数组合执行出错: {str(e)}')
+            timing.sheet_seconds = time.perf_counter() - started
+
+            if not success:
+                COMBINATIONS_TOTAL.labels('failed').inc()
+                shards.release(shard, i, timing.sheet_seconds)
+                shards.retire(shard)
+                worker._log_warning(f'[{label}] 第 {i + 1} 个参数组合执行失败，目标退出，剩余组合由其他目标接手')
+                return
+
+            COMBINATIONS_TOTAL.labels('success').inc()
+            try:
+                param_load = worker._build_param_load(name, i, result)
+                await asyncio.to_thread(worker._finalize_combination, i, combination, result, success, param_load,
+                                        timing)
+            except Exception as e:
+                await asyncio.to_thread(worker._discard_step_results, i)
+                shards.release(shard, i, time.perf_counter() - started)
+                shards.stop('error', PipelineStageError(i, e))
+                return
+
+            shards.complete(shard, i, time.perf_counter() - started)
+            task_progress.step(self.task_id, total_combinations - shards.remaining())
+            worker._log_info(f'[{label}] 第 {i + 1} 个参数组合执行完成')
+
+    async def _wait_for_circuit_async(self, error: CircuitOpenError) -> Optional[str]:
+        """依赖服务熔断期间暂停任务（协程版），语义与_wait_for_circuit相同，等待不占用线程"""
+        breaker = get_breaker(error.dependency)
+        self._log_warning(f"{str(error)}，任务暂停等待")
+        task_progress.update(self.task_id, paused_on=error.dependency)
+        try:
+            while True:
+                await asyncio.sleep(min(max(breaker.retry_after(), 1), self._heartbeat_interval))
+                await asyncio.to_thread(self._heartbeat, True)
+                run_state = await asyncio.to_thread(self._check_run_state)
+                if run_state:
+                    return run_state
+                if not breaker.is_open():
+                    self._log_info(f"{error.dependency} 熔断冷却结束，任务恢复执行")
+                    return None
+        finally:
+            task_progress.update(self.task_id, paused_on=None)
+
+    async def _execute_deduplicated_async(self, combination: List, config_data: Dict[str, Any],
+                                          timing: CombinationTiming) -> Tuple[bool, Dict[str, Any]]:
+        """计算参数组合（协程版），同一表格模型上的相同组合正在被其他任务计算时等待并复用其结果"""
+        dedup = get_config_manager().get_config('combination_dedup', True)
+        key = build_dedup_key(config_data, combination, self.stock_no)
+        while dedup:
+            future, owner = inflight_combinations.acquire(key)
+            if owner:
+                break
+            self._log_info(f"参数组合 {combination} 正在由其他任务计算，等待共享结果")
+            shared = await self._wait_shared_result_async(future, timing)
+            if shared is not None:
+                return shared
+
+        self._shared_values = None
+        try:
+            # 限制整个引擎同时进行的工作表计算数，等待共享结果的任务不占用名额
+            async with self.engine.evaluation_slots:
+                with combination_budget(self._combination_budget):
+                    outcome = await self._execute_parameter_combination_async(combination, config_data, timing=timing)
+        except BaseException as e:
+            if dedup:
+                self._publish_shared(key, future, e)
+            raise
+        if dedup:
+            self._publish_shared(key, future)
+        return outcome
+
+    async def _wait_shared_result_async(self, future: Future, timing: CombinationTiming
+                                        ) -> Optional[Tuple[bool, Dict[str, Any]]]:
+        """等待其他任务的计算结果（协程版），计算方出错时返回None"""
+        waiter = asyncio.wrap_future(future)
+        with timing.measure('wait'):
+            while True:
+                try:
+                    values = await asyncio.wait_for(asyncio.shield(waiter), self._heartbeat_interval)
+                    break
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._heartbeat)
+                    run_state = await asyncio.to_thread(self._check_run_state)
+                    if run_state:
+                        raise RuntimeError(f"等待共享结果时任务状态变为 {run_state}")
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    self._log_warning(f"共享计算失败，改由本任务计算: {str(e)}")
+                    return None
+        timing.shared = True
+        self._log_info(f"复用其他任务读取的单元格值: {values}")
+        return self._judge_shared_values(values)
+
+    @with_retry_policy('combination', retry_if_result=lambda result: result[0] is False)
+    async def _execute_parameter_combination_async(self, combination: List, config_data: Dict[str, Any],
+                                                   timing: CombinationTiming = None) -> Tuple[bool, Dict[str, Any]]:
+        """执行单个参数组合（协程版），结果校验与同步版的validate_result_dict一致"""
+        timing = timing or CombinationTiming()
+        timing.attempts += 1
+        self._shared_values = None
+        outcome = await self._evaluate_combination_async(combination, config_data, timing)
+        return validate_result_dict(
+            none_values=RESULT_NONE_VALUES, allow_zero=lambda: self.result_rules.allow_zero
+        )(lambda: outcome)()
+
+    async def _read_sentinel_async(self, sentinel_cell: str):
+        """读取哨兵单元格（协程版），为空或读取失败时返回None"""
+        try:
+            return await self.google_sheet.get_cell(sentinel_cell)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self._log_warning(f"读取哨兵单元格 {sentinel_cell} 失败: {str(e)}")
+            return None
+
+    async def _evaluate_combination_async(self, combination: List, config_data: Dict[str, Any],
+                                          timing: CombinationTiming) -> Tuple[bool, Dict[str, Any]]:
+        try:
+            param_positions = config_data.get('parameter_positions', [])
+            check_positions = config_data.get('check_positions', [])
+            result_positions = config_data.get('result_positions', [])
+
+            cell_updates = self._prepare_cell_updates(combination, param_positions)
+            results = dict(cell_updates)
+            sentinel = self._get_sentinel(config_data)
+
+            async def _update_cell(num=0):
+                if sentinel:
+                    cell_updates[sentinel[0]] = self._new_nonce()
+                self._log_info(f"向Google Sheet写入参数: {cell_updates}")
+                with timing.measure('write'):
+                    await self.google_sheet.update_jumped_cells(cell_updates)
+                if num <= 0 or sentinel:
+                    return
+                random_key = random.choice(list(cell_updates.keys()))
+                self._log_info(f"防止模型卡顿，在随机位置写入：{random_key},当前是第{num + 1}轮检查")
+                with timing.measure('write'):
+                    await self.google_sheet.update_cell(random_key, cell_updates[random_key])
+
+            await _update_cell()
+            written_at = time.monotonic()
+
+            for attempt in range(MAX_POLL_ATTEMPTS):
+                if budget_exhausted():
+                    self._log_warning("已用完单个参数组合的时间预算，停止等待")
+                    return False, {}
+                delay = self._get_poll_delay(attempt)
+                self._log_info(f"第 {attempt + 1} 次检查执行状态... delay {delay} 秒")
+                timing.polls += 1
+                with timing.measure('wait'):
+                    await asyncio.sleep(cap_to_budget(delay))
+                if time.monotonic() - self._last_heartbeat_at >= self._heartbeat_interval:
+                    await asyncio.to_thread(self._heartbeat)
+
+                if self._should_refresh_params(attempt, bool(sentinel)):
+                    await _update_cell(attempt)
+
+                if sentinel:
+                    with timing.measure('read'):
+                        stamp = await self._read_sentinel_async(sentinel[1])
+                    if stamp != cell_updates[sentinel[0]]:
+                        self._log_info(f"哨兵单元格尚未更新（{stamp}），继续等待...")
+                        continue
+                elif check_positions:
+                    try:
+                        with timing.measure('read'):
+                            check_values = await self.google_sheet.get_cells_batch(check_positions)
+                        self._log_info(f"获取到检查位置的值: {check_values}")
+                        with timing.measure('validate'):
+                            check_passed = self._validate_check_values(check_values, results)
+                        if not check_passed:
+                            self._log_info("检查位置验证失败，继续等待...")
+                            continue
+                    except CircuitOpenError:
+                        raise
+                    except Exception as e:
+                        self._log_error(f"批量检查位置时出错: {str(e)}")
+                        continue
+
+                if result_positions:
+                    try:
+                        with timing.measure('read'):
+                            result_values = await self.google_sheet.get_cells_batch(result_positions)
+                        self._log_info(f"获取到参数执行结果: {result_values}")
+
+                        with timing.measure('validate'):
+                            is_valid, error_msgs = self._validate_result_values(result_values, result_positions)
+                        if not is_valid:
+                            self._log_warning(f"结果验证失败: {error_msgs}，继续等待...")
+                            continue
+
+                        RECALC_WAIT_SECONDS.observe(time.monotonic() - written_at)
+                        with timing.measure('validate'):
+                            return self._collect_results(results, result_values, result_positions)
+
+                    except (checkForErrors, CombinationRejected, CircuitOpenError):
+                        raise
+                    except Exception as e:
+                        self._log_error(f"批量获取结果时出错: {str(e)}")
+                        continue
+
+            self._log_warning("执行超时，未在规定时间内完成")
+            return False, {}
+
+        except (CombinationRejected, CircuitOpenError):
+            raise
+        except Exception as e:
+            self._log_error(f"执行参数组合时出错: {traceback.format_exc()}")
+            raise e
@@ -1,14 +1,26 @@
-import os
-import time
 import traceback
 from typing import Optional
 
 import gspread
+import requests
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.credentials import Credentials
 from gspread import Cell
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.utils.circuit_breaker import GOOGLE_SHEETS, get_breaker
 from app.utils.logger import get_logger
+from app.utils.metrics import SHEET_WRITE_SECONDS, SHEET_READ_SECONDS
 
 logger = get_logger(__name__)
+sheets_breaker = get_breaker(GOOGLE_SHEETS)
+
+
+def first_value(values) -> str:
+    """取值区域第一个单元格的值，空单元格（接口不返回该行或该列）为空字符串"""
+    if values and values[0]:
+        return values[0][0]
+    return ""
+
 
 class GoogleSheet:
     """Google Sheet客户端类"""
@@ -32,12 +44,11 @@ class GoogleSheet:
             # 加载凭证
             creds = Credentials.from_authorized_user_file(token_file, scopes=SCOPES)
 
-            self.client = gspread.authorize(credentials=creds)
+            session = None
             if proxy_url:
                 logger.info(f"使用代理：{proxy_url}")
-                # 设置代理环境变量
-                os.environ['HTTP_PROXY'] = proxy_url
-                os.environ['HTTPS_PROXY'] = proxy_url
+                session = self._proxied_session(creds, proxy_url)
+            self.client = gspread.authorize(credentials=creds, session=session)
 
             # 打开电子表格
             self.sheet = self.client.open_by_key(spreadsheet_id)
@@ -54,6 +65,25 @@ class GoogleSheet:
             logger.error(f'打开表格错误。错误内容：{traceback.format_exc()}')
             raise e
 
+    @staticmethod
+    def _proxied_session(creds, proxy_url: str) -> AuthorizedSession:
+        """
+        使用代理的授权会话
+
+        代理只设置在本连接的会话上（包括刷新令牌的请求），不修改进程环境变量，
+        分片执行时各目标的连接在不同线程中使用不同的代理，互不影响
+        """
+        proxies = {'http': proxy_url, 'https': proxy_url}
+        refresh_session = requests.Session()
+        refresh_session.proxies.update(proxies)
+        session = AuthorizedSession(creds, auth_request=Request(refresh_session))
+        session.proxies.update(proxies)
+        return session
+
+    def _session(self):
+        """gspread客户端的requests会话（gspread 6起位于http_client中）"""
+        return getattr(self.client, 'http_client', self.client).session
+
     def get(self, name):
         """获取属性"""
         return getattr(self, name)
@@ -152,7 +182,8 @@ class GoogleSheet:
 
     def update_cell(self, cell_address, cell_value):
         """更新单个单元格"""
-        self.worksheet.update(cell_address, cell_value)  # 更新 A1 单元格
+        with sheets_breaker.guard(), SHEET_WRITE_SECONDS.labels('update_cell').time():
+            self.worksheet.update(cell_address, cell_value)  # 更新 A1 单元格
 
     def update_jumped_cells(self, cell_updates):
         """
@@ -189,15 +220,21 @@ class GoogleSheet:
                 return None
 
             # 批量更新单元格
-            return self.worksheet.update_cells(cells)
+            with sheets_breaker.guard(), SHEET_WRITE_SECONDS.labels('update_cells').time():
+                return self.worksheet.update_cells(cells)
 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"更新跳跃单元格失败: {e}", exc_info=True)
             return None
 
     def get_cell(self, cell_ref):
-        """获取指定单元格的值"""
-        return self.worksheet.get(cell_ref)[0][0]
+        """获取指定单元格的值，空单元格返回空字符串"""
+        # 熔断器只统计接口调用本身，取值在guard之外，空单元格不计为故障
+        with sheets_breaker.guard(), SHEET_READ_SECONDS.labels('get').time():
+            values = self.worksheet.get(cell_ref)
+        return first_value(values)
 
     def get_cells_batch(self, cell_refs):
         """
@@ -226,19 +263,19 @@ class GoogleSheet:
             ranges = [f"{ref}" for ref in cell_refs]
             
             # 批量获取值
-            batch_values = self.worksheet.batch_get(ranges)
+            with sheets_breaker.guard(), SHEET_READ_SECONDS.labels('batch_get').time():
+                batch_values = self.worksheet.batch_get(ranges)
             
             # 将结果转换为字典格式
             for i, cell_ref in enumerate(cell_refs):
-                if i < len(batch_values) and batch_values[i]:
-                    # batch_values[i] 是一个列表，包含该单元格的值
-                    value = batch_values[i][0][0] if batch_values[i][0] else ""
-                    results[cell_ref] = value
-                else:
-                    results[cell_ref] = ""
+                # batch_values[i] 是一个列表，包含该单元格的值
+                results[cell_ref] = first_value(batch_values[i]) if i < len(batch_values) else ""
             
             return results
-            
+
+        except CircuitOpenError:
+            # 熔断中逐个获取同样会被拒绝
+            raise
         except Exception as e:
             logger.error(f"批量获取单元格失败: {e}", exc_info=True)
             # 如果批量获取失败，回退到逐个获取
@@ -248,36 +285,47 @@ class GoogleSheet:
                 try:
                     value = self.get_cell(cell_ref)
                     results[cell_ref] = value
+                except CircuitOpenError:
+                    raise
                 except Exception as cell_error:
                     logger.error(f"获取单元格 {cell_ref} 失败: {cell_error}")
                     results[cell_ref] = ""
             return results
 
     def get_trade_count_with_retry(self, cell_ref, max_retries=None, delay=None):
-        """带重试机制获取交易数量"""
+        """带重试机制获取交易数量，按trade_count重试策略重试，受总期限和组合时间预算约束"""
         # 从配置获取重试参数
         from app.services.config_manager import get_config_manager
+        from app.utils.retry_policy import get_policy
         config_manager = get_config_manager()
         if max_retries is None:
             max_retries = config_manager.get_config('api_retry_max_attempts', 10)
         if delay is None:
             delay = config_manager.get_config('api_retry_delay', 30)
-            
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                trade_count = self.worksheet.get(cell_ref)[0][0]
-                if trade_count != '#DIV/0!' and trade_count.find("target") == -1:
-                    return trade_count
-            except Exception as e:
-                logger.error(f'获取交易数量出错: {str(e)}')
-            logger.info(f'重试中，已尝试{retry_count}次')
-            retry_count += 1
-            if retry_count < max_retries:
-                time.sleep(delay)
-        logger.warning(f'多次尝试后，仍无法获取有效的交易数量，返回0')
-        return '0'
-        
+
+        def read_trade_count():
+            with sheets_breaker.guard():
+                values = self.worksheet.get(cell_ref)
+            trade_count = first_value(values)
+            # 空单元格与#DIV/0!一样表示尚未算出，继续重试
+            if not trade_count or trade_count == '#DIV/0!' or str(trade_count).find("target") != -1:
+                return None
+            return trade_count
+
+        policy = get_policy('trade_count', retry_if_result=lambda value: value is None,
+                            max_attempts=max_retries, min_delay=delay, max_delay=delay)
+        try:
+            trade_count = policy.call(read_trade_count)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f'获取交易数量出错: {str(e)}')
+            trade_count = None
+        if trade_count is None:
+            logger.warning(f'多次尝试后，仍无法获取有效的交易数量，返回0')
+            return '0'
+        return trade_count
+
     def get_all_worksheets(self):
         """获取电子表格中的所有工作表名称"""
         try:
@@ -292,17 +340,11 @@ class GoogleSheet:
     def close(self):
         """关闭连接并清理资源"""
         try:
-            # 清理代理设置
-            if 'HTTP_PROXY' in os.environ:
-                del os.environ['HTTP_PROXY']
-            if 'HTTPS_PROXY' in os.environ:
-                del os.environ['HTTPS_PROXY']
-            
             # 清理对象引用
             self.worksheet = None
             self.sheet = None
             if self.client:
-                self.client.session.close()  # 关闭gspread的session
+                self._session().close()  # 关闭gspread的session
             self.client = None
             
         except Exception as e:
@@ -1,30 +1,56 @@
+import copy
 import json
 import random
+import threading
 import time
 import traceback
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from datetime import datetime
 from typing import Dict, Any, List, Optional,Tuple
 
 from flask import current_app
-from sqlalchemy import text
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_result
+from sqlalchemy import func, text
 
 from app.exceptions.checkForErrors import checkForErrors
-from app.models import Task, TaskLog, TaskResult, db
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.exceptions.combinationRejected import CombinationRejected
+from app.models import Task, TaskResult, db
+from app.services.campaign_service import resolve_task_config
+from app.services.combination_dedup import build_dedup_key, inflight_combinations
+from app.services.combination_pipeline import CombinationPipeline, PipelineStageError, PipelineStats, pipeline_turn
+from app.services.combination_shards import ShardQueue
+from app.services.combination_timing import CombinationTiming
 from app.services.config_manager import get_config_manager
 from app.services.google_sheet_client import GoogleSheet
+from app.services.notification_dispatcher import notification_dispatcher
+from app.services.persistence import get_persistence_backend
+from app.services.stock_param_cache import MISSING, stock_param_cache
+from app.services.task_log_writer import task_log_writer
+from app.services.task_progress import task_progress
 from app.utils.db_retry import safe_db_operation, db_retry_manager
+from app.utils.circuit_breaker import get_breaker
 from app.utils.db_stock_api import StockAPIClient
 from app.utils.logger import get_logger
+from app.utils.metrics import COMBINATIONS_TOTAL, RECALC_WAIT_SECONDS
+from app.utils.result_rules import compile_result_rules
 from app.utils.result_validator import validate_result_dict, validate_google_sheet_result, is_valid_result_value
+from app.utils.retry_policy import budget_exhausted, cap_to_budget, combination_budget, with_retry_policy
 
 logger = get_logger(__name__)
 
+# 结果字典中视为空值的取值
+RESULT_NONE_VALUES = (None, '', ' ', '#N/A', '#DIV/0!', '#ERROR!', '#VALUE!', '#REF!', '#NAME?', '#NUM!')
+# 单个参数组合最多检查次数
+MAX_POLL_ATTEMPTS = 60
+# 分片执行者没有可取组合时，等待其他目标放回组合的检查间隔（秒）
+SHARD_IDLE_SECONDS = 1
+
 
 class GoogleSheetService:
     """Google Sheet服务"""
 
-    def __init__(self, config: Dict[str, Any], task_id: str, event_queue=None, app=None):
+    def __init__(self, config: Dict[str, Any], task_id: str, event_queue=None, app=None, run_token: str = None):
         self.config = config
         self.google_sheet:Optional[GoogleSheet] = None
         self.api_client = StockAPIClient()
@@ -32,23 +58,36 @@ class GoogleSheetService:
         self.task_id = task_id
         self.event_queue = event_queue
         self.app = app
+        # 执行器标识与心跳节流
+        self.run_token = run_token
+        self._heartbeat_interval = 15
+        self._last_heartbeat_at = 0.0
+        # 任务配置的结果规则，在_prepare_execution中编译
+        self.result_rules = compile_result_rules(None)
+        # 单个参数组合的时间预算（秒），0表示不限制
+        self._combination_budget = 0.0
+        # 最近一次计算读到的原始单元格值（结果规则和校验之前），去重时交给等待者
+        self._shared_values: Optional[Dict[str, Any]] = None
+        # 股票编号（任务名称），在_prepare_execution中设置，去重键按股票区分
+        self.stock_no: Optional[str] = None
         # 创建任务专用日志记录器 - 不使用TaskLogger的前缀功能，我们自己控制格式
         self.task_logger = get_logger(f"{__name__}.{task_id}")
 
     def error_dd(self,error_msg):
-        error_msg = self.app.notifier.error_google_task_templates(
+        """发送任务异常通知（异步限速发送，短时间内多条合并为汇总卡片）"""
+        notification_dispatcher.notify(
+            self.app, 'error',
             f"{self.task_id} -- {self.task.name}",
             error_msg,
             f"{current_app.config.get('BASE_URL')}/google-sheet/detail?task_id={self.task_id}")
-        self.app.notifier.send_message(error_msg)
 
     def task_ok_to_dd(self,result):
-        error_msg = self.app.notifier.google_task_ok_templates(
+        """发送任务完成通知（异步限速发送，短时间内多条合并为汇总卡片）"""
+        notification_dispatcher.notify(
+            self.app, 'ok',
             f"{self.task_id} -- {self.task.name}",
             result,
-            f"{current_app.config.get('BASE_URL')}/google-sheet/detail?task_id={self.task_id}"
-                                                               )
-        self.app.notifier.send_message(error_msg)
+            f"{current_app.config.get('BASE_URL')}/google-sheet/detail?task_id={self.task_id}")
 
 
     def execute_task(self):
@@ -58,263 +97,739 @@ class GoogleSheetService:
             # 统一使用应用上下文
             context_app = self.app or current_app
             with context_app.app_context():
-                task = Task.query.get(self.task_id)
-                self.task = task
-                if not task:
-                    self._log_error(f'任务 {self.task_id} 不存在')
-                    return 'error'
-
-                # 检查任务是否已被取消
-                if task.status == 'cancelled':
-                    self._log_info(f'任务 {self.task_id} 已被取消，停止执行')
-                    return 'cancelled'
-
-                # 解析配置
-                if isinstance(task.config, str):
-                    try:
-                        config_data = json.loads(task.config)
-                    except json.JSONDecodeError as e:
-                        self._log_error(f"配置解析失败: {str(e)}")
-                        return 'error'
-                else:
-                    config_data = task.config or {}
+                prepared = self._prepare_execution()
+                if isinstance(prepared, str):
+                    return prepared
+                task, name, parameters, config_data, stock_param, index_z = prepared
 
-                config_manager = get_config_manager()
-                config_data = {**config_manager.get_google_sheet_config(), **config_data}
-                
-                # 推送任务开始日志
-                self._log_info('开始执行Google Sheet任务')
+                success_count, failed_count, task_status = self.get_bdl(task, name, parameters, config_data, index_z)
+                return self._finish_execution(task, stock_param, success_count, failed_count, task_status)
 
-                # 初始化Google Sheet连接
-                self._init_google_sheet(config_data)
+        except Exception as e:
+            return self._handle_execution_error(e)
 
-                # 获取参数列表
-                parameters = config_data.get('parameters', [])
-                if not parameters:
-                    self._log_error("没有参数配置")
-                    return 'error'
-                
-                name = task.name
-                sheet_name = config_data.get('sheet_name', "")
+    def _prepare_execution(self):
+        """
+        执行前准备：加载任务、解析配置、连接Google Sheet、获取股票参数
+
+        Returns:
+            准备失败或任务已取消时返回任务状态字符串，
+            否则返回 (task, name, parameters, config_data, stock_param, index_z)
+        """
+        task = Task.query.get(self.task_id)
+        self.task = task
+        if not task:
+            self._log_error(f'任务 {self.task_id} 不存在')
+            return 'error'
+
+        # 检查任务是否已被取消
+        if task.status == 'cancelled':
+            self._log_info(f'任务 {self.task_id} 已被取消，停止执行')
+            return 'cancelled'
+
+        # 解析配置
+        if isinstance(task.config, str):
+            try:
+                config_data = json.loads(task.config)
+            except json.JSONDecodeError as e:
+                self._log_error(f"配置解析失败: {str(e)}")
+                return 'error'
+        else:
+            config_data = task.config or {}
+
+        config_manager = get_config_manager()
+        config_data = {**config_manager.get_google_sheet_config(), **resolve_task_config(config_data, task.campaign_id)}
+        self._heartbeat_interval = int(config_manager.get_config('heartbeat_interval', 15))
+        self._combination_budget = float(config_manager.get_config('combination_time_budget', 5400) or 0)
+        try:
+            self.result_rules = compile_result_rules(config_data.get('result_rules'))
+        except ValueError as e:
+            self._log_error(f"结果规则配置错误: {str(e)}")
+            return 'error'
+        task_log_writer.start(self.app or current_app._get_current_object())
+        
+        # 推送任务开始日志
+        self._log_info('开始执行Google Sheet任务')
 
-                # 检查任务是否已被取消
-                if task.status == 'cancelled':
-                    self._log_info(f'任务 {self.task_id} 已被取消，停止执行')
-                    return 'cancelled'
+        # 初始化Google Sheet连接
+        self._init_google_sheet(config_data)
 
+        # 获取参数列表
+        parameters = config_data.get('parameters', [])
+        if not parameters:
+            self._log_error("没有参数配置")
+            return 'error'
+        
+        name = task.name
+        self.stock_no = name
+
+        # 检查任务是否已被取消
+        if task.status == 'cancelled':
+            self._log_info(f'任务 {self.task_id} 已被取消，停止执行')
+            return 'cancelled'
+
+        # 优先读取缓存（过期时后台刷新），没有可用缓存时再同步请求股票API
+        stock_param = stock_param_cache.get(name, not_before=self._stock_param_not_before(name))
+        if stock_param is not MISSING:
+            self._log_info("使用缓存的股票模板参数")
+        while stock_param is MISSING:
+            try:
                 stock_param = self.get_single_stock_template_param(name)
+                stock_param_cache.put(name, stock_param)
+            except CircuitOpenError as e:
+                run_state = self._wait_for_circuit(e)
+                if run_state:
+                    return run_state
+
+        if stock_param is not None and stock_param != "error":
+            multiplier_index = 0 if stock_param.get('multiplier_index', 0) == 0 else stock_param.get(
+                'multiplier_index', 0) + 1
+            self._log_info(f"开始执行参数批量处理，multiplier_index: {multiplier_index}")
+            return task, name, parameters, config_data, stock_param, multiplier_index
+        elif stock_param != "error":
+            self._log_info("开始执行参数批量处理（默认参数模式）")
+            return task, name, parameters, config_data, stock_param, 0
+        else:
+            self._log_error("获取股票参数失败")
+            return 'error'
 
-                if stock_param is not None and stock_param != "error":
-                    multiplier_index = 0 if stock_param.get('multiplier_index', 0) == 0 else stock_param.get(
-                        'multiplier_index', 0) + 1
-                    self._log_info(f"开始执行参数批量处理，multiplier_index: {multiplier_index}")
-                    success_count, failed_count, task_status = self.get_bdl(task, name, parameters, config_data, multiplier_index)
-                elif stock_param != "error":
-                    self._log_info("开始执行参数批量处理（默认参数模式）")
-                    success_count, failed_count, task_status = self.get_bdl(task, name, parameters, config_data)
-                else:
-                    self._log_error("获取股票参数失败")
-                    return 'error'
-
-                # 根据任务状态决定返回结果
-                if task_status == 'cancelled':
-                    # 任务被取消，保持cancelled状态
-                    self._log_info(f'任务已取消，成功执行: {success_count}, 失败: {failed_count}')
-                    # 推送任务取消通知
-                    self.task_ok_to_dd(f'任务已取消！成功执行: {success_count}, 失败: {failed_count}')
-                    return 'cancelled'
-                elif task_status == 'error':
-                    # 任务执行出错
-                    # 推送错误通知
-                    error_details = f'任务执行出错！成功: {success_count}, 失败: {failed_count}'
-                    if task.error:
-                        error_details += f', 错误信息: {str(task.error)}'
-                    self.error_dd(error_details)
-                    return 'error'
+    @staticmethod
+    def _stock_param_not_before(name: str):
+        """同名任务最近一次结束的时间，此前获取的模板参数中的multiplier_index已过时"""
+        return safe_db_operation(
+            lambda: db.session.query(func.max(Task.end_time)).filter(Task.name == name).scalar()
+        )
+
+    def _finish_execution(self, task, stock_param, success_count, failed_count, task_status):
+        """根据批量处理结果发送通知并返回最终任务状态"""
+        if task_status == 'superseded':
+            # 执行权已被看门狗转移，由新的执行器负责后续通知
+            return 'superseded'
+        elif task_status == 'cancelled':
+            # 任务被取消，保持cancelled状态
+            self._log_info(f'任务已取消，成功执行: {success_count}, 失败: {failed_count}')
+            # 推送任务取消通知
+            self.task_ok_to_dd(f'任务已取消！成功执行: {success_count}, 失败: {failed_count}')
+            return 'cancelled'
+        elif task_status == 'error':
+            # 任务执行出错
+            # 推送错误通知
+            error_details = f'任务执行出错！成功: {success_count}, 失败: {failed_count}'
+            if task.error:
+                error_details += f', 错误信息: {str(task.error)}'
+            self.error_dd(error_details)
+            return 'error'
+        else:
+            if stock_param is not None and stock_param != "error":
+                final_status = 'completed' if success_count > 0 else 'error'
+                if final_status == 'completed':
+                    # 推送成功完成通知
+                    self.task_ok_to_dd(f'任务成功完成！成功执行: {success_count}, 失败: {failed_count}')
                 else:
-                    if stock_param is not None and stock_param != "error":
-                        final_status = 'completed' if success_count > 0 else 'error'
-                        if final_status == 'completed':
-                            # 推送成功完成通知
-                            self.task_ok_to_dd(f'任务成功完成！成功执行: {success_count}, 失败: {failed_count}')
-                        else:
-                            # 推送失败通知
-                            self.error_dd(f'任务执行失败！成功: {success_count}, 失败: {failed_count}')
-                        return final_status
-
-                if success_count == 0 and failed_count == 0:
-                    self._log_error('任务执行失败')
-                    # 推送无结果失败通知
-                    self.error_dd('任务执行失败！没有成功或失败的参数组合')
-                    return 'error'
-                
-                # 推送任务完成通知
-                self.task_ok_to_dd(f'任务执行完成！成功: {success_count}, 失败: {failed_count}')
-                # 推送任务完成信息
-                completion_msg = f'任务执行完成！成功: {success_count}, 失败: {failed_count}'
-                self._log_info(completion_msg)
+                    # 推送失败通知
+                    self.error_dd(f'任务执行失败！成功: {success_count}, 失败: {failed_count}')
+                return final_status
+
+        if success_count == 0 and failed_count == 0:
+            self._log_error('任务执行失败')
+            # 推送无结果失败通知
+            self.error_dd('任务执行失败！没有成功或失败的参数组合')
+            return 'error'
+        
+        # 推送任务完成通知
+        self.task_ok_to_dd(f'任务执行完成！成功: {success_count}, 失败: {failed_count}')
+        # 推送任务完成信息
+        completion_msg = f'任务执行完成！成功: {success_count}, 失败: {failed_count}'
+        self._log_info(completion_msg)
+
+        return 'completed'
+
+    def _handle_execution_error(self, e: Exception) -> str:
+        """任务执行异常处理"""
+        # 检查是否是任务被取消导致的异常
+        try:
+            task = Task.query.get(self.task_id)
+            if task and task.status == 'cancelled':
+                self._log_info(f'任务已被取消: {str(e)}')
+                return 'cancelled'
+        except:
+            pass
+        
+        # 其他异常情况
+        error_msg = f"执行Google Sheet任务失败: {self.task_id}, 错误: {str(e)}"
+        self._log_error(error_msg)
+        self.error_dd(error_msg)
+        return 'error'
 
-                return 'completed'
+    def get_bdl(self, task, name, parameters, config_data, index_z=0):
+        """执行批量数据处理"""
+        success_count = 0
+        failed_count = 0
+        try:
+            total_combinations, start_index = self._start_batch(task, parameters, index_z)
+            if start_index is None:
+                return 0, 0
+
+            targets = self._get_targets(config_data)
+            if len(targets) > 1:
+                self.pipeline_stats = PipelineStats()
+                return self._run_sharded(task, name, parameters, config_data, start_index, total_combinations, targets)
+
+            # 结果持久化、上游推送和前端通知交给后台流水线，主线程继续写入下一个组合
+            pipeline_workers = int(get_config_manager().get_config('pipeline_workers', 2))
+            self.pipeline_stats = PipelineStats()
+            pipeline = None
+            if pipeline_workers > 0:
+                pipeline = CombinationPipeline(self.app or current_app._get_current_object(),
+                                               pipeline_workers, stats=self.pipeline_stats)
+
+            try:
+                success_count, failed_count, status = self._run_combinations(
+                    task, name, parameters, config_data, start_index, total_combinations, pipeline
+                )
+            finally:
+                if pipeline:
+                    pipeline.shutdown()
+                self._log_info(self.pipeline_stats.summary())
+            return success_count, failed_count, status
 
         except Exception as e:
             # 检查是否是任务被取消导致的异常
-            try:
-                task = Task.query.get(self.task_id)
-                if task and task.status == 'cancelled':
-                    self._log_info(f'任务已被取消: {str(e)}')
-                    return 'cancelled'
-            except:
-                pass
+            if self._is_cancelled():
+                self._log_info(f'批量数据处理中断（任务被取消）: {str(e)}')
+                return success_count, failed_count, 'cancelled'
             
-            # 其他异常情况
-            error_msg = f"执行Google Sheet任务失败: {self.task_id}, 错误: {str(e)}"
+            error_msg = f"批量数据处理失败: {traceback.format_exc()}"
             self._log_error(error_msg)
-            self.error_dd(error_msg)
-            return 'error'
+            return 0, 1, 'error'
 
-    def get_bdl(self, task, name, parameters, config_data, index_z=0):
-        """执行批量数据处理"""
+    def _start_batch(self, task, parameters, index_z=0):
+        """
+        计算参数组合总数并确定起始位置
+
+        Returns:
+            (总组合数, 起始组合序号)，数据库已有记录超过组合数时起始序号为None
+        """
+        # 计算总参数组合数（不生成实际组合，避免内存问题）
+        total_combinations = 1
+        for param_list in parameters:
+            total_combinations *= len(param_list)
+
+        # 更新任务总步数
+        task.total_steps = total_combinations
+        db_retry_manager.commit_with_retry(db.session)
+
+        # 推送参数组合信息
+        self._log_info(f'将执行 {total_combinations} 个参数组合')
+
+        if index_z > total_combinations:
+            self._log_warning(f'任务数据库内条数:{index_z} > 参数组合条数:{total_combinations}，跳过执行,好像执行过的')
+            return total_combinations, None
+
+        # 检查是否从断点恢复
+        start_index = max(index_z, task.current_step - 1) if task.current_step >= 1 else index_z
+        self._log_info(f"任务将从第 {start_index + 1} 个参数组合开始执行")
+        task_progress.start(self.task_id, total_combinations, start_index)
+        return total_combinations, start_index
+
+    def _check_run_state(self) -> Optional[str]:
+        """
+        检查任务是否仍可继续执行
+
+        Returns:
+            None表示继续，'cancelled'表示已取消，'superseded'表示执行权已转移
+        """
+        # 原子性检查任务是否被取消
+        # SQLite不支持FOR UPDATE，使用简单查询
+        def check_task_status():
+            row = db.session.execute(
+                text("SELECT status, run_token FROM tasks WHERE id = :task_id"),
+                {"task_id": self.task_id}
+            ).fetchone()
+            # 结束只读事务归还连接，熔断等待和重试退避期间不占用连接池
+            db.session.commit()
+            return row
+        
+        result = safe_db_operation(check_task_status)
+        
+        if not result or result.status in ('cancelled', 'deleting'):
+            self._log_warning("任务已被取消，停止执行")
+            return 'cancelled'
+        
+        if self.run_token and result.run_token != self.run_token:
+            self._log_warning("任务执行权已被看门狗转移，当前执行线程退出")
+            return 'superseded'
+        return None
+
+    def _mark_step(self, task, step_index: int, checkpoint: Optional[int] = None):
+        """
+        更新当前步数，同时写入心跳
+
+        checkpoint为最早的未完成后处理的组合序号（默认即step_index），断点只推进到这里，
+        进程中途退出时从该组合重新执行，不会越过尚未保存和推送的组合
+        """
+        task.current_step = (step_index if checkpoint is None else checkpoint) + 1
+        task.last_heartbeat = datetime.now()
+        db_retry_manager.commit_with_retry(db.session)
+        self._last_heartbeat_at = time.monotonic()
+        task_progress.step(self.task_id, step_index + 1)
+
+    def _rewind_checkpoint(self, task, error: PipelineStageError):
+        """后处理失败的组合需要重新执行，断点回退到该组合"""
+        task.error = error.error
+        task.current_step = error.step_index + 1
+        db_retry_manager.commit_with_retry(db.session)
+        self._log_error(str(error))
+
+    def _is_cancelled(self) -> bool:
+        """组合执行出错时检查是否是任务被取消导致"""
         try:
-            # 计算总参数组合数（不生成实际组合，避免内存问题）
-            total_combinations = 1
-            for param_list in parameters:
-                total_combinations *= len(param_list)
-
-            # 更新任务总步数
-            task.total_steps = total_combinations
-            db_retry_manager.commit_with_retry(db.session)
-
-            # 推送参数组合信息
-            self._log_info(f'将执行 {total_combinations} 个参数组合')
-
-            # 执行参数组合
-            success_count = 0
-            failed_count = 0
-            if index_z > total_combinations:
-                self._log_warning(f'任务数据库内条数:{index_z} > 参数组合条数:{total_combinations}，跳过执行,好像执行过的')
-                return 0, 0
+            task_check = Task.query.get(self.task_id)
+            return bool(task_check and task_check.status in ('cancelled', 'deleting'))
+        except:
+            return False
 
+    def _wait_for_circuit(self, error: CircuitOpenError) -> Optional[str]:
+        """
+        依赖服务熔断期间暂停任务：不消耗重试次数，保持心跳并响应取消，
+        熔断器进入半开状态后返回，由调用方重新执行同一个组合（第一个调用即为探测请求）
 
-            # 检查是否从断点恢复
-            start_index = max(index_z, task.current_step - 1) if task.current_step >= 1 else index_z
-            self._log_info(f"任务将从第 {start_index + 1} 个参数组合开始执行")
-            success_count = start_index # 成功执行计数器，从断点除重新来
+        Returns:
+            None表示继续，否则为任务状态（同_check_run_state）
+        """
+        breaker = get_breaker(error.dependency)
+        self._log_warning(f"{str(error)}，任务暂停等待")
+        task_progress.update(self.task_id, paused_on=error.dependency)
+        try:
+            while True:
+                # 半开状态下其他任务的探测请求尚未返回时retry_after为0，至少等待1秒
+                time.sleep(min(max(breaker.retry_after(), 1), self._heartbeat_interval))
+                self._heartbeat(force=True)
+                run_state = self._check_run_state()
+                if run_state:
+                    return run_state
+                if not breaker.is_open():
+                    self._log_info(f"{error.dependency} 熔断冷却结束，任务恢复执行")
+                    return None
+        finally:
+            task_progress.update(self.task_id, paused_on=None)
 
+    @staticmethod
+    def _build_param_load(name: str, step_index: int, result: Dict[str, Any]) -> Dict[str, Any]:
+        """将组合结果转换为上游接口的参数格式"""
+        return {
+            "stock_no": name,
+            "multiplier": result['B6'],
+            "danbian": result['B7'],
+            "xiancang": result['B9'],
+            "zhishu": result['B10'],
+            "smoothing": result['B11'],
+            "bordering": result['B12'],
+            "multiplier_index": step_index,
+            "danbian_index": 0,
+            "xiancang_index": 0,
+            "zhishu_index": 0,
+            "smoothing_index": 0,
+            "bordering_index": 0,
+            "return_rate": result['I15'],
+            "annualized_rate": result['I16'],
+            "maxdd": result['I17'],
+            "index_rate": result['I18'],
+            "index_annualized_rate": result['I19'],
+            "max_index_dd": result['I20'],
+            "fee_total": result['I21'],
+            "fee_annualized": result['I22'],
+            "year_rate": result['I23']
+        }
+
+    def _run_combinations(self, task, name, parameters, config_data, start_index, total_combinations, pipeline=None):
+        """按顺序执行参数组合，pipeline为None时同步执行后处理"""
+        success_count = start_index # 成功执行计数器，从断点除重新来
+        failed_count = 0
+        rejected_count = 0
+        try:
             for i in range(start_index, total_combinations):
                 self._log_step(i + 1, total_combinations, f"开始执行参数组合")
                 
                 # 按需计算参数组合，避免内存问题
                 combination = self._get_parameter_combination_by_index(parameters, i)
                 
-                # 原子性检查任务是否被取消
-                # SQLite不支持FOR UPDATE，使用简单查询
-                def check_task_status():
-                    return db.session.execute(
-                        text("SELECT status FROM tasks WHERE id = :task_id"),
-                        {"task_id": self.task_id}
-                    ).fetchone()
-                
-                result = safe_db_operation(check_task_status)
-                
-                if not result or result.status == 'cancelled':
-                    self._log_warning("任务已被取消，停止执行")
-                    return success_count, failed_count, 'cancelled'
+                run_state = self._check_run_state()
+                if run_state:
+                    return success_count, failed_count, run_state
 
                 # 推送执行进度
                 progress_msg = f'正在执行第 {i + 1}/{total_combinations} 个参数组合 {combination}'
                 self._log_info(progress_msg)
 
-                # 更新当前步数
-                task.current_step = i + 1
-                db_retry_manager.commit_with_retry(db.session)
+                self._mark_step(task, i, pipeline.low_water(i) if pipeline else None)
 
                 # 执行单个参数组合
                 try:
-                    success, result = self._execute_parameter_combination(combination, config_data)
+                    timing = CombinationTiming()
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            with self.pipeline_stats.measure('sheet'):
+                                success, result = self._execute_deduplicated(combination, config_data, timing)
+                            break
+                        except CircuitOpenError as e:
+                            # 依赖服务熔断，断点停在当前组合，恢复后重新执行
+                            run_state = self._wait_for_circuit(e)
+                            if run_state:
+                                return success_count, failed_count, run_state
+                    timing.sheet_seconds = time.perf_counter() - started
 
                     if success:
                         success_count += 1
+                        COMBINATIONS_TOTAL.labels('success').inc()
                         self._log_info(f'第 {i + 1} 个参数组合执行成功，{result}')
                     else:
                         self._log_warning(f'第 {i + 1} 个参数组合执行失败')
                         failed_count += 1
+                        COMBINATIONS_TOTAL.labels('failed').inc()
                         return success_count, failed_count, 'error'
 
-                    param_load = {
-                        "stock_no": name,
-                        "multiplier": result['B6'],
-                        "danbian": result['B7'],
-                        "xiancang": result['B9'],
-                        "zhishu": result['B10'],
-                        "smoothing": result['B11'],
-                        "bordering": result['B12'],
-                        "multiplier_index": i,
-                        "danbian_index": 0,
-                        "xiancang_index": 0,
-                        "zhishu_index": 0,
-                        "smoothing_index": 0,
-                        "bordering_index": 0,
-                        "return_rate": result['I15'],
-                        "annualized_rate": result['I16'],
-                        "maxdd": result['I17'],
-                        "index_rate": result['I18'],
-                        "index_annualized_rate": result['I19'],
-                        "max_index_dd": result['I20'],
-                        "fee_total": result['I21'],
-                        "fee_annualized": result['I22'],
-                        "year_rate": result['I23']
-                    }
-
-
-                    # 保存结果到数据库
-                    self._save_task_result(i, combination, result, success)
-                    # # 推送结果，到生产数据库
-                    self.send_stock_template_param_data(param_load, lambda level, msg: self._log(level, msg))
+                    param_load = self._build_param_load(name, i, result)
 
-                except checkForErrors as e:
-                    self._log_error(str(e))
-                    task.error = e
-                    return success_count, failed_count, 'error'
+                    if pipeline:
+                        pipeline.submit(i, self._finalize_combination, i, combination, result, success, param_load, timing)
+                    else:
+                        self._finalize_combination(i, combination, result, success, param_load, timing)
+
+                except CombinationRejected as e:
+                    # 不满足结果规则，不保存结果也不推送上游
+                    rejected_count += 1
+                    COMBINATIONS_TOTAL.labels('rejected').inc()
+                    self._log_info(f'第 {i + 1} 个参数组合被结果规则淘汰: {str(e)}')
+                except (checkForErrors, PipelineStageError):
+                    raise
                 except Exception as e:
                     failed_count += 1
+                    COMBINATIONS_TOTAL.labels('failed').inc()
                     # 检查是否是任务被取消
                     task.error = e
-                    try:
-                        task_check = Task.query.get(self.task_id)
-                        if task_check and task_check.status == 'cancelled':
-                            self._log_info(f'第 {i + 1} 个参数组合执行中断（任务被取消）: {str(e)}')
-                            break  # 退出循环
-                    except:
-                        pass
+                    if self._is_cancelled():
+                        self._log_info(f'第 {i + 1} 个参数组合执行中断（任务被取消）: {str(e)}')
+                        break  # 退出循环
 
                     error_msg = f'第 {i + 1} 个参数组合执行出错: {str(e)}'
                     self._log_error(error_msg)
                     return success_count, failed_count, 'error'
 
+                task_progress.update(self.task_id, success_count=success_count, failed_count=failed_count)
                 self._log_info(f"第 {i + 1} 个参数组合执行完成，成功: {success_count}, 失败: {failed_count}")
 
-            self._log_info(f"批量数据处理完成，总成功: {success_count}, 总失败: {failed_count}")
+            # 等待最后几个组合的后处理完成，断点推进到最后一个组合
+            if pipeline:
+                pipeline.drain()
+                self._mark_step(task, total_combinations - 1)
+
+            self._log_info(f"批量数据处理完成，总成功: {success_count}, 总失败: {failed_count}, 淘汰: {rejected_count}")
             return success_count, failed_count, 'completed'
-            
-        except Exception as e:
-            # 检查是否是任务被取消导致的异常
+
+        except checkForErrors as e:
+            self._log_error(str(e))
+            task.error = e
+            return success_count, failed_count, 'error'
+        except PipelineStageError as e:
+            self._rewind_checkpoint(task, e)
+            return success_count - 1, failed_count + 1, 'error'
+
+    def _run_sharded(self, task, name, parameters, config_data, start_index, total_combinations, targets):
+        """
+        多目标分片执行：每个目标一个执行线程，组合序号按分片分配并互相窃取
+
+        各执行线程同步完成后处理（执行线程本身已并行），主线程只负责推进断点；
+        断点推进到最小的未完成序号，恢复时跳过已有成功结果的组合
+        """
+        shards, success_count = self._prepare_shards(task, start_index, total_combinations, targets)
+        app = self.app or current_app._get_current_object()
+        workers = []
+        for shard, target in enumerate(targets):
+            worker = threading.Thread(
+                target=self._run_shard_worker,
+                args=(app, shards, shard, target, name, parameters, config_data, total_combinations),
+                name=f"task-{self.task_id[:8]}-shard-{shard}"
+            )
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=self._heartbeat_interval)
+            self._checkpoint_shards(task, shards, total_combinations)
+            self._heartbeat()
+
+        return self._finish_shards(task, shards, success_count)
+
+    def _prepare_shards(self, task, start_index, total_combinations, targets) -> Tuple[ShardQueue, int]:
+        """
+        建立分片队列
+
+        Returns:
+            (分片队列, 已成功的组合数)
+        """
+        # 分片执行时上游记录可能不连续，断点只认本任务记录的最小未完成序号
+        if task.current_step >= 1:
+            start_index = min(start_index, task.current_step - 1)
+        done = self._load_done_steps(start_index)
+        indices = [i for i in range(start_index, total_combinations) if i not in done]
+        shards = ShardQueue(indices, [target['label'] for target in targets])
+        success_count = start_index + len(done)
+        self._log_info(f"分片执行：{len(targets)} 个目标，待执行 {len(indices)} 个组合，跳过已有结果 {len(done)} 个")
+        task_progress.start(self.task_id, total_combinations, success_count)
+        return shards, success_count
+
+    def _run_shard_worker(self, app, shards: ShardQueue, shard: int, target: Dict[str, Any], name, parameters,
+                          config_data, total_combinations):
+        """单个目标的执行线程，使用服务的浅拷贝，只替换工作表连接"""
+        with app.app_context():
+            worker = copy.copy(self)
+            label = target['label']
             try:
-                task_check = Task.query.get(self.task_id)
-                if task_check and task_check.status == 'cancelled':
-                    self._log_info(f'批量数据处理中断（任务被取消）: {str(e)}')
-                    return success_count, failed_count, 'cancelled'
-            except:
-                pass
-            
-            error_msg = f"批量数据处理失败: {traceback.format_exc()}"
-            self._log_error(error_msg)
-            return 0, 1, 'error'
+                worker.google_sheet = self.google_sheet if shard == 0 else self._open_target(target)
+            except Exception as e:
+                self._log_warning(f"[{label}] 连接失败，目标退出: {str(e)}")
+                shards.retire(shard)
+                return
+
+            while True:
+                i = shards.next(shard)
+                if i is None:
+                    if shards.should_wait(shard):
+                        time.sleep(SHARD_IDLE_SECONDS)
+                        continue
+                    return
+                run_state = worker._check_run_state()
+                if run_state:
+                    shards.release(shard, i, failed=False)
+                    shards.stop(run_state)
+                    return
+
+                combination = worker._get_parameter_combination_by_index(parameters, i)
+                worker._log_info(f'[{label}] 正在执行第 {i + 1}/{total_combinations} 个参数组合 {combination}')
+                timing = CombinationTiming()
+                started = time.perf_counter()
+                try:
+                    with self.pipeline_stats.measure('sheet'):
+                        success, result = worker._execute_deduplicated(combination, config_data, timing)
+                except CircuitOpenError as e:
+                    # 熔断器由所有目标共享，不退出目标，放回组合后暂停
+                    shards.release(shard, i, time.perf_counter() - started, failed=False)
+                    run_state = worker._wait_for_circuit(e)
+                    if run_state:
+                        shards.stop(run_state)
+                        return
+                    continue
+                except CombinationRejected as e:
+                    COMBINATIONS_TOTAL.labels('rejected').inc()
+                    shards.complete(shard, i, time.perf_counter() - started)
+                    worker._log_info(f'[{label}] 第 {i + 1} 个参数组合被结果规则淘汰: {str(e)}')
+                    continue
+                except checkForErrors as e:
+                    shards.release(shard, i, time.perf_counter() - started)
+                    shards.stop('error', e)
+                    return
+                except Exception as e:
+                    success, result = False, {}
+                    worker._log_warning(f'[{label}] 第 {i + 1} 个参数组合执行出错: {str(e)}')
+                timing.sheet_seconds = time.perf_counter() - started
+
+                if not success:
+                    COMBINATIONS_TOTAL.labels('failed').inc()
+                    shards.release(shard, i, timing.sheet_seconds)
+                    shards.retire(shard)
+                    worker._log_warning(f'[{label}] 第 {i + 1} 个参数组合执行失败，目标退出，剩余组合由其他目标接手')
+                    return
+
+                COMBINATIONS_TOTAL.labels('success').inc()
+                try:
+                    param_load = worker._build_param_load(name, i, result)
+                    worker._finalize_combination(i, combination, result, success, param_load, timing)
+                except Exception as e:
+                    # 结果可能已保存，删除后恢复时才会重新执行并推送上游
+                    worker._discard_step_results(i)
+                    shards.release(shard, i, time.perf_counter() - started)
+                    shards.stop('error', PipelineStageError(i, e))
+                    return
+
+                shards.complete(shard, i, time.perf_counter() - started)
+                task_progress.step(self.task_id, total_combinations - shards.remaining())
+                worker._log_info(f'[{label}] 第 {i + 1} 个参数组合执行完成')
+
+    def _checkpoint_shards(self, task, shards: ShardQueue, total_combinations: int):
+        """断点推进到最小的未完成序号，并更新各目标吞吐"""
+        low_water = shards.low_water()
+        task.current_step = total_combinations if low_water is None else low_water + 1
+        task.last_heartbeat = datetime.now()
+        db_retry_manager.commit_with_retry(db.session)
+        self._last_heartbeat_at = time.monotonic()
+        task_progress.update(self.task_id, targets=shards.snapshot())
+
+    def _finish_shards(self, task, shards: ShardQueue, success_count: int):
+        """汇总分片执行结果，返回 (成功数, 失败数, 状态)"""
+        success_count += shards.completed()
+        failed_count = shards.failed()
+        self._log_info(shards.summary())
+        task_progress.update(self.task_id, success_count=success_count, failed_count=failed_count)
+
+        if shards.stop_status:
+            if shards.stop_error is not None:
+                task.error = shards.stop_error
+                self._log_error(str(shards.stop_error))
+            return success_count, failed_count, shards.stop_status
+        if shards.remaining():
+            task.error = Exception(f"所有目标均已退出，剩余 {shards.remaining()} 个参数组合未执行")
+            self._log_error(str(task.error))
+            return success_count, failed_count, 'error'
+
+        self._log_info(f"批量数据处理完成，总成功: {success_count}, 总失败: {failed_count}")
+        return success_count, failed_count, 'completed'
+
+    def _load_done_steps(self, start_index: int) -> set:
+        """已有成功结果的组合序号（不小于start_index）"""
+        def query_done():
+            rows = db.session.query(TaskResult.step_index).filter(
+                TaskResult.task_id == self.task_id,
+                TaskResult.success.is_(True),
+                TaskResult.step_index >= start_index
+            ).distinct().all()
+            return {row.step_index for row in rows}
+
+        return safe_db_operation(query_done)
+
+    def _discard_step_results(self, step_index: int):
+        """删除某个组合已保存的结果"""
+        def delete_results():
+            TaskResult.query.filter_by(task_id=self.task_id, step_index=step_index).delete()
+            db.session.commit()
+
+        try:
+            safe_db_operation(delete_results)
+        except Exception as e:
+            db.session.rollback()
+            self._log_error(f"删除第 {step_index + 1} 个参数组合结果失败: {str(e)}")
+
+    def _execute_deduplicated(self, combination: List, config_data: Dict[str, Any],
+                              timing: CombinationTiming) -> Tuple[bool, Dict[str, Any]]:
+        """计算参数组合，同一表格模型上的相同组合正在被其他任务计算时等待并复用其结果"""
+        if not get_config_manager().get_config('combination_dedup', True):
+            with combination_budget(self._combination_budget):
+                return self._execute_parameter_combination(combination, config_data, timing=timing)
+
+        key = build_dedup_key(config_data, combination, self.stock_no)
+        while True:
+            future, owner = inflight_combinations.acquire(key)
+            if owner:
+                break
+            self._log_info(f"参数组合 {combination} 正在由其他任务计算，等待共享结果")
+            shared = self._wait_shared_result(future, timing)
+            if shared is not None:
+                return shared
+            # 计算方出错（例如其任务被取消），改由本任务计算
+
+        self._shared_values = None
+        try:
+            with combination_budget(self._combination_budget):
+                outcome = self._execute_parameter_combination(combination, config_data, timing=timing)
+        except BaseException as e:
+            self._publish_shared(key, future, e)
+            raise
+        self._publish_shared(key, future)
+        return outcome
+
+    def _publish_shared(self, key, future: Future, error: BaseException = None):
+        """
+        把本次计算读到的原始单元格值交给等待者，等待者按各自的结果规则和校验处理；
+        没有读到完整结果（超时、出错、被中断）时等待者改由自己计算
+        """
+        values = self._shared_values
+        if values is not None:
+            inflight_combinations.finish(key, future, values)
+        elif isinstance(error, Exception):
+            inflight_combinations.finish(key, future, error=error)
+        else:
+            # 协程取消等非Exception异常不传给等待者
+            inflight_combinations.finish(key, future, error=RuntimeError(
+                '计算被中断' if error is not None else '未读取到完整的计算结果'))
+
+    def _wait_shared_result(self, future: Future, timing: CombinationTiming) -> Optional[Tuple[bool, Dict[str, Any]]]:
+        """等待其他任务的计算结果，期间保持心跳并响应取消；计算方出错时返回None"""
+        with timing.measure('wait'):
+            while True:
+                try:
+                    values = future.result(timeout=self._heartbeat_interval)
+                    break
+                except FutureTimeoutError:
+                    self._heartbeat()
+                    run_state = self._check_run_state()
+                    if run_state:
+                        raise RuntimeError(f"等待共享结果时任务状态变为 {run_state}")
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    self._log_warning(f"共享计算失败，改由本任务计算: {str(e)}")
+                    return None
+        timing.shared = True
+        self._log_info(f"复用其他任务读取的单元格值: {values}")
+        return self._judge_shared_values(values)
+
+    def _judge_shared_values(self, values: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+        """
+        按本任务的结果规则和校验处理共享的单元格值（复制一份，各任务各自保存和推送）
 
-    @retry(
-        stop=stop_after_attempt(3),  # 最多尝试3次
-        wait=wait_exponential(multiplier=1, min=4, max=10),  # 指数退避：4s, 6s, 10s...
-        reraise=True  # 重试耗尽后重新抛出原始异常
-    )
+        Raises:
+            CombinationRejected: 不满足本任务的结果规则
+        """
+        results = dict(values)
+        self._apply_result_rules(results)
+        is_valid_gs, gs_error_msg = validate_google_sheet_result(results, self.result_rules.allow_zero)
+        if not is_valid_gs:
+            self._log_warning(f"Google Sheet结果验证失败: {gs_error_msg}")
+            return False, {}
+        return validate_result_dict(
+            none_values=RESULT_NONE_VALUES, allow_zero=lambda: self.result_rules.allow_zero
+        )(lambda: (True, results))()
+
+    def _finalize_combination(self, step_index: int, combination: List, result: Dict, success: bool, param_load: Dict,
+                              timing: CombinationTiming = None):
+        """
+        参数组合后处理：推送上游、保存结果、通知前端，流水线模式下在后台线程中执行
+
+        先推送上游再保存，耗时分解可随结果一起写入；推送失败时仍保存结果，再抛出异常。
+        上游按组合顺序推送（上游的multiplier_index即恢复点），前面的组合推送失败时本组合不推送也不保存
+        """
+        timing = timing or CombinationTiming()
+        entered = False
+        try:
+            with pipeline_turn():
+                entered = True
+                with self.pipeline_stats.measure('upstream'), timing.measure('upstream'):
+                    # 推送结果，到生产数据库；股票API熔断时等待恢复后再推送
+                    while True:
+                        try:
+                            self.send_stock_template_param_data(param_load, lambda level, msg: self._log(level, msg))
+                            break
+                        except CircuitOpenError as e:
+                            run_state = self._wait_for_circuit(e)
+                            if run_state:
+                                raise RuntimeError(f"等待熔断恢复时任务状态变为 {run_state}")
+        finally:
+            if entered:
+                with self.pipeline_stats.measure('persist'):
+                    # 保存结果到数据库
+                    self._save_task_result(step_index, combination, result, success, timing)
+        with self.pipeline_stats.measure('notify'):
+            self._push_event("result_update", {
+                "step_index": step_index,
+                "parameters": combination,
+                "result": result,
+                "success": success
+            })
+
+    @with_retry_policy('stock_api_write')
     def send_stock_template_param_data(self, payload: Dict,log) -> int:
         """
         发送股票模板参数数据
@@ -330,16 +845,14 @@ class GoogleSheetService:
             result = self.api_client.insert_stock_template_param(payload)
             self._log_api("发送股票模板参数数据成功", f"ID: {result}")
             return result
+        except CircuitOpenError:
+            raise
         except Exception as e:
             self._log_api_error("发送股票模板参数数据", str(e))
             log('error',f"发送股票模板参数数据失败: {str(e)}")
             raise e
 
-    @retry(
-        stop=stop_after_attempt(3),  # 最多尝试3次
-        wait=wait_exponential(multiplier=1, min=4, max=10),  # 指数退避：4s, 6s, 10s...
-        reraise=True  # 重试耗尽后重新抛出原始异常
-    )
+    @with_retry_policy('stock_api_read')
     def get_single_stock_template_param(self, stock_no: str) -> Optional[Dict]:
         """
         获取单个股票模板参数
@@ -365,23 +878,14 @@ class GoogleSheetService:
         try:
             self._log_info("开始初始化Google Sheet连接")
             
-            spreadsheet_id = config_data.get('spreadsheet_id')
-            sheet_name = config_data.get('sheet_name', 'data')
-            token_file = config_data.get('token_file', 'data/token.json')
-            proxy_url = config_data.get('proxy_url', None)
-
-            if not spreadsheet_id:
+            targets = self._get_targets(config_data)
+            if not all(target['spreadsheet_id'] for target in targets):
                 error_msg = "缺少spreadsheet_id配置"
                 self._log_error(error_msg)
                 raise ValueError(error_msg)
 
-            self._log_info(f"连接参数 - Spreadsheet ID: {spreadsheet_id}, Sheet: {sheet_name}, Token: {token_file}")
-            if proxy_url:
-                self._log_info(f"使用代理: {proxy_url}")
-
-            self.google_sheet = GoogleSheet(spreadsheet_id, sheet_name, token_file, proxy_url)
-            if not self.google_sheet.worksheet:
-                raise Exception("请先选择工作表")
+            # 多目标时这里连接第一个目标，其余目标由各自的执行者连接
+            self.google_sheet = self._open_target(targets[0])
 
             self._log_info("Google Sheet连接初始化成功")
         except Exception as e:
@@ -389,6 +893,42 @@ class GoogleSheetService:
             self._log_error(error_msg)
             raise
             
+    def _open_target(self, target: Dict[str, Any]) -> GoogleSheet:
+        """连接一个目标的工作表"""
+        self._log_info(f"连接参数 - Spreadsheet ID: {target['spreadsheet_id']}, Sheet: {target['sheet_name']}, "
+                       f"Token: {target['token_file']}")
+        if target['proxy_url']:
+            self._log_info(f"使用代理: {target['proxy_url']}")
+
+        google_sheet = GoogleSheet(target['spreadsheet_id'], target['sheet_name'], target['token_file'],
+                                   target['proxy_url'])
+        if not google_sheet.worksheet:
+            raise Exception("请先选择工作表")
+        return google_sheet
+
+    @staticmethod
+    def _get_targets(config_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        解析执行目标列表
+
+        任务配置的targets为 [{spreadsheet_id, sheet_name, token_file, proxy_url}, ...]，
+        未填写的字段使用任务配置顶层的值；没有targets时只有顶层配置一个目标
+        """
+        defaults = {
+            'spreadsheet_id': config_data.get('spreadsheet_id'),
+            'sheet_name': config_data.get('sheet_name', 'data'),
+            'token_file': config_data.get('token_file', 'data/token.json'),
+            'proxy_url': config_data.get('proxy_url', None)
+        }
+        targets = []
+        for target in config_data.get('targets') or [{}]:
+            merged = {key: target.get(key) or value for key, value in defaults.items()}
+            # 兼容proxy写法
+            merged['proxy_url'] = target.get('proxy') or merged['proxy_url']
+            merged['label'] = f"{merged['spreadsheet_id']}/{merged['sheet_name']}"
+            targets.append(merged)
+        return targets
+
     @staticmethod
     def get_worksheets(spreadsheet_id: str, token_file: str = "data/token.json", proxy_url: str = None) -> List[str]:
         """
@@ -415,15 +955,16 @@ class GoogleSheetService:
             raise
 
 
-    @retry(
-        stop=stop_after_attempt(3),  # 最多尝试3次
-        wait=wait_exponential(multiplier=1, min=4, max=10),  # 指数退避：4s, 6s, 10s...
-        reraise=True,  # 重试耗尽后重新抛出原始异常
-        retry=retry_if_result(lambda result: result[0] is False)
-    )
-    @validate_result_dict(none_values=(None, '', ' ', '#N/A', '#DIV/0!', '#ERROR!', '#VALUE!', '#REF!', '#NAME?', '#NUM!'))
-    def _execute_parameter_combination(self, combination: List, config_data: Dict[str, Any]) -> tuple[bool, Dict[str, Any]]:
-        """执行单个参数组合"""
+    # 结果无效时按combination策略重试，总耗时受组合时间预算约束
+    @with_retry_policy('combination', retry_if_result=lambda result: result[0] is False)
+    @validate_result_dict(none_values=RESULT_NONE_VALUES,
+                          allow_zero=lambda self, *args, **kwargs: self.result_rules.allow_zero)
+    def _execute_parameter_combination(self, combination: List, config_data: Dict[str, Any],
+                                       timing: CombinationTiming = None) -> tuple[bool, Dict[str, Any]]:
+        """执行单个参数组合，timing跨重试累计各片段耗时"""
+        timing = timing or CombinationTiming()
+        timing.attempts += 1
+        self._shared_values = None
         try:
             # 获取参数位置配置
             param_positions = config_data.get('parameter_positions', [])
@@ -431,137 +972,76 @@ class GoogleSheetService:
             check_positions = config_data.get('check_positions', [])
             result_positions = config_data.get('result_positions', [])
 
-            results = {}
-            cell_updates = {}
+            cell_updates = self._prepare_cell_updates(combination, param_positions)
+            results = dict(cell_updates)
+            sentinel = self._get_sentinel(config_data)
 
             def _update_cell(num=0):
-                # 准备要更新的单元格
-                for i, position in enumerate(param_positions):
-                    cell_updates[position] = combination[i]
-                    results[position] = combination[i]
-
+                if sentinel:
+                    # 每次写入使用新的nonce，哨兵单元格回显它即表示本次写入已重新计算完成
+                    cell_updates[sentinel[0]] = self._new_nonce()
                 self._log_info(f"向Google Sheet写入参数: {cell_updates}")
-                self.google_sheet.update_jumped_cells(cell_updates)
-                if num <= 0:
+                with timing.measure('write'):
+                    self.google_sheet.update_jumped_cells(cell_updates)
+                if num <= 0 or sentinel:
                     return None
                 # 随机选择一个键
                 random_key = random.choice(list(cell_updates.keys()))
                 self._log_info(f"防止模型卡顿，在随机位置写入：{random_key},当前是第{num + 1}轮检查")
                 # 使用选中的键和对应的值更新单元格
-                self.google_sheet.update_cell(random_key, cell_updates[random_key])
+                with timing.measure('write'):
+                    self.google_sheet.update_cell(random_key, cell_updates[random_key])
                 return None
 
-            def check_result(_position, _value=None):
-                if not _value or not is_valid_result_value(_value):
-                    self._log_info(f"结果位置 {_position} 值为空或无效，跳过重新检查")
-                    raise Exception(f"结果位置 {_position} 值为空或无效，跳过重新检查")
-
-                if str(_value).strip().startswith(("#", "#N/A")):
-                    _error_msg = f"获取结果位置 {_position} 时出错: {str(_value)}"
-                    raise checkForErrors(f"检查报错，出现#|#N/A 这种异常错误，联系用户检查 {_error_msg}")
-
-                if '%' in _value:
-                    _value = float(_value.replace('%', '').replace(',', '')) / 100
-                if isinstance(_value, str):
-                    _value = float(_value.replace(',', ''))
-
-                results[_position] = round(_value, 5)
-
-            def _validate_check_values(check_values: Dict[str, Any]) -> bool:
-                """验证检查位置的值是否有效"""
-                if not check_values:
-                    return False
-                
-                for position, value in check_values.items():
-                    if not value or value in ['#DIV/0!', '', '#N/A', '#ERROR!', '#VALUE!']:
-                        return False
-                    if 'target' in str(value).lower():
-                        return False
-                    
-                    # 检查是否与输入参数匹配
-                    input_key = f"B{position[1:]}"  # 将 I6 -> B6
-                    if input_key in results:
-                        try:
-                            check_val = float(value.replace('%', '')) / 100 if '%' in value else float(value)
-                            input_val = float(results[input_key])
-                            if round(check_val) != round(input_val):
-                                return False
-                        except (ValueError, TypeError):
-                            return False
-                
-                return True
-
-            def _validate_result_values(result_values: Dict[str, Any]) -> Tuple[bool, List[str]]:
-                """验证结果值是否完整有效"""
-                if not result_values:
-                    return False, ["结果字典为空"]
-                
-                missing_positions = []
-                invalid_positions = []
-                
-                for position in result_positions:
-                    if position not in result_values:
-                        missing_positions.append(position)
-                        continue
-                    
-                    value = result_values[position]
-                    if not is_valid_result_value(value):
-                        invalid_positions.append(f"{position}({value})")
-                
-                error_msgs = []
-                if missing_positions:
-                    error_msgs.append(f"缺少位置: {missing_positions}")
-                if invalid_positions:
-                    error_msgs.append(f"无效值: {invalid_positions}")
-                
-                return len(error_msgs) == 0, error_msgs
-
-
-            sleep_num = 5
-
-            def get_sell_sleep(min_sleep: int, max_sleep: int) -> int:
-                nonlocal sleep_num
-                if sleep_num <= 0:
-                    sleep_num = 5
-                _ = min(min_sleep + sleep_num * 5, max_sleep)  # 最多60秒
-                sleep_num -= 1
-                return int(_)
-
             # 写入参数到Google Sheet
             _update_cell()
+            written_at = time.monotonic()
 
             is_exit = 0
             max_error_num = 3
 
             # 定时检查是否完成（最多检查60次，20-30秒）
-            for attempt in range(60):
-                # 从配置获取执行延迟时间
-                config_manager = get_config_manager()
-                delay_min = int(config_manager.get_config('execution_delay_min', 20))
-                delay_max = int(config_manager.get_config('execution_delay_max', 30))
-                _ = get_sell_sleep(delay_min, delay_max)
+            for attempt in range(MAX_POLL_ATTEMPTS):
+                if budget_exhausted():
+                    self._log_warning("已用完单个参数组合的时间预算，停止等待")
+                    return False, {}
+                _ = self._get_poll_delay(attempt)
                 self._log_info(f"第 {attempt + 1} 次检查执行状态... delay {_} 秒")
-                time.sleep(_)
+                timing.polls += 1
+                with timing.measure('wait'):
+                    time.sleep(cap_to_budget(_))
+                self._heartbeat()
 
                 
                 # 定期刷新参数，防止模型卡顿
-                if attempt % 10 == 0 or attempt in [3, 5, 8]:
+                if self._should_refresh_params(attempt, bool(sentinel)):
                     _update_cell(attempt)
 
                 # 检查所有位置是否都有产出
                 all_completed = True
                 
-                # 1. 检查检查位置的值
-                if self.google_sheet and check_positions:
+                # 1. 配置了哨兵单元格时只读取这一个单元格，否则检查检查位置的值
+                if sentinel:
+                    with timing.measure('read'):
+                        stamp = self._read_sentinel(sentinel[1])
+                    if stamp != cell_updates[sentinel[0]]:
+                        self._log_info(f"哨兵单元格尚未更新（{stamp}），继续等待...")
+                        continue
+                elif self.google_sheet and check_positions:
                     try:
-                        check_values = self.google_sheet.get_cells_batch(check_positions)
+                        with timing.measure('read'):
+                            check_values = self.google_sheet.get_cells_batch(check_positions)
                         self._log_info(f"获取到检查位置的值: {check_values}")
                         
-                        if not _validate_check_values(check_values):
+                        with timing.measure('validate'):
+                            check_passed = self._validate_check_values(check_values, results)
+                        if not check_passed:
                             all_completed = False
                             self._log_info(f"检查位置验证失败，继续等待...")
                             continue
                             
+                    except CircuitOpenError:
+                        raise
                     except Exception as e:
                         error_msg = f"批量检查位置时出错: {str(e)}"
                         self._log_error(error_msg)
@@ -571,31 +1051,23 @@ class GoogleSheetService:
                 # 2. 如果检查通过，获取结果
                 if all_completed and self.google_sheet and result_positions:
                     try:
-                        result_values = self.google_sheet.get_cells_batch(result_positions)
+                        with timing.measure('read'):
+                            result_values = self.google_sheet.get_cells_batch(result_positions)
                         self._log_info(f"获取到参数执行结果: {result_values}")
                         
                         # 验证结果完整性
-                        is_valid, error_msgs = _validate_result_values(result_values)
+                        with timing.measure('validate'):
+                            is_valid, error_msgs = self._validate_result_values(result_values, result_positions)
                         if not is_valid:
                             self._log_warning(f"结果验证失败: {error_msgs}，继续等待...")
                             all_completed = False
                             continue
                         
-                        # 所有结果都有效，处理结果
-                        for position in result_positions:
-                            value = result_values.get(position, "")
-                            check_result(position, value)
-                        
-                        # 使用专门的Google Sheet结果验证
-                        is_valid_gs, gs_error_msg = validate_google_sheet_result(results)
-                        if not is_valid_gs:
-                            self._log_warning(f"Google Sheet结果验证失败: {gs_error_msg}")
-                            return False, {}
-                        
-                        self._log_info(f"参数组合执行成功，结果: {results}")
-                        return True, results
+                        RECALC_WAIT_SECONDS.observe(time.monotonic() - written_at)
+                        with timing.measure('validate'):
+                            return self._collect_results(results, result_values, result_positions)
 
-                    except checkForErrors as e:
+                    except (checkForErrors, CombinationRejected, CircuitOpenError) as e:
                         raise e
                     except Exception as e:
                         error_msg = f"批量获取结果时出错: {str(e)}"
@@ -607,8 +1079,11 @@ class GoogleSheetService:
                         fallback_success = True
                         for position in result_positions:
                             try:
-                                value = self.google_sheet.get_cell(position)
-                                check_result(position, value)
+                                with timing.measure('read'):
+                                    value = self.google_sheet.get_cell(position)
+                                results[position] = self._parse_result_value(position, value)
+                            except CircuitOpenError:
+                                raise
                             except Exception as cell_error:
                                 error_msg = f"获取结果位置 {position} 时出错: {str(cell_error)}"
                                 self._log_error(error_msg)
@@ -617,7 +1092,9 @@ class GoogleSheetService:
                         
                         if fallback_success:
                             # 验证回退模式的结果
-                            is_valid_gs, gs_error_msg = validate_google_sheet_result(results)
+                            self._shared_values = dict(results)
+                            self._apply_result_rules(results)
+                            is_valid_gs, gs_error_msg = validate_google_sheet_result(results, self.result_rules.allow_zero)
                             if is_valid_gs:
                                 return True, results
                             else:
@@ -627,11 +1104,189 @@ class GoogleSheetService:
             self._log_warning("执行超时，未在规定时间内完成")
             return False, {}
 
+        except (CombinationRejected, CircuitOpenError):
+            raise
         except Exception as e:
             error_msg = f"执行参数组合时出错: {traceback.format_exc()}"
             self._log_error(error_msg)
             raise e
 
+    @staticmethod
+    def _prepare_cell_updates(combination: List, param_positions: List[str]) -> Dict[str, Any]:
+        """准备要写入的参数单元格 {位置: 参数值}"""
+        return {position: combination[i] for i, position in enumerate(param_positions)}
+
+    @staticmethod
+    def _should_refresh_params(attempt: int, sentinel: bool = False) -> bool:
+        """
+        是否在本轮检查前重新写入参数，防止模型卡顿
+
+        哨兵模式下不会因输入重复而误判完成，只需每10轮用新的nonce重写一次
+        """
+        if sentinel:
+            return attempt > 0 and attempt % 10 == 0
+        return attempt % 10 == 0 or attempt in [3, 5, 8]
+
+    @staticmethod
+    def _get_sentinel(config_data: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """
+        哨兵配置 (nonce_cell, sentinel_cell)，未配置时返回None
+
+        nonce_cell随参数一起写入一个随机nonce，sentinel_cell是模型计算完成后回显该nonce的公式单元格
+        """
+        nonce_cell = config_data.get('nonce_cell')
+        sentinel_cell = config_data.get('sentinel_cell')
+        if nonce_cell and sentinel_cell:
+            return nonce_cell, sentinel_cell
+        return None
+
+    @staticmethod
+    def _new_nonce() -> str:
+        # 加前缀避免被表格识别为数字
+        return f"n-{uuid.uuid4().hex[:12]}"
+
+    def _read_sentinel(self, sentinel_cell: str) -> Optional[str]:
+        """读取哨兵单元格，为空或读取失败时返回None"""
+        try:
+            return self.google_sheet.get_cell(sentinel_cell)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self._log_warning(f"读取哨兵单元格 {sentinel_cell} 失败: {str(e)}")
+            return None
+
+    @staticmethod
+    def _get_poll_delay(attempt: int) -> int:
+        """第attempt轮检查前的等待时间，从配置获取执行延迟范围，按5轮一个周期递减"""
+        config_manager = get_config_manager()
+        delay_min = int(config_manager.get_config('execution_delay_min', 20))
+        delay_max = int(config_manager.get_config('execution_delay_max', 30))
+        countdown = 5 - attempt % 5
+        return int(min(delay_min + countdown * 5, delay_max))  # 最多60秒
+
+    def _parse_result_value(self, position: str, value: Any) -> float:
+        """解析单个结果单元格的值，空值或错误值时抛出异常"""
+        if not value or not is_valid_result_value(value):
+            self._log_info(f"结果位置 {position} 值为空或无效，跳过重新检查")
+            raise Exception(f"结果位置 {position} 值为空或无效，跳过重新检查")
+
+        if str(value).strip().startswith(("#", "#N/A")):
+            error_msg = f"获取结果位置 {position} 时出错: {str(value)}"
+            raise checkForErrors(f"检查报错，出现#|#N/A 这种异常错误，联系用户检查 {error_msg}")
+
+        if '%' in value:
+            value = float(value.replace('%', '').replace(',', '')) / 100
+        if isinstance(value, str):
+            value = float(value.replace(',', ''))
+
+        return round(value, 5)
+
+    @staticmethod
+    def _validate_check_values(check_values: Dict[str, Any], results: Dict[str, Any]) -> bool:
+        """验证检查位置的值是否有效"""
+        if not check_values:
+            return False
+        
+        for position, value in check_values.items():
+            if not value or value in ['#DIV/0!', '', '#N/A', '#ERROR!', '#VALUE!']:
+                return False
+            if 'target' in str(value).lower():
+                return False
+            
+            # 检查是否与输入参数匹配
+            input_key = f"B{position[1:]}"  # 将 I6 -> B6
+            if input_key in results:
+                try:
+                    check_val = float(value.replace('%', '')) / 100 if '%' in value else float(value)
+                    input_val = float(results[input_key])
+                    if round(check_val) != round(input_val):
+                        return False
+                except (ValueError, TypeError):
+                    return False
+        
+        return True
+
+    @staticmethod
+    def _validate_result_values(result_values: Dict[str, Any], result_positions: List[str]) -> Tuple[bool, List[str]]:
+        """验证结果值是否完整有效"""
+        if not result_values:
+            return False, ["结果字典为空"]
+        
+        missing_positions = []
+        invalid_positions = []
+        
+        for position in result_positions:
+            if position not in result_values:
+                missing_positions.append(position)
+                continue
+            
+            value = result_values[position]
+            if not is_valid_result_value(value):
+                invalid_positions.append(f"{position}({value})")
+        
+        error_msgs = []
+        if missing_positions:
+            error_msgs.append(f"缺少位置: {missing_positions}")
+        if invalid_positions:
+            error_msgs.append(f"无效值: {invalid_positions}")
+        
+        return len(error_msgs) == 0, error_msgs
+
+    def _collect_results(self, results: Dict[str, Any], result_values: Dict[str, Any],
+                         result_positions: List[str]) -> Tuple[bool, Dict[str, Any]]:
+        """解析已通过完整性验证的结果值并做最终校验"""
+        # 所有结果都有效，处理结果
+        for position in result_positions:
+            value = result_values.get(position, "")
+            results[position] = self._parse_result_value(position, value)
+        
+        # 原始值供等待同一组合的其他任务按各自的规则处理
+        self._shared_values = dict(results)
+
+        # 先按结果规则淘汰，确定性的淘汰不进入空值校验和重试
+        self._apply_result_rules(results)
+
+        # 使用专门的Google Sheet结果验证
+        is_valid_gs, gs_error_msg = validate_google_sheet_result(results, self.result_rules.allow_zero)
+        if not is_valid_gs:
+            self._log_warning(f"Google Sheet结果验证失败: {gs_error_msg}")
+            return False, {}
+        
+        self._log_info(f"参数组合执行成功，结果: {results}")
+        return True, results
+
+    def _apply_result_rules(self, results: Dict[str, Any]):
+        """结果不满足任务的结果规则时抛出CombinationRejected"""
+        reason = self.result_rules.check(results)
+        if reason:
+            raise CombinationRejected(reason)
+
+    def _heartbeat(self, force: bool = False):
+        """写入执行器心跳，按heartbeat_interval节流，只更新当前执行器持有的任务"""
+        now = time.monotonic()
+        if not force and now - self._last_heartbeat_at < self._heartbeat_interval:
+            return
+        self._last_heartbeat_at = now
+        
+        def heartbeat_operation():
+            if self.run_token:
+                db.session.execute(
+                    text("UPDATE tasks SET last_heartbeat = :now WHERE id = :task_id AND run_token = :run_token"),
+                    {"now": datetime.now(), "task_id": self.task_id, "run_token": self.run_token}
+                )
+            else:
+                db.session.execute(
+                    text("UPDATE tasks SET last_heartbeat = :now WHERE id = :task_id"),
+                    {"now": datetime.now(), "task_id": self.task_id}
+                )
+            db.session.commit()
+        
+        try:
+            safe_db_operation(heartbeat_operation)
+        except Exception as e:
+            db.session.rollback()
+            self.task_logger.warning(f"[Task-{self.task_id[:8]}] 写入心跳失败: {str(e)}")
+
     def _log(self, level: str, message: str, log_type: str = 'general', **kwargs):
         """
         统一的日志记录接口 - 完整版，包含前端推送和数据库保存
@@ -689,38 +1344,28 @@ class GoogleSheetService:
             return message
     
     def _save_to_database(self, level: str, message: str):
-        """保存日志到数据库，包含重试逻辑"""
-        def save_log_operation():
-            log = TaskLog(
-                task_id=self.task_id,
-                level=level,
-                message=message
-            )
-            db.session.add(log)
-            db.session.commit()
-        
+        """保存日志到数据库，由后台写入器批量提交"""
         try:
-            if self.app:
-                with self.app.app_context():
-                    safe_db_operation(save_log_operation)
-            else:
-                with current_app.app_context():
-                    safe_db_operation(save_log_operation)
+            task_log_writer.write(self.task_id, level, message)
         except Exception as e:
             # 数据库保存失败时静默处理，不影响主流程
             pass
     
     def _push_to_frontend(self, level: str, message: str):
         """推送日志到前端"""
+        self._push_event("log_update", {
+            "level": level,
+            "message": message,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    def _push_event(self, event_type: str, data: Dict[str, Any]):
+        """推送事件到前端（SSE）"""
         try:
             if self.event_queue:
                 self.event_queue.put({
-                    "type": "log_update",
-                    "data": {
-                        "level": level,
-                        "message": message,
-                        "timestamp": datetime.now().isoformat()
-                    }
+                    "type": event_type,
+                    "data": data
                 })
         except Exception as e:
             # 前端推送失败时静默处理，不影响主流程
@@ -755,18 +1400,22 @@ class GoogleSheetService:
         """记录API错误日志"""
         self._log('error', '', 'api_error', action=action, error=error)
 
-    def _save_task_result(self, step_index: int, parameters: List, result: Dict, success: bool):
-        """保存任务结果到数据库，包含重试逻辑"""
+    def _save_task_result(self, step_index: int, parameters: List, result: Dict, success: bool,
+                          timing: CombinationTiming = None):
+        """
+        保存任务结果到数据库，包含重试逻辑
+
+        timing中的persist为构建并写入结果行的耗时，事务提交耗时见db_commit_seconds指标
+        """
         def save_result_operation():
-            task_result = TaskResult(
-                task_id=self.task_id,
-                step_index=step_index,
-                parameters=json.dumps(parameters),
-                result=json.dumps(result),
-                success=success
-            )
-            db.session.add(task_result)
-            db.session.commit()
+            # 按 (task_id, step_index) 覆盖已有结果：PostgreSQL用upsert，其余数据库先删除再插入
+            get_persistence_backend().save_result({
+                'task_id': self.task_id,
+                'step_index': step_index,
+                'parameters': json.dumps(parameters),
+                'result': json.dumps(result),
+                'success': success
+            }, timing)
         
         try:
             if self.app:
@@ -0,0 +1,333 @@
+"""
+钉钉通知异步发送模块
+任务通知先进入有界队列，由后台线程按令牌桶限速发送（钉钉机器人限制每分钟20条），
+短时间内同类通知较多或令牌不足时合并为一张汇总卡片，避免阻塞任务结束流程和超限丢消息。
+gunicorn的每个工作进程各有一个发送线程，令牌桶状态保存在加文件锁的共享文件中，所有进程合计不超过限速。
+发送线程是守护线程，进程退出前（gunicorn worker_exit 钩子或 atexit）在限定时间内同步发送剩余通知
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from app.utils.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows下以单进程运行（run.py），使用进程内令牌桶
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# 多进程共享的令牌桶状态文件
+BUCKET_FILE = os.path.join('data', 'notification_bucket.json')
+
+# 钉钉返回的发送过快错误码
+DINGTALK_RATE_LIMITED = 130101
+
+# 进程退出时同步发送剩余通知的最长时间（秒），需小于gunicorn的graceful_timeout
+FLUSH_TIMEOUT = 5.0
+
+KIND_TITLES = {
+    'error': '🚨 告警：{window}内 {count} 个任务执行异常',
+    'ok': '🎉 {window}内 {count} 个任务执行完成'
+}
+
+
+class TokenBucket:
+    """令牌桶限速器，非线程安全，仅在发送线程中使用"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def available(self) -> int:
+        self._refill()
+        return int(self.tokens)
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """距离下一个令牌可用的秒数"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def drain(self):
+        """清空令牌（钉钉已判定限流时使用）"""
+        self._refill()
+        self.tokens = 0
+
+
+class SharedTokenBucket:
+    """
+    多进程共享的令牌桶，接口与TokenBucket相同
+
+    状态（令牌数和更新时间）保存在文件中，每次操作持有文件锁读取、补充并写回
+    """
+
+    def __init__(self, path: str, rate_per_minute: float, capacity: Optional[float] = None):
+        self.path = path
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """持有文件锁，产出补充后的状态字典，退出时写回"""
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                now = time.time()
+                try:
+                    saved = json.loads(f.read())
+                    tokens = float(saved['tokens']) + max(now - float(saved['updated_at']), 0.0) * self.rate
+                except (ValueError, KeyError, TypeError):
+                    # 文件不存在或损坏时从满桶开始
+                    tokens = self.capacity
+                state = {'tokens': min(self.capacity, tokens)}
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({'tokens': state['tokens'], 'updated_at': now}))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def available(self) -> int:
+        with self._locked() as state:
+            return int(state['tokens'])
+
+    def try_acquire(self) -> bool:
+        with self._locked() as state:
+            if state['tokens'] >= 1:
+                state['tokens'] -= 1
+                return True
+            return False
+
+    def wait_time(self) -> float:
+        with self._locked() as state:
+            return 0.0 if state['tokens'] >= 1 else (1 - state['tokens']) / self.rate
+
+    def drain(self):
+        with self._locked() as state:
+            state['tokens'] = 0
+
+
+class NotificationDispatcher:
+    """钉钉通知发送器"""
+
+    def __init__(self, rate_per_minute: int = 20, max_queue_size: int = 1000, coalesce_delay: float = 5.0,
+                 digest_threshold: int = 3):
+        """
+        Args:
+            rate_per_minute: 每分钟最多发送的消息数
+            max_queue_size: 队列容量，队列满时丢弃新通知并记录系统日志
+            coalesce_delay: 收到通知后等待同类通知聚合的时间（秒）
+            digest_threshold: 同类通知达到该数量时合并为汇总卡片
+        """
+        self.rate_per_minute = rate_per_minute
+        self.coalesce_delay = coalesce_delay
+        self.digest_threshold = digest_threshold
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._app = None
+        # 等待发送的通知，按类型分组
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+
+    def start(self, app):
+        """启动后台发送线程（每个进程各自启动）"""
+        with self._lock:
+            self._app = app
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            thread = threading.Thread(target=self._loop, name='notification-dispatcher')
+            thread.daemon = True
+            self._thread = thread
+            thread.start()
+        # 进程退出前发送剩余通知（重复启动时只注册一次）
+        atexit.unregister(self.flush)
+        atexit.register(self.flush)
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def depth(self) -> int:
+        """队列中和等待聚合的通知数"""
+        return self._queue.qsize() + sum(len(items) for items in list(self._pending.values()))
+
+    def notify(self, app, kind: str, task: str, message: str, url: str):
+        """
+        提交一条任务通知，发送线程未启动时同步发送
+
+        Args:
+            app: Flask应用实例，提供notifier和BASE_URL
+            kind: 'error' 或 'ok'
+            task: 任务标识（ID和名称）
+            message: 通知内容
+            url: 任务详情链接
+        """
+        item = {'kind': kind, 'task': task, 'message': message, 'url': url, 'created_at': time.monotonic()}
+        if not self.is_running():
+            self._send(app, self._build_message(app, kind, [item]))
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.error(f"通知队列已满，丢弃通知: {task} {message}")
+
+    def _make_bucket(self):
+        """所有工作进程共享的令牌桶，不支持文件锁的平台使用进程内令牌桶"""
+        if fcntl is None:
+            return TokenBucket(self.rate_per_minute)
+        try:
+            return SharedTokenBucket(BUCKET_FILE, self.rate_per_minute)
+        except OSError as e:
+            logger.warning(f"无法创建共享令牌桶文件，改为按进程限速: {str(e)}")
+            return TokenBucket(self.rate_per_minute)
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT):
+        """
+        停止发送线程，在timeout秒内同步发送队列中和等待聚合的通知（不再等待聚合时间），
+        超时仍未发出的记录日志后丢弃。可重复调用，之后提交的通知同步发送
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            thread = self._thread
+            self._stopping.set()
+        if thread and thread.is_alive():
+            try:
+                # 唤醒阻塞在队列上的发送线程
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            thread.join(max(deadline - time.monotonic(), 0))
+            if thread.is_alive():
+                logger.error(f"通知发送线程未能在 {timeout} 秒内停止，约 {self.depth()} 条通知未发送")
+                return
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._pending.setdefault(item['kind'], []).append(item)
+        if not self._pending or self._app is None:
+            return
+
+        bucket = self._make_bucket()
+        while self._pending and time.monotonic() < deadline:
+            try:
+                self._dispatch_due(bucket, coalesce=False)
+            except Exception as e:
+                logger.error(f"发送钉钉通知失败: {str(e)}")
+                break
+            if self._pending:
+                time.sleep(min(max(bucket.wait_time(), 0.05), max(deadline - time.monotonic(), 0)))
+        if self._pending:
+            logger.error(f"进程退出，{self.depth()} 条通知未能在 {timeout} 秒内发送，已丢弃")
+            self._pending.clear()
+
+    def _loop(self):
+        bucket = self._make_bucket()
+        while not self._stopping.is_set():
+            timeout = None
+            if self._pending:
+                oldest = min(items[0]['created_at'] for items in self._pending.values())
+                timeout = max(oldest + self.coalesce_delay - time.monotonic(), bucket.wait_time(), 0.05)
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is None:
+                    # flush() 的停止信号，剩余通知由flush发送
+                    break
+                self._pending.setdefault(item['kind'], []).append(item)
+            except queue.Empty:
+                pass
+
+            try:
+                self._dispatch_due(bucket)
+            except Exception as e:
+                logger.error(f"发送钉钉通知失败: {str(e)}")
+
+    def _dispatch_due(self, bucket: TokenBucket, coalesce: bool = True):
+        """发送聚合时间已到的通知（coalesce为False时不等待聚合时间），令牌不足的留在pending中继续聚合"""
+        now = time.monotonic()
+        for kind in list(self._pending):
+            items = self._pending[kind]
+            if coalesce and now - items[0]['created_at'] < self.coalesce_delay:
+                continue
+            available = bucket.available()
+            if available < 1:
+                return
+
+            if len(items) < self.digest_threshold and len(items) <= available:
+                messages = [(self._build_message(self._app, kind, [item]), [item]) for item in items]
+            else:
+                messages = [(self._build_message(self._app, kind, items), items)]
+            del self._pending[kind]
+
+            for index, (message, sent_items) in enumerate(messages):
+                unsent = [item for _, group in messages[index:] for item in group]
+                if not bucket.try_acquire():
+                    # 令牌被其他进程取走，未发出的通知放回pending继续聚合
+                    self._pending.setdefault(kind, [])[0:0] = unsent
+                    return
+                response = self._send(self._app, message)
+                if isinstance(response, dict) and response.get('errcode') == DINGTALK_RATE_LIMITED:
+                    # 被钉钉限流，未发出的通知放回pending，等下一个令牌时合并发送
+                    logger.warning("钉钉通知发送过快，稍后合并重发")
+                    bucket.drain()
+                    self._pending.setdefault(kind, [])[0:0] = unsent
+                    return
+
+    def _build_message(self, app, kind: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        notifier = app.notifier
+        if len(items) == 1:
+            item = items[0]
+            if kind == 'error':
+                return notifier.error_google_task_templates(item['task'], item['message'], item['url'])
+            return notifier.google_task_ok_templates(item['task'], item['message'], item['url'])
+
+        span = time.monotonic() - items[0]['created_at']
+        window = f"最近{max(round(span / 60), 1)}分钟"
+        title = KIND_TITLES.get(kind, '{window}内 {count} 条任务通知').format(window=window, count=len(items))
+        return notifier.google_task_digest_templates(
+            title,
+            [(item['task'], item['message']) for item in items],
+            f"{app.config.get('BASE_URL')}/admin/tasks"
+        )
+
+    @staticmethod
+    def _send(app, message: Dict[str, Any]):
+        try:
+            return app.notifier.send_message(message)
+        except Exception as e:
+            logger.error(f"发送钉钉通知失败: {str(e)}")
+            return None
+
+
+# 全局通知发送器实例
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,312 @@
+"""
+持久化后端模块
+任务日志和结果的批量写入按数据库类型选择后端，由DATABASE_URL自动决定：
+
+- SQLite等：ORM批量插入，结果逐行插入
+- PostgreSQL：日志和批量结果用COPY写入；结果按 (task_id, step_index) 用 INSERT ... ON CONFLICT 覆盖，
+  断点回退重新执行的组合只保留最新结果；task_logs 按月范围分区，分区由后台维护器提前创建
+
+已有的PostgreSQL库需执行一次 `flask pg-upgrade` 把 task_logs 转为分区表并为结果建立唯一索引
+"""
+import io
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models import TaskLog, TaskResult, db
+from app.utils.background import PeriodicWorker
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+RESULT_UNIQUE_INDEX = 'ux_task_results_task_id_step'
+# 提前创建的月分区数（含当月）
+PARTITION_MONTHS_AHEAD = 3
+
+
+def _month_start(day: date, offset: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _copy_value(value: Any) -> str:
+    """COPY文本格式的字段值"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class PersistenceBackend:
+    """默认后端：ORM写入，适用于SQLite"""
+
+    name = 'orm'
+
+    def create_schema(self):
+        """创建数据表（已存在的表不变）"""
+        db.create_all()
+
+    def copy_rows(self, model, rows: List[Dict[str, Any]]):
+        """批量插入一批记录（同一批记录的字段相同），调用方负责提交"""
+        db.session.bulk_insert_mappings(model, rows)
+
+    def insert_logs(self, entries: List[Dict[str, Any]]):
+        """写入一批任务日志并提交"""
+        self.copy_rows(TaskLog, entries)
+        db.session.commit()
+
+    def save_result(self, values: Dict[str, Any], timing=None):
+        """
+        写入单个组合的结果并提交，先删除该组合已有的结果（上游推送失败后恢复重新执行时不会重复）
+
+        timing不为空时在写入后补上persist耗时（构建并写入结果行的耗时）
+        """
+        started = time.perf_counter()
+        TaskResult.query.filter_by(task_id=values['task_id'], step_index=values['step_index']).delete()
+        task_result = TaskResult(**values)
+        db.session.add(task_result)
+        if timing is not None:
+            db.session.flush()
+            timing.add('persist', time.perf_counter() - started)
+            task_result.timing = timing.to_json()
+        db.session.commit()
+
+
+class PostgresBackend(PersistenceBackend):
+    """PostgreSQL后端：COPY批量写入、结果upsert、日志按月分区"""
+
+    name = 'postgresql'
+
+    def __init__(self):
+        self._has_result_index: Optional[bool] = None
+        self._lock = threading.Lock()
+
+    def create_schema(self):
+        """task_logs 建为按月分区表，其余表由ORM创建"""
+        tables = [table for name, table in db.metadata.tables.items() if name != TaskLog.__tablename__]
+        db.metadata.create_all(bind=db.engine, tables=tables)
+        if not self._table_exists(TaskLog.__tablename__):
+            self._create_partitioned_logs()
+        self.ensure_partitions(commit=False)
+        db.session.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {RESULT_UNIQUE_INDEX} ON task_results (task_id, step_index)"
+        ))
+        db.session.commit()
+        self._has_result_index = None
+
+    @staticmethod
+    def _table_exists(name: str) -> bool:
+        return db.session.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': name}).scalar()
+
+    @staticmethod
+    def is_partitioned() -> bool:
+        return bool(db.session.execute(text(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('task_logs')"
+        )).scalar())
+
+    @staticmethod
+    def _create_partitioned_logs():
+        """创建分区的task_logs；分区键必须包含在主键中，主键为 (id, timestamp)"""
+        db.session.execute(text("CREATE SEQUENCE IF NOT EXISTS task_logs_id_seq"))
+        db.session.execute(text("""
+            CREATE TABLE task_logs (
+                id BIGINT NOT NULL DEFAULT nextval('task_logs_id_seq'),
+                task_id VARCHAR(36) NOT NULL REFERENCES tasks (id),
+                level VARCHAR(20) DEFAULT 'info',
+                message TEXT NOT NULL,
+                timestamp TIMESTAMP NOT NULL DEFAULT now(),
+                PRIMARY KEY (id, timestamp)
+            ) PARTITION BY RANGE (timestamp)
+        """))
+        db.session.execute(text("ALTER SEQUENCE task_logs_id_seq OWNED BY task_logs.id"))
+        db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_task_logs_task_id_id ON task_logs (task_id, id)"))
+        # 默认分区兜底，维护器未及时创建月分区时写入也不会失败
+        db.session.execute(text("CREATE TABLE IF NOT EXISTS task_logs_default PARTITION OF task_logs DEFAULT"))
+
+    @staticmethod
+    def _existing_partitions() -> set:
+        rows = db.session.execute(text("""
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass('task_logs')
+        """)).all()
+        return {row[0] for row in rows}
+
+    def ensure_partitions(self, start: date = None, months: int = PARTITION_MONTHS_AHEAD, commit: bool = True) -> List[str]:
+        """
+        创建从start所在月开始的months个月分区，已存在的跳过
+
+        先建独立表、把默认分区中落在该月的记录移入，再挂载为分区，默认分区已有该月数据时也能创建；
+        commit为False时由调用方在同一事务中提交
+
+        Returns:
+            新建的分区名
+        """
+        if not self.is_partitioned():
+            return []
+        first = _month_start(start or date.today())
+        existing = self._existing_partitions()
+        created = []
+        for offset in range(months):
+            lower, upper = _month_start(first, offset), _month_start(first, offset + 1)
+            name = f"task_logs_y{lower.year}m{lower.month:02d}"
+            if name in existing:
+                continue
+            bounds = {'lower': lower, 'upper': upper}
+            db.session.execute(text(
+                f"CREATE TABLE {name} (LIKE task_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ))
+            db.session.execute(text(f"""
+                WITH moved AS (
+                    DELETE FROM task_logs_default WHERE timestamp >= :lower AND timestamp < :upper RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """), bounds)
+            db.session.execute(text(
+                f"ALTER TABLE task_logs ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            ))
+            if commit:
+                db.session.commit()
+            created.append(name)
+        return created
+
+    def upgrade_schema(self) -> Dict[str, Any]:
+        """
+        升级已有的库：task_logs 转为分区表（在一个事务中复制数据），结果表去重后建立唯一索引
+
+        Returns:
+            升级摘要
+        """
+        summary = {'partitioned_logs': False, 'migrated_logs': 0, 'removed_duplicate_results': 0}
+        if self._table_exists(TaskLog.__tablename__) and not self.is_partitioned():
+            db.session.execute(text("ALTER SEQUENCE IF EXISTS task_logs_id_seq OWNED BY NONE"))
+            db.session.execute(text("ALTER TABLE task_logs RENAME TO task_logs_unpartitioned"))
+            db.session.execute(text("ALTER TABLE task_logs_unpartitioned RENAME CONSTRAINT task_logs_pkey TO task_logs_unpartitioned_pkey"))
+            db.session.execute(text("ALTER INDEX IF EXISTS ix_task_logs_task_id_id RENAME TO ix_task_logs_unpartitioned_task_id_id"))
+            self._create_partitioned_logs()
+            oldest = db.session.execute(text("SELECT min(timestamp) FROM task_logs_unpartitioned")).scalar()
+            if oldest:
+                today = date.today()
+                months = (today.year - oldest.year) * 12 + today.month - oldest.month + PARTITION_MONTHS_AHEAD
+                self.ensure_partitions(oldest.date(), months, commit=False)
+            summary['migrated_logs'] = db.session.execute(text("""
+                INSERT INTO task_logs (id, task_id, level, message, timestamp)
+                SELECT id, task_id, level, message, COALESCE(timestamp, now()) FROM task_logs_unpartitioned
+            """)).rowcount
+            db.session.execute(text("DROP TABLE task_logs_unpartitioned"))
+            db.session.execute(text(
+                "SELECT setval('task_logs_id_seq', GREATEST((SELECT COALESCE(max(id), 0) FROM task_logs), 1))"
+            ))
+            db.session.commit()
+            summary['partitioned_logs'] = True
+        self.ensure_partitions()
+
+        summary['removed_duplicate_results'] = db.session.execute(text("""
+            DELETE FROM task_results older USING task_results newer
+            WHERE older.task_id = newer.task_id AND older.step_index = newer.step_index AND older.id < newer.id
+        """)).rowcount
+        db.session.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {RESULT_UNIQUE_INDEX} ON task_results (task_id, step_index)"
+        ))
+        db.session.commit()
+        self._has_result_index = None
+        return summary
+
+    def copy_rows(self, model, rows: List[Dict[str, Any]]):
+        """用COPY写入一批记录，驱动不支持copy_expert时退回批量插入"""
+        if not rows:
+            return
+        raw_connection = db.session.connection().connection
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(row.get(column)) for column in columns))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor = raw_connection.cursor()
+        try:
+            if not hasattr(cursor, 'copy_expert'):
+                super().copy_rows(model, rows)
+                return
+            cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+
+    def _result_index_ready(self) -> bool:
+        """结果表是否已有 (task_id, step_index) 唯一索引，没有时ON CONFLICT无法使用"""
+        with self._lock:
+            if self._has_result_index is None:
+                self._has_result_index = self._table_exists(RESULT_UNIQUE_INDEX)
+                if not self._has_result_index:
+                    logger.warning("task_results 缺少唯一索引，结果逐行插入；执行 flask pg-upgrade 后启用upsert")
+            return self._has_result_index
+
+    def save_result(self, values: Dict[str, Any], timing=None):
+        """按 (task_id, step_index) upsert结果，一条语句写入，persist耗时只含构建结果行"""
+        if not self._result_index_ready():
+            super().save_result(values, timing)
+            return
+        started = time.perf_counter()
+        values = dict(values, timestamp=datetime.now())
+        if timing is not None:
+            timing.add('persist', time.perf_counter() - started)
+            values['timing'] = timing.to_json()
+        statement = pg_insert(TaskResult).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['task_id', 'step_index'],
+            set_={column: statement.excluded[column] for column in values if column not in ('task_id', 'step_index')}
+        )
+        db.session.execute(statement)
+        db.session.commit()
+
+
+class PartitionMaintainer(PeriodicWorker):
+    """提前创建task_logs的月分区"""
+
+    name = 'pg-partition-maintainer'
+    default_interval = 6 * 3600
+
+    def run_once(self):
+        created = get_persistence_backend().ensure_partitions()
+        if created:
+            logger.info(f"已创建任务日志分区: {', '.join(created)}")
+
+
+_backend: Optional[PersistenceBackend] = None
+_backend_lock = threading.Lock()
+
+
+def backend_for_url(database_url: str) -> PersistenceBackend:
+    if database_url.startswith(('postgresql', 'postgres')):
+        return PostgresBackend()
+    return PersistenceBackend()
+
+
+def get_persistence_backend() -> PersistenceBackend:
+    """按当前应用的数据库地址（DATABASE_URL）选择后端，在应用上下文中调用"""
+    global _backend
+    if _backend is None:
+        from flask import current_app
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_for_url(current_app.config['SQLALCHEMY_DATABASE_URI'])
+                logger.info(f"任务日志和结果持久化后端: {_backend.name}")
+    return _backend
+
+
+def start_maintenance(app):
+    """PostgreSQL后端启动分区维护器"""
+    with app.app_context():
+        if isinstance(get_persistence_backend(), PostgresBackend):
+            partition_maintainer.start(app)
+
+
+# 全局分区维护器实例
+partition_maintainer = PartitionMaintainer()
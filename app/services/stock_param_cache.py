@@ -0,0 +1,247 @@
+"""
+股票模板参数缓存模块
+任务启动时从进程内缓存读取股票模板参数，不再在启动路径上同步请求股票API（上游不稳定时重试退避可达数十秒）：
+
+- 后台刷新器每 stock_param_refresh_interval 秒只刷新排队任务需要、且没有新鲜缓存的股票：
+  股票数未达到 stock_param_bulk_threshold 时逐个用 GetSingleStockTemplateParam 获取，
+  否则用 GetStockTemplateParams 分页批量拉取；没有排队任务时不请求上游。新建批量任务时立即唤醒刷新器
+- 缓存 stock_param_cache_ttl 秒内为新鲜数据；之后 stock_param_stale_seconds 秒内仍直接返回旧值，
+  同时在后台单独刷新该股票（stale-while-revalidate）；再往后视为没有缓存，由执行器同步获取后写回
+- 模板参数中的multiplier_index随执行推进变化，调用方传入not_before（同一股票的任务最近一次结束时间），
+  在此之前获取的参数视为没有缓存
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.utils.background import PeriodicWorker
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 缓存中没有可用的参数（None是合法的参数值，表示使用默认参数）
+MISSING = object()
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_STALE_SECONDS = 3600
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_BULK_THRESHOLD = 50
+# 分页拉取的最大页数，防止上游分页异常时无限循环
+MAX_PAGES = 1000
+# 后台单独刷新过期股票的并发数
+REVALIDATE_WORKERS = 2
+
+
+def _config(key: str, default):
+    try:
+        from app.services.config_manager import get_config_manager
+        return get_config_manager().get_config(key, default)
+    except Exception:
+        # 后台刷新线程没有应用上下文时使用默认值
+        return default
+
+
+class StockParamCache:
+    """进程内的股票模板参数缓存"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 股票编号 -> (获取时的单调时钟, 获取时间, 参数)
+        self._entries: Dict[str, Tuple[float, datetime, Optional[Dict]]] = {}
+        self._revalidating: set = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self.last_refresh_at: Optional[datetime] = None
+
+    def _client(self):
+        """每个线程一个股票API客户端（requests会话不跨线程共享）"""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            from app.utils.db_stock_api import StockAPIClient
+            client = self._local.client = StockAPIClient()
+        return client
+
+    def put(self, stock_no: str, value: Optional[Dict]):
+        with self._lock:
+            self._entries[stock_no] = (time.monotonic(), datetime.now(), value)
+
+    def invalidate(self, stock_no: str):
+        with self._lock:
+            self._entries.pop(stock_no, None)
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, stock_no: str, not_before: Optional[datetime] = None) -> Any:
+        """
+        读取股票模板参数，过期但仍在容忍期内时返回旧值并在后台刷新
+
+        Returns:
+            参数字典或None，没有可用缓存时返回MISSING
+        """
+        ttl = float(_config('stock_param_cache_ttl', DEFAULT_TTL_SECONDS))
+        stale_seconds = float(_config('stock_param_stale_seconds', DEFAULT_STALE_SECONDS))
+        with self._lock:
+            entry = self._entries.get(stock_no)
+        if entry is None:
+            return MISSING
+        fetched_mono, fetched_at, value = entry
+        if not_before is not None and fetched_at < not_before:
+            return MISSING
+        age = time.monotonic() - fetched_mono
+        if age <= ttl:
+            return value
+        if age <= ttl + stale_seconds:
+            self._revalidate(stock_no)
+            return value
+        return MISSING
+
+    def is_fresh(self, stock_no: str) -> bool:
+        ttl = float(_config('stock_param_cache_ttl', DEFAULT_TTL_SECONDS))
+        with self._lock:
+            entry = self._entries.get(stock_no)
+        return entry is not None and time.monotonic() - entry[0] <= ttl
+
+    def _revalidate(self, stock_no: str):
+        """在后台刷新单只股票，同一股票同时只刷新一次"""
+        with self._lock:
+            if stock_no in self._revalidating:
+                return
+            self._revalidating.add(stock_no)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS,
+                                                    thread_name_prefix='stock-param-revalidate')
+            executor = self._executor
+        executor.submit(self._revalidate_one, stock_no)
+
+    def _revalidate_one(self, stock_no: str):
+        try:
+            self.put(stock_no, self._client().get_single_stock_template_param(stock_no))
+        except Exception as e:
+            # 刷新失败时保留旧值，过了容忍期后由执行器同步获取
+            logger.warning(f"刷新股票 {stock_no} 模板参数失败: {str(e)}")
+        finally:
+            with self._lock:
+                self._revalidating.discard(stock_no)
+
+    @staticmethod
+    def _multiplier_index(row: Dict) -> int:
+        try:
+            return int(row.get('multiplier_index') or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    @staticmethod
+    def _page_rows(response: Optional[Dict]) -> List[Dict]:
+        if not response:
+            return []
+        rows = response.get('data')
+        if rows is None:
+            rows = response.get('ret_obj')
+        return rows if isinstance(rows, list) else []
+
+    def refresh_all(self, page_size: Optional[int] = None) -> int:
+        """
+        分页批量拉取全部股票的模板参数
+
+        上游每推送一个组合记录一行，同一股票有多条记录时保留multiplier_index最大的一行（与GetSingleStockTemplateParam一致，
+        是任务恢复执行的位置），相同时保留分页中靠后的一行；拉取中途失败时已拉取的页仍写入缓存
+
+        Returns:
+            写入缓存的股票数
+        """
+        page_size = int(page_size or _config('stock_param_page_size', DEFAULT_PAGE_SIZE))
+        client = self._client()
+        started = time.perf_counter()
+        params: Dict[str, Dict] = {}
+        try:
+            for page in range(MAX_PAGES):
+                rows = self._page_rows(client.get_stock_template_params(limit=page_size, offset=page * page_size))
+                for row in rows:
+                    stock_no = row.get('stock_no') if isinstance(row, dict) else None
+                    if not stock_no:
+                        continue
+                    current = params.get(str(stock_no))
+                    if current is None or self._multiplier_index(row) >= self._multiplier_index(current):
+                        params[str(stock_no)] = row
+                if len(rows) < page_size:
+                    break
+        except Exception as e:
+            logger.warning(f"批量拉取股票模板参数中断: {str(e)}")
+
+        now_mono, now = time.monotonic(), datetime.now()
+        with self._lock:
+            for stock_no, value in params.items():
+                self._entries[stock_no] = (now_mono, now, value)
+        self.last_refresh_at = now
+        logger.info(f"批量拉取股票模板参数 {len(params)} 个，耗时 {time.perf_counter() - started:.1f}s")
+        return len(params)
+
+    def refresh_stocks(self, stock_nos: Iterable[str]) -> int:
+        """
+        逐个获取股票的模板参数，单只股票失败时保留旧值继续下一只
+
+        Returns:
+            写入缓存的股票数
+        """
+        client = self._client()
+        refreshed = 0
+        for stock_no in stock_nos:
+            try:
+                self.put(stock_no, client.get_single_stock_template_param(stock_no))
+                refreshed += 1
+            except Exception as e:
+                logger.warning(f"刷新股票 {stock_no} 模板参数失败: {str(e)}")
+        return refreshed
+
+    def refresh_needed(self, stock_nos: Iterable[str]) -> int:
+        """
+        刷新stock_nos中没有新鲜缓存的股票，数量达到stock_param_bulk_threshold时改为分页批量拉取
+
+        Returns:
+            写入缓存的股票数
+        """
+        stale = [stock_no for stock_no in dict.fromkeys(stock_nos) if not self.is_fresh(stock_no)]
+        if not stale:
+            return 0
+        if len(stale) >= int(_config('stock_param_bulk_threshold', DEFAULT_BULK_THRESHOLD)):
+            return self.refresh_all()
+        refreshed = self.refresh_stocks(stale)
+        self.last_refresh_at = datetime.now()
+        return refreshed
+
+    def prefetch(self, stock_nos: Iterable[str]):
+        """
+        有股票没有新鲜缓存时唤醒刷新器立即刷新
+
+        缓存和刷新器都在进程内，只预热调用方所在的工作进程；其他进程按刷新间隔拉取，未命中时同步获取
+        """
+        if not all(self.is_fresh(stock_no) for stock_no in stock_nos):
+            stock_param_refresher.wake()
+
+
+class StockParamRefresher(PeriodicWorker):
+    """定期刷新排队任务需要的股票模板参数"""
+
+    name = 'stock-param-refresher'
+    default_interval = 300
+
+    def get_interval(self) -> float:
+        return _config('stock_param_refresh_interval', self.default_interval)
+
+    def run_once(self):
+        from app.models import Task, db
+
+        rows = db.session.query(Task.name).filter(
+            Task.status == 'queued', Task.task_type == 'google_sheet'
+        ).distinct().all()
+        # 结束只读事务，刷新期间不占用数据库连接
+        db.session.commit()
+        stock_param_cache.refresh_needed(row.name for row in rows)
+
+
+# 全局股票模板参数缓存和刷新器实例
+stock_param_cache = StockParamCache()
+stock_param_refresher = StockParamRefresher()
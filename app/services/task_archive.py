@@ -0,0 +1,248 @@
+"""
+任务归档模块
+结束超过archive_retention_days天的任务，其日志和结果写入 data/archive/<task_id>.json.gz 后从数据库分批删除；
+读取已归档任务的日志和结果时从归档文件还原，重启已归档任务时先把归档写回数据库
+
+归档顺序保证任何时刻数据都至少有一份完整副本：
+先用条件更新认领任务（archived_at），再写归档文件（临时文件+原子替换），确认文件存在后才删除数据库记录；
+归档文件存在之前读取仍走数据库，进程中途退出时下一轮会补写文件并继续删除
+"""
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, or_
+
+from app.config import Config
+from app.models import Task, TaskLog, TaskResult, db
+from app.services.persistence import get_persistence_backend
+from app.utils.background import PeriodicWorker
+from app.utils.database import safe_delete_in_batches
+from app.utils.db_retry import safe_db_operation
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+ARCHIVE_DIR = Config.DATA_DIR / 'archive'
+ARCHIVE_VERSION = 1
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+# 每轮最多归档的任务数，避免单轮占用数据库过久
+TASKS_PER_RUN = 20
+
+LOG_COLUMNS = ('id', 'task_id', 'level', 'message', 'timestamp')
+RESULT_COLUMNS = ('id', 'task_id', 'step_index', 'parameters', 'result', 'success', 'error_message', 'timing',
+                  'timestamp')
+
+
+def archive_path(task_id: str) -> Path:
+    return ARCHIVE_DIR / f"{task_id}.json.gz"
+
+
+def _row_to_dict(row, columns) -> Dict[str, Any]:
+    data = {column: getattr(row, column) for column in columns}
+    if isinstance(data['timestamp'], datetime):
+        data['timestamp'] = data['timestamp'].isoformat()
+    return data
+
+
+def _dict_to_row(data: Dict[str, Any]) -> Dict[str, Any]:
+    values = dict(data)
+    if values.get('timestamp'):
+        values['timestamp'] = datetime.fromisoformat(values['timestamp'])
+    return values
+
+
+def _dict_to_model(model, data: Dict[str, Any]):
+    """还原为游离的模型实例，读取时复用模型的to_dict"""
+    return model(**_dict_to_row(data))
+
+
+def write_archive(task_id: str) -> Path:
+    """读取任务的全部日志和结果写入归档文件，返回文件路径"""
+    logs = TaskLog.query.filter_by(task_id=task_id).order_by(TaskLog.id.asc()).all()
+    results = TaskResult.query.filter_by(task_id=task_id).order_by(TaskResult.step_index.asc(), TaskResult.id.asc()).all()
+    payload = {
+        'version': ARCHIVE_VERSION,
+        'task_id': task_id,
+        'archived_at': datetime.now().isoformat(),
+        'logs': [_row_to_dict(log, LOG_COLUMNS) for log in logs],
+        'results': [_row_to_dict(result, RESULT_COLUMNS) for result in results]
+    }
+
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = archive_path(task_id)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+@lru_cache(maxsize=8)
+def _read_archive(path: str, mtime: float) -> Dict[str, Any]:
+    """按路径和修改时间缓存解压后的归档，详情页轮询时不重复解压"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_archive(task_id: str) -> Optional[Dict[str, Any]]:
+    """读取任务的归档，不存在时返回None"""
+    path = archive_path(task_id)
+    try:
+        return _read_archive(str(path), path.stat().st_mtime)
+    except FileNotFoundError:
+        return None
+
+
+def is_archived(task: Task) -> bool:
+    """日志和结果是否应从归档读取（已认领且归档文件已写入）"""
+    return bool(task and task.archived_at and archive_path(task.id).exists())
+
+
+def archived_logs(task_id: str) -> List[TaskLog]:
+    archive = load_archive(task_id) or {}
+    return [_dict_to_model(TaskLog, data) for data in archive.get('logs', [])]
+
+
+def archived_results(task_id: str) -> List[TaskResult]:
+    archive = load_archive(task_id) or {}
+    return [_dict_to_model(TaskResult, data) for data in archive.get('results', [])]
+
+
+def _purge_rows(task_id: str, batch_size: int) -> int:
+    """分批删除任务的日志和结果，每批单独提交，避免长时间持有写锁"""
+    return sum(safe_delete_in_batches(model, batch_size, task_id=task_id) for model in (TaskLog, TaskResult))
+
+
+def archive_task(task_id: str, batch_size: int = 500) -> bool:
+    """
+    归档单个任务
+
+    Returns:
+        是否由本次调用完成归档（其他进程已认领时返回False）
+    """
+    task = Task.query.get(task_id)
+    if not task or task.status not in FINISHED_STATUSES:
+        return False
+
+    if not task.archived_at:
+        def claim():
+            claimed = Task.query.filter(Task.id == task_id, Task.archived_at.is_(None)).update(
+                {Task.archived_at: datetime.now()}, synchronize_session=False
+            )
+            db.session.commit()
+            return claimed
+
+        if not safe_db_operation(claim):
+            return False
+
+    # 认领后、删除前写入归档文件；文件已存在说明上一轮写过，数据库记录可能已部分删除，不能重写
+    if not archive_path(task_id).exists():
+        write_archive(task_id)
+    deleted = _purge_rows(task_id, batch_size)
+    logger.info(f"任务 {task_id} 已归档，删除 {deleted} 条日志和结果")
+    return True
+
+
+def restore_task(task_id: str) -> bool:
+    """
+    把归档写回数据库并删除归档文件，重启已归档的任务前调用
+
+    Returns:
+        是否还原了归档
+    """
+    task = Task.query.get(task_id)
+    if not task or not task.archived_at:
+        return False
+    if not archive_path(task_id).exists():
+        # 认领后尚未写入文件，记录仍全部在数据库中
+        task.archived_at = None
+        db.session.commit()
+        return False
+
+    archive = load_archive(task_id) or {}
+    logs = [_dict_to_row(data) for data in archive.get('logs', [])]
+    results = [_dict_to_row(data) for data in archive.get('results', [])]
+
+    def restore():
+        # 删除中途退出时数据库中还有部分记录，以归档为准
+        TaskLog.query.filter_by(task_id=task_id).delete(synchronize_session=False)
+        TaskResult.query.filter_by(task_id=task_id).delete(synchronize_session=False)
+        backend = get_persistence_backend()
+        backend.copy_rows(TaskLog, logs)
+        backend.copy_rows(TaskResult, results)
+        task.archived_at = None
+        db.session.commit()
+
+    safe_db_operation(restore)
+    archive_path(task_id).unlink(missing_ok=True)
+    logger.info(f"任务 {task_id} 已从归档还原 {len(logs)} 条日志和 {len(results)} 条结果")
+    return True
+
+
+def delete_archive(task_id: str):
+    archive_path(task_id).unlink(missing_ok=True)
+
+
+def find_archivable_tasks(retention_days: int, limit: int = TASKS_PER_RUN) -> List[str]:
+    """结束超过retention_days天且尚未归档的任务，以及已认领但记录未删完的任务"""
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    finished_at = func.coalesce(Task.end_time, Task.updated_at)
+    rows = db.session.query(Task.id).filter(
+        Task.status.in_(FINISHED_STATUSES),
+        or_(
+            Task.archived_at.is_(None) & (finished_at < cutoff),
+            Task.archived_at.isnot(None) & (Task.logs.any() | Task.results.any())
+        )
+    ).order_by(finished_at.asc()).limit(limit).all()
+    return [row.id for row in rows]
+
+
+class TaskArchiver(PeriodicWorker):
+    """按保留策略归档已结束任务的日志和结果"""
+
+    name = 'task-archiver'
+    default_interval = 3600
+
+    def get_interval(self) -> float:
+        from app.services.config_manager import get_config_manager
+        return get_config_manager().get_config('archive_interval', self.default_interval)
+
+    def run_once(self):
+        self.archive_expired()
+
+    def archive_expired(self, retention_days: int = None, limit: int = TASKS_PER_RUN) -> int:
+        """
+        归档过期任务，retention_days为None时读取系统配置，为0时不归档
+
+        Returns:
+            本轮归档的任务数
+        """
+        from app.services.config_manager import get_config_manager
+        config_manager = get_config_manager()
+        if retention_days is None:
+            retention_days = int(config_manager.get_config('archive_retention_days', 0) or 0)
+        if retention_days <= 0:
+            return 0
+        batch_size = int(config_manager.get_config('archive_batch_size', 500))
+
+        archived = 0
+        for task_id in find_archivable_tasks(retention_days, limit):
+            try:
+                if archive_task(task_id, batch_size):
+                    archived += 1
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"归档任务 {task_id} 失败: {str(e)}")
+        if archived:
+            logger.info(f"本轮归档了 {archived} 个任务")
+        return archived
+
+
+# 全局归档工作器实例
+task_archiver = TaskArchiver()
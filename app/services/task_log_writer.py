@@ -0,0 +1,120 @@
+"""
+任务日志批量写入模块
+任务执行过程中的日志先进入内存队列，由后台线程批量写入数据库，避免每条日志单独提交
+"""
+import queue
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from app.services.persistence import get_persistence_backend
+from app.utils.db_retry import safe_db_operation
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TaskLogWriter:
+    """任务日志批量写入器"""
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0, max_queue_size: int = 10000):
+        """
+        Args:
+            batch_size: 单次批量写入的最大条数
+            flush_interval: 队列未满一批时的最长等待时间（秒）
+            max_queue_size: 队列容量，队列满时退化为同步写入
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+
+    def start(self, app):
+        """启动后台写入线程（每个进程各自启动）"""
+        with self._lock:
+            self._app = app
+            if self._thread and self._thread.is_alive():
+                return
+            thread = threading.Thread(target=self._loop, name='task-log-writer')
+            thread.daemon = True
+            self._thread = thread
+            thread.start()
+
+    def is_running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def depth(self) -> int:
+        """当前待写入的日志条数"""
+        return self._queue.qsize()
+
+    def write(self, task_id: str, level: str, message: str):
+        """提交一条任务日志，写入线程未启动或队列已满时同步写入"""
+        entry = {
+            'task_id': task_id,
+            'level': level,
+            'message': message,
+            'timestamp': datetime.now()
+        }
+        if self.is_running():
+            try:
+                self._queue.put_nowait(entry)
+                return
+            except queue.Full:
+                logger.warning("任务日志队列已满，改为同步写入")
+        self._insert([entry])
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """等待此前提交的日志全部写入数据库"""
+        if not self.is_running():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _loop(self):
+        while True:
+            entries: List[Dict[str, Any]] = []
+            markers: List[threading.Event] = []
+            item = self._queue.get()
+            while True:
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    entries.append(item)
+                if len(entries) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.flush_interval if not markers else 0.01)
+                except queue.Empty:
+                    break
+
+            if entries:
+                self._insert(entries)
+            for marker in markers:
+                marker.set()
+
+    def _insert(self, entries: List[Dict[str, Any]]):
+        """批量写入一批日志，失败时丢弃并记录系统日志，不影响任务执行"""
+        def insert_operation():
+            # PostgreSQL用COPY写入，其余数据库ORM批量插入
+            get_persistence_backend().insert_logs(entries)
+
+        try:
+            if self._app:
+                with self._app.app_context():
+                    safe_db_operation(insert_operation)
+            else:
+                from flask import current_app
+                with current_app.app_context():
+                    safe_db_operation(insert_operation)
+        except Exception as e:
+            logger.error(f"批量写入任务日志失败，丢弃 {len(entries)} 条: {str(e)}")
+
+
+# 全局任务日志写入器实例
+task_log_writer = TaskLogWriter()
@@ -1,25 +1,54 @@
+import asyncio
 import uuid
 import threading
 import queue
 import json
+import time
+from collections import Counter
+from pathlib import Path
 # 获取当前应用实例，传递给后台线程
 from flask import current_app
 from datetime import datetime
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.orm import aliased
 from typing import Dict, Any, Optional
 from app.models import Task, TaskLog, TaskResult, db
-from app.services.google_sheet_service import GoogleSheetService
 from app.utils.logger import get_logger, get_task_logger
 from app.utils.database import transaction_required, safe_delete, safe_update, safe_create
+from app.utils.db_retry import safe_db_operation
+from app.utils.background import PeriodicWorker
+from app.utils.metrics import RUNNING_TASKS, SSE_QUEUE_DEPTH, LOG_WRITER_QUEUE_DEPTH, QUEUED_TASKS
+from app.utils.profiler import cprofile_to_file, sample_thread, sample_coroutine
 from app.services.config_manager import get_config_manager
+from app.services.task_watchdog import TaskWatchdog
+from app.services.task_log_writer import task_log_writer
+from app.services.notification_dispatcher import notification_dispatcher
+from app.services.task_progress import task_progress, build_rates
+from app.services import persistence, task_archive
+from app.services.campaign_service import resolve_task_config
+from app.services.task_reaper import DELETING, deletion_progress, task_reaper
+from app.services.stock_param_cache import stock_param_refresher
+from app.services.combination_timing import summarize_timings
 
 logger = get_logger(__name__)
 
+# 调度槽位认领的PostgreSQL咨询锁键
+DISPATCH_LOCK_KEY = 0x7461736b
+
+# 可以执行的任务类型
+SUPPORTED_TASK_TYPES = ('google_sheet',)
+
 class TaskManager:
     """任务管理器"""
     
     def __init__(self):
-        self.running_tasks: Dict[str, threading.Thread] = {}
+        self.running_tasks: Dict[str, Any] = {}  # 任务ID -> 执行线程或异步运行句柄
         self.task_events: Dict[str, queue.Queue] = {}
+        # 队列调度器与心跳看门狗
+        self.dispatcher = TaskDispatcher(self)
+        self.watchdog = TaskWatchdog(self)
+        # 各提交者最近一次被调度的时间，用于公平轮转
+        self._submitter_last_served: Dict[str, float] = {}
         # 不再在初始化时缓存配置，而是每次动态获取
     
     def _get_config(self, key: str, default: Any = None) -> Any:
@@ -27,8 +56,20 @@ class TaskManager:
         config_manager = get_config_manager()
         return config_manager.get_config(key, default)
     
+    def _parse_task_config(self, task: Task) -> Dict[str, Any]:
+        """解析任务配置并合并所属批量任务的共享配置，解析失败时视为空字典"""
+        if isinstance(task.config, dict):
+            config = task.config
+        else:
+            try:
+                config = json.loads(task.config) if task.config else {}
+            except (json.JSONDecodeError, TypeError):
+                config = {}
+        return resolve_task_config(config, task.campaign_id)
+    
     @transaction_required
-    def create_task(self, name: str, description: str, task_type: str, config: Dict[str, Any]) -> str:
+    def create_task(self, name: str, description: str, task_type: str, config: Dict[str, Any],
+                    priority: int = 0, submitter: Optional[str] = None) -> str:
         """创建新任务"""
         task_id = str(uuid.uuid4())
         
@@ -42,7 +83,9 @@ class TaskManager:
             description=description,
             task_type=task_type,
             config=config_str,
-            status='pending'
+            status='pending',
+            priority=priority,
+            submitter=submitter
         )
         
         # 使用任务专用日志记录器
@@ -52,20 +95,210 @@ class TaskManager:
         logger.info(f"创建任务: {task_id} - {name}")
         return task_id
     
-    def start_task(self, task_id: str) -> bool:
-        """启动任务"""
-        # 创建任务专用日志记录器
-        task_logger = get_task_logger(task_id, f"{__name__}.start")
+    def enqueue_task(self, task_id: str, priority: Optional[int] = None) -> bool:
+        """将任务加入调度队列，由调度器在有空闲槽位时启动"""
+        task_logger = get_task_logger(task_id, f"{__name__}.enqueue")
         
-        # 动态获取最大并发任务数配置，确保实时生效
-        max_concurrent = int(self._get_config('max_concurrent_tasks', 5))
+        task = Task.query.get(task_id)
+        if not task:
+            logger.error(f"任务不存在: {task_id}")
+            return False
         
-        if len(self.running_tasks) >= max_concurrent:
-            error_msg = f"任务队列已满，无法启动任务 (当前运行: {len(self.running_tasks)}, 最大并发数: {max_concurrent})"
-            task_logger.warning(error_msg)
-            logger.warning(f"任务队列已满，无法启动任务: {task_id} (最大并发数: {max_concurrent})")
+        if task.status not in ('pending', 'queued'):
+            task_logger.warning(f"任务状态不是pending，无法加入队列，当前状态: {task.status}")
+            return False
+        
+        if task.task_type not in SUPPORTED_TASK_TYPES:
+            # 调度器永远不会启动这类任务，不进入队列
+            self._reject_unsupported(task)
             return False
         
+        updates = {'status': 'queued'}
+        if task.status != 'queued':
+            # 已在队列中的任务保持原有排队时间，避免丢失队列位置
+            updates['queued_at'] = datetime.now()
+        if priority is not None:
+            updates['priority'] = priority
+        safe_update(task, commit=True, **updates)
+        
+        self._add_task_log(task_id, 'info', f'任务已加入队列，优先级: {task.priority or 0}')
+        logger.info(f"任务加入队列: {task_id} (优先级: {task.priority or 0}, 提交者: {task.submitter or '-'})")
+        
+        self.start_background_workers(current_app._get_current_object())
+        self.dispatcher.wake()
+        return True
+    
+    def _reject_unsupported(self, task: Task):
+        """不支持的任务类型直接置为error，避免一直排队"""
+        error_msg = f"不支持的任务类型: {task.task_type}"
+        safe_update(task, commit=True, status='error', end_time=datetime.now(), error_message=error_msg)
+        self._add_task_log(task.id, 'error', error_msg)
+        logger.error(f"{error_msg}，任务置为error: {task.id}")
+    
+    def get_queued_tasks(self) -> list:
+        """获取排队中的任务（按优先级和排队时间排序）"""
+        tasks = Task.query.filter_by(status='queued').order_by(Task.priority.desc(), Task.queued_at.asc()).all()
+        return [dict(task.to_dict(), queue_position=index + 1) for index, task in enumerate(tasks)]
+    
+    def start_background_workers(self, app):
+        """启动队列调度器、心跳看门狗、日志写入器、通知发送器、归档器、删除回收器、股票参数刷新器和PostgreSQL分区维护器（线程不能跨fork继承，每个进程各自启动）"""
+        self.dispatcher.start(app)
+        self.watchdog.start(app)
+        task_log_writer.start(app)
+        notification_dispatcher.start(app)
+        task_archive.task_archiver.start(app)
+        task_reaper.start(app)
+        stock_param_refresher.start(app)
+        persistence.start_maintenance(app)
+    
+    def update_metrics(self):
+        """刷新本进程的运行任务数和队列深度指标，由调度器每轮和/metrics接口调用"""
+        RUNNING_TASKS.set(len(self.running_tasks))
+        SSE_QUEUE_DEPTH.set(sum(event_queue.qsize() for event_queue in list(self.task_events.values())))
+        LOG_WRITER_QUEUE_DEPTH.set(task_log_writer.depth())
+        QUEUED_TASKS.set(Task.query.filter_by(status='queued').count())
+    
+    def _lock_dispatch(self):
+        """
+        PostgreSQL下用事务级咨询锁串行化各进程的槽位认领，认领语句中的运行数统计不会读到并发认领前的快照；
+        SQLite的写事务本身串行，无需加锁
+        """
+        if db.session.get_bind().dialect.name == 'postgresql':
+            db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': DISPATCH_LOCK_KEY})
+    
+    def _claim_slot(self, task_id: str, from_status: str, spreadsheet_id: str, sheet_cap: int) -> bool:
+        """
+        原子地认领执行槽位：任务仍为from_status，且全局运行数和该电子表格的运行数都未达上限时置为running
+        
+        运行数按数据库统计，gunicorn多个工作进程的调度器共享同一份并发限制
+        """
+        max_concurrent = int(self._get_config('max_concurrent_tasks', 5))
+        
+        def claim_operation():
+            self._lock_dispatch()
+            running = aliased(Task)
+            conditions = [
+                Task.id == task_id,
+                Task.status == from_status,
+                select(func.count(running.id)).where(running.status == 'running').scalar_subquery() < max_concurrent
+            ]
+            if sheet_cap > 0:
+                conditions.append(select(func.count(running.id)).where(
+                    running.status == 'running', running.spreadsheet_id == spreadsheet_id
+                ).scalar_subquery() < sheet_cap)
+            now = datetime.now()
+            count = db.session.execute(
+                update(Task).where(*conditions).values(
+                    status='running', spreadsheet_id=spreadsheet_id, last_heartbeat=now, updated_at=now
+                ).execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            return count == 1
+        
+        return safe_db_operation(claim_operation)
+    
+    def _running_usage(self):
+        """数据库中的运行任务数，以及各电子表格的运行任务数"""
+        rows = db.session.query(Task.spreadsheet_id, func.count(Task.id)).filter(
+            Task.status == 'running'
+        ).group_by(Task.spreadsheet_id).all()
+        sheet_usage = {spreadsheet_id: count for spreadsheet_id, count in rows}
+        return sum(sheet_usage.values()), sheet_usage
+    
+    def _dispatch_once(self) -> int:
+        """
+        按优先级调度排队任务，同优先级时在提交者之间公平轮转
+        
+        空闲槽位和电子表格占用按数据库中所有进程的运行任务计算，最终以 _claim_slot 的条件更新为准
+        
+        Returns:
+            本轮启动的任务数
+        """
+        max_concurrent = int(self._get_config('max_concurrent_tasks', 5))
+        running_count, sheet_usage = self._running_usage()
+        free_slots = max_concurrent - running_count
+        if free_slots <= 0:
+            return 0
+        
+        # 看门狗自动重排队的任务在退避结束前不参与调度
+        queued_tasks = Task.query.filter(
+            Task.status == 'queued',
+            or_(Task.queued_at.is_(None), Task.queued_at <= datetime.now())
+        ).order_by(Task.priority.desc(), Task.queued_at.asc()).all()
+        # 升级前已排队的不支持类型的任务置为error，不再参与调度
+        for task in [task for task in queued_tasks if task.task_type not in SUPPORTED_TASK_TYPES]:
+            self._reject_unsupported(task)
+            queued_tasks.remove(task)
+        if not queued_tasks:
+            return 0
+        
+        # 按提交者分组，组内保持优先级与排队先后顺序
+        by_submitter: Dict[str, list] = {}
+        sheet_limits: Dict[str, tuple] = {}
+        for task in queued_tasks:
+            by_submitter.setdefault(task.submitter or '', []).append(task)
+            sheet_limits[task.id] = self._get_sheet_limit(task)
+        
+        started = 0
+        while free_slots > 0 and by_submitter:
+            # 队首优先级最高者优先；优先级相同时最久未被调度的提交者优先
+            submitter = min(
+                by_submitter,
+                key=lambda s: (-(by_submitter[s][0].priority or 0), self._submitter_last_served.get(s, 0.0))
+            )
+            candidates = by_submitter[submitter]
+            
+            chosen = None
+            for task in candidates:
+                spreadsheet_id, cap = sheet_limits[task.id]
+                if cap > 0 and sheet_usage.get(spreadsheet_id, 0) >= cap:
+                    continue
+                chosen = task
+                break
+            
+            if chosen is None:
+                # 该提交者的任务都受电子表格并发限制，本轮跳过
+                del by_submitter[submitter]
+                continue
+            
+            candidates.remove(chosen)
+            if not candidates:
+                del by_submitter[submitter]
+            self._submitter_last_served[submitter] = time.monotonic()
+            
+            if self.start_task(chosen.id, from_status='queued'):
+                started += 1
+                free_slots -= 1
+                spreadsheet_id = sheet_limits[chosen.id][0]
+                sheet_usage[spreadsheet_id] = sheet_usage.get(spreadsheet_id, 0) + 1
+            else:
+                # 其他进程已认领该任务或抢先占满了槽位，重新统计
+                running_count, sheet_usage = self._running_usage()
+                free_slots = max_concurrent - running_count
+        
+        if started:
+            logger.info(f"队列调度启动了 {started} 个任务，剩余空闲槽位: {free_slots}")
+        return started
+    
+    def _get_sheet_limit(self, task: Task) -> tuple:
+        """任务占用的电子表格及该电子表格的并发上限（0表示不限制）"""
+        task_config = self._parse_task_config(task)
+        return (
+            task_config.get('spreadsheet_id') or self._get_config('spreadsheet_id', ''),
+            int(task_config.get('spreadsheet_concurrency') or self._get_config('max_tasks_per_spreadsheet', 0) or 0)
+        )
+    
+    def start_task(self, task_id: str, from_status: str = 'pending') -> bool:
+        """
+        启动任务：先在数据库中认领执行槽位（from_status -> running），全局或电子表格并发已满时返回False
+        
+        Args:
+            task_id: 任务ID
+            from_status: 认领前任务应处的状态，调度器启动排队任务时为queued
+        """
+        # 创建任务专用日志记录器
+        task_logger = get_task_logger(task_id, f"{__name__}.start")
+        
         task = Task.query.get(task_id)
         if not task:
             error_msg = "任务不存在"
@@ -73,10 +306,22 @@ class TaskManager:
             logger.error(f"任务不存在: {task_id}")
             return False
         
-        if task.status != 'pending':
-            error_msg = f"任务状态不是pending，当前状态: {task.status}"
+        if task.status != from_status:
+            error_msg = f"任务状态不是{from_status}，当前状态: {task.status}"
             task_logger.warning(error_msg)
-            logger.warning(f"任务状态不是pending，无法启动: {task_id}")
+            logger.warning(f"任务状态不是{from_status}，无法启动: {task_id}")
+            return False
+        
+        if task.task_type not in SUPPORTED_TASK_TYPES:
+            error_msg = f"不支持的任务类型: {task.task_type}"
+            task_logger.error(error_msg)
+            logger.error(f"不支持的任务类型: {task.task_type}")
+            return False
+        
+        spreadsheet_id, sheet_cap = self._get_sheet_limit(task)
+        if not self._claim_slot(task_id, from_status, spreadsheet_id, sheet_cap):
+            # 并发已满或已被其他进程认领，任务保持原状态
+            task_logger.info("没有空闲执行槽位或任务已被其他进程启动，暂不启动")
             return False
         
         task_logger.info(f"开始启动任务 - 名称: {task.name}, 类型: {task.task_type}")
@@ -87,15 +332,13 @@ class TaskManager:
 
         app = current_app._get_current_object()
         
+        # 异步执行引擎：任务以协程方式运行在共享事件循环中
+        if app.config.get('EXECUTION_ENGINE', 'thread') == 'async':
+            return self._start_async_task(task, app, task_logger)
+        
         # 根据任务类型启动相应的执行器
-        if task.task_type == 'google_sheet':
-            thread = threading.Thread(target=self._execute_google_sheet_task, args=(task_id, app))
-            task_logger.info("创建Google Sheet任务执行线程")
-        else:
-            error_msg = f"不支持的任务类型: {task.task_type}"
-            task_logger.error(error_msg)
-            logger.error(f"不支持的任务类型: {task.task_type}")
-            return False
+        thread = threading.Thread(target=self._execute_google_sheet_task, args=(task_id, app))
+        task_logger.info("创建Google Sheet任务执行线程")
         
         thread.daemon = True
         self.running_tasks[task_id] = thread
@@ -105,6 +348,22 @@ class TaskManager:
         logger.info(f"启动任务: {task_id}")
         return True
     
+    def _start_async_task(self, task: Task, app, task_logger) -> bool:
+        """在异步执行引擎中启动任务"""
+        from app.services.async_task_engine import async_engine, AsyncTaskRun
+        
+        async_engine.start(int(app.config.get('ASYNC_MAX_CONNECTIONS', 100)),
+                           int(app.config.get('ASYNC_MAX_CONCURRENT_EVALUATIONS', 200)))
+        
+        handle = AsyncTaskRun(task.id)
+        self.running_tasks[task.id] = handle
+        handle.coro = self._execute_google_sheet_task_async(task.id, app, handle)
+        handle.future = async_engine.submit(handle.coro)
+        
+        task_logger.info("任务已提交到异步执行引擎")
+        logger.info(f"启动任务(async): {task.id}")
+        return True
+    
     @transaction_required
     def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
@@ -112,17 +371,19 @@ class TaskManager:
         if not task:
             return False
         
-        if task.status in ['completed', 'cancelled', 'error']:
+        if task.status in ['completed', 'cancelled', 'error', DELETING]:
             return False
         
         # 使用safe_update更新任务状态
         safe_update(task, commit=False, status='cancelled', end_time=datetime.now())
+        task_progress.update(task_id, status='cancelled')
         
         # 清理资源
         if task_id in self.running_tasks:
             del self.running_tasks[task_id]
         if task_id in self.task_events:
             del self.task_events[task_id]
+        self.dispatcher.wake()
         
         self._add_task_log(task_id, 'info', f'任务已取消')
         logger.info(f"取消任务: {task_id}")
@@ -153,10 +414,6 @@ class TaskManager:
         # 检查内存中是否还有运行的线程
         memory_running = task_id in self.running_tasks
         
-        # 获取最新的任务结果和日志
-        latest_result = TaskResult.query.filter_by(task_id=task_id).order_by(TaskResult.timestamp.desc()).first()
-        latest_log = TaskLog.query.filter_by(task_id=task_id).order_by(TaskLog.timestamp.desc()).first()
-        
         # 判断任务状态
         status_check = {
             "task_id": task_id,
@@ -164,30 +421,28 @@ class TaskManager:
             "memory_running": memory_running,
             "current_step": task.current_step,
             "total_steps": task.total_steps,
-            "latest_result_time": latest_result.timestamp.isoformat() if latest_result else None,
-            "latest_log_time": latest_log.timestamp.isoformat() if latest_log else None,
+            "last_heartbeat": task.last_heartbeat.isoformat() if task.last_heartbeat else None,
+            "restart_count": task.restart_count or 0,
             "can_restart": False,
             "restart_reason": None
         }
         
-        # 识别可能需要重启的情况
-        if db_status == 'running' and not memory_running:
-            status_check["can_restart"] = True
-            status_check["restart_reason"] = "任务在数据库中显示为运行状态，但内存中没有对应的线程"
-        elif db_status == 'running' and memory_running:
-            # 检查是否长时间没有更新
-            import datetime
-            timeout_seconds = self._get_config('task_status_check_timeout', 600)  # 默认10分钟
+        # 识别可能需要重启的情况：以执行器心跳为准，不再查询最新日志
+        if db_status == 'running':
+            timeout_seconds = int(self._get_config('task_status_check_timeout', 600))  # 默认10分钟
+            last_alive = task.last_heartbeat or task.start_time
+            heartbeat_age = (datetime.now() - last_alive).total_seconds() if last_alive else None
             
-            now = datetime.datetime.now()
-            if latest_log:
-                time_diff = now - latest_log.timestamp
-                if time_diff.total_seconds() > timeout_seconds:
-                    timeout_minutes = timeout_seconds // 60
-                    status_check["can_restart"] = True
-                    status_check["restart_reason"] = f"任务超过{timeout_minutes}分钟没有日志更新，可能已挂死"
-            else:
+            if heartbeat_age is None or heartbeat_age > timeout_seconds:
+                timeout_minutes = timeout_seconds // 60
+                status_check["can_restart"] = True
+                status_check["restart_reason"] = f"任务超过{timeout_minutes}分钟没有心跳，可能已挂死"
+            elif memory_running:
                 status_check["restart_reason"] = "任务正在正常运行"
+            else:
+                status_check["restart_reason"] = "任务心跳正常，由其他工作进程执行"
+        elif db_status == 'queued':
+            status_check["restart_reason"] = "任务正在队列中等待调度"
         else:
             # 为非运行状态提供状态描述
             if db_status == 'pending':
@@ -198,6 +453,8 @@ class TaskManager:
                 status_check["restart_reason"] = "任务执行出错"
             elif db_status == 'cancelled':
                 status_check["restart_reason"] = "任务已被取消"
+            elif db_status == DELETING:
+                status_check["restart_reason"] = "任务正在删除"
             else:
                 status_check["restart_reason"] = f"任务状态: {db_status}"
         
@@ -221,6 +478,10 @@ class TaskManager:
             elif task.status not in ['pending', 'completed', 'error', 'cancelled']:
                 return {"status": "error", "message": f"任务状态 '{task.status}' 不允许重启"}
             
+            # 已归档的任务先把日志和结果写回数据库，断点恢复和分片跳过已完成组合都依赖结果表
+            if task.archived_at:
+                task_archive.restore_task(task_id)
+            
             # 停止现有任务（如果在运行）
             if task_id in self.running_tasks:
                 try:
@@ -245,10 +506,11 @@ class TaskManager:
                 self._add_task_log(task_id, 'info', '重新开始任务，从第 1 步开始')
             
             # 重置任务状态 - 清空开始和结束时间，确保重启后时间信息正确
-            safe_update(task, commit=True, status='pending', error_message=None, start_time=None, end_time=None)
+            safe_update(task, commit=True, status='pending', error_message=None, start_time=None, end_time=None,
+                        run_token=None, restart_count=0)
             
-            # 重新启动任务
-            success = self.start_task(task_id)
+            # 重新加入队列，由调度器在有空闲槽位时启动
+            success = self.enqueue_task(task_id)
             
             if success:
                 # 确定重启原因
@@ -268,7 +530,7 @@ class TaskManager:
                 self._add_task_log(task_id, 'info', f'任务重启成功，原因: {restart_reason}')
                 return {
                     "status": "success", 
-                    "message": "任务重启成功",
+                    "message": "任务重启成功，已加入队列",
                     "restart_from_step": restart_step,
                     "restart_reason": restart_reason
                 }
@@ -299,7 +561,10 @@ class TaskManager:
                 description=f"基于任务 {original_task_id} 重启",
                 task_type=original_task.task_type,
                 config=json.dumps(original_config),
-                status='pending'
+                campaign_id=original_task.campaign_id,
+                status='pending',
+                priority=original_task.priority,
+                submitter=original_task.submitter
             )
             
             db.session.add(new_task)
@@ -312,18 +577,108 @@ class TaskManager:
             logger.error(f"创建重启任务失败: {str(e)}")
             raise
     
-    def get_task_logs(self, task_id: str) -> list:
-        """获取任务日志"""
-        logs = TaskLog.query.filter_by(task_id=task_id).order_by(TaskLog.timestamp.asc()).all()
-        return [log.to_dict() for log in logs]
+    def get_task_logs(self, task_id: str, since_id: Optional[int] = None, limit: Optional[int] = None) -> list:
+        """
+        获取任务日志
+        
+        Args:
+            since_id: 只返回id大于该值的日志（增量轮询游标），按id升序
+            limit: 最多返回条数
+        """
+        if task_archive.is_archived(Task.query.get(task_id)):
+            logs = task_archive.archived_logs(task_id)
+            if since_id is not None:
+                logs = [log for log in logs if log.id > since_id]
+            else:
+                logs.sort(key=lambda log: log.timestamp)
+            return [log.to_dict() for log in (logs[:limit] if limit else logs)]
+        
+        query = TaskLog.query.filter_by(task_id=task_id)
+        if since_id is not None:
+            query = query.filter(TaskLog.id > since_id).order_by(TaskLog.id.asc())
+        else:
+            query = query.order_by(TaskLog.timestamp.asc())
+        if limit:
+            query = query.limit(limit)
+        return [log.to_dict() for log in query.all()]
     
-    def get_task_results(self, task_id: str) -> list:
-        """获取任务结果"""
-        results = TaskResult.query.filter_by(task_id=task_id).order_by(TaskResult.step_index.asc()).all()
+    def get_task_results(self, task_id: str, since_step: Optional[int] = None) -> list:
+        """
+        获取任务结果
+        
+        Args:
+            since_step: 只返回step_index大于该值的结果（增量轮询游标）
+        """
+        if task_archive.is_archived(Task.query.get(task_id)):
+            return [
+                result.to_dict() for result in task_archive.archived_results(task_id)
+                if since_step is None or result.step_index > since_step
+            ]
+        
+        query = TaskResult.query.filter_by(task_id=task_id)
+        if since_step is not None:
+            query = query.filter(TaskResult.step_index > since_step)
+        results = query.order_by(TaskResult.step_index.asc()).all()
         return [result.to_dict() for result in results]
     
+    def get_task_progress(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务进度：优先使用本进程执行器维护的内存快照，
+        任务不在本进程执行时从任务表计算（不含速率），删除中的任务附带删除进度
+        """
+        snapshot = task_progress.get(task_id)
+        if snapshot and snapshot.get('status') != DELETING:
+            return snapshot
+        
+        task = Task.query.get(task_id)
+        if not task:
+            return None
+        
+        updated_at = task.last_heartbeat or task.end_time or task.created_at
+        progress = {
+            'task_id': task.id,
+            'status': task.status,
+            'current_step': task.current_step or 0,
+            'total_steps': task.total_steps or 0,
+            'success_count': None,
+            'failed_count': None,
+            'started_at': task.start_time.isoformat() if task.start_time else None,
+            'updated_at': updated_at.isoformat() if updated_at else None,
+            'source': 'database'
+        }
+        progress.update(build_rates(progress['current_step'], progress['total_steps'], None))
+        if task.status == DELETING:
+            progress['deletion'] = deletion_progress(task)
+        return progress
+    
+    def get_task_profile(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """按任务汇总各参数组合的耗时分解，说明时间花在了哪里、浪费了多少次轮询"""
+        task = Task.query.get(task_id)
+        if not task:
+            return None
+        
+        if task_archive.is_archived(task):
+            rows = [(result.timing,) for result in task_archive.archived_results(task_id) if result.timing]
+        else:
+            rows = TaskResult.query.with_entities(TaskResult.timing).filter(
+                TaskResult.task_id == task_id, TaskResult.timing.isnot(None)
+            ).all()
+        
+        def parse(raw):
+            try:
+                return json.loads(raw)
+            except (json.JSONDecodeError, TypeError):
+                return None
+        
+        profile = summarize_timings(parse(timing) for (timing,) in rows)
+        profile['task_id'] = task_id
+        return profile
+    
     def delete_task(self, task_id: str) -> bool:
-        """删除任务及其相关数据"""
+        """
+        删除任务：标记为deleting后立即返回，日志、结果和任务本身由后台回收器分批删除，
+        避免大任务在一个事务中删除几十万行时长时间持有写锁
+        """
         try:
             with current_app.app_context():
                 # 检查任务是否存在
@@ -332,31 +687,27 @@ class TaskManager:
                     logger.warning(f"任务不存在: {task_id}")
                     return False
                 
-                # 如果任务正在运行，先取消任务
-                if task.status == 'running':
-                    # 直接更新状态，避免嵌套事务
-                    task.status = 'cancelled'
-                    task.end_time = datetime.now()
-                
-                # 删除任务结果
-                TaskResult.query.filter_by(task_id=task_id).delete()
-                
-                # 删除任务日志
-                TaskLog.query.filter_by(task_id=task_id).delete()
-                
-                # 删除任务本身
-                db.session.delete(task)
-                
-                # 提交事务
-                db.session.commit()
+                if task.status != DELETING:
+                    # 清空run_token：正在执行的执行器下次检查时发现执行权已转移，退出且不再改写任务状态
+                    def mark_deleting():
+                        Task.query.filter_by(id=task_id).update(
+                            {'status': DELETING, 'run_token': None, 'end_time': task.end_time or datetime.now()},
+                            synchronize_session=False
+                        )
+                        db.session.commit()
+                    
+                    safe_db_operation(mark_deleting)
                 
                 # 清理内存中的任务事件队列
                 if task_id in self.task_events:
                     del self.task_events[task_id]
                 if task_id in self.running_tasks:
                     del self.running_tasks[task_id]
+                task_progress.remove(task_id)
+                self.dispatcher.wake()
+                task_reaper.wake()
                 
-                logger.info(f"任务删除成功: {task_id}")
+                logger.info(f"任务已标记删除，等待后台回收: {task_id}")
                 return True
                 
         except Exception as e:
@@ -366,95 +717,188 @@ class TaskManager:
     
     def _execute_google_sheet_task(self, task_id: str, app):
         """执行Google Sheet任务"""
-        # 创建任务专用日志记录器
-        task_logger = get_task_logger(task_id, f"{__name__}.{task_id}")
+        # 服务模块依赖gspread/google-auth/requests，首次执行任务时才导入
+        from app.services.google_sheet_service import GoogleSheetService
+
+        # 本次执行的执行器标识，看门狗接管任务后旧线程据此识别执行权已转移
+        run_token = str(uuid.uuid4())
         
         try:
             # 使用传递的应用实例创建应用上下文
             with app.app_context():
-                task = Task.query.get(task_id)
-                if not task:
-                    task_logger.error("任务不存在")
+                service = self._begin_task_run(task_id, app, run_token, GoogleSheetService)
+                if not service:
                     return
                 
-                task_logger.info(f"开始执行Google Sheet任务: {task.name}")
-                
-                # 更新任务状态
-                task.status = 'running'
-                task.start_time = datetime.now()
+                # 执行任务，任务配置开启cprofile时在执行线程中记录cProfile
+                with cprofile_to_file(self._get_cprofile_path(task_id, app)):
+                    task_result = service.execute_task()
+                self._complete_task_run(task_id, app, run_token, task_result)
+            
+        except Exception as e:
+            self._fail_task_run(task_id, app, run_token, e)
+        
+        finally:
+            self._release_task_run(task_id, threading.current_thread())
+
+    def _get_cprofile_path(self, task_id: str, app) -> Optional[Path]:
+        """任务配置了cprofile时返回本次执行的.prof文件路径，否则返回None"""
+        task = Task.query.get(task_id)
+        enabled = bool(task) and self._parse_task_config(task).get('cprofile')
+        # 结束只读事务，任务执行期间本上下文的会话不占用数据库连接
+        db.session.commit()
+        if not enabled:
+            return None
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return Path(app.config['LOGS_DIR']) / f"task_{task_id}_{timestamp}.prof"
+    
+    def sample_task_stacks(self, task_id: str, seconds: float) -> Optional[Counter]:
+        """
+        采样本进程中正在执行的任务的调用栈
+        
+        Returns:
+            调用栈采样计数，任务不在本进程中执行时返回None
+        """
+        runner = self.running_tasks.get(task_id)
+        if runner is None:
+            return None
+        if isinstance(runner, threading.Thread):
+            return sample_thread(runner.ident, seconds)
+        return sample_coroutine(getattr(runner, 'coro', None), seconds)
+    
+    async def _execute_google_sheet_task_async(self, task_id: str, app, handle):
+        """在异步执行引擎中执行Google Sheet任务，同步的数据库操作放到线程中执行"""
+        from app.services.google_sheet_async_service import AsyncGoogleSheetService
+        
+        run_token = str(uuid.uuid4())
+        
+        def begin():
+            with app.app_context():
+                return self._begin_task_run(task_id, app, run_token, AsyncGoogleSheetService)
+        
+        def complete(task_result):
+            with app.app_context():
+                self._complete_task_run(task_id, app, run_token, task_result)
+        
+        try:
+            service = await asyncio.to_thread(begin)
+            if service:
+                task_result = await service.execute_task_async()
+                await asyncio.to_thread(complete, task_result)
+        except Exception as e:
+            await asyncio.to_thread(self._fail_task_run, task_id, app, run_token, e)
+        finally:
+            await asyncio.to_thread(self._release_task_run, task_id, handle)
+
+    def _begin_task_run(self, task_id: str, app, run_token: str, service_class):
+        """将任务置为运行中并创建服务实例，任务不存在时返回None"""
+        task_logger = get_task_logger(task_id, f"{__name__}.{task_id}")
+        task = Task.query.get(task_id)
+        if not task:
+            task_logger.error("任务不存在")
+            return None
+        
+        task_logger.info(f"开始执行Google Sheet任务: {task.name}")
+        
+        # 更新任务状态
+        task.status = 'running'
+        task.start_time = datetime.now()
+        task.last_heartbeat = task.start_time
+        task.run_token = run_token
+        # 提交前读取配置：提交后不再访问task，执行期间本上下文的会话不占用数据库连接
+        config = task.config
+        db.session.commit()
+        
+        self._add_task_log(task_id, 'info', '开始执行Google Sheet任务', app)
+        
+        # 创建Google Sheet服务
+        service = service_class(config, task_id, self.task_events.get(task_id), app, run_token=run_token)
+        
+        task_logger.info("开始执行任务业务逻辑")
+        return service
+
+    def _complete_task_run(self, task_id: str, app, run_token: str, task_result: str):
+        """根据执行结果更新任务状态"""
+        task_logger = get_task_logger(task_id, f"{__name__}.{task_id}")
+        
+        # 检查任务当前状态（可能在执行过程中被取消或被看门狗接管）
+        db.session.expire_all()
+        task = Task.query.get(task_id)
+        if task_result == 'superseded' or (task and task.run_token != run_token):
+            # 执行权已转移给新的执行器，不再修改任务状态
+            task_logger.info('任务执行权已转移，当前执行线程退出，不更新任务状态')
+        elif task and task.status == 'cancelled':
+            # 任务已被取消，保持cancelled状态
+            task.end_time = datetime.now()
+            db.session.commit()
+            task_logger.info('任务执行完成，状态: cancelled（任务被取消）')
+            self._add_task_log(task_id, 'info', f'任务执行完成，状态: cancelled（任务被取消）', app)
+        else:
+            # 根据执行结果更新状态
+            # task_result 可能是: 'completed', 'error', 'cancelled'
+            if task_result == 'cancelled':
+                # 任务在执行过程中被取消
+                task.status = 'cancelled'
+                task.end_time = datetime.now()
                 db.session.commit()
-                
-                self._add_task_log(task_id, 'info', '开始执行Google Sheet任务', app)
-                
-                # 创建Google Sheet服务
-                config = task.config
-                service = GoogleSheetService(config, task_id, self.task_events.get(task_id), app)
-                
-                task_logger.info("开始执行任务业务逻辑")
-                
-                # 执行任务
-                task_result = service.execute_task()
-                
-                # 检查任务当前状态（可能在执行过程中被取消）
+                task_logger.info('任务执行完成，状态: cancelled（执行过程中被取消）')
+                self._add_task_log(task_id, 'info', f'任务执行完成，状态: cancelled（执行过程中被取消）', app)
+            elif task_result == 'completed':
+                # 任务成功完成
+                task.status = 'completed'
+                task.end_time = datetime.now()
+                db.session.commit()
+                task_logger.info('任务执行完成，状态: completed')
+                self._add_task_log(task_id, 'info', f'任务执行完成，状态: completed', app)
+            else:
+                # 任务执行出错
+                task.status = 'error'
+                task.end_time = datetime.now()
+                db.session.commit()
+                task_logger.info('任务执行完成，状态: error')
+                self._add_task_log(task_id, 'info', f'任务执行完成，状态: error', app)
+        
+        if task and task.run_token == run_token:
+            task_progress.update(task_id, status=task.status)
+
+    def _fail_task_run(self, task_id: str, app, run_token: str, e: Exception):
+        """执行器异常退出时将任务标记为错误"""
+        task_logger = get_task_logger(task_id, f"{__name__}.{task_id}")
+        task_logger.exception(f"执行任务失败: {str(e)}")
+        
+        # 更新任务状态为错误
+        try:
+            with app.app_context():
                 task = Task.query.get(task_id)
-                if task and task.status == 'cancelled':
-                    # 任务已被取消，保持cancelled状态
+                if task and task.run_token == run_token:
+                    task.status = 'error'
+                    task.error_message = str(e)
                     task.end_time = datetime.now()
                     db.session.commit()
-                    task_logger.info('任务执行完成，状态: cancelled（任务被取消）')
-                    self._add_task_log(task_id, 'info', f'任务执行完成，状态: cancelled（任务被取消）', app)
-                else:
-                    # 根据执行结果更新状态
-                    # task_result 可能是: 'completed', 'error', 'cancelled'
-                    if task_result == 'cancelled':
-                        # 任务在执行过程中被取消
-                        task.status = 'cancelled'
-                        task.end_time = datetime.now()
-                        db.session.commit()
-                        task_logger.info('任务执行完成，状态: cancelled（执行过程中被取消）')
-                        self._add_task_log(task_id, 'info', f'任务执行完成，状态: cancelled（执行过程中被取消）', app)
-                    elif task_result == 'completed':
-                        # 任务成功完成
-                        task.status = 'completed'
-                        task.end_time = datetime.now()
-                        db.session.commit()
-                        task_logger.info('任务执行完成，状态: completed')
-                        self._add_task_log(task_id, 'info', f'任务执行完成，状态: completed', app)
-                    else:
-                        # 任务执行出错
-                        task.status = 'error'
-                        task.end_time = datetime.now()
-                        db.session.commit()
-                        task_logger.info('任务执行完成，状态: error')
-                        self._add_task_log(task_id, 'info', f'任务执行完成，状态: error', app)
-            
-        except Exception as e:
-            task_logger.exception(f"执行任务失败: {str(e)}")
-            
-            # 更新任务状态为错误
-            try:
-                with app.app_context():
-                    task = Task.query.get(task_id)
-                    if task:
-                        task.status = 'error'
-                        task.error_message = str(e)
-                        task.end_time = datetime.now()
-                        db.session.commit()
-            except Exception as update_error:
-                task_logger.error(f"更新任务状态失败: {str(update_error)}")
-            
-            self._add_task_log(task_id, 'error', f'任务执行失败: {str(e)}', app)
+                    task_progress.update(task_id, status='error')
+        except Exception as update_error:
+            task_logger.error(f"更新任务状态失败: {str(update_error)}")
         
-        finally:
-            # 清理资源
-            if task_id in self.running_tasks:
-                del self.running_tasks[task_id]
-                task_logger.info("清理任务线程资源")
+        self._add_task_log(task_id, 'error', f'任务执行失败: {str(e)}', app)
+
+    def _release_task_run(self, task_id: str, owner):
+        """执行器退出时清理资源，owner为running_tasks中登记的线程或异步运行句柄"""
+        task_logger = get_task_logger(task_id, f"{__name__}.{task_id}")
+        
+        # 确保任务日志在执行器退出前全部落库
+        task_log_writer.flush()
+
+        # 清理资源：只清理本执行器持有的资源，避免误删接管后新执行器的资源
+        if self.running_tasks.get(task_id) is owner:
+            del self.running_tasks[task_id]
+            task_logger.info("清理任务线程资源")
             if task_id in self.task_events:
                 del self.task_events[task_id]
                 task_logger.info("清理任务事件队列")
-            
-            task_logger.info("任务执行器退出")
+        
+        # 释放槽位后唤醒调度器启动下一个排队任务
+        self.dispatcher.wake()
+        task_logger.info("任务执行器退出")
     
     def _add_task_log(self, task_id: str, level: str, message: str, app=None):
         """添加任务日志"""
@@ -484,5 +928,23 @@ class TaskManager:
             logger.error(f"添加任务日志失败: {str(e)}")
     
 
+class TaskDispatcher(PeriodicWorker):
+    """任务队列调度器：有空闲槽位时启动排队任务，任务结束或入队时被唤醒"""
+    
+    name = 'task-dispatcher'
+    default_interval = 5
+    
+    def __init__(self, manager: TaskManager):
+        super().__init__()
+        self.manager = manager
+    
+    def get_interval(self) -> float:
+        return self.manager._get_config('dispatcher_interval', self.default_interval)
+    
+    def run_once(self):
+        self.manager._dispatch_once()
+        self.manager.update_metrics()
+
+
 # 全局任务管理器实例
 task_manager = TaskManager()
@@ -0,0 +1,119 @@
+"""
+任务进度快照模块
+执行器在内存中维护每个任务的进度快照（步数、速率、预计剩余时间），
+详情页轮询进度时直接读取快照，不查询数据库
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# 计算速率使用的最近步数窗口
+RATE_WINDOW = 20
+# 已结束任务的快照保留时间（秒）
+FINISHED_TTL = 3600
+
+FINISHED_STATUSES = ('completed', 'cancelled', 'error')
+
+
+class TaskProgressTracker:
+    """任务进度快照"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+        self._step_times: Dict[str, deque] = {}
+
+    def start(self, task_id: str, total_steps: int, start_step: int = 0):
+        """执行器开始批量处理时调用"""
+        with self._lock:
+            self._evict()
+            now = datetime.now()
+            self._snapshots[task_id] = {
+                'task_id': task_id,
+                'status': 'running',
+                'current_step': start_step,
+                'total_steps': total_steps,
+                'success_count': start_step,
+                'failed_count': 0,
+                'started_at': now.isoformat(),
+                'updated_at': now.isoformat(),
+                'finished_at': None
+            }
+            self._step_times[task_id] = deque(maxlen=RATE_WINDOW)
+
+    def step(self, task_id: str, current_step: int):
+        """进入新的参数组合时调用，记录步进时间用于计算速率"""
+        with self._lock:
+            snapshot = self._snapshots.get(task_id)
+            if snapshot is None:
+                return
+            snapshot['current_step'] = current_step
+            snapshot['updated_at'] = datetime.now().isoformat()
+            self._step_times[task_id].append(time.monotonic())
+
+    def update(self, task_id: str, **fields):
+        """更新状态或成功/失败计数"""
+        with self._lock:
+            snapshot = self._snapshots.get(task_id)
+            if snapshot is None:
+                return
+            snapshot.update(fields)
+            snapshot['updated_at'] = datetime.now().isoformat()
+            if snapshot.get('status') in FINISHED_STATUSES and not snapshot.get('finished_at'):
+                snapshot['finished_at'] = time.monotonic()
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取进度快照，包含速率和预计剩余时间，不存在时返回None"""
+        with self._lock:
+            snapshot = self._snapshots.get(task_id)
+            if snapshot is None:
+                return None
+            result = {key: value for key, value in snapshot.items() if key != 'finished_at'}
+            step_times = self._step_times.get(task_id) or ()
+
+        avg_step_seconds = None
+        if len(step_times) >= 2:
+            avg_step_seconds = (step_times[-1] - step_times[0]) / (len(step_times) - 1)
+
+        result.update(build_rates(result['current_step'], result['total_steps'], avg_step_seconds))
+        result['source'] = 'memory'
+        return result
+
+    def remove(self, task_id: str):
+        with self._lock:
+            self._snapshots.pop(task_id, None)
+            self._step_times.pop(task_id, None)
+
+    def _evict(self):
+        """清理结束超过FINISHED_TTL的快照，调用方持有锁"""
+        now = time.monotonic()
+        expired = [
+            task_id for task_id, snapshot in self._snapshots.items()
+            if snapshot.get('finished_at') and now - snapshot['finished_at'] > FINISHED_TTL
+        ]
+        for task_id in expired:
+            self._snapshots.pop(task_id, None)
+            self._step_times.pop(task_id, None)
+
+
+def build_rates(current_step: int, total_steps: int, avg_step_seconds: Optional[float]) -> Dict[str, Any]:
+    """根据平均每步耗时计算百分比、速率和预计剩余时间"""
+    current_step = current_step or 0
+    total_steps = total_steps or 0
+    rates = {
+        'percent': round(current_step / total_steps * 100, 1) if total_steps else 0,
+        'avg_step_seconds': round(avg_step_seconds, 1) if avg_step_seconds else None,
+        'steps_per_hour': round(3600 / avg_step_seconds, 1) if avg_step_seconds else None,
+        'eta_seconds': None
+    }
+    if avg_step_seconds and total_steps:
+        # 当前步尚未完成，剩余步数包含当前步
+        remaining = max(total_steps - current_step + 1, 0)
+        rates['eta_seconds'] = round(remaining * avg_step_seconds)
+    return rates
+
+
+# 全局任务进度快照实例
+task_progress = TaskProgressTracker()
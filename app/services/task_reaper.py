@@ -0,0 +1,128 @@
+"""
+任务删除回收模块
+删除任务时接口只把任务标记为deleting并立即返回，由后台回收器分批删除日志和结果：
+每批是一个很短的事务，批次之间让出写锁，运行中任务的提交不会被一次性大删除阻塞；
+子记录删完后再删除任务本身和归档文件。进程中途退出时下一轮从剩余记录继续
+"""
+from typing import Any, Dict, List
+
+from app.models import Task, TaskLog, TaskResult, db
+from app.services import task_archive
+from app.services.task_progress import task_progress
+from app.utils.background import PeriodicWorker
+from app.utils.database import safe_delete_in_batches
+from app.utils.db_retry import safe_db_operation
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DELETING = 'deleting'
+# 每轮最多回收的任务数
+TASKS_PER_RUN = 20
+
+
+def count_remaining(task_id: str) -> Dict[str, int]:
+    """任务剩余待删除的日志和结果数（按task_id索引计数）"""
+    return {
+        'logs': TaskLog.query.filter_by(task_id=task_id).count(),
+        'results': TaskResult.query.filter_by(task_id=task_id).count()
+    }
+
+
+def deletion_progress(task: Task) -> Dict[str, Any]:
+    """删除进度，任务不在本进程回收时只有剩余记录数"""
+    remaining = count_remaining(task.id)
+    progress = {
+        'requested_at': task.updated_at.isoformat() if task.updated_at else None,
+        'remaining_logs': remaining['logs'],
+        'remaining_results': remaining['results'],
+        'deleted_rows': None
+    }
+    snapshot = task_progress.get(task.id)
+    if snapshot and snapshot.get('status') == DELETING:
+        progress['deleted_rows'] = snapshot['current_step']
+    return progress
+
+
+def find_deleting_tasks(limit: int = TASKS_PER_RUN) -> List[str]:
+    rows = db.session.query(Task.id).filter(Task.status == DELETING).order_by(Task.updated_at.asc()).limit(limit).all()
+    return [row.id for row in rows]
+
+
+def reap_task(task_id: str, batch_size: int = 1000, pause: float = 0.05) -> bool:
+    """
+    分批删除任务的日志和结果，最后删除任务本身
+
+    Returns:
+        是否由本次调用删除了任务行（其他进程已删除时返回False）
+    """
+    remaining = count_remaining(task_id)
+    total = remaining['logs'] + remaining['results']
+    # 借用进度快照展示删除进度：current_step为已删除记录数
+    task_progress.start(task_id, total)
+    task_progress.update(task_id, status=DELETING)
+    deleted = 0
+
+    def on_batch(count: int):
+        nonlocal deleted
+        deleted += count
+        task_progress.step(task_id, min(deleted, total))
+
+    for model in (TaskLog, TaskResult):
+        safe_delete_in_batches(model, batch_size, pause, on_batch, task_id=task_id)
+
+    def delete_task_row():
+        # 执行器退出前可能还写入了少量日志，和任务行在同一个短事务中删除
+        TaskLog.query.filter_by(task_id=task_id).delete(synchronize_session=False)
+        TaskResult.query.filter_by(task_id=task_id).delete(synchronize_session=False)
+        count = Task.query.filter_by(id=task_id, status=DELETING).delete(synchronize_session=False)
+        db.session.commit()
+        return count
+
+    removed = safe_db_operation(delete_task_row)
+    task_archive.delete_archive(task_id)
+    task_progress.remove(task_id)
+    if removed:
+        logger.info(f"任务删除完成: {task_id}，删除 {deleted} 条日志和结果")
+    return bool(removed)
+
+
+class TaskReaper(PeriodicWorker):
+    """回收标记为deleting的任务"""
+
+    name = 'task-reaper'
+    default_interval = 30
+
+    def get_interval(self) -> float:
+        from app.services.config_manager import get_config_manager
+        return get_config_manager().get_config('reaper_interval', self.default_interval)
+
+    def run_once(self):
+        self.reap_pending()
+
+    def reap_pending(self, limit: int = TASKS_PER_RUN) -> int:
+        """
+        回收所有待删除的任务
+
+        Returns:
+            本轮删除的任务数
+        """
+        from app.services.config_manager import get_config_manager
+        config_manager = get_config_manager()
+        batch_size = int(config_manager.get_config('delete_batch_size', 1000))
+        pause = float(config_manager.get_config('delete_batch_pause', 0.05))
+
+        reaped = 0
+        for task_id in find_deleting_tasks(limit):
+            try:
+                if reap_task(task_id, batch_size, pause):
+                    reaped += 1
+            except Exception as e:
+                db.session.rollback()
+                task_progress.remove(task_id)
+                logger.error(f"回收任务 {task_id} 失败: {str(e)}")
+        return reaped
+
+
+# 全局任务回收器实例
+task_reaper = TaskReaper()
@@ -0,0 +1,109 @@
+"""
+任务统计模块
+仪表盘的任务数按状态一次GROUP BY查询，吞吐量按TaskResult的时间窗口一次聚合查询，
+结果在进程内缓存几秒，仪表盘自动刷新和多个页面同时打开都不会重复查询
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case, func
+
+from app.models import Task, TaskResult, db
+from app.services.combination_timing import SPANS
+from app.utils.db_retry import safe_db_operation
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 默认缓存时间（秒），可通过系统配置task_stats_ttl调整
+DEFAULT_TTL_SECONDS = 10
+# 仪表盘固定展示的状态，没有任务时计为0
+DASHBOARD_STATUSES = ('pending', 'queued', 'running', 'completed', 'cancelled', 'error')
+# 平均单步耗时取最近一小时内最多这么多条结果的耗时分解
+LATENCY_SAMPLE_SIZE = 500
+
+
+def _step_ms(timing: Dict[str, Any]) -> Optional[int]:
+    """单个组合的总耗时：表格阶段（含重试退避）加后处理，旧记录没有sheet时按各片段之和"""
+    if 'sheet' in timing:
+        return timing['sheet'] + timing.get('upstream', 0) + timing.get('persist', 0)
+    total = sum(timing.get(span, 0) for span in SPANS)
+    return total or None
+
+
+def compute_task_stats(now: datetime = None) -> Dict[str, Any]:
+    """查询任务数和吞吐量，调用方负责应用上下文"""
+    now = now or datetime.now()
+    hour_ago = now - timedelta(hours=1)
+    day_ago = now - timedelta(hours=24)
+
+    counts = {status: 0 for status in DASHBOARD_STATUSES}
+    for status, count in db.session.query(Task.status, func.count(Task.id)).group_by(Task.status).all():
+        counts[status or 'pending'] = count
+    counts['total'] = sum(counts.values())
+
+    last_hour, last_day = db.session.query(
+        func.sum(case((TaskResult.timestamp >= hour_ago, 1), else_=0)),
+        func.count(TaskResult.id)
+    ).filter(TaskResult.timestamp >= day_ago, TaskResult.success.is_(True)).one()
+    last_hour, last_day = int(last_hour or 0), int(last_day or 0)
+
+    timings = db.session.query(TaskResult.timing).filter(
+        TaskResult.timestamp >= hour_ago, TaskResult.timing.isnot(None)
+    ).order_by(TaskResult.id.desc()).limit(LATENCY_SAMPLE_SIZE).all()
+    latencies = []
+    for (raw,) in timings:
+        try:
+            step_ms = _step_ms(json.loads(raw))
+        except (TypeError, ValueError):
+            continue
+        if step_ms:
+            latencies.append(step_ms)
+
+    return {
+        'counts': counts,
+        'throughput': {
+            '1h': {'combinations': last_hour, 'per_hour': last_hour},
+            '24h': {'combinations': last_day, 'per_hour': round(last_day / 24, 1)}
+        },
+        'avg_step_ms': round(sum(latencies) / len(latencies)) if latencies else None,
+        'latency_samples': len(latencies),
+        'generated_at': now.isoformat()
+    }
+
+
+class TaskStatsCache:
+    """任务统计缓存，过期后由第一个请求重新查询，其余请求等待其结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value: Optional[Dict[str, Any]] = None
+        self._expires_at = 0.0
+
+    @staticmethod
+    def _ttl() -> float:
+        from app.services.config_manager import get_config_manager
+        try:
+            return float(get_config_manager().get_config('task_stats_ttl', DEFAULT_TTL_SECONDS))
+        except (TypeError, ValueError):
+            return DEFAULT_TTL_SECONDS
+
+    def get(self, force: bool = False) -> Dict[str, Any]:
+        """获取任务统计，force为True时忽略缓存"""
+        with self._lock:
+            if not force and self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+            self._value = safe_db_operation(compute_task_stats)
+            self._expires_at = time.monotonic() + self._ttl()
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0.0
+
+
+# 全局任务统计缓存实例
+task_stats = TaskStatsCache()
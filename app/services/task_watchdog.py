@@ -0,0 +1,144 @@
+"""
+任务心跳看门狗模块
+按执行器心跳识别挂死的运行中任务，自动重新排队（指数退避，从断点继续）或标记为失败
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import or_, and_
+
+from app.models import Task, db
+from app.utils.background import PeriodicWorker
+from app.utils.db_retry import safe_db_operation
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class TaskWatchdog(PeriodicWorker):
+    """任务心跳看门狗"""
+
+    name = 'task-watchdog'
+    default_interval = 60
+
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+
+    def get_interval(self) -> float:
+        return self.manager._get_config('watchdog_interval', self.default_interval)
+
+    def run_once(self):
+        self.scan()
+
+    def find_stale_tasks(self) -> List[Task]:
+        """一次索引查询找出心跳超时的运行中任务"""
+        timeout_seconds = int(self.manager._get_config('task_status_check_timeout', 600))
+        cutoff = datetime.now() - timedelta(seconds=timeout_seconds)
+        return Task.query.filter(
+            Task.status == 'running',
+            or_(
+                Task.last_heartbeat < cutoff,
+                # 兼容升级前没有心跳的任务，按开始时间判断
+                and_(Task.last_heartbeat.is_(None), or_(Task.start_time.is_(None), Task.start_time < cutoff))
+            )
+        ).all()
+
+    def scan(self) -> int:
+        """
+        扫描并处理挂死任务
+
+        Returns:
+            处理的任务数
+        """
+        # 接管提交后会话中的任务会过期重新加载，扫描时记下各任务的执行器令牌作为接管条件
+        stale_tasks = [(task, task.run_token) for task in self.find_stale_tasks()]
+        if not stale_tasks:
+            return 0
+
+        timeout_minutes = int(self.manager._get_config('task_status_check_timeout', 600)) // 60
+        handled = 0
+        for task, run_token in stale_tasks:
+            if self._recover(task, run_token, f"任务超过{timeout_minutes}分钟没有心跳，可能已挂死"):
+                handled += 1
+
+        if handled:
+            logger.warning(f"看门狗处理了 {handled} 个心跳超时的任务")
+            self.manager.dispatcher.wake()
+        return handled
+
+    def recover_orphaned_tasks(self) -> int:
+        """
+        单进程启动时调用：当前进程没有执行线程的运行中任务全部视为中断，立即重新排队
+
+        Returns:
+            恢复的任务数
+        """
+        tasks = [(task, task.run_token) for task in Task.query.filter_by(status='running').all()]
+        recovered = 0
+        for task, run_token in tasks:
+            if task.id in self.manager.running_tasks:
+                continue
+            if self._recover(task, run_token, "应用重启时检测到任务中断", backoff=False):
+                recovered += 1
+
+        if recovered:
+            self.manager.dispatcher.wake()
+        return recovered
+
+    def _recover(self, task: Task, run_token: Optional[str], reason: str, backoff: bool = True) -> bool:
+        """
+        接管挂死任务：未超过重排队上限时重新排队，否则标记为错误
+
+        run_token为扫描时看到的执行器令牌，任务此后已被其他进程重新启动时不接管
+        """
+        max_requeues = int(self.manager._get_config('watchdog_max_requeues', 3))
+        restart_count = task.restart_count or 0
+        now = datetime.now()
+
+        if restart_count < max_requeues:
+            delay = 0
+            if backoff:
+                delay = int(self.manager._get_config('watchdog_backoff_base', 60)) * (2 ** restart_count)
+            updates = {
+                'status': 'queued',
+                'queued_at': now + timedelta(seconds=delay),
+                'restart_count': restart_count + 1,
+                'run_token': None,
+                'error_message': None
+            }
+            level = 'warning'
+            message = (f"{reason}，第 {restart_count + 1}/{max_requeues} 次自动重新排队，"
+                       f"{delay} 秒后从第 {max(task.current_step or 0, 1)} 步继续")
+        else:
+            updates = {
+                'status': 'error',
+                'end_time': now,
+                'run_token': None,
+                'error_message': f"{reason}，自动重新排队次数已达上限 {max_requeues}"
+            }
+            level = 'error'
+            message = updates['error_message']
+
+        # 条件更新：只接管仍由同一执行器持有的运行中任务，避免多个进程重复处理
+        def takeover_operation():
+            count = Task.query.filter_by(id=task.id, status='running', run_token=run_token).update(
+                updates, synchronize_session=False
+            )
+            db.session.commit()
+            return count == 1
+
+        try:
+            if not safe_db_operation(takeover_operation):
+                return False
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"看门狗接管任务失败: {task.id}, 错误: {str(e)}")
+            return False
+
+        # 旧执行线程若仍在本进程中阻塞，释放其槽位；线程恢复后会发现执行权已转移并自行退出
+        self.manager.running_tasks.pop(task.id, None)
+
+        self.manager._add_task_log(task.id, level, message)
+        logger.warning(f"看门狗接管任务: {task.id} - {message}")
+        return True
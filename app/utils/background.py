@@ -0,0 +1,67 @@
+"""
+后台周期任务工具模块
+提供在守护线程中按固定间隔执行的工作器基类
+"""
+import threading
+from typing import Optional
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PeriodicWorker:
+    """
+    后台周期工作器基类
+
+    子类实现 run_once，在应用上下文中按 get_interval 返回的间隔反复执行，
+    可通过 wake 提前唤醒。线程不能跨fork继承，每个进程需各自调用 start。
+    """
+
+    name = 'periodic-worker'
+    default_interval = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get_interval(self) -> float:
+        """获取执行间隔（秒），在应用上下文中调用，子类可从配置读取"""
+        return self.default_interval
+
+    def run_once(self):
+        """执行一轮工作，在应用上下文中调用"""
+        raise NotImplementedError
+
+    def start(self, app) -> bool:
+        """启动工作线程，已启动时直接返回False"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            thread = threading.Thread(target=self._loop, args=(app,), name=self.name)
+            thread.daemon = True
+            self._thread = thread
+            thread.start()
+            return True
+
+    def is_running(self) -> bool:
+        """工作线程是否存活"""
+        return bool(self._thread and self._thread.is_alive())
+
+    def wake(self):
+        """提前唤醒工作线程执行下一轮"""
+        self._event.set()
+
+    def _loop(self, app):
+        logger.info(f"后台工作器已启动: {self.name}")
+        while True:
+            interval = self.default_interval
+            self._event.clear()
+            try:
+                with app.app_context():
+                    interval = float(self.get_interval() or self.default_interval)
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"后台工作器执行失败: {self.name}, 错误: {str(e)}")
+            self._event.wait(timeout=interval)
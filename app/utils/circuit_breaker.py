@@ -0,0 +1,202 @@
+"""
+熔断器模块
+Google Sheets和股票API各有一个熔断器，由本进程内所有任务共享：
+时间窗口内的配额/瞬时错误次数和失败比例都达到阈值后打开，打开期间调用直接抛出CircuitOpenError，不再请求依赖服务；
+冷却时间过后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开并加倍冷却时间
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, List
+
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.utils.logger import get_logger
+from app.utils.metrics import CIRCUIT_REJECTED, CIRCUIT_STATE
+
+logger = get_logger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# 依赖名
+GOOGLE_SHEETS = 'google_sheets'
+STOCK_API = 'stock_api'
+
+
+class CircuitBreaker:
+    """单个依赖服务的熔断器，线程安全"""
+
+    def __init__(self, name: str, failure_threshold: int = 10, window: float = 60.0, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 300.0, failure_rate: float = 0.5):
+        """
+        Args:
+            name: 依赖名
+            failure_threshold: window秒内的失败次数达到该值时打开
+            failure_rate: 同时要求window秒内失败调用的比例达到该值，多个任务共享时零星的瞬时错误不会触发熔断
+            window: 统计失败次数的时间窗口（秒）
+            reset_timeout: 打开后进入半开状态前的冷却时间（秒），探测失败时加倍
+            max_reset_timeout: 冷却时间上限（秒）
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_rate = failure_rate
+        self.window = window
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._lock = threading.Lock()
+        self._failures: Deque[float] = deque()
+        self._calls: Deque[float] = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._reset_timeout = reset_timeout
+        self._probe_in_flight = False
+        self._rejected = 0
+        self._last_error = None
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        """切换状态，调用方持有锁（初始化时除外）"""
+        if state != self._state:
+            logger.warning(f"熔断器 {self.name}: {self._state} -> {state}")
+        self._state = state
+        CIRCUIT_STATE.labels(self.name).set(STATE_VALUES[state])
+
+    def _retry_after(self) -> float:
+        return max(self._opened_at + self._reset_timeout - time.monotonic(), 0.0)
+
+    def _acquire(self) -> bool:
+        """
+        申请发起一次调用
+
+        Returns:
+            是否为半开状态的探测调用
+        """
+        with self._lock:
+            if self._state == OPEN:
+                if self._retry_after() > 0:
+                    self._rejected += 1
+                    CIRCUIT_REJECTED.labels(self.name).inc()
+                    raise CircuitOpenError(self.name, self._retry_after())
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self._rejected += 1
+                    CIRCUIT_REJECTED.labels(self.name).inc()
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def _record(self, probe: bool, error: Exception = None):
+        from app.utils.retry_policy import QUOTA, TRANSIENT, classify_error
+
+        counted = error is not None and classify_error(error) in (QUOTA, TRANSIENT)
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                self._probe_in_flight = False
+                if counted:
+                    # 探测失败，重新打开并加倍冷却时间
+                    self._reset_timeout = min(self._reset_timeout * 2, self.max_reset_timeout)
+                    self._opened_at = now
+                    self._last_error = str(error)
+                    self._set_state(OPEN)
+                else:
+                    self._reset_timeout = self.base_reset_timeout
+                    self._failures.clear()
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+                return
+
+            self._calls.append(now)
+            while self._calls and now - self._calls[0] > self.window:
+                self._calls.popleft()
+            if not counted:
+                return
+            self._last_error = str(error)
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            if (self._state == CLOSED and len(self._failures) >= self.failure_threshold
+                    and len(self._failures) >= self.failure_rate * len(self._calls)):
+                self._opened_at = now
+                self._set_state(OPEN)
+
+    @contextmanager
+    def guard(self):
+        """
+        包裹一次对依赖服务的调用
+
+        Raises:
+            CircuitOpenError: 熔断器打开（或半开且已有探测请求）时，调用不会发出
+        """
+        probe = self._acquire()
+        try:
+            yield
+        except Exception as e:
+            self._record(probe, e)
+            raise
+        except BaseException:
+            # 协程被取消等情况不计入成功或失败，只释放探测名额
+            if probe:
+                with self._lock:
+                    self._probe_in_flight = False
+            raise
+        else:
+            self._record(probe)
+
+    def is_open(self) -> bool:
+        """是否处于打开状态且冷却时间未到（等待中的任务据此决定是否恢复）"""
+        with self._lock:
+            return self._state == OPEN and self._retry_after() > 0
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return self._retry_after() if self._state == OPEN else 0.0
+
+    def reset(self):
+        """手动关闭熔断器"""
+        with self._lock:
+            self._failures.clear()
+            self._calls.clear()
+            self._reset_timeout = self.base_reset_timeout
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            recent = sum(1 for failed_at in self._failures if now - failed_at <= self.window)
+            calls = sum(1 for called_at in self._calls if now - called_at <= self.window)
+            return {
+                'dependency': self.name,
+                'state': self._state,
+                'recent_failures': recent,
+                'recent_calls': calls,
+                'failure_threshold': self.failure_threshold,
+                'failure_rate': self.failure_rate,
+                'retry_after': round(self._retry_after(), 1) if self._state == OPEN else 0,
+                'reset_timeout': self._reset_timeout,
+                'rejected': self._rejected,
+                'last_error': self._last_error
+            }
+
+
+# 全局熔断器实例
+breakers: Dict[str, CircuitBreaker] = {
+    GOOGLE_SHEETS: CircuitBreaker(GOOGLE_SHEETS, failure_threshold=10, window=60, reset_timeout=30),
+    STOCK_API: CircuitBreaker(STOCK_API, failure_threshold=5, window=60, reset_timeout=30),
+}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    return breakers[name]
+
+
+def breaker_snapshots() -> List[Dict[str, Any]]:
+    """所有熔断器的状态"""
+    return [breaker.snapshot() for breaker in breakers.values()]
@@ -3,6 +3,7 @@
 提供事务管理、连接管理等功能
 """
 import functools
+import time
 from sqlalchemy.exc import IntegrityError, OperationalError
 from app.extensions import db
 from app.utils.logger import get_logger
@@ -66,6 +67,39 @@ def safe_delete(model_class, **filters):
         raise
 
 
+def safe_delete_in_batches(model_class, batch_size=1000, pause=0.0, on_batch=None, **filters):
+    """
+    分批删除，每批按主键删除并单独提交，避免长事务持有SQLite写锁阻塞其他提交
+
+    Args:
+        model_class: 模型类
+        batch_size: 每批删除的记录数
+        pause: 批次之间的等待时间（秒），让其他连接有机会获取写锁
+        on_batch: 每批提交后调用，参数为该批删除的记录数
+        **filters: 过滤条件
+
+    Returns:
+        int: 删除的记录数
+    """
+    deleted = 0
+    while True:
+        def delete_batch():
+            ids = [row.id for row in db.session.query(model_class.id).filter_by(**filters).limit(batch_size)]
+            if ids:
+                model_class.query.filter(model_class.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+            return len(ids)
+
+        count = safe_db_operation(delete_batch)
+        deleted += count
+        if count and on_batch:
+            on_batch(count)
+        if count < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
 def safe_update(model_instance, commit=True, **updates):
     """
     安全更新操作，包含重试逻辑
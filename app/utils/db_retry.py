@@ -8,6 +8,7 @@ from functools import wraps
 from typing import Callable, Any, Optional
 from sqlalchemy.exc import OperationalError
 from app.utils.logger import get_logger
+from app.utils.metrics import DB_OPERATION_RETRIES, DB_LOCK_FAILURES
 
 logger = get_logger(__name__)
 
@@ -106,7 +107,9 @@ def safe_db_operation(
     
     for attempt in range(max_attempts):
         try:
-            return operation(*args, **kwargs)
+            result = operation(*args, **kwargs)
+            DB_OPERATION_RETRIES.observe(attempt)
+            return result
         except OperationalError as e:
             last_exception = e
             error_str = str(e).lower()
@@ -120,6 +123,8 @@ def safe_db_operation(
                     time.sleep(delay)
                     continue
                 else:
+                    DB_OPERATION_RETRIES.observe(attempt)
+                    DB_LOCK_FAILURES.inc()
                     logger.error(f"数据库锁定重试失败，已达到最大重试次数 {max_attempts}")
                     raise DatabaseLockError(f"数据库锁定重试失败: {str(e)}")
             else:
@@ -5,26 +5,34 @@ HTTP请求工具类
 用于与股票API进行通信
 """
 
+import os
 import requests
 import json
 import time
 from typing import Dict, Optional, Any
 import logging
 
+from app.utils.circuit_breaker import STOCK_API, get_breaker
+from app.utils.metrics import STOCK_API_SECONDS
+
 logger = logging.getLogger(__name__)
+stock_api_breaker = get_breaker(STOCK_API)
+
+DEFAULT_BASE_URL = "http://sxapi.stplan.cn/api/Stock"
 
 
 class StockAPIClient:
     """股票API客户端"""
 
-    def __init__(self, base_url: str = "http://sxapi.stplan.cn/api/Stock", timeout: int = 30):
+    def __init__(self, base_url: str = None, timeout: int = 30):
         """
         初始化API客户端
 
         Args:
-            base_url: API基础URL
+            base_url: API基础URL，默认读取环境变量STOCK_API_BASE_URL
             timeout: 请求超时时间（秒）
         """
+        base_url = base_url or os.environ.get('STOCK_API_BASE_URL', DEFAULT_BASE_URL)
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
         self.session = requests.Session()
@@ -48,23 +56,35 @@ class StockAPIClient:
 
         Returns:
             响应数据字典或None
+
+        Raises:
+            CircuitOpenError: 股票API熔断中，请求未发出
         """
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
 
         logger.debug(f"发送 {method} 请求到 {url}")
 
-        if method.upper() == 'GET':
-            response = self.session.get(url, params=params, timeout=self.timeout)
-        elif method.upper() == 'POST':
-            response = self.session.post(url, json=data, params=params, timeout=self.timeout)
-        elif method.upper() == 'PUT':
-            response = self.session.put(url, json=data, params=params, timeout=self.timeout)
-        elif method.upper() == 'DELETE':
-            response = self.session.delete(url, params=params, timeout=self.timeout)
-        else:
-            raise ValueError(f"不支持的HTTP方法: {method}")
-
-        response.raise_for_status()
+        # 指标按接口名统计，去掉路径中的ID
+        metric_endpoint = endpoint.lstrip('/').split('/')[0]
+        started = time.perf_counter()
+        outcome = 'error'
+        with stock_api_breaker.guard():
+            try:
+                if method.upper() == 'GET':
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                elif method.upper() == 'POST':
+                    response = self.session.post(url, json=data, params=params, timeout=self.timeout)
+                elif method.upper() == 'PUT':
+                    response = self.session.put(url, json=data, params=params, timeout=self.timeout)
+                elif method.upper() == 'DELETE':
+                    response = self.session.delete(url, params=params, timeout=self.timeout)
+                else:
+                    raise ValueError(f"不支持的HTTP方法: {method}")
+
+                response.raise_for_status()
+                outcome = 'success'
+            finally:
+                STOCK_API_SECONDS.labels(metric_endpoint, outcome).observe(time.perf_counter() - started)
 
         # 检查响应状态
         if response.status_code == 200:
@@ -1,5 +1,5 @@
 from datetime import datetime
-import requests
+import threading
 import time
 import hmac
 import hashlib
@@ -77,6 +77,22 @@ class DingTalkNotifier:
         self.access_token = access_token
         self.secret = secret
         self.base_url = 'https://oapi.dingtalk.com/robot/send'
+        # 复用连接，超时避免钉钉接口缓慢时阻塞调用方
+        self.timeout = (3, 10)
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """首次发送时才导入requests并创建会话，应用启动不承担其导入耗时"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    session = requests.Session()
+                    session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4))
+                    self._session = session
+        return self._session
 
     def _generate_signature(self):
         """
@@ -145,6 +161,42 @@ class DingTalkNotifier:
         }
 
 
+    def google_task_digest_templates(self, title, items, url, max_items=10):
+        """
+        合并多条通知为一张汇总卡片
+
+        Args:
+            title: 卡片标题，例如 "最近1分钟内12个任务执行失败"
+            items: [(任务标识, 消息)] 列表
+            url: 按钮跳转链接
+            max_items: 卡片中最多列出的条数
+        """
+        lines = [f"- **{task}**: {msg}" for task, msg in items[:max_items]]
+        if len(items) > max_items:
+            lines.append(f"- ……另有 {len(items) - max_items} 条")
+        text = "\n".join(lines)
+        return {
+            "msgtype": "actionCard",
+            "actionCard": {
+                "title": title,
+                "text": f"""## {title}
+
+        **汇总时间**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+{text}""",
+                "btnOrientation": "0",
+                "btns": [
+                    {
+                        "title": "📋 查看任务列表",
+                        "actionURL": url
+                    }
+                ]
+            },
+            "at": {
+                "isAtAll": False,
+            }
+        }
+
     def send_message(self,data):
         """
         发送消息到钉钉
@@ -157,7 +209,7 @@ class DingTalkNotifier:
         try:
             timestamp, sign = self._generate_signature()
             url = f'{self.base_url}?access_token={self.access_token}&timestamp={timestamp}&sign={sign}'
-            response = requests.post(url, json=data)
+            response = self.session.post(url, json=data, timeout=self.timeout)
 
             return response.json()
         except Exception as e:
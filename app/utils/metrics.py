@@ -0,0 +1,123 @@
+"""
+运行指标模块
+基于prometheus_client定义热点路径的直方图、计数器和队列深度仪表，由 /metrics 接口导出。
+
+gunicorn多进程部署时设置环境变量 PROMETHEUS_MULTIPROC_DIR（需在导入本模块前设置，
+启动前清空该目录），各worker把指标写入该目录，/metrics 汇总所有worker的数据。
+"""
+import os
+import time
+from typing import Tuple
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# 表格和接口调用的耗时分桶（秒）
+API_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+# 表格重新计算等待时间分桶（秒），轮询间隔为20-30秒
+RECALC_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1200, 1800)
+# 数据库提交耗时分桶（秒）
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+SHEET_WRITE_SECONDS = Histogram(
+    'gsheet_write_seconds', 'Google Sheet写入耗时', ['op'], buckets=API_BUCKETS
+)
+SHEET_READ_SECONDS = Histogram(
+    'gsheet_read_seconds', 'Google Sheet读取耗时', ['op'], buckets=API_BUCKETS
+)
+RECALC_WAIT_SECONDS = Histogram(
+    'combination_recalc_wait_seconds', '参数写入到取得有效结果的等待时间', buckets=RECALC_BUCKETS
+)
+COMBINATIONS_TOTAL = Counter(
+    'combinations_completed_total', '已执行的参数组合数', ['outcome']
+)
+STOCK_API_SECONDS = Histogram(
+    'stock_api_request_seconds', '上游股票API请求耗时', ['endpoint', 'outcome'], buckets=API_BUCKETS
+)
+DB_COMMIT_SECONDS = Histogram(
+    'db_commit_seconds', '数据库提交耗时（含flush）', buckets=DB_BUCKETS
+)
+DB_OPERATION_RETRIES = Histogram(
+    'db_operation_retries', 'safe_db_operation每次调用的锁定重试次数', buckets=(0, 1, 2, 3, 4, 5)
+)
+DB_LOCK_FAILURES = Counter(
+    'db_lock_failures_total', '数据库锁定重试耗尽的次数'
+)
+RETRY_ATTEMPTS = Counter(
+    'retry_attempts_total', '按重试策略发起的重试次数', ['operation', 'kind']
+)
+RETRY_GIVEUPS = Counter(
+    'retry_giveups_total', '放弃重试的次数', ['operation', 'reason']
+)
+RETRY_BACKOFF_SECONDS = Counter(
+    'retry_backoff_seconds_total', '重试退避等待的总时长（秒）', ['operation']
+)
+COMBINATION_BUDGET_SPENT_SECONDS = Histogram(
+    'combination_budget_spent_seconds', '单个参数组合消耗的时间预算（秒）', buckets=RECALC_BUCKETS
+)
+COMBINATION_BUDGET_EXHAUSTED = Counter(
+    'combination_budget_exhausted_total', '耗尽时间预算的参数组合数'
+)
+
+# 队列深度和运行任务数由各进程定期刷新，多进程模式下按存活进程求和
+RUNNING_TASKS = Gauge(
+    'running_tasks', '正在执行的任务数', multiprocess_mode='livesum'
+)
+SSE_QUEUE_DEPTH = Gauge(
+    'sse_queue_depth', 'SSE事件队列中未消费的事件数', multiprocess_mode='livesum'
+)
+LOG_WRITER_QUEUE_DEPTH = Gauge(
+    'task_log_writer_queue_depth', '任务日志写入器队列深度', multiprocess_mode='livesum'
+)
+# 熔断器状态（0关闭/1半开/2打开），各进程独立熔断，取最严重的值
+CIRCUIT_STATE = Gauge(
+    'circuit_breaker_state', '依赖服务熔断器状态（0关闭/1半开/2打开）', ['dependency'], multiprocess_mode='max'
+)
+CIRCUIT_REJECTED = Counter(
+    'circuit_breaker_rejected_total', '熔断期间被拒绝的调用数', ['dependency']
+)
+# 排队任务数来自数据库，各进程读到的值相同，取最大值
+QUEUED_TASKS = Gauge(
+    'queued_tasks', '排队等待调度的任务数', multiprocess_mode='max'
+)
+
+
+def is_multiprocess() -> bool:
+    """是否启用了多进程汇总模式"""
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def generate_metrics() -> Tuple[bytes, str]:
+    """生成Prometheus文本格式的指标，返回 (内容, Content-Type)"""
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """worker退出时清理其存活进程指标（gunicorn child_exit钩子中调用）"""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+@event.listens_for(Session, 'before_commit')
+def _before_commit(session):
+    session.info['_commit_started'] = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    started = session.info.pop('_commit_started', None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('_commit_started', None)
@@ -0,0 +1,113 @@
+"""
+任务性能剖析工具模块
+采样剖析：定时读取执行线程（或协程）的调用栈，输出collapsed格式，可直接用flamegraph.pl或speedscope生成火焰图；
+确定性剖析：在任务执行线程中开启cProfile，结束后写入.prof文件
+"""
+import cProfile
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 采样间隔（秒）
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _thread_stack(thread_id: int) -> Optional[List[str]]:
+    """获取线程当前调用栈（外层在前），线程已结束时返回None"""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return None
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _coroutine_stack(coro) -> Optional[List[str]]:
+    """沿cr_await链获取协程当前挂起位置（外层在前），协程已结束时返回None"""
+    if coro is None or getattr(coro, 'cr_frame', None) is None:
+        return None
+    stack = []
+    awaitable = coro
+    while awaitable is not None:
+        frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        awaitable = getattr(awaitable, 'cr_await', None) or getattr(awaitable, 'gi_yieldfrom', None)
+    return stack
+
+
+def sample_stacks(get_stack: Callable[[], Optional[List[str]]], seconds: float,
+                  interval: float = DEFAULT_SAMPLE_INTERVAL) -> Counter:
+    """
+    在seconds秒内每隔interval秒采样一次调用栈
+
+    Returns:
+        Counter，键为分号连接的调用栈，值为采样次数；目标提前结束时返回已采到的样本
+    """
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        stack = get_stack()
+        if stack is None:
+            break
+        if stack:
+            counts[';'.join(stack)] += 1
+        time.sleep(interval)
+    return counts
+
+
+def sample_thread(thread_id: int, seconds: float, interval: float = DEFAULT_SAMPLE_INTERVAL) -> Counter:
+    """采样指定线程的调用栈"""
+    return sample_stacks(lambda: _thread_stack(thread_id), seconds, interval)
+
+
+def sample_coroutine(coro, seconds: float, interval: float = DEFAULT_SAMPLE_INTERVAL) -> Counter:
+    """采样指定协程的挂起位置（异步引擎中所有任务共用一个线程，只能按协程采样）"""
+    return sample_stacks(lambda: _coroutine_stack(coro), seconds, interval)
+
+
+def format_collapsed(counts: Counter) -> str:
+    """格式化为collapsed格式：每行 "栈帧1;栈帧2;... 次数" """
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+@contextmanager
+def cprofile_to_file(path: Optional[Union[str, Path]]):
+    """
+    在当前线程开启cProfile，结束时写入path；path为None时不做任何事
+
+    cProfile只统计开启它的线程，流水线后处理线程中的耗时不在结果中
+    """
+    if not path:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(path))
+            logger.info(f"cProfile结果已写入: {path}")
+        except Exception as e:
+            logger.error(f"写入cProfile结果失败: {path}, 错误: {str(e)}")
@@ -0,0 +1,88 @@
+"""
+结果规则模块
+任务配置中的result_rules声明结果的取值范围和允许为0的结果键，编译为一个判定函数，
+超出范围的组合直接判定为淘汰：不重试、不保存结果、不推送上游
+"""
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+# 结果字段名与结果单元格的对应关系，与上游接口的字段一致
+RESULT_FIELD_CELLS = {
+    'return_rate': 'I15',
+    'annualized_rate': 'I16',
+    'maxdd': 'I17',
+    'index_rate': 'I18',
+    'index_annualized_rate': 'I19',
+    'max_index_dd': 'I20',
+    'fee_total': 'I21',
+    'fee_annualized': 'I22',
+    'year_rate': 'I23'
+}
+
+RULE_OPTIONS = ('min', 'max', 'allow_zero')
+
+
+class ResultRules:
+    """编译后的结果规则"""
+
+    def __init__(self, bounds: List[Tuple[str, str, Optional[float], Optional[float]]], allow_zero: FrozenSet[str]):
+        self.allow_zero = allow_zero
+        self._bounds = bounds
+        self.check: Callable[[Dict[str, Any]], Optional[str]] = self._compile(bounds)
+
+    def __bool__(self):
+        return bool(self._bounds or self.allow_zero)
+
+    @staticmethod
+    def _compile(bounds) -> Callable[[Dict[str, Any]], Optional[str]]:
+        """
+        生成判定函数：返回第一条不满足的规则说明，全部满足时返回None
+
+        非数值（尚未解析的结果）不参与判定，交给后续的结果校验处理
+        """
+        if not bounds:
+            return lambda result: None
+
+        def check(result: Dict[str, Any]) -> Optional[str]:
+            for cell, label, low, high in bounds:
+                value = result.get(cell)
+                if not isinstance(value, (int, float)):
+                    continue
+                if low is not None and value < low:
+                    return f"{label}={value} 小于下限 {low}"
+                if high is not None and value > high:
+                    return f"{label}={value} 大于上限 {high}"
+            return None
+
+        return check
+
+
+def compile_result_rules(rules: Optional[Dict[str, Dict[str, Any]]]) -> ResultRules:
+    """
+    编译任务配置中的result_rules
+
+    格式为 {结果键: {'min': 下限, 'max': 上限, 'allow_zero': 是否允许为0}}，
+    结果键可以是单元格（I17）或字段名（maxdd）；百分比结果按小数比较，例如最大回撤50%写作0.5
+
+    Raises:
+        ValueError: 规则格式错误
+    """
+    bounds = []
+    allow_zero = set()
+    for key, rule in (rules or {}).items():
+        cell = RESULT_FIELD_CELLS.get(key, key)
+        if not isinstance(rule, dict):
+            raise ValueError(f"结果规则 {key} 必须是对象")
+        unknown = set(rule) - set(RULE_OPTIONS)
+        if unknown:
+            raise ValueError(f"结果规则 {key} 包含未知选项: {sorted(unknown)}")
+
+        try:
+            low = float(rule['min']) if rule.get('min') is not None else None
+            high = float(rule['max']) if rule.get('max') is not None else None
+        except (TypeError, ValueError):
+            raise ValueError(f"结果规则 {key} 的上下限必须是数字")
+        if low is not None or high is not None:
+            bounds.append((cell, key, low, high))
+        if rule.get('allow_zero'):
+            allow_zero.add(cell)
+    return ResultRules(bounds, frozenset(allow_zero))
@@ -4,18 +4,23 @@
 """
 
 from functools import wraps
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Tuple, Callable, Iterable, Optional
+from app.exceptions.checkForErrors import checkForErrors
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.exceptions.combinationRejected import CombinationRejected
 from app.utils.logger import get_logger
 from app.services.config_manager import get_config_manager
 logger = get_logger(__name__)
 
 
-def validate_result_dict(none_values: Tuple[Any, ...] = (None, '', ' ', 0, '0', '0.0', '0.00')):
+def validate_result_dict(none_values: Tuple[Any, ...] = (None, '', ' ', 0, '0', '0.0', '0.00'),
+                         allow_zero: Optional[Callable[..., Iterable[str]]] = None):
     """
     装饰器：验证返回的字典中是否包含空值或无效值
     
     Args:
         none_values: 被认为是"空"的值列表，默认包含 None, '', ' ', 0, '0', '0.0', '0.00'
+        allow_zero: 返回允许为0的键的函数，参数与被装饰函数相同
     
     Returns:
         如果字典中包含空值，则返回 (False, {})，否则返回原始结果
@@ -43,6 +48,7 @@ def validate_result_dict(none_values: Tuple[Any, ...] = (None, '', ' ', 0, '0',
                     return False, {}
                 
                 # 检查字典中是否有任何空值或无效值
+                zero_keys = set(allow_zero(*args, **kwargs)) if allow_zero else ()
                 empty_keys = []
                 for key, value in result_dict.items():
                     if value in none_values:
@@ -50,7 +56,8 @@ def validate_result_dict(none_values: Tuple[Any, ...] = (None, '', ' ', 0, '0',
                     elif isinstance(value, str) and value.strip() == '':
                         empty_keys.append([key,value])
                     elif not str(key).startswith(("B","b")) and  isinstance(value, (int, float)) and value == 0:
-                        empty_keys.append([key,value])
+                        if key not in zero_keys:
+                            empty_keys.append([key,value])
                 
                 # 如果发现空值，记录日志并返回失败
                 if empty_keys:
@@ -60,6 +67,9 @@ def validate_result_dict(none_values: Tuple[Any, ...] = (None, '', ' ', 0, '0',
                 # 所有检查通过，返回原始结果
                 return success, result_dict
                 
+            except (checkForErrors, CombinationRejected, CircuitOpenError):
+                # 单元格错误值、确定性淘汰或依赖服务熔断，交给调用方处理，不按失败重试
+                raise
             except Exception as e:
                 logger.error(f"验证函数 {func.__name__} 结果时出错: {str(e)}")
                 return False, {}
@@ -68,12 +78,13 @@ def validate_result_dict(none_values: Tuple[Any, ...] = (None, '', ' ', 0, '0',
     return decorator
 
 
-def validate_google_sheet_result(result_dict: Dict[str, Any]) -> Tuple[bool, str]:
+def validate_google_sheet_result(result_dict: Dict[str, Any], allow_zero: Iterable[str] = ()) -> Tuple[bool, str]:
     """
     专门验证 Google Sheet 结果的字典
     
     Args:
         result_dict: 包含 Google Sheet 结果的字典
+        allow_zero: 允许为0的结果键
         
     Returns:
         (是否有效, 错误信息)
@@ -101,7 +112,7 @@ def validate_google_sheet_result(result_dict: Dict[str, Any]) -> Tuple[bool, str
             empty_keys.append(key)
         elif isinstance(result_dict[key], (int, float)) and result_dict[key] == 0:
             # 对于某些键，0 可能是有效值，需要进一步检查
-            if key in result_keys:
+            if key in result_keys and key not in allow_zero:
                 # 结果键为0可能表示计算错误
                 empty_keys.append(key)
     
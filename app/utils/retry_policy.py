@@ -0,0 +1,288 @@
+"""
+重试策略模块
+统一各操作的重试次数、退避时间和总期限，按错误类型决定是否重试：
+配额错误（429）等待更久后重试，瞬时错误（超时、5xx、连接中断）按指数退避重试，确定性错误立即放弃。
+单个参数组合还有一个总时间预算，组合内部的轮询、重试和上游调用都不能超出它，避免多层重试的耗时相乘
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import random
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.logger import get_logger
+from app.utils.metrics import (
+    COMBINATION_BUDGET_EXHAUSTED, COMBINATION_BUDGET_SPENT_SECONDS, RETRY_ATTEMPTS, RETRY_BACKOFF_SECONDS,
+    RETRY_GIVEUPS
+)
+
+logger = get_logger(__name__)
+
+# 错误类型
+QUOTA = 'quota'
+TRANSIENT = 'transient'
+DETERMINISTIC = 'deterministic'
+# 依赖服务熔断中，重试只会继续被拒绝，交给调用方暂停等待
+CIRCUIT_OPEN = 'circuit_open'
+# 返回值判定为失败（例如组合结果无效）
+FAILED_RESULT = 'failed_result'
+
+# 配额按分钟计算，配额错误至少等待的秒数
+QUOTA_MIN_DELAY = 30
+
+# 各操作的默认策略：最多尝试次数、退避下限/上限（秒）、总期限（秒，None表示只受组合预算限制）
+DEFAULT_POLICIES: Dict[str, Dict[str, Any]] = {
+    'combination': {'max_attempts': 3, 'min_delay': 4, 'max_delay': 10, 'deadline': None},
+    'stock_api_read': {'max_attempts': 3, 'min_delay': 4, 'max_delay': 10, 'deadline': 120},
+    'stock_api_write': {'max_attempts': 3, 'min_delay': 4, 'max_delay': 10, 'deadline': 120},
+    'trade_count': {'max_attempts': 10, 'min_delay': 30, 'max_delay': 30, 'deadline': 600},
+}
+
+STATUS_IN_MESSAGE = re.compile(r'状态码: (\d{3})')
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """从gspread/requests/httpx的异常中取HTTP状态码，StockAPIClient的错误只在消息中带状态码"""
+    response = getattr(error, 'response', None)
+    for attr in ('status_code', 'status'):
+        code = getattr(response, attr, None)
+        if isinstance(code, int):
+            return code
+    match = STATUS_IN_MESSAGE.search(str(error))
+    return int(match.group(1)) if match else None
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    错误分类
+
+    Returns:
+        QUOTA / TRANSIENT / DETERMINISTIC / CIRCUIT_OPEN
+    """
+    from app.exceptions.checkForErrors import checkForErrors
+    from app.exceptions.circuitOpen import CircuitOpenError
+    from app.exceptions.combinationRejected import CombinationRejected
+
+    if isinstance(error, CircuitOpenError):
+        return CIRCUIT_OPEN
+    if isinstance(error, (checkForErrors, CombinationRejected, ValueError, KeyError, TypeError)):
+        return DETERMINISTIC
+
+    message = str(error).lower()
+    status = _status_code(error)
+    if status == 429 or 'quota' in message or 'rate limit' in message:
+        return QUOTA
+    if status is not None:
+        if status == 403 and ('rate' in message or 'limit' in message):
+            return QUOTA
+        if status >= 500 or status == 408:
+            return TRANSIENT
+        if 400 <= status < 500:
+            return DETERMINISTIC
+    return TRANSIENT
+
+
+class CombinationBudget:
+    """单个参数组合的总时间预算"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + seconds
+
+    def remaining(self) -> float:
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def exhausted(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def spent(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+_current_budget: contextvars.ContextVar[Optional[CombinationBudget]] = contextvars.ContextVar(
+    'combination_budget', default=None
+)
+
+
+@contextmanager
+def combination_budget(seconds: Optional[float]):
+    """
+    在当前线程（或协程）中为一个参数组合设置时间预算，seconds为0或None时不限制
+
+    上下文变量随asyncio.to_thread传递，组合内同步调用的重试同样受预算约束
+    """
+    if not seconds:
+        yield None
+        return
+
+    budget = CombinationBudget(float(seconds))
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+        COMBINATION_BUDGET_SPENT_SECONDS.observe(budget.spent())
+        if budget.exhausted():
+            COMBINATION_BUDGET_EXHAUSTED.inc()
+
+
+def current_budget() -> Optional[CombinationBudget]:
+    return _current_budget.get()
+
+
+def budget_exhausted() -> bool:
+    """当前参数组合的时间预算是否已用完"""
+    budget = _current_budget.get()
+    return bool(budget and budget.exhausted())
+
+
+def cap_to_budget(seconds: float) -> float:
+    """把等待时间截断到当前参数组合的剩余预算内"""
+    budget = _current_budget.get()
+    return min(seconds, budget.remaining()) if budget else seconds
+
+
+class RetryPolicy:
+    """单个操作的重试策略"""
+
+    def __init__(self, name: str, max_attempts: int = 3, min_delay: float = 4, max_delay: float = 10,
+                 deadline: Optional[float] = None, retry_if_result: Optional[Callable[[Any], bool]] = None):
+        """
+        Args:
+            name: 操作名，用于日志和指标
+            max_attempts: 最多尝试次数（含第一次）
+            min_delay/max_delay: 指数退避的下限和上限（秒）
+            deadline: 从第一次尝试开始的总期限（秒）
+            retry_if_result: 返回值需要重试时返回True
+        """
+        self.name = name
+        self.max_attempts = max(1, int(max_attempts))
+        self.min_delay = float(min_delay)
+        self.max_delay = float(max_delay)
+        self.deadline = float(deadline) if deadline else None
+        self.retry_if_result = retry_if_result
+
+    def backoff(self, attempt: int, kind: str) -> float:
+        """第attempt次尝试失败后的等待时间，指数退避并加少量抖动"""
+        delay = min(max(self.min_delay * 2 ** (attempt - 1), self.min_delay), self.max_delay)
+        if kind == QUOTA:
+            delay = max(delay, QUOTA_MIN_DELAY)
+        return delay * random.uniform(0.9, 1.1)
+
+    def _next_delay(self, attempt: int, kind: str, started_at: float) -> Optional[float]:
+        """
+        决定是否再次尝试
+
+        Returns:
+            等待秒数；不再尝试时返回None并记录放弃原因
+        """
+        reason = None
+        delay = self.backoff(attempt, kind)
+        if kind == DETERMINISTIC:
+            reason = 'deterministic'
+        elif kind == CIRCUIT_OPEN:
+            reason = 'circuit_open'
+        elif attempt >= self.max_attempts:
+            reason = 'attempts'
+        elif self.deadline and time.monotonic() + delay - started_at > self.deadline:
+            reason = 'deadline'
+        else:
+            budget = _current_budget.get()
+            if budget and budget.remaining() <= delay:
+                reason = 'budget'
+
+        if reason:
+            RETRY_GIVEUPS.labels(self.name, reason).inc()
+            return None
+        RETRY_ATTEMPTS.labels(self.name, kind).inc()
+        RETRY_BACKOFF_SECONDS.labels(self.name).inc(delay)
+        return delay
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """按策略调用同步函数，放弃时重新抛出最后的异常或返回最后的结果"""
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                delay = self._next_delay(attempt, kind, started_at)
+                if delay is None:
+                    raise
+                logger.warning(f"{self.name} 第 {attempt} 次尝试失败（{kind}），{delay:.1f}秒后重试: {str(e)}")
+                time.sleep(delay)
+                continue
+
+            if not (self.retry_if_result and self.retry_if_result(result)):
+                return result
+            delay = self._next_delay(attempt, FAILED_RESULT, started_at)
+            if delay is None:
+                return result
+            logger.warning(f"{self.name} 第 {attempt} 次尝试结果无效，{delay:.1f}秒后重试")
+            time.sleep(delay)
+
+    async def call_async(self, fn: Callable, *args, **kwargs):
+        """按策略调用协程函数，语义与call相同"""
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                kind = classify_error(e)
+                delay = self._next_delay(attempt, kind, started_at)
+                if delay is None:
+                    raise
+                logger.warning(f"{self.name} 第 {attempt} 次尝试失败（{kind}），{delay:.1f}秒后重试: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+
+            if not (self.retry_if_result and self.retry_if_result(result)):
+                return result
+            delay = self._next_delay(attempt, FAILED_RESULT, started_at)
+            if delay is None:
+                return result
+            logger.warning(f"{self.name} 第 {attempt} 次尝试结果无效，{delay:.1f}秒后重试")
+            await asyncio.sleep(delay)
+
+
+def get_policy(name: str, retry_if_result: Optional[Callable[[Any], bool]] = None, **overrides) -> RetryPolicy:
+    """
+    获取操作的重试策略
+
+    优先级：调用方传入的overrides > 系统配置retry_policies中该操作的设置 > DEFAULT_POLICIES
+    """
+    options = dict(DEFAULT_POLICIES.get(name, DEFAULT_POLICIES['combination']))
+    try:
+        from app.services.config_manager import get_config_manager
+        configured = get_config_manager().get_config('retry_policies', {}) or {}
+        if isinstance(configured, dict) and isinstance(configured.get(name), dict):
+            options.update({key: value for key, value in configured[name].items() if key in options})
+    except Exception as e:
+        logger.debug(f"读取重试策略配置失败，使用默认值: {str(e)}")
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return RetryPolicy(name, retry_if_result=retry_if_result, **options)
+
+
+def with_retry_policy(name: str, retry_if_result: Optional[Callable[[Any], bool]] = None):
+    """装饰器：按名为name的策略重试被装饰的函数（同步或协程），每次调用时读取最新配置"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await get_policy(name, retry_if_result).call_async(func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_policy(name, retry_if_result).call(func, *args, **kwargs)
+        return wrapper
+    return decorator
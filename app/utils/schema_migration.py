@@ -0,0 +1,63 @@
+"""
+数据库迁移辅助函数
+migrations/versions 中的迁移只补齐缺少的列、索引和表，已存在的跳过：
+由 flask init-db（create_all）按最新模型建立的库可以直接执行 flask db upgrade；
+表本身不存在时跳过，由 create_all 按最新模型建立
+"""
+import sqlalchemy as sa
+from alembic import op
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def has_table(table: str) -> bool:
+    return _inspector().has_table(table)
+
+
+def has_column(table: str, column: str) -> bool:
+    return any(item['name'] == column for item in _inspector().get_columns(table))
+
+
+def has_index(table: str, index: str) -> bool:
+    return any(item['name'] == index for item in _inspector().get_indexes(table))
+
+
+def is_sqlite() -> bool:
+    return op.get_bind().dialect.name == 'sqlite'
+
+
+def add_column(table: str, column: sa.Column) -> bool:
+    """表存在且缺少该列时添加，返回是否添加"""
+    if not has_table(table):
+        logger.info(f"表 {table} 不存在，跳过添加列 {column.name}")
+        return False
+    if has_column(table, column.name):
+        return False
+    op.add_column(table, column)
+    return True
+
+
+def drop_column(table: str, column: str):
+    if has_table(table) and has_column(table, column):
+        # SQLite较旧版本不支持DROP COLUMN，batch模式重建表
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column)
+
+
+def create_index(name: str, table: str, columns, **kwargs) -> bool:
+    """表存在且缺少该索引时建立，返回是否建立"""
+    if not has_table(table) or has_index(table, name):
+        return False
+    op.create_index(name, table, columns, **kwargs)
+    return True
+
+
+def drop_index(name: str, table: str):
+    if has_table(table) and has_index(table, name):
+        op.drop_index(name, table_name=table)
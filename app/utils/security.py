@@ -2,9 +2,15 @@
 安全相关工具模块
 提供配置验证、敏感信息检查等功能
 """
+import bisect
+import fnmatch
+import hashlib
+import json
 import os
 import re
 import secrets
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
@@ -12,6 +18,114 @@ from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+NEWLINE = re.compile('\n')
+
+# 扫描缓存格式版本，模式列表变化时缓存中的匹配结果失效
+SCAN_CACHE_VERSION = 1
+
+# 命令行安全检查使用的扫描缓存
+DEFAULT_SCAN_CACHE_FILE = os.path.join('data', 'security_scan_cache.json')
+
+
+@lru_cache(maxsize=4)
+def _compile_combined(patterns: tuple, start_chars: str) -> 're.Pattern':
+    alternatives = '|'.join(f'(?P<p{index}>{pattern})' for index, pattern in enumerate(patterns))
+    return re.compile(f'(?=[{start_chars}])(?=(?:{alternatives}))', re.IGNORECASE)
+
+
+def _load_scan_cache(cache_path: Path) -> Dict[str, Dict[str, Any]]:
+    """读取扫描缓存，版本或模式列表不一致时丢弃"""
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != SCAN_CACHE_VERSION or data.get('patterns') != SecurityValidator.SENSITIVE_PATTERNS:
+        return {}
+    return data.get('files', {})
+
+
+def _save_scan_cache(cache_path: Path, files: Dict[str, Dict[str, Any]]):
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': SCAN_CACHE_VERSION, 'patterns': SecurityValidator.SENSITIVE_PATTERNS, 'files': files},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.debug(f"写入扫描缓存失败 {cache_path}: {str(e)}")
+
+
+class GitIgnore:
+    """
+    .gitignore 规则的简化实现，只读取扫描目录下的.gitignore
+    支持注释、取反(!)、目录规则(/结尾)、锚定规则(/开头或中间含/)和 *、?、**、[] 通配
+    """
+    
+    def __init__(self, lines: List[str]):
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            anchored = '/' in line
+            body = self._translate(line.lstrip('/'))
+            regex = re.compile(('^' if anchored else '^(?:.*/)?') + body + '$')
+            self.rules.append((regex, negate, dir_only))
+    
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        """把通配模式转换为正则（路径分隔符为/）"""
+        parts = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                parts.append('(?:.*/)?')
+                i += 3
+            elif pattern.startswith('**', i):
+                parts.append('.*')
+                i += 2
+            elif pattern[i] == '*':
+                parts.append('[^/]*')
+                i += 1
+            elif pattern[i] == '?':
+                parts.append('[^/]')
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+                end = pattern.index(']', i + 1)
+                parts.append('[' + pattern[i + 1:end].replace('!', '^', 1) + ']')
+                i = end + 1
+            else:
+                parts.append(re.escape(pattern[i]))
+                i += 1
+        return ''.join(parts)
+    
+    @classmethod
+    def from_directory(cls, directory: Path) -> 'GitIgnore':
+        try:
+            with open(directory / '.gitignore', 'r', encoding='utf-8', errors='ignore') as f:
+                return cls(f.readlines())
+        except OSError:
+            return cls([])
+    
+    def ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """相对路径是否被忽略，后面的规则覆盖前面的规则"""
+        result = False
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                result = not negate
+        return result
+
 
 class SecurityValidator:
     """安全验证器"""
@@ -47,53 +161,148 @@ class SecurityValidator:
         
         return True
     
+    # 所有敏感信息模式可能的首字符（忽略大小写），合并正则先检查首字符再尝试各模式，新增模式时需同步更新
+    MATCH_START_CHARS = 'capstgy0-9'
+    
+    # 扫描时不进入的目录
+    EXCLUDED_DIRS = {'.git', '__pycache__', 'node_modules'}
+    
+    # 扫描时跳过的文件名
+    EXCLUDED_FILE_PATTERNS = (
+        '*.pyc',
+        '*.log',
+        'env.example',
+        'token.json.example',
+        '*example*',
+        '*template*',
+    )
+    
+    # 未指定缓存文件时，同一进程内重复扫描使用的缓存：目录 -> 文件相对路径 -> 缓存条目
+    _memory_cache: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    
     @classmethod
-    def scan_sensitive_files(cls, directory: str = ".") -> List[Dict[str, Any]]:
-        """扫描目录中的敏感信息"""
+    def _combined_pattern(cls) -> 're.Pattern':
+        """
+        把所有敏感信息模式合并为一个正则，一次遍历文件内容
+        
+        每个模式放在前瞻断言中的命名分组里，每个位置都会尝试，不同模式的匹配可以重叠（与逐个模式扫描结果一致）
+        """
+        return _compile_combined(tuple(cls.SENSITIVE_PATTERNS), cls.MATCH_START_CHARS)
+    
+    @classmethod
+    def _scan_content(cls, content: str) -> List[List[Any]]:
+        """
+        扫描文本内容
+        
+        Returns:
+            [模式序号, 行号, 匹配文本] 列表
+        """
+        matches = []
+        last_end: Dict[str, int] = {}
+        newlines = None
+        for match in cls._combined_pattern().finditer(content):
+            group = match.lastgroup
+            start, end = match.span(group)
+            # 同一模式的匹配不重叠，与re.finditer逐个模式扫描的行为一致
+            if start < last_end.get(group, 0):
+                continue
+            last_end[group] = end
+            if newlines is None:
+                # 行首偏移表只在文件有匹配时建立，行号用二分查找
+                newlines = [newline.start() for newline in NEWLINE.finditer(content)]
+            matches.append([int(group[1:]), bisect.bisect_left(newlines, start) + 1, match.group(group)])
+        return matches
+    
+    @classmethod
+    def _scan_file(cls, file_path: Path, cached: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        扫描单个文件，修改时间和大小未变时直接使用缓存，变化时内容哈希相同也不再匹配
+        
+        Returns:
+            新的缓存条目，无法读取时返回None
+        """
+        try:
+            stat = file_path.stat()
+            if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+                return cached
+            data = file_path.read_bytes()
+        except OSError as e:
+            logger.debug(f"无法读取文件 {file_path}: {str(e)}")
+            return None
+        
+        digest = hashlib.sha1(data).hexdigest()
+        if cached and cached['sha1'] == digest:
+            matches = cached['matches']
+        else:
+            matches = cls._scan_content(data.decode('utf-8', errors='ignore'))
+        return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest, 'matches': matches}
+    
+    @classmethod
+    def _iter_files(cls, directory_path: Path, gitignore: Optional['GitIgnore'], skip: Optional[str] = None):
+        """遍历待扫描的文件（相对路径），被排除或被.gitignore忽略的目录不进入"""
+        for root, dirnames, filenames in os.walk(directory_path):
+            relative_root = Path(root).relative_to(directory_path)
+            dirnames[:] = [
+                name for name in dirnames
+                if name not in cls.EXCLUDED_DIRS
+                and not (gitignore and gitignore.ignored((relative_root / name).as_posix(), True))
+            ]
+            for name in filenames:
+                if any(fnmatch.fnmatch(name, pattern) for pattern in cls.EXCLUDED_FILE_PATTERNS):
+                    continue
+                relative_path = (relative_root / name).as_posix()
+                if relative_path == skip or (gitignore and gitignore.ignored(relative_path, False)):
+                    continue
+                yield relative_path
+    
+    @classmethod
+    def scan_sensitive_files(cls, directory: str = ".", cache_file: Optional[str] = None,
+                             respect_gitignore: bool = True, max_workers: int = 8) -> List[Dict[str, Any]]:
+        """
+        扫描目录中的敏感信息
+        
+        Args:
+            directory: 扫描的目录
+            cache_file: 扫描缓存文件（JSON），重复扫描只重新匹配有变化的文件；为None时只在本进程内缓存
+            respect_gitignore: 是否跳过目录下.gitignore忽略的目录和文件
+            max_workers: 并发读取文件的线程数
+        """
         issues = []
         directory_path = Path(directory)
+        gitignore = GitIgnore.from_directory(directory_path) if respect_gitignore else None
+        cache_path = Path(cache_file) if cache_file else None
         
-        # 排除的目录和文件
-        exclude_patterns = [
-            "**/__pycache__/**",
-            "**/.git/**",
-            "**/node_modules/**",
-            "**/*.pyc",
-            "**/*.log",
-            "**/env.example",
-            "**/token.json.example",
-            "**/*example*",
-            "**/*template*",
-        ]
+        if cache_path:
+            cache = _load_scan_cache(cache_path)
+        else:
+            cache = cls._memory_cache.setdefault(str(directory_path.resolve()), {})
         
-        for file_path in directory_path.rglob("*"):
-            if file_path.is_file():
-                # 检查是否应该排除
-                skip_file = False
-                for pattern in exclude_patterns:
-                    if file_path.match(pattern):
-                        skip_file = True
-                        break
-                
-                if skip_file:
-                    continue
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                        
-                    for pattern in cls.SENSITIVE_PATTERNS:
-                        matches = re.finditer(pattern, content, re.IGNORECASE)
-                        for match in matches:
-                            issues.append({
-                                "file": str(file_path),
-                                "pattern": pattern,
-                                "match": match.group(),
-                                "line_number": content[:match.start()].count('\n') + 1
-                            })
-                            
-                except Exception as e:
-                    logger.debug(f"无法读取文件 {file_path}: {str(e)}")
+        # 缓存文件本身包含匹配文本，不能被扫描
+        skip = Path(os.path.relpath(cache_path.resolve(), directory_path.resolve())).as_posix() if cache_path else None
+        files = list(cls._iter_files(directory_path, gitignore, skip))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            entries = list(executor.map(
+                lambda relative_path: cls._scan_file(directory_path / relative_path, cache.get(relative_path)), files
+            ))
+        
+        scanned = {}
+        for relative_path, entry in zip(files, entries):
+            if entry is None:
+                continue
+            scanned[relative_path] = entry
+            for pattern_index, line_number, text in entry['matches']:
+                issues.append({
+                    "file": str(directory_path / relative_path),
+                    "pattern": cls.SENSITIVE_PATTERNS[pattern_index],
+                    "match": text,
+                    "line_number": line_number
+                })
+        
+        # 已删除的文件不再保留在缓存中
+        cache.clear()
+        cache.update(scanned)
+        if cache_path:
+            _save_scan_cache(cache_path, cache)
         
         return issues
     
@@ -122,11 +331,11 @@ class SecurityValidator:
         return secrets.token_hex(length)
     
     @classmethod
-    def validate_environment(cls) -> Dict[str, Any]:
+    def validate_environment(cls, cache_file: Optional[str] = None) -> Dict[str, Any]:
         """验证环境配置的安全性"""
         results = {
             "secret_key_ok": cls.check_secret_key(),
-            "sensitive_files": cls.scan_sensitive_files(),
+            "sensitive_files": cls.scan_sensitive_files(cache_file=cache_file),
             "token_files": cls.validate_token_files(),
             "recommendations": []
         }
@@ -155,7 +364,7 @@ def run_security_check() -> None:
     print("🔒 运行安全检查...")
     
     validator = SecurityValidator()
-    results = validator.validate_environment()
+    results = validator.validate_environment(cache_file=DEFAULT_SCAN_CACHE_FILE)
     
     print(f"SECRET_KEY 安全: {'✅' if results['secret_key_ok'] else '❌'}")
     print(f"发现敏感文件: {len(results['sensitive_files'])} 个")
@@ -0,0 +1,160 @@
+"""
+内存版Google Sheet
+模拟gspread工作表的 update_cells / update / batch_get / get，
+支持可配置的请求延迟、重新计算延迟、错误注入和429限流
+"""
+import hashlib
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import gspread
+from gspread.exceptions import APIError
+
+from app.services.google_sheet_client import GoogleSheet
+
+
+class _FakeResponse:
+    """构造gspread.APIError所需的最小响应对象"""
+
+    def __init__(self, code: int, message: str):
+        self.status_code = code
+        self.text = message
+        self._payload = {'error': {'code': code, 'message': message, 'status': 'RESOURCE_EXHAUSTED'}}
+
+    def json(self):
+        return self._payload
+
+
+class FakeWorksheet:
+    """
+    内存工作表
+
+    参数单元格被写入新值后，检查单元格（I列镜像B列同行的输入）和结果单元格
+    在recalc_latency秒后才有值，之前读取返回空字符串，模拟Sheet重新计算。
+    配置sentinel时，哨兵单元格在重新计算完成后回显nonce单元格的值。
+    """
+
+    def __init__(self, result_positions: List[str], call_latency: float = 0.01, recalc_latency: float = 0.05,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: Optional[int] = None,
+                 sentinel: Optional[Tuple[str, str]] = None):
+        """
+        Args:
+            result_positions: 结果单元格，值由输入参数确定性地计算
+            call_latency: 每次API调用的延迟（秒）
+            recalc_latency: 参数变化后重新计算的延迟（秒）
+            error_rate: 调用返回500错误的概率
+            rate_limit_rate: 调用返回429限流的概率
+            sentinel: (nonce单元格, 哨兵单元格)
+        """
+        self.result_positions = list(result_positions)
+        self.call_latency = call_latency
+        self.recalc_latency = recalc_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.sentinel = sentinel
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._values: Dict[str, Any] = {}
+        self._ready_at = 0.0
+        self.latencies: List[float] = []
+        self.errors_injected = 0
+        self.rate_limited = 0
+
+    # gspread兼容接口
+
+    def update_cells(self, cells: List[gspread.Cell], value_input_option: str = 'RAW'):
+        self._call()
+        self._write({gspread.utils.rowcol_to_a1(cell.row, cell.col): cell.value for cell in cells})
+        return {'updatedCells': len(cells)}
+
+    def update(self, range_name, values=None, **kwargs):
+        self._call()
+        if isinstance(values, list):
+            values = values[0][0]
+        self._write({range_name: values})
+        return {'updatedCells': 1}
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[Any]]]:
+        self._call()
+        return [[[value]] if value != '' else [] for value in (self._read(ref) for ref in ranges)]
+
+    def get(self, range_name: str, **kwargs) -> List[List[Any]]:
+        self._call()
+        return [[self._read(range_name)]]
+
+    # 内部实现
+
+    def _call(self):
+        started = time.monotonic()
+        try:
+            if self.call_latency:
+                time.sleep(self.call_latency)
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                self.rate_limited += 1
+                raise APIError(_FakeResponse(429, 'Quota exceeded for quota metric \'Read requests\''))
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.errors_injected += 1
+                raise APIError(_FakeResponse(500, 'Internal error encountered.'))
+        finally:
+            with self._lock:
+                self.latencies.append(time.monotonic() - started)
+
+    def _write(self, updates: Dict[str, Any]):
+        with self._lock:
+            changed = any(self._values.get(ref) != value for ref, value in updates.items())
+            self._values.update(updates)
+            if changed:
+                # 只有输入变化才触发重新计算
+                self._ready_at = time.monotonic() + self.recalc_latency
+
+    def _read(self, ref: str) -> Any:
+        with self._lock:
+            if ref.startswith('B'):
+                return self._values.get(ref, '')
+            if time.monotonic() < self._ready_at:
+                return ''
+            if ref in self.result_positions:
+                return self._result_value(ref)
+            if self.sentinel and ref == self.sentinel[1]:
+                return self._values.get(self.sentinel[0], '')
+            # 检查单元格镜像同行的输入参数
+            value = self._values.get(f"B{ref[1:]}", '')
+            return str(value) if value != '' else ''
+
+    def _result_value(self, ref: str) -> str:
+        """根据当前输入确定性地生成非零百分比结果"""
+        inputs = '|'.join(f"{key}={self._values[key]}" for key in sorted(self._values) if key.startswith('B'))
+        digest = hashlib.md5(f"{inputs}#{ref}".encode()).hexdigest()
+        return f"{int(digest[:6], 16) % 9000 / 100 + 1:.2f}%"
+
+
+class FakeGoogleSheet(GoogleSheet):
+    """跳过OAuth认证、使用内存工作表的GoogleSheet，可直接替换GoogleSheetService中的GoogleSheet"""
+
+    # 按电子表格ID共享的内存工作表，多个任务使用同一表格时共享状态
+    worksheets: Dict[str, FakeWorksheet] = {}
+    worksheet_options: Dict[str, Any] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, spreadsheet_id, sheet_name=None, token_file=None, proxy_url=None):
+        self.client = None
+        self.sheet = None
+        with self._registry_lock:
+            worksheet = self.worksheets.get(spreadsheet_id)
+            if worksheet is None:
+                worksheet = FakeWorksheet(**self.worksheet_options)
+                self.worksheets[spreadsheet_id] = worksheet
+        self.worksheet = worksheet
+
+    @classmethod
+    def reset(cls, **worksheet_options):
+        """清空内存工作表并设置新建工作表的参数"""
+        with cls._registry_lock:
+            cls.worksheets = {}
+            cls.worksheet_options = worksheet_options
+
+    def close(self):
+        self.worksheet = None
@@ -0,0 +1,95 @@
+"""
+本地模拟股票API
+实现StockAPIClient用到的接口，运行在后台线程中，可配置响应延迟和错误率
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeStockAPIServer:
+    """本地模拟股票API服务"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.005, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            port: 监听端口，0表示随机分配
+            latency: 每个请求的处理延迟（秒）
+            error_rate: 返回500错误的概率
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.inserted = 0
+        self.requests = 0
+        self.errors_injected = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/Stock"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-stock-api', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handle(self, path: str, payload: dict):
+        """返回 (状态码, 响应体)"""
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors_injected += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 500, {'ret_code': -1, 'ret_msg': 'injected error'}
+
+        endpoint = path.rstrip('/').rsplit('/', 1)[-1]
+        if endpoint == 'GetSingleStockTemplateParam':
+            return 200, {'ret_code': 0, 'ret_obj': {'stock_no': payload.get('stock_no'), 'multiplier_index': 0}}
+        if endpoint == 'InsertStockTemplateParam':
+            with self._lock:
+                self.inserted += 1
+                ret_count = self.inserted
+            return 200, {'ret_code': 0, 'ret_count': ret_count}
+        return 404, {'ret_code': -1, 'ret_msg': f'unknown endpoint {endpoint}'}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                try:
+                    payload = json.loads(body) if body else {}
+                except json.JSONDecodeError:
+                    payload = {}
+                status, data = server._handle(self.path, payload)
+                encoded = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
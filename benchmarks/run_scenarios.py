@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+离线吞吐量基准测试
+使用内存Google Sheet和本地模拟股票API，经 TaskManager → GoogleSheetService 完整链路执行任务，
+以JSON输出每个场景的 组合数/小时、数据库写入/秒 和 API延迟p95。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.run_scenarios                       # 默认场景（100个组合）
+    python -m benchmarks.run_scenarios --scenarios all       # 含1万个组合的场景
+    python -m benchmarks.run_scenarios --scenarios t8_c100 --rate-limit-rate 0.02 --output result.json
+
+运行中每隔 --progress-interval 秒向标准错误输出一行进度；收到SIGTERM或Ctrl+C时停止等待，
+输出已完成场景和当前场景的部分结果（interrupted为true）后退出
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+# 数据库地址在导入应用配置时读取，必须先设置
+_BENCH_DIR = Path(tempfile.mkdtemp(prefix='gs-bench-'))
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{_BENCH_DIR / 'bench.db'}")
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import init_config  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Task, TaskResult  # noqa: E402
+from app.services import google_sheet_service  # noqa: E402
+from app.services.config_manager import get_config_manager  # noqa: E402
+from app.services.task_manager import task_manager  # noqa: E402
+from app.utils.db_stock_api import StockAPIClient  # noqa: E402
+from benchmarks.fake_sheet import FakeGoogleSheet  # noqa: E402
+from benchmarks.fake_stock_api import FakeStockAPIServer  # noqa: E402
+
+# 与默认配置一致的单元格位置
+PARAMETER_POSITIONS = ['B6', 'B7', 'B9', 'B10', 'B11', 'B12']
+RESULT_POSITIONS = ['I15', 'I16', 'I17', 'I18', 'I19', 'I20', 'I21', 'I22', 'I23']
+# 哨兵模式使用的 (nonce单元格, 哨兵单元格)
+SENTINEL = ('Z1', 'Z2')
+
+# 场景：任务数 × 每个任务的组合数
+SCENARIOS = {
+    f"t{tasks}_c{combos}": {'tasks': tasks, 'combinations': combos}
+    for combos in (100, 10000)
+    for tasks in (1, 8, 32)
+}
+DEFAULT_SCENARIOS = [name for name, spec in SCENARIOS.items() if spec['combinations'] == 100]
+
+FINISHED_STATUSES = ('completed', 'error', 'cancelled')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_parameters(combinations: int) -> List[List[Any]]:
+    """生成组合数为combinations的参数网格（前两个参数展开，其余固定）"""
+    first = 1
+    while first * first < combinations:
+        first += 1
+    second = -(-combinations // first)
+    return [
+        list(range(1, first + 1)),
+        list(range(1, second + 1)),
+        [3], [4], [5], [6]
+    ]
+
+
+class StatementCounter:
+    """统计数据库写入语句数和写入行数"""
+
+    def __init__(self, engine):
+        self.statements = 0
+        self.rows = 0
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    def reset(self):
+        self.statements = 0
+        self.rows = 0
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            self.statements += 1
+            self.rows += len(parameters) if executemany else max(cursor.rowcount, 1)
+
+
+class APILatencyRecorder:
+    """记录StockAPIClient每次请求的客户端耗时"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        original = StockAPIClient._make_request
+        recorder = self
+
+        def timed_request(client, *args, **kwargs):
+            started = time.monotonic()
+            try:
+                return original(client, *args, **kwargs)
+            finally:
+                recorder.latencies.append(time.monotonic() - started)
+
+        StockAPIClient._make_request = timed_request
+
+    def reset(self):
+        self.latencies = []
+
+
+def configure(app, args):
+    """写入压测用的系统配置，并替换外部依赖"""
+    with app.app_context():
+        db.create_all()
+        init_config()
+        get_config_manager().update_configs({
+            'execution_delay_min': 0,
+            'execution_delay_max': 0,
+            'dispatcher_interval': 1,
+            'heartbeat_interval': 15,
+            'pipeline_workers': args.pipeline_workers,
+            'max_tasks_per_spreadsheet': 0
+        })
+
+    google_sheet_service.GoogleSheet = FakeGoogleSheet
+    # 不发送钉钉通知
+    app.notifier.send_message = lambda *a, **kw: None
+
+
+def run_scenario(app, name: str, spec: Dict[str, Any], args, counter: StatementCounter,
+                 api_recorder: APILatencyRecorder) -> Dict[str, Any]:
+    FakeGoogleSheet.reset(
+        result_positions=RESULT_POSITIONS,
+        call_latency=args.sheet_latency,
+        recalc_latency=args.recalc_latency,
+        error_rate=args.sheet_error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+        sentinel=SENTINEL if args.sentinel else None
+    )
+    parameters = build_parameters(spec['combinations'])
+    sentinel_config = {'nonce_cell': SENTINEL[0], 'sentinel_cell': SENTINEL[1]} if args.sentinel else {}
+
+    with app.app_context():
+        get_config_manager().set_config('max_concurrent_tasks', spec['tasks'])
+        task_ids = [
+            task_manager.create_task(f"BENCH{i:03d}", f"benchmark {name}", 'google_sheet', {
+                'spreadsheet_id': f"bench-{name}-{i}",
+                'sheet_name': 'data',
+                'parameters': parameters,
+                **sentinel_config
+            }, submitter='benchmark')
+            for i in range(spec['tasks'])
+        ]
+
+        counter.reset()
+        api_recorder.reset()
+        started = time.monotonic()
+        for task_id in task_ids:
+            task_manager.enqueue_task(task_id)
+
+        deadline = started + args.timeout
+        next_progress = started + args.progress_interval
+        statuses: Dict[str, int] = {}
+        interrupted = False
+        try:
+            while time.monotonic() < deadline:
+                time.sleep(0.5)
+                db.session.expire_all()
+                rows = Task.query.with_entities(Task.status).filter(Task.id.in_(task_ids)).all()
+                statuses = {}
+                for (status,) in rows:
+                    statuses[status] = statuses.get(status, 0) + 1
+                # 结束只读事务，不占用任务执行需要的连接
+                db.session.commit()
+                if sum(statuses.get(status, 0) for status in FINISHED_STATUSES) == len(task_ids):
+                    break
+                if time.monotonic() >= next_progress:
+                    next_progress += args.progress_interval
+                    report_progress(name, started, statuses, task_ids)
+        except KeyboardInterrupt:
+            interrupted = True
+        elapsed = time.monotonic() - started
+        db_statements, db_rows = counter.statements, counter.rows
+
+        for task_id in task_ids:
+            if Task.query.get(task_id).status not in FINISHED_STATUSES:
+                task_manager.cancel_task(task_id)
+
+        combinations = TaskResult.query.filter(TaskResult.task_id.in_(task_ids)).count()
+
+    sheet_latencies = [lat for ws in FakeGoogleSheet.worksheets.values() for lat in ws.latencies]
+    return {
+        'scenario': name,
+        'tasks': spec['tasks'],
+        'combinations_per_task': spec['combinations'],
+        'elapsed_seconds': round(elapsed, 2),
+        'timed_out': elapsed >= args.timeout,
+        'interrupted': interrupted,
+        'task_statuses': statuses,
+        'combinations': combinations,
+        'combinations_per_hour': round(combinations / elapsed * 3600, 1) if elapsed else 0,
+        'db_writes_per_sec': round(db_statements / elapsed, 1) if elapsed else 0,
+        'db_rows_per_sec': round(db_rows / elapsed, 1) if elapsed else 0,
+        'stock_api_p95_ms': round(percentile(api_recorder.latencies, 95) * 1000, 1),
+        'sheet_api_p95_ms': round(percentile(sheet_latencies, 95) * 1000, 1),
+        'sheet_calls_per_combination': round(len(sheet_latencies) / combinations, 1) if combinations else 0,
+        'sheet_errors_injected': sum(ws.errors_injected for ws in FakeGoogleSheet.worksheets.values()),
+        'sheet_rate_limited': sum(ws.rate_limited for ws in FakeGoogleSheet.worksheets.values())
+    }
+
+
+def report_progress(name: str, started: float, statuses: Dict[str, int], task_ids: List[str]):
+    """向标准错误输出当前场景的进度"""
+    combinations = TaskResult.query.filter(TaskResult.task_id.in_(task_ids)).count()
+    db.session.commit()
+    print(json.dumps({
+        'progress': name,
+        'elapsed_seconds': round(time.monotonic() - started, 1),
+        'task_statuses': statuses,
+        'combinations': combinations
+    }, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def _interrupt(signum, frame):
+    """SIGTERM按Ctrl+C处理，由run_scenario输出部分结果"""
+    raise KeyboardInterrupt
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='离线吞吐量基准测试')
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS),
+                        help=f"逗号分隔的场景名或all，可选: {', '.join(SCENARIOS)}")
+    parser.add_argument('--sheet-latency', type=float, default=0.01, help='Sheet每次调用延迟（秒）')
+    parser.add_argument('--recalc-latency', type=float, default=0.05, help='Sheet重新计算延迟（秒）')
+    parser.add_argument('--sheet-error-rate', type=float, default=0.0, help='Sheet调用500错误概率')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Sheet调用429限流概率')
+    parser.add_argument('--api-latency', type=float, default=0.005, help='股票API处理延迟（秒）')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help='股票API 500错误概率')
+    parser.add_argument('--sentinel', action='store_true', help='使用哨兵单元格判断重新计算完成')
+    parser.add_argument('--pipeline-workers', type=int, default=2, help='组合后处理线程数')
+    parser.add_argument('--timeout', type=float, default=1800, help='单个场景最长运行时间（秒）')
+    parser.add_argument('--progress-interval', type=float, default=10, help='进度输出间隔（秒）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='结果JSON输出文件，默认只输出到标准输出')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = list(SCENARIOS) if args.scenarios == 'all' else [n.strip() for n in args.scenarios.split(',') if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"未知场景: {unknown}")
+
+    stock_api = FakeStockAPIServer(latency=args.api_latency, error_rate=args.api_error_rate, seed=args.seed).start()
+    os.environ['STOCK_API_BASE_URL'] = stock_api.base_url
+
+    app = create_app()
+    configure(app, args)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+    api_recorder = APILatencyRecorder()
+    task_manager.start_background_workers(app)
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    results = []
+    try:
+        for name in names:
+            result = run_scenario(app, name, SCENARIOS[name], args, counter, api_recorder)
+            results.append(result)
+            print(json.dumps(result, ensure_ascii=False), file=sys.stderr, flush=True)
+            if result['interrupted']:
+                break
+    finally:
+        stock_api.stop()
+
+    report = {
+        'database': os.environ['DATABASE_URL'],
+        'options': vars(args),
+        'results': results
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    print(output, flush=True)
+
+
+if __name__ == '__main__':
+    main()
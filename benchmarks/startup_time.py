@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+应用冷启动基准测试
+在全新的解释器中导入应用并调用 create_app()，多次测量取中位数，与启动预算比较；
+另用 python -X importtime 运行一次，列出累计耗时最高的顶层导入，并检查应延迟导入的重依赖是否被提前导入。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.startup_time                        # create_app()，预算1.5秒
+    python -m benchmarks.startup_time --target run --runs 5  # 导入run.py（flask命令行和gunicorn加载的入口）
+    python -m benchmarks.startup_time --budget 1.0 --output startup.json
+超出预算或重依赖被提前导入时以非0状态码退出。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# create_app() 冷启动预算（秒）
+DEFAULT_BUDGET_SECONDS = 1.5
+
+# 测量入口：名称 -> 在子进程中执行的代码
+TARGETS = {
+    'create_app': "from app import create_app; create_app()",
+    'run': "import run",
+}
+
+# 只在执行任务时才需要的重依赖，启动阶段不应导入
+# （requests可能被flask_restx依赖的jsonschema间接导入，不在检查范围内）
+LAZY_MODULES = ('gspread', 'google.auth', 'google.oauth2', 'httpx')
+
+TIMED_SNIPPET = """
+import json, sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'lazy_loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def _env(workdir: Path) -> Dict[str, str]:
+    """子进程环境：临时数据库，固定SECRET_KEY避免打印警告，不启用Prometheus多进程目录"""
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f"sqlite:///{workdir / 'startup.db'}")
+    env.setdefault('SECRET_KEY', 'benchmark')
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    return env
+
+
+def measure(code: str, runs: int, env: Dict[str, str]) -> Dict[str, Any]:
+    """在全新的解释器中执行code runs次，返回耗时中位数和提前导入的重依赖"""
+    snippet = TIMED_SNIPPET.format(code=code, lazy=LAZY_MODULES)
+    samples = []
+    lazy_loaded: List[str] = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-c', snippet], cwd=ROOT_DIR, env=env, capture_output=True, text=True, check=True
+        )
+        data = json.loads(completed.stdout.strip().splitlines()[-1])
+        samples.append(data['seconds'])
+        lazy_loaded = data['lazy_loaded']
+    return {
+        'median_seconds': round(statistics.median(samples), 3),
+        'min_seconds': round(min(samples), 3),
+        'max_seconds': round(max(samples), 3),
+        'lazy_loaded': lazy_loaded
+    }
+
+
+def import_breakdown(code: str, env: Dict[str, str], top: int) -> List[Dict[str, Any]]:
+    """
+    用 -X importtime 运行一次，汇总顶层导入的累计耗时
+
+    stderr每行格式为 "import time: self [us] | cumulative | imported package"，
+    包名前的缩进表示嵌套层级，只统计未缩进的顶层导入
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT_DIR, env=env, capture_output=True, text=True,
+        check=True
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, package = line[len('import time:'):].split('|', 2)
+        # 分隔符后固定有一个空格，其余空格为嵌套缩进
+        if package[1:].startswith(' '):
+            continue
+        entries.append({
+            'module': package.strip(),
+            'cumulative_ms': round(int(cumulative_us) / 1000, 1),
+            'self_ms': round(int(self_us) / 1000, 1)
+        })
+    entries.sort(key=lambda entry: entry['cumulative_ms'], reverse=True)
+    return entries[:top]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='应用冷启动基准测试')
+    parser.add_argument('--target', choices=sorted(TARGETS), default='create_app', help='测量的入口')
+    parser.add_argument('--runs', type=int, default=3, help='测量次数，取中位数')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS, help='冷启动预算（秒）')
+    parser.add_argument('--top', type=int, default=15, help='列出累计耗时最高的顶层导入数')
+    parser.add_argument('--output', help='结果JSON输出文件，默认只输出到标准输出')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    code = TARGETS[args.target]
+    with tempfile.TemporaryDirectory(prefix='gs-startup-') as workdir:
+        env = _env(Path(workdir))
+        timing = measure(code, max(args.runs, 1), env)
+        breakdown = import_breakdown(code, env, args.top)
+
+    report = {
+        'target': args.target,
+        'budget_seconds': args.budget,
+        **timing,
+        'within_budget': timing['median_seconds'] <= args.budget,
+        'top_imports': breakdown
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+
+    if timing['lazy_loaded']:
+        print(f"启动阶段导入了应延迟导入的模块: {timing['lazy_loaded']}", file=sys.stderr)
+    if not report['within_budget']:
+        print(f"冷启动 {timing['median_seconds']}秒 超出预算 {args.budget}秒", file=sys.stderr)
+    return 0 if report['within_budget'] and not timing['lazy_loaded'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 # gunicorn.conf.py
 import multiprocessing
+import os
 
 # 绑定地址和端口
 bind = "0.0.0.0:5000"
@@ -7,10 +8,13 @@ bind = "0.0.0.0:5000"
 # 工作进程数，根据CPU核心数计算
 workers = multiprocessing.cpu_count() * 2 + 1
 
-# 工作模式
-worker_class = "sync"
+# 工作模式：/api/events 的SSE长连接只占用一个线程，sync工作进程会被整个占住，必须使用gthread
+worker_class = "gthread"
 
-# 每个工作进程的最大并发连接数
+# 每个工作进程的线程数，即每个进程可同时保持的SSE连接和普通请求数
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# 每个工作进程的最大并发连接数（gthread下包括keep-alive连接）
 worker_connections = 1000
 
 # 请求超时时间（秒）
@@ -37,4 +41,32 @@ proc_name = "google-sheet-validator"
 graceful_timeout = 30
 
 # Keep-Alive时间
-keepalive = 5
\ No newline at end of file
+keepalive = 5
+
+
+def post_worker_init(worker):
+    """worker启动后启动任务队列调度器和心跳看门狗（preload的线程无法跨fork继承）"""
+    from app.services.task_manager import task_manager
+    task_manager.start_background_workers(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    """worker退出前在限定时间内发送队列中剩余的钉钉通知（发送线程是守护线程，不会等待）"""
+    from app.services.notification_dispatcher import notification_dispatcher
+    notification_dispatcher.flush()
+
+
+def on_starting(server):
+    """主进程启动时清空Prometheus多进程指标目录，避免读到上次运行的残留数据"""
+    import os
+    import shutil
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        shutil.rmtree(multiproc_dir, ignore_errors=True)
+        os.makedirs(multiproc_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """worker退出后清理其存活进程指标（running_tasks等livesum仪表）"""
+    from app.utils.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
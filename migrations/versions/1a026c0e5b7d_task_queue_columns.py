@@ -0,0 +1,31 @@
+"""任务队列：优先级、提交者、入队时间和占用的电子表格
+
+Revision ID: 1a026c0e5b7d
+Revises:
+Create Date: 2026-10-19 01:16:42
+
+"""
+import sqlalchemy as sa
+
+from app.utils.schema_migration import add_column, create_index, drop_column, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '1a026c0e5b7d'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('tasks', sa.Column('priority', sa.Integer(), server_default='0'))
+    add_column('tasks', sa.Column('submitter', sa.String(length=100)))
+    add_column('tasks', sa.Column('queued_at', sa.DateTime()))
+    add_column('tasks', sa.Column('spreadsheet_id', sa.String(length=100)))
+    create_index('ix_tasks_status_spreadsheet', 'tasks', ['status', 'spreadsheet_id'])
+
+
+def downgrade():
+    drop_index('ix_tasks_status_spreadsheet', 'tasks')
+    for column in ('spreadsheet_id', 'queued_at', 'submitter', 'priority'):
+        drop_column('tasks', column)
@@ -0,0 +1,30 @@
+"""看门狗：执行器心跳、执行器标识和自动重排队次数
+
+Revision ID: 2b027d4f8c1e
+Revises: 1a026c0e5b7d
+Create Date: 2026-10-19 01:18:55
+
+"""
+import sqlalchemy as sa
+
+from app.utils.schema_migration import add_column, create_index, drop_column, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '2b027d4f8c1e'
+down_revision = '1a026c0e5b7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('tasks', sa.Column('last_heartbeat', sa.DateTime()))
+    add_column('tasks', sa.Column('run_token', sa.String(length=36)))
+    add_column('tasks', sa.Column('restart_count', sa.Integer(), server_default='0'))
+    create_index('ix_tasks_status_heartbeat', 'tasks', ['status', 'last_heartbeat'])
+
+
+def downgrade():
+    drop_index('ix_tasks_status_heartbeat', 'tasks')
+    for column in ('restart_count', 'run_token', 'last_heartbeat'):
+        drop_column('tasks', column)
@@ -0,0 +1,25 @@
+"""增量轮询：日志和结果的游标索引
+
+Revision ID: 3c030a9e2d4b
+Revises: 2b027d4f8c1e
+Create Date: 2026-10-19 01:26:54
+
+"""
+from app.utils.schema_migration import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '3c030a9e2d4b'
+down_revision = '2b027d4f8c1e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index('ix_task_logs_task_id_id', 'task_logs', ['task_id', 'id'])
+    create_index('ix_task_results_task_id_step', 'task_results', ['task_id', 'step_index'])
+
+
+def downgrade():
+    drop_index('ix_task_results_task_id_step', 'task_results')
+    drop_index('ix_task_logs_task_id_id', 'task_logs')
@@ -0,0 +1,25 @@
+"""参数组合耗时分解：task_results.timing
+
+Revision ID: 4d033b6f1a8c
+Revises: 3c030a9e2d4b
+Create Date: 2026-10-19 01:33:27
+
+"""
+import sqlalchemy as sa
+
+from app.utils.schema_migration import add_column, drop_column
+
+
+# revision identifiers, used by Alembic.
+revision = '4d033b6f1a8c'
+down_revision = '3c030a9e2d4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('task_results', sa.Column('timing', sa.Text()))
+
+
+def downgrade():
+    drop_column('task_results', 'timing')
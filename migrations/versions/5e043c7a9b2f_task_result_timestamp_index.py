@@ -0,0 +1,23 @@
+"""仪表盘吞吐统计：task_results.timestamp 索引
+
+Revision ID: 5e043c7a9b2f
+Revises: 4d033b6f1a8c
+Create Date: 2026-10-19 01:51:27
+
+"""
+from app.utils.schema_migration import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '5e043c7a9b2f'
+down_revision = '4d033b6f1a8c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index('ix_task_results_timestamp', 'task_results', ['timestamp'])
+
+
+def downgrade():
+    drop_index('ix_task_results_timestamp', 'task_results')
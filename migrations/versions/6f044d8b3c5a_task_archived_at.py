@@ -0,0 +1,25 @@
+"""日志与结果归档：tasks.archived_at
+
+Revision ID: 6f044d8b3c5a
+Revises: 5e043c7a9b2f
+Create Date: 2026-10-19 01:52:50
+
+"""
+import sqlalchemy as sa
+
+from app.utils.schema_migration import add_column, drop_column
+
+
+# revision identifiers, used by Alembic.
+revision = '6f044d8b3c5a'
+down_revision = '5e043c7a9b2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    add_column('tasks', sa.Column('archived_at', sa.DateTime()))
+
+
+def downgrade():
+    drop_column('tasks', 'archived_at')
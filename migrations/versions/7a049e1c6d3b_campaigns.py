@@ -0,0 +1,51 @@
+"""批量任务：campaigns表和tasks.campaign_id
+
+Revision ID: 7a049e1c6d3b
+Revises: 6f044d8b3c5a
+Create Date: 2026-10-19 02:05:20
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.utils.schema_migration import (
+    add_column, create_index, drop_column, drop_index, has_table, is_sqlite
+)
+
+
+# revision identifiers, used by Alembic.
+revision = '7a049e1c6d3b'
+down_revision = '6f044d8b3c5a'
+branch_labels = None
+depends_on = None
+
+CAMPAIGN_FK = 'fk_tasks_campaign_id_campaigns'
+
+
+def upgrade():
+    if not has_table('campaigns'):
+        op.create_table(
+            'campaigns',
+            sa.Column('id', sa.String(length=36), primary_key=True),
+            sa.Column('name', sa.String(length=255), nullable=False),
+            sa.Column('description', sa.Text()),
+            sa.Column('config', sa.Text()),
+            sa.Column('stock_nos', sa.Text()),
+            sa.Column('priority', sa.Integer(), server_default='0'),
+            sa.Column('submitter', sa.String(length=100)),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('updated_at', sa.DateTime())
+        )
+    if add_column('tasks', sa.Column('campaign_id', sa.String(length=36))) and not is_sqlite():
+        # SQLite不支持ALTER TABLE添加外键约束，只添加列
+        op.create_foreign_key(CAMPAIGN_FK, 'tasks', 'campaigns', ['campaign_id'], ['id'])
+    create_index('ix_tasks_campaign_id', 'tasks', ['campaign_id'])
+
+
+def downgrade():
+    drop_index('ix_tasks_campaign_id', 'tasks')
+    if not is_sqlite():
+        op.execute(f"ALTER TABLE tasks DROP CONSTRAINT IF EXISTS {CAMPAIGN_FK}")
+    drop_column('tasks', 'campaign_id')
+    if has_table('campaigns'):
+        op.drop_table('campaigns')
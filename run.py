@@ -4,6 +4,9 @@
 """
 import os
 from datetime import datetime
+
+import click
+
 from app import create_app
 from app.extensions import db
 from app.models import Task, TaskLog, TaskResult, SystemConfig
@@ -24,7 +27,8 @@ def make_shell_context():
 @app.cli.command()
 def init_db():
     """初始化数据库"""
-    db.create_all()
+    from app.services.persistence import get_persistence_backend
+    get_persistence_backend().create_schema()
     print("数据库初始化完成")
 
 @app.cli.command()
@@ -33,8 +37,35 @@ def init_config():
     init_config2()
     print("默认配置初始化完成")
 
+@app.cli.command('archive-tasks')
+@click.option('--days', type=int, default=None, help='保留天数，默认读取系统配置archive_retention_days')
+@click.option('--limit', type=int, default=1000, help='本次最多归档的任务数')
+def archive_tasks(days, limit):
+    """归档结束超过保留天数的任务日志和结果"""
+    from app.services.task_archive import task_archiver
+    archived = task_archiver.archive_expired(retention_days=days, limit=limit)
+    print(f"归档完成，共 {archived} 个任务")
+
+@app.cli.command('restore-task')
+@click.argument('task_id')
+def restore_task(task_id):
+    """把已归档任务的日志和结果写回数据库"""
+    from app.services.task_archive import restore_task as restore
+    print("还原完成" if restore(task_id) else "任务未归档或归档文件不存在")
+
+@app.cli.command('pg-upgrade')
+def pg_upgrade():
+    """把已有PostgreSQL库的task_logs转为分区表，并为task_results建立 (task_id, step_index) 唯一索引"""
+    from app.services.persistence import PostgresBackend, get_persistence_backend
+    backend = get_persistence_backend()
+    if not isinstance(backend, PostgresBackend):
+        print("当前数据库不是PostgreSQL，无需升级")
+        return
+    summary = backend.upgrade_schema()
+    print(f"升级完成: {summary}")
+
 def check_and_cleanup_dead_tasks():
-    """启动时检查并清理挂死的任务"""
+    """启动时检查中断的任务，自动重新排队并从断点继续"""
     from app.services.task_manager import task_manager
     from app.utils.logger import get_logger
     
@@ -42,38 +73,12 @@ def check_and_cleanup_dead_tasks():
     
     with app.app_context():
         try:
-            # 获取所有运行状态的任务
-            running_tasks = Task.query.filter_by(status='running').all()
-            
-            if not running_tasks:
-                logger.info("没有发现运行中的任务")
-                return
-            
-            logger.info(f"发现 {len(running_tasks)} 个运行中的任务，开始检查状态")
-            
-            for task in running_tasks:
-                status_check = task_manager.check_local_task_status(task.id)
-                
-                if status_check.get("can_restart", False):
-                    logger.info(f"发现中断的任务: {task.id} - {status_check.get('restart_reason')}")
-                    
-                    # 重置任务状态为pending，允许用户重新启动
-                    task.status = 'pending'
-                    task.error_message = None  # 清除之前的错误信息
-                    task.end_time = None  # 清除结束时间
-                    
-                    # 添加日志
-                    task_manager._add_task_log(
-                        task.id, 
-                        'info', 
-                        f"应用重启时检测到任务中断，已重置为待启动状态: {status_check.get('restart_reason')}"
-                    )
-                    
-                    logger.info(f"已将任务 {task.id} 重置为pending状态，用户可选择重新启动")
-                else:
-                    logger.info(f"任务 {task.id} 状态正常")
-            
-            db.session.commit()
+            # 单进程启动时没有任何执行线程，所有运行中任务都已中断，由看门狗统一接管
+            recovered = task_manager.watchdog.recover_orphaned_tasks()
+            if recovered:
+                logger.info(f"发现 {recovered} 个中断的任务，已重新加入队列")
+            else:
+                logger.info("没有发现中断的任务")
             logger.info("任务状态检查完成")
             
         except Exception as e:
@@ -89,12 +94,17 @@ if __name__ == '__main__':
 
     # 初始化数据库
     with app.app_context():
-        db.create_all()
+        from app.services.persistence import get_persistence_backend
+        get_persistence_backend().create_schema()
         init_config2()
 
     # 检查并清理挂死的任务
     check_and_cleanup_dead_tasks()
 
+    # 启动任务队列调度器和心跳看门狗，继续执行上次遗留的排队任务
+    from app.services.task_manager import task_manager
+    task_manager.start_background_workers(app)
+
     # 运行应用
     debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() in ('true', '1', 'yes', 'on')
     app.run(debug=debug_mode, host='127.0.0.1', port=5000)
@@ -0,0 +1,72 @@
+"""
+测试公共夹具：每个测试使用独立的临时SQLite数据库，系统配置直接写入配置管理器缓存
+"""
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+import pytest
+
+# 配置类在导入时读取DATABASE_URL，必须先于app导入设置
+_DB_DIR = tempfile.mkdtemp(prefix='gsv-tests-')
+os.environ['DATABASE_URL'] = f"sqlite:///{_DB_DIR}/test.db"
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Task  # noqa: E402
+from app.services.config_manager import get_config_manager  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def app_ctx(app):
+    """建表并进入应用上下文，测试结束后删表"""
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def set_config(app_ctx):
+    """设置系统配置（只写缓存，不落库）"""
+    manager = get_config_manager()
+    manager._cache.clear()
+    # 缓存非空时配置管理器不再整体加载数据库配置
+    manager._cache['_tests'] = True
+
+    def setter(**values):
+        manager._cache.update(values)
+
+    yield setter
+    manager._cache.clear()
+
+
+@pytest.fixture
+def make_task(app_ctx):
+    """直接插入任务行"""
+    def factory(name='600000', status='queued', config=None, **fields):
+        task = Task(
+            id=str(uuid.uuid4()),
+            name=name,
+            task_type='google_sheet',
+            status=status,
+            config=json.dumps(config if config is not None else {'parameters': [[1, 2]]}),
+            queued_at=fields.pop('queued_at', datetime.now()),
+            **fields
+        )
+        db.session.add(task)
+        db.session.commit()
+        return task.id
+
+    return factory
@@ -0,0 +1,65 @@
+"""
+批量任务：一次批量插入排队任务，任务只保存覆盖项，展示时合并共享配置；同一工作表同时只运行一只股票
+"""
+import json
+
+import pytest
+
+from app.models import Task, TaskLog, db
+from app.services import campaign_service
+from app.services.task_manager import TaskManager
+
+GRID = {'spreadsheet_id': 'S', 'sheet_name': 'W', 'parameters': [[1, 2], [3]]}
+
+
+def test_create_campaign_inserts_queued_tasks(set_config):
+    created = campaign_service.create_campaign('grid', ['600000', ' 600001', '600000', None], GRID, priority=2,
+                                               submitter='alice')
+
+    assert list(created['tasks']) == ['600000', '600001']
+    tasks = Task.query.filter_by(campaign_id=created['campaign_id']).all()
+    assert {task.status for task in tasks} == {'queued'}
+    assert {task.priority for task in tasks} == {2}
+    assert {task.config for task in tasks} == {'{}'}
+    assert TaskLog.query.filter(TaskLog.task_id.in_(created['tasks'].values())).count() == 2
+
+    detail = campaign_service.get_campaign(created['campaign_id'])
+    assert detail['status_counts'] == {'queued': 2}
+    assert detail['config'] == dict(GRID, spreadsheet_concurrency=1)
+
+
+def test_task_dict_shows_campaign_config(set_config):
+    created = campaign_service.create_campaign('grid', ['600000'], GRID)
+    task = Task.query.get(created['tasks']['600000'])
+    task.config = json.dumps({'sheet_name': 'override'})
+
+    config = task.to_dict()['config']
+
+    assert config['spreadsheet_id'] == 'S'
+    assert config['parameters'] == [[1, 2], [3]]
+    assert config['sheet_name'] == 'override'
+
+
+def test_create_campaign_validates_input(set_config):
+    set_config(campaign_max_stocks=1)
+    with pytest.raises(ValueError):
+        campaign_service.create_campaign('grid', [], GRID)
+    with pytest.raises(ValueError):
+        campaign_service.create_campaign('grid', ['600000', '600001'], GRID)
+    with pytest.raises(ValueError):
+        campaign_service.create_campaign('grid', ['600000'], {'spreadsheet_id': 'S'})
+
+
+def test_campaign_stocks_never_share_a_sheet_concurrently(set_config, monkeypatch):
+    monkeypatch.setattr(TaskManager, '_execute_google_sheet_task', lambda self, task_id, app: None)
+    set_config(max_concurrent_tasks=10, max_tasks_per_spreadsheet=0)
+    created = campaign_service.create_campaign('grid', ['600000', '600001'], GRID)
+    manager = TaskManager()
+
+    assert manager._dispatch_once() == 1
+    assert manager._dispatch_once() == 0
+
+    running = Task.query.filter_by(campaign_id=created['campaign_id'], status='running').one()
+    running.status = 'completed'
+    db.session.commit()
+    assert manager._dispatch_once() == 1
@@ -0,0 +1,99 @@
+"""
+熔断器状态机，以及空单元格不计为依赖故障
+"""
+import time
+
+import pytest
+
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.services.google_sheet_client import GoogleSheet, sheets_breaker
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def _fail(breaker, error=None):
+    with pytest.raises(ConnectionError):
+        with breaker.guard():
+            raise error or ConnectionError("connection reset")
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker('test', failure_threshold=2, window=60, reset_timeout=60)
+    _fail(breaker)
+    assert breaker.snapshot()['state'] == CLOSED
+    _fail(breaker)
+    assert breaker.snapshot()['state'] == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            pass
+    assert breaker.snapshot()['rejected'] == 1
+
+
+def test_sporadic_failures_below_rate_keep_closed():
+    breaker = CircuitBreaker('test', failure_threshold=2, window=60, reset_timeout=60, failure_rate=0.5)
+    for _ in range(3):
+        with breaker.guard():
+            pass
+    _fail(breaker)
+    _fail(breaker)
+    assert breaker.snapshot()['state'] == CLOSED
+
+    # 3次失败/6次调用达到一半
+    _fail(breaker)
+    assert breaker.snapshot()['state'] == OPEN
+
+
+def test_half_open_probe_failure_doubles_cooldown():
+    breaker = CircuitBreaker('test', failure_threshold=1, window=60, reset_timeout=0.05)
+    _fail(breaker)
+    time.sleep(0.06)
+
+    _fail(breaker)
+    snapshot = breaker.snapshot()
+    assert snapshot['state'] == OPEN
+    assert snapshot['reset_timeout'] == pytest.approx(0.1)
+
+
+def test_half_open_allows_single_probe_then_closes():
+    breaker = CircuitBreaker('test', failure_threshold=1, window=60, reset_timeout=0.05)
+    _fail(breaker)
+    time.sleep(0.06)
+
+    with breaker.guard():
+        assert breaker.snapshot()['state'] == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            with breaker.guard():
+                pass
+    snapshot = breaker.snapshot()
+    assert snapshot['state'] == CLOSED
+    assert snapshot['reset_timeout'] == 0.05
+
+
+def test_permanent_errors_are_not_counted():
+    breaker = CircuitBreaker('test', failure_threshold=1, window=60, reset_timeout=60)
+    with pytest.raises(ValueError):
+        with breaker.guard():
+            raise ValueError("bad request")
+    assert breaker.snapshot()['state'] == CLOSED
+
+
+class _EmptyWorksheet:
+    """空单元格：接口不返回任何行"""
+
+    def get(self, cell_ref):
+        return []
+
+    def batch_get(self, ranges):
+        return [[] for _ in ranges]
+
+
+def test_empty_cell_is_a_value_not_a_failure():
+    sheet = GoogleSheet.__new__(GoogleSheet)
+    sheet.worksheet = _EmptyWorksheet()
+    sheets_breaker.reset()
+
+    assert sheet.get_cell('A1') == ""
+    assert sheet.get_cells_batch(['A1', 'B2']) == {'A1': "", 'B2': ""}
+    snapshot = sheets_breaker.snapshot()
+    assert snapshot['state'] == CLOSED
+    assert snapshot['recent_failures'] == 0
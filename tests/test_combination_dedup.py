@@ -0,0 +1,128 @@
+"""
+参数组合去重：只在同一股票的任务之间共享，等待者拿到计算方读到的原始单元格值，按自己的结果规则和校验处理
+"""
+import threading
+import time
+
+import pytest
+
+from app.exceptions.combinationRejected import CombinationRejected
+from app.services.combination_dedup import build_dedup_key, inflight_combinations
+from app.services.combination_timing import CombinationTiming
+from app.services.google_sheet_service import GoogleSheetService
+from app.utils.result_rules import compile_result_rules
+
+PARAM_CELLS = {'B6': 1, 'B7': 2, 'B9': 3, 'B10': 4, 'B11': 5, 'B12': 6}
+RESULT_POSITIONS = ['I15', 'I16', 'I17', 'I18', 'I19', 'I20', 'I21', 'I22', 'I23']
+STOCK = '600000'
+CONFIG = {'spreadsheet_id': 'S', 'sheet_name': 'W', 'parameter_positions': list(PARAM_CELLS)}
+
+
+def _service(rules=None):
+    service = GoogleSheetService({}, 'task', app=None)
+    service.result_rules = compile_result_rules(rules)
+    service._log = lambda *args, **kwargs: None
+    service.stock_no = STOCK
+    return service
+
+
+def _share(owner, waiter, result_values):
+    """owner登记组合并读到result_values，waiter在另一个线程等待共享结果；返回 (owner结果, waiter结果或异常)"""
+    combination = list(PARAM_CELLS.values())
+    key = build_dedup_key(CONFIG, combination, STOCK)
+    future, is_owner = inflight_combinations.acquire(key)
+    assert is_owner
+
+    waited = {}
+
+    def wait():
+        try:
+            waited['outcome'] = waiter._execute_deduplicated(combination, CONFIG, CombinationTiming())
+        except Exception as e:
+            waited['outcome'] = e
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    time.sleep(0.05)
+
+    owner._shared_values = None
+    try:
+        owner_outcome = owner._collect_results(dict(PARAM_CELLS), result_values, RESULT_POSITIONS)
+    except CombinationRejected as e:
+        owner_outcome = e
+        owner._publish_shared(key, future, e)
+    else:
+        owner._publish_shared(key, future)
+    thread.join(5)
+    return owner_outcome, waited['outcome']
+
+
+def _values(**overrides):
+    values = {cell: '0.3' for cell in RESULT_POSITIONS}
+    values.update(overrides)
+    return values
+
+
+def test_owner_rejection_is_not_shared(set_config):
+    owner = _service({'annualized_rate': {'min': 0.5}})
+    waiter = _service()
+
+    owner_outcome, waiter_outcome = _share(owner, waiter, _values())
+
+    assert isinstance(owner_outcome, CombinationRejected)
+    success, result = waiter_outcome
+    assert success
+    assert result['I16'] == 0.3
+
+
+def test_waiter_applies_its_own_rules(set_config):
+    owner = _service()
+    waiter = _service({'annualized_rate': {'max': 0.1}})
+
+    owner_outcome, waiter_outcome = _share(owner, waiter, _values())
+
+    assert owner_outcome[0]
+    assert isinstance(waiter_outcome, CombinationRejected)
+
+
+def test_waiter_applies_its_own_allow_zero(set_config):
+    owner = _service({'fee_total': {'allow_zero': True}})
+    waiter = _service()
+
+    owner_outcome, waiter_outcome = _share(owner, waiter, _values(I21='0'))
+
+    assert owner_outcome[0]
+    assert waiter_outcome == (False, {})
+
+
+def test_waiter_computes_itself_without_values(set_config, monkeypatch):
+    owner = _service()
+    waiter = _service()
+    computed = []
+    monkeypatch.setattr(waiter, '_execute_parameter_combination',
+                        lambda combination, config_data, timing=None: computed.append(combination) or (False, {}))
+
+    combination = list(PARAM_CELLS.values())
+    key = build_dedup_key(CONFIG, combination, STOCK)
+    future, _ = inflight_combinations.acquire(key)
+    owner._shared_values = None
+    owner._publish_shared(key, future)
+
+    with pytest.raises(RuntimeError):
+        future.result()
+    assert waiter._execute_deduplicated(combination, CONFIG, CombinationTiming()) == (False, {})
+    assert computed == [combination]
+
+
+def test_key_includes_stock_and_cell_layout():
+    combination = [1, 2]
+    base = build_dedup_key(CONFIG, combination, STOCK)
+
+    assert build_dedup_key(dict(CONFIG), combination, STOCK) == base
+    assert build_dedup_key(CONFIG, combination, '600001') != base
+    assert build_dedup_key(dict(CONFIG, parameter_positions=['B7', 'B6']), combination, STOCK) != base
+    assert build_dedup_key(dict(CONFIG, result_positions=['I15']), combination, STOCK) != base
+    assert build_dedup_key(dict(CONFIG, sentinel_cell='Z1', nonce_cell='Z2'), combination, STOCK) != base
+    assert build_dedup_key(dict(CONFIG, spreadsheet_id='T'), combination, STOCK) != base
+    assert build_dedup_key(dict(CONFIG, spreadsheet_id='T', model_key='S/W'), combination,
+                           STOCK) == build_dedup_key(dict(CONFIG, model_key='S/W'), combination, STOCK)
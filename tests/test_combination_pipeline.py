@@ -0,0 +1,143 @@
+"""
+参数组合流水线：上游推送按提交顺序执行，断点只推进到最早的未完成后处理
+"""
+import threading
+import time
+
+import pytest
+
+from app.models import Task, TaskResult
+from app.services.combination_pipeline import (
+    CombinationPipeline, PipelineAborted, PipelineStageError, PipelineStats, pipeline_turn
+)
+from app.services.google_sheet_service import GoogleSheetService
+
+
+def test_turns_follow_submission_order(app):
+    pipeline = CombinationPipeline(app, workers=3, max_pending=3)
+    order = []
+
+    def finalize(step_index, delay):
+        time.sleep(delay)
+        with pipeline_turn():
+            order.append(step_index)
+
+    try:
+        for step_index, delay in enumerate((0.2, 0.1, 0.0)):
+            pipeline.submit(step_index, finalize, step_index, delay)
+        pipeline.drain()
+    finally:
+        pipeline.shutdown()
+
+    assert order == [0, 1, 2]
+
+
+def test_failed_turn_aborts_later_turns(app):
+    pipeline = CombinationPipeline(app, workers=2, max_pending=2)
+    entered = []
+
+    def finalize(step_index):
+        if step_index == 0:
+            time.sleep(0.1)
+        with pipeline_turn():
+            entered.append(step_index)
+            if step_index == 0:
+                raise RuntimeError("上游推送失败")
+
+    try:
+        pipeline.submit(0, finalize, 0)
+        pipeline.submit(1, finalize, 1)
+        with pytest.raises(PipelineStageError) as exc_info:
+            pipeline.drain()
+    finally:
+        pipeline.shutdown()
+
+    assert exc_info.value.step_index == 0
+    assert entered == [0]
+
+
+def test_turn_outside_pipeline_runs_directly():
+    with pipeline_turn():
+        pass
+    assert issubclass(PipelineAborted, Exception)
+
+
+def test_low_water_is_earliest_unfinished_step(app):
+    pipeline = CombinationPipeline(app, workers=2, max_pending=2)
+    release = threading.Event()
+    try:
+        pipeline.submit(3, release.wait, 5)
+        pipeline.submit(4, lambda: None)
+        time.sleep(0.05)
+        assert pipeline.low_water(5) == 3
+        assert pipeline.low_water(2) == 2
+        release.set()
+        pipeline.drain()
+        assert pipeline.low_water(5) == 5
+    finally:
+        release.set()
+        pipeline.shutdown()
+
+
+def test_checkpoint_waits_for_unfinished_finalize(app_ctx, make_task, monkeypatch):
+    """第0个组合推送未完成时，执行到第2个组合的断点仍停在第0个组合"""
+    task_id = make_task(status='running')
+    task = Task.query.get(task_id)
+    service = GoogleSheetService({}, task_id, app=app_ctx)
+    service.pipeline_stats = PipelineStats()
+    release = threading.Event()
+    checkpoints = {}
+    posted = []
+
+    def execute(combination, config_data, timing):
+        step_index = combination[0]
+        checkpoints[step_index] = task.current_step
+        if step_index == 2:
+            release.set()
+        return True, {'I16': step_index}
+
+    def send(payload, log):
+        if payload['step'] == 0:
+            release.wait(5)
+        posted.append(payload['step'])
+
+    monkeypatch.setattr(service, '_execute_deduplicated', execute)
+    monkeypatch.setattr(service, '_build_param_load', lambda name, step_index, result: {'step': step_index})
+    monkeypatch.setattr(service, 'send_stock_template_param_data', send)
+    monkeypatch.setattr(service, '_save_task_result', lambda *args, **kwargs: None)
+    monkeypatch.setattr(service, '_log', lambda *args, **kwargs: None)
+
+    pipeline = CombinationPipeline(app_ctx, workers=2, max_pending=2, stats=service.pipeline_stats)
+    try:
+        _, _, status = service._run_combinations(task, '600000', [[0, 1, 2, 3]], {}, 0, 4, pipeline)
+    finally:
+        pipeline.shutdown()
+
+    assert status == 'completed'
+    assert checkpoints[0] == 1
+    assert checkpoints[2] == 1
+    assert posted == [0, 1, 2, 3]
+    assert task.current_step == 4
+
+
+def test_failed_upstream_post_is_not_duplicated_on_resume(app_ctx, make_task, monkeypatch):
+    """推送失败时仍保存结果，恢复后重新执行同一组合时覆盖该结果而不是再插入一行"""
+    task_id = make_task(status='running')
+    service = GoogleSheetService({}, task_id, app=app_ctx)
+    service.pipeline_stats = PipelineStats()
+    monkeypatch.setattr(service, '_log', lambda *args, **kwargs: None)
+    monkeypatch.setattr(service, '_push_event', lambda *args, **kwargs: None)
+
+    def fail(payload, log):
+        raise ConnectionError("上游推送失败")
+
+    monkeypatch.setattr(service, 'send_stock_template_param_data', fail)
+    with pytest.raises(ConnectionError):
+        service._finalize_combination(0, [1, 2], {'I16': 1}, True, {})
+
+    monkeypatch.setattr(service, 'send_stock_template_param_data', lambda payload, log: 1)
+    service._finalize_combination(0, [1, 2], {'I16': 2}, True, {})
+
+    results = TaskResult.query.filter_by(task_id=task_id, step_index=0).all()
+    assert len(results) == 1
+    assert '2' in results[0].result
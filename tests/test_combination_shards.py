@@ -0,0 +1,60 @@
+"""
+分片执行：窃取和放回后断点只推进到最小的未完成组合；恢复时从断点开始并跳过已有成功结果的组合
+"""
+from app.models import Task, TaskResult, db
+from app.services.combination_shards import ShardQueue
+from app.services.google_sheet_service import GoogleSheetService
+
+
+def test_steal_takes_the_tail_of_the_largest_shard():
+    shards = ShardQueue(range(8), ['a', 'b'])
+    taken = [shards.next(1) for _ in range(4)]
+    assert taken == [4, 5, 6, 7]
+
+    # 分片b为空，从a的尾部拿走一半
+    assert shards.next(1) == 2
+    assert shards.snapshot()[1]['stolen'] == 2
+
+
+def test_low_water_follows_released_and_inflight_combinations():
+    shards = ShardQueue(range(4), ['a', 'b'])
+    first = shards.next(0)
+    second = shards.next(1)
+    assert (first, second) == (0, 2)
+
+    shards.complete(1, second, 0.1)
+    assert shards.low_water() == 0
+    shards.release(0, first)
+    assert shards.low_water() == 0
+    assert shards.next(0) == 0
+    shards.complete(0, 0, 0.1)
+    assert shards.low_water() == 1
+
+    for shard in (0, 1):
+        while (index := shards.next(shard)) is not None:
+            shards.complete(shard, index, 0.1)
+    assert shards.low_water() is None
+    assert shards.remaining() == 0
+    assert shards.failed() == 1
+
+
+def test_prepare_shards_resumes_from_checkpoint(make_task):
+    task_id = make_task(status='running', current_step=3)
+    for step, success in ((3, True), (4, False), (5, True), (1, True)):
+        db.session.add(TaskResult(task_id=task_id, step_index=step, success=success))
+    db.session.commit()
+    service = GoogleSheetService({}, task_id)
+    service._log = lambda *args, **kwargs: None
+
+    shards, success_count = service._prepare_shards(Task.query.get(task_id), 6, 8, [{'label': 'a'}, {'label': 'b'}])
+
+    # 断点为第3步（序号2），其后已成功的3和5跳过，失败的4重新执行
+    assert success_count == 4
+    assert shards.remaining() == 4
+    assert shards.low_water() == 2
+    executed = []
+    for shard in (0, 1):
+        while (index := shards.next(shard)) is not None:
+            executed.append(index)
+            shards.complete(shard, index, 0)
+    assert sorted(executed) == [2, 4, 6, 7]
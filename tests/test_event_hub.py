@@ -0,0 +1,121 @@
+"""
+任务事件中心：与上一轮比较，状态变化推送status、只有步数变化推送progress、消失的任务推送deleted；
+订阅者缓冲区内同一任务只保留最新一条；单线程工作进程拒绝事件流，页面退回定时轮询
+"""
+from datetime import datetime, timedelta
+
+from app.models import Task, TaskLog, db
+from app.services.event_hub import EventHub, Subscription
+
+
+def _types(events):
+    return sorted((event['type'], event['task_id']) for event in events)
+
+
+def _update(task_id, **fields):
+    Task.query.filter_by(id=task_id).update(fields)
+    db.session.commit()
+
+
+def test_first_poll_reports_active_and_recently_changed_tasks(app_ctx, make_task):
+    running = make_task(status='running', current_step=1, total_steps=10)
+    old = make_task(status='completed')
+    _update(old, updated_at=datetime.now() - timedelta(hours=1))
+    hub = EventHub()
+    subscription = Subscription()
+
+    hub.poll([subscription])
+
+    assert _types(subscription.drain(0)) == [('status', running)]
+
+
+def test_step_changes_are_progress_and_status_changes_are_status(app_ctx, make_task):
+    task_id = make_task(status='running', current_step=1, total_steps=10)
+    hub = EventHub()
+    subscription = Subscription()
+    hub.poll([subscription])
+    subscription.drain(0)
+
+    hub.poll([subscription])
+    assert subscription.drain(0) == []
+
+    _update(task_id, current_step=2)
+    hub.poll([subscription])
+    events = subscription.drain(0)
+    assert _types(events) == [('progress', task_id)]
+    assert events[0]['data']['current_step'] == 2
+    assert events[0]['id'] == hub.last_poll_at.isoformat()
+
+    _update(task_id, status='completed', current_step=10, end_time=datetime.now())
+    hub.poll([subscription])
+    events = subscription.drain(0)
+    assert _types(events) == [('status', task_id)]
+    assert events[0]['data']['status'] == 'completed'
+
+
+def test_deleted_tasks_are_reported_once(app_ctx, make_task):
+    kept = make_task(status='running')
+    removed = make_task(status='running')
+    hub = EventHub()
+    subscription = Subscription()
+    hub.poll([subscription])
+    subscription.drain(0)
+
+    Task.query.filter_by(id=removed).delete()
+    db.session.commit()
+    hub.poll([subscription])
+    assert _types(subscription.drain(0)) == [('deleted', removed)]
+
+    hub.poll([subscription])
+    assert subscription.drain(0) == []
+    assert hub._known_ids == {kept}
+
+
+def test_subscribers_only_receive_their_tasks(app_ctx, make_task):
+    first = make_task(status='running')
+    second = make_task(status='running')
+    hub = EventHub()
+    everything = Subscription()
+    only_first = Subscription({first})
+
+    hub.poll([everything, only_first])
+
+    assert _types(everything.drain(0)) == sorted([('status', first), ('status', second)])
+    assert _types(only_first.drain(0)) == [('status', first)]
+
+
+def test_logs_start_after_the_first_poll(app_ctx, make_task):
+    task_id = make_task(status='running')
+    db.session.add(TaskLog(task_id=task_id, level='info', message='before'))
+    db.session.commit()
+    hub = EventHub()
+    subscription = Subscription(include_logs=True)
+    hub.poll([subscription])
+    subscription.drain(0)
+
+    db.session.add(TaskLog(task_id=task_id, level='info', message='after'))
+    db.session.commit()
+    hub.poll([subscription])
+
+    logs = [event for event in subscription.drain(0) if event['type'] == 'log']
+    assert [event['data']['message'] for event in logs] == ['after']
+
+
+def test_unsent_events_keep_only_the_latest_per_task():
+    subscription = Subscription()
+    for step in (1, 2, 3):
+        subscription.publish({'type': 'progress', 'task_id': 't1', 'data': {'current_step': step}})
+    subscription.publish({'type': 'status', 'task_id': 't1', 'data': {'status': 'running'}})
+
+    events = subscription.drain(0)
+
+    assert [(event['type'], event['data']) for event in events] == [
+        ('progress', {'current_step': 3}), ('status', {'status': 'running'})
+    ]
+
+
+def test_event_stream_is_refused_on_single_threaded_workers(app_ctx):
+    response = app_ctx.test_client().get('/api/events', environ_overrides={'wsgi.multithread': False})
+
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'error'
@@ -0,0 +1,41 @@
+"""
+Google Sheet客户端：代理设置在各自连接的会话上，不修改进程环境变量
+"""
+import os
+
+import gspread
+from google.oauth2.credentials import Credentials
+
+from app.services.google_sheet_client import GoogleSheet
+
+
+class _FakeSpreadsheet:
+    def worksheet(self, name):
+        return object()
+
+
+def _open(monkeypatch, proxy_url):
+    monkeypatch.setattr(Credentials, 'from_authorized_user_file',
+                        classmethod(lambda cls, *args, **kwargs: Credentials(token='token')))
+    monkeypatch.setattr(gspread.Client, 'open_by_key', lambda self, key: _FakeSpreadsheet())
+    return GoogleSheet('spreadsheet', 'sheet', proxy_url=proxy_url)
+
+
+def test_proxy_is_set_per_session(monkeypatch):
+    monkeypatch.delenv('HTTP_PROXY', raising=False)
+    monkeypatch.delenv('HTTPS_PROXY', raising=False)
+
+    first = _open(monkeypatch, 'http://proxy-a:7890')
+    second = _open(monkeypatch, 'http://proxy-b:7890')
+    direct = _open(monkeypatch, None)
+
+    assert first._session().proxies['https'] == 'http://proxy-a:7890'
+    assert first._session()._auth_request.session.proxies['https'] == 'http://proxy-a:7890'
+    assert second._session().proxies['https'] == 'http://proxy-b:7890'
+    assert not direct._session().proxies
+    assert 'HTTP_PROXY' not in os.environ and 'HTTPS_PROXY' not in os.environ
+
+    first.close()
+    assert second._session().proxies['https'] == 'http://proxy-b:7890'
+    second.close()
+    direct.close()
@@ -0,0 +1,87 @@
+"""
+数据库迁移：从基线结构升级后补齐各需求新增的列、索引和表；对create_all建立的最新结构重复执行不报错
+"""
+import os
+
+import pytest
+import sqlalchemy as sa
+from flask_migrate import downgrade, upgrade
+
+from app.extensions import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+# 引入迁移之前的表结构
+BASELINE_DDL = [
+    """CREATE TABLE tasks (
+        id VARCHAR(36) PRIMARY KEY, name VARCHAR(255) NOT NULL, description TEXT, status VARCHAR(20),
+        task_type VARCHAR(50), config TEXT, start_time DATETIME, end_time DATETIME, current_step INTEGER,
+        total_steps INTEGER, error_message TEXT, created_at DATETIME, updated_at DATETIME)""",
+    """CREATE TABLE task_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, task_id VARCHAR(36) NOT NULL REFERENCES tasks (id),
+        level VARCHAR(20), message TEXT NOT NULL, timestamp DATETIME)""",
+    """CREATE TABLE task_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, task_id VARCHAR(36) NOT NULL REFERENCES tasks (id),
+        step_index INTEGER NOT NULL, parameters TEXT, result TEXT, success BOOLEAN, error_message TEXT,
+        timestamp DATETIME)""",
+]
+
+# 迁移后应存在的 {表: (列, 索引)}
+EXPECTED = {
+    'tasks': (
+        {'priority', 'submitter', 'queued_at', 'spreadsheet_id', 'last_heartbeat', 'run_token', 'restart_count',
+         'archived_at', 'campaign_id'},
+        {'ix_tasks_status_spreadsheet', 'ix_tasks_status_heartbeat', 'ix_tasks_campaign_id'},
+    ),
+    'campaigns': (
+        {'id', 'name', 'description', 'config', 'stock_nos', 'priority', 'submitter', 'created_at', 'updated_at'},
+        set(),
+    ),
+    'task_logs': (set(), {'ix_task_logs_task_id_id'}),
+    'task_results': ({'timing'}, {'ix_task_results_task_id_step', 'ix_task_results_timestamp'}),
+}
+
+
+@pytest.fixture
+def empty_db(app_ctx):
+    db.drop_all()
+    yield
+    with db.engine.begin() as connection:
+        connection.execute(sa.text("DROP TABLE IF EXISTS alembic_version"))
+    db.drop_all()
+    db.create_all()
+
+
+def _assert_schema():
+    """迁移后的列和索引包含EXPECTED，且不少于模型中定义的"""
+    inspector = sa.inspect(db.engine)
+    for table, (columns, indexes) in EXPECTED.items():
+        model = db.metadata.tables[table]
+        actual_columns = {column['name'] for column in inspector.get_columns(table)}
+        actual_indexes = {index['name'] for index in inspector.get_indexes(table)}
+        assert columns | set(model.columns.keys()) <= actual_columns, table
+        assert indexes | {index.name for index in model.indexes} <= actual_indexes, table
+
+
+def test_upgrade_from_baseline(empty_db):
+    with db.engine.begin() as connection:
+        for ddl in BASELINE_DDL:
+            connection.execute(sa.text(ddl))
+        connection.execute(sa.text("INSERT INTO tasks (id, name, status) VALUES ('t1', '600000', 'completed')"))
+
+    upgrade(directory=MIGRATIONS_DIR)
+
+    _assert_schema()
+    with db.engine.connect() as connection:
+        assert connection.execute(sa.text("SELECT priority, restart_count FROM tasks WHERE id = 't1'")).one() == (0, 0)
+
+    downgrade(directory=MIGRATIONS_DIR, revision='base')
+    inspector = sa.inspect(db.engine)
+    assert not {column['name'] for column in inspector.get_columns('tasks')} & EXPECTED['tasks'][0]
+    assert not inspector.has_table('campaigns')
+
+
+def test_upgrade_on_current_schema_is_a_no_op(empty_db):
+    db.create_all()
+    upgrade(directory=MIGRATIONS_DIR)
+    _assert_schema()
@@ -0,0 +1,107 @@
+"""
+钉钉通知限速：令牌桶由所有工作进程共享，令牌被其他进程取走时通知留待合并发送；进程退出前限时发送剩余通知
+"""
+import time
+
+import pytest
+
+from app.services import notification_dispatcher as module
+from app.services.notification_dispatcher import NotificationDispatcher, SharedTokenBucket, TokenBucket
+
+pytestmark = pytest.mark.skipif(module.fcntl is None, reason='需要文件锁')
+
+
+def test_shared_bucket_limits_all_processes_together(tmp_path):
+    path = str(tmp_path / 'bucket.json')
+    first = SharedTokenBucket(path, rate_per_minute=3)
+    second = SharedTokenBucket(path, rate_per_minute=3)
+
+    acquired = [bucket.try_acquire() for bucket in (first, second, first, second)]
+
+    assert acquired == [True, True, True, False]
+    assert first.available() == 0
+    assert second.wait_time() > 0
+
+
+def test_shared_bucket_refills_and_drains(tmp_path):
+    bucket = SharedTokenBucket(str(tmp_path / 'bucket.json'), rate_per_minute=600)
+    bucket.drain()
+    assert bucket.available() == 0
+    time.sleep(0.25)
+    assert bucket.try_acquire()
+
+
+class _Notifier:
+    def __init__(self):
+        self.sent = []
+
+    def error_google_task_templates(self, task, message, url):
+        return {'task': task}
+
+    def send_message(self, message):
+        self.sent.append(message)
+        return {'errcode': 0}
+
+
+class _App:
+    config = {}
+
+    def __init__(self):
+        self.notifier = _Notifier()
+
+
+def test_dispatch_keeps_items_when_token_taken_elsewhere():
+    dispatcher = NotificationDispatcher(rate_per_minute=2, coalesce_delay=0)
+    dispatcher._app = _App()
+    items = [{'kind': 'error', 'task': f't{index}', 'message': 'm', 'url': 'u', 'created_at': 0.0}
+             for index in range(2)]
+    dispatcher._pending['error'] = list(items)
+
+    class _RacingBucket(TokenBucket):
+        """available时有2个令牌，发送第二条前被其他进程取走"""
+
+        def try_acquire(self):
+            acquired = super().try_acquire()
+            self.tokens = 0
+            return acquired
+
+    dispatcher._dispatch_due(_RacingBucket(2))
+
+    assert dispatcher._app.notifier.sent == [{'task': 't0'}]
+    assert dispatcher._pending['error'] == items[1:]
+
+
+def test_flush_sends_pending_items_before_exit(monkeypatch):
+    monkeypatch.setattr(NotificationDispatcher, '_make_bucket', lambda self: TokenBucket(self.rate_per_minute))
+    dispatcher = NotificationDispatcher(rate_per_minute=20, coalesce_delay=60)
+    app = _App()
+    dispatcher.start(app)
+    try:
+        dispatcher.notify(app, 'error', 't0', 'm', 'u')
+        dispatcher.notify(app, 'error', 't1', 'm', 'u')
+
+        # 聚合时间未到，退出时不再等待，在限定时间内同步发出
+        dispatcher.flush(timeout=2)
+    finally:
+        module.atexit.unregister(dispatcher.flush)
+
+    assert not dispatcher.is_running()
+    assert app.notifier.sent == [{'task': 't0'}, {'task': 't1'}]
+    assert dispatcher.depth() == 0
+
+
+def test_flush_drops_items_it_cannot_send_in_time():
+    dispatcher = NotificationDispatcher(rate_per_minute=1, coalesce_delay=0)
+    dispatcher._app = _App()
+    bucket = TokenBucket(1)
+    bucket.drain()
+    dispatcher._make_bucket = lambda: bucket
+    dispatcher._pending['error'] = [{'kind': 'error', 'task': 't0', 'message': 'm', 'url': 'u', 'created_at': 0.0}]
+
+    # 令牌要等约一分钟才补充，超时后丢弃而不是等待
+    started = time.monotonic()
+    dispatcher.flush(timeout=0.2)
+
+    assert time.monotonic() - started < 1
+    assert dispatcher._app.notifier.sent == []
+    assert dispatcher.depth() == 0
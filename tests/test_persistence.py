@@ -0,0 +1,92 @@
+"""
+持久化后端：按数据库地址选择后端；COPY文本格式转义制表符、换行和反斜杠；月分区边界跨年计算
+"""
+from datetime import date, datetime
+
+import pytest
+
+from app.models import TaskLog, db
+from app.services import persistence
+from app.services.persistence import PersistenceBackend, PostgresBackend, _copy_value, _month_start, backend_for_url
+
+
+@pytest.mark.parametrize('url, name', [
+    ('postgresql://user@host/db', 'postgresql'),
+    ('postgresql+psycopg2://user@host/db', 'postgresql'),
+    ('postgres://user@host/db', 'postgresql'),
+    ('sqlite:///data/app.db', 'orm'),
+    ('mysql://user@host/db', 'orm'),
+])
+def test_backend_for_url(url, name):
+    assert backend_for_url(url).name == name
+
+
+def test_application_backend_follows_database_url(app_ctx, monkeypatch):
+    monkeypatch.setattr(persistence, '_backend', None)
+    assert persistence.get_persistence_backend().name == 'orm'
+    assert persistence.get_persistence_backend() is persistence.get_persistence_backend()
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, '\\N'),
+    (True, 't'),
+    (False, 'f'),
+    (3, '3'),
+    (datetime(2026, 1, 2, 3, 4, 5), '2026-01-02 03:04:05'),
+    ('a\tb', 'a\\tb'),
+    ('line1\nline2\r\n', 'line1\\nline2\\r\\n'),
+    ('C:\\path\\N', 'C:\\\\path\\\\N'),
+    ('\\t', '\\\\t'),
+])
+def test_copy_value_escaping(value, expected):
+    assert _copy_value(value) == expected
+
+
+@pytest.mark.parametrize('day, offset, expected', [
+    (date(2026, 10, 19), 0, date(2026, 10, 1)),
+    (date(2026, 10, 19), 1, date(2026, 11, 1)),
+    (date(2026, 12, 31), 1, date(2027, 1, 1)),
+    (date(2026, 11, 1), 3, date(2027, 2, 1)),
+    (date(2026, 1, 15), -1, date(2025, 12, 1)),
+])
+def test_month_start(day, offset, expected):
+    assert _month_start(day, offset) == expected
+
+
+class _CopyCursor:
+    def __init__(self):
+        self.statement = None
+        self.data = None
+
+    def copy_expert(self, statement, buffer):
+        self.statement = statement
+        self.data = buffer.read()
+
+    def close(self):
+        pass
+
+
+def test_copy_rows_writes_one_escaped_line_per_row(app_ctx, monkeypatch):
+    cursor = _CopyCursor()
+
+    class _Connection:
+        connection = type('RawConnection', (), {'cursor': lambda self: cursor})()
+
+    monkeypatch.setattr(db.session, 'connection', lambda: _Connection())
+    PostgresBackend().copy_rows(TaskLog, [
+        {'task_id': 't1', 'level': 'info', 'message': 'a\tb\nc'},
+        {'task_id': 't1', 'level': 'error', 'message': None},
+    ])
+
+    assert cursor.statement == 'COPY task_logs (task_id, level, message) FROM STDIN'
+    assert cursor.data == 't1\tinfo\ta\\tb\\nc\nt1\terror\t\\N\n'
+
+
+def test_orm_copy_rows_inserts_batch(app_ctx, make_task):
+    task_id = make_task()
+    PersistenceBackend().insert_logs([{'task_id': task_id, 'level': 'info', 'message': f"log {index}"}
+                                      for index in range(3)])
+
+    assert [log.message for log in TaskLog.query.filter_by(task_id=task_id).order_by(TaskLog.id)] == [
+        'log 0', 'log 1', 'log 2'
+    ]
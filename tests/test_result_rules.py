@@ -0,0 +1,43 @@
+"""
+结果规则：字段名和单元格均可作为键，超出上下限的结果返回原因，未解析的结果不参与判定
+"""
+import pytest
+
+from app.utils.result_rules import compile_result_rules
+
+
+def test_bounds_by_field_name_and_cell():
+    rules = compile_result_rules({'maxdd': {'max': 0.5}, 'I15': {'min': 0}})
+
+    assert rules.check({'I15': 0.1, 'I17': 0.3}) is None
+    assert '上限' in rules.check({'I15': 0.1, 'I17': 0.6})
+    assert 'I15' in rules.check({'I15': -0.2, 'I17': 0.3})
+
+
+def test_unparsed_values_are_left_to_result_validation():
+    rules = compile_result_rules({'maxdd': {'max': 0.5}})
+    assert rules.check({'I17': '#N/A'}) is None
+    assert rules.check({}) is None
+
+
+def test_allow_zero_only_rules():
+    rules = compile_result_rules({'fee_total': {'allow_zero': True}})
+    assert rules
+    assert rules.allow_zero == frozenset({'I21'})
+    assert rules.check({'I21': 0}) is None
+
+
+def test_empty_rules_are_falsy():
+    rules = compile_result_rules(None)
+    assert not rules
+    assert rules.check({'I15': -1}) is None
+
+
+@pytest.mark.parametrize('config', [
+    {'maxdd': 0.5},
+    {'maxdd': {'maximum': 0.5}},
+    {'maxdd': {'max': 'half'}},
+])
+def test_invalid_rules_raise(config):
+    with pytest.raises(ValueError):
+        compile_result_rules(config)
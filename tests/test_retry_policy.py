@@ -0,0 +1,130 @@
+"""
+重试策略：按错误类型决定是否重试，次数、期限和组合时间预算都会让重试提前放弃；单元格错误值不重试组合
+"""
+import pytest
+
+from app.exceptions.checkForErrors import checkForErrors
+from app.exceptions.circuitOpen import CircuitOpenError
+from app.services.combination_timing import CombinationTiming
+from app.services.google_sheet_service import GoogleSheetService
+from app.utils.retry_policy import (
+    CIRCUIT_OPEN, DETERMINISTIC, QUOTA, QUOTA_MIN_DELAY, TRANSIENT, RetryPolicy, classify_error,
+    combination_budget, get_policy
+)
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class _HTTPError(Exception):
+    def __init__(self, status_code, message='error'):
+        super().__init__(message)
+        self.response = _Response(status_code)
+
+
+@pytest.mark.parametrize('error, kind', [
+    (_HTTPError(429), QUOTA),
+    (_HTTPError(403, 'Rate Limit Exceeded'), QUOTA),
+    (Exception('Quota exceeded for quota metric'), QUOTA),
+    (_HTTPError(503), TRANSIENT),
+    (_HTTPError(408), TRANSIENT),
+    (Exception('请求失败，状态码: 502'), TRANSIENT),
+    (ConnectionError('connection reset'), TRANSIENT),
+    (_HTTPError(404), DETERMINISTIC),
+    (ValueError('bad value'), DETERMINISTIC),
+    (CircuitOpenError('google_sheets', 10), CIRCUIT_OPEN),
+])
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+
+
+def _flaky(errors, result='ok'):
+    """依次抛出errors中的异常，之后返回result"""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return fn, calls
+
+
+def test_transient_errors_are_retried_until_success():
+    fn, calls = _flaky([ConnectionError('reset'), _HTTPError(500)])
+    assert RetryPolicy('test', max_attempts=3, min_delay=0, max_delay=0).call(fn) == 'ok'
+    assert len(calls) == 3
+
+
+def test_gives_up_after_max_attempts():
+    fn, calls = _flaky([ConnectionError('reset')] * 5)
+    with pytest.raises(ConnectionError):
+        RetryPolicy('test', max_attempts=2, min_delay=0, max_delay=0).call(fn)
+    assert len(calls) == 2
+
+
+def test_deterministic_errors_are_not_retried():
+    fn, calls = _flaky([ValueError('bad value')])
+    with pytest.raises(ValueError):
+        RetryPolicy('test', max_attempts=5, min_delay=0, max_delay=0).call(fn)
+    assert len(calls) == 1
+
+
+def test_retry_stops_when_combination_budget_is_spent():
+    fn, calls = _flaky([ConnectionError('reset')] * 5)
+    with combination_budget(1):
+        with pytest.raises(ConnectionError):
+            RetryPolicy('test', max_attempts=5, min_delay=4, max_delay=10).call(fn)
+    assert len(calls) == 1
+
+
+def test_retry_if_result_returns_last_result_when_giving_up():
+    results = iter([None, None, None])
+    policy = RetryPolicy('test', max_attempts=3, min_delay=0, max_delay=0, retry_if_result=lambda r: r is None)
+    assert policy.call(lambda: next(results)) is None
+
+
+def test_quota_backoff_waits_at_least_a_minute_window():
+    policy = RetryPolicy('test', min_delay=1, max_delay=2)
+    assert policy.backoff(1, QUOTA) >= QUOTA_MIN_DELAY * 0.9
+    assert policy.backoff(1, TRANSIENT) <= 1.1
+
+
+def test_configured_policy_overrides_defaults(set_config):
+    set_config(retry_policies={'stock_api_read': {'max_attempts': 7, 'unknown': 1}})
+    policy = get_policy('stock_api_read', min_delay=1)
+    assert policy.max_attempts == 7
+    assert policy.min_delay == 1
+    assert policy.deadline == 120
+
+
+class _ErrorCellSheet:
+    """结果单元格为公式错误值的工作表"""
+
+    def __init__(self):
+        self.result_reads = 0
+
+    def update_jumped_cells(self, updates):
+        pass
+
+    def get_cells_batch(self, positions):
+        self.result_reads += 1
+        return {position: '#SPILL!' if position == 'I15' else '0.3' for position in positions}
+
+
+def test_sheet_error_result_runs_a_single_attempt(set_config):
+    set_config(execution_delay_min=0, execution_delay_max=0)
+    service = GoogleSheetService({}, 'task', app=None)
+    service._log = lambda *args, **kwargs: None
+    service.google_sheet = _ErrorCellSheet()
+    timing = CombinationTiming()
+    config = {'parameter_positions': ['B6', 'B7'], 'result_positions': ['I15', 'I16']}
+
+    with pytest.raises(checkForErrors):
+        service._execute_parameter_combination([1, 2], config, timing)
+
+    assert timing.attempts == 1
+    assert service.google_sheet.result_reads == 1
@@ -0,0 +1,94 @@
+"""
+敏感信息扫描：合并正则一次遍历的结果与逐个模式扫描一致；未变化的文件使用缓存，.gitignore忽略的目录不进入
+"""
+import os
+import re
+
+import pytest
+
+from app.utils.security import GitIgnore, SecurityValidator
+
+CONTENT = '\n'.join([
+    'CLIENT_SECRET = "abc123"',
+    'config = {"api_key": "k1", "token": "t1"}',
+    'password=hunter2 password=again',
+    'secrettoken=x',
+    'creds = GOCSPX-abc_DEF ya29.a0Af-x 123-abc.apps.googleusercontent.com',
+    'nothing to see here',
+])
+
+
+def _scan_per_pattern(content):
+    """原实现：逐个模式 re.finditer，行号由匹配前的换行数得出"""
+    matches = []
+    for index, pattern in enumerate(SecurityValidator.SENSITIVE_PATTERNS):
+        for match in re.finditer(pattern, content, re.IGNORECASE):
+            matches.append([index, content[:match.start()].count('\n') + 1, match.group()])
+    return matches
+
+
+@pytest.mark.parametrize('content', [CONTENT, '', 'token', 'x' * 50 + 'secret:1secret:2\n\ntoken=secret=3'])
+def test_single_pass_matches_per_pattern_scan(content):
+    assert sorted(SecurityValidator._scan_content(content)) == sorted(_scan_per_pattern(content))
+
+
+def test_every_pattern_starts_with_a_guarded_character():
+    # 首字符集合漏掉某个模式时，合并正则会静默地跳过该模式的所有匹配
+    samples = ['client_secret=a', 'api_key=a', 'password=a', 'secret=a', 'token=a', 'GOCSPX-a', 'ya29.a',
+               '1-a.apps.googleusercontent.com']
+    found = {index for sample in samples for index, _, _ in SecurityValidator._scan_content(sample)}
+    assert found == set(range(len(SecurityValidator.SENSITIVE_PATTERNS)))
+
+
+def test_unchanged_files_reuse_cached_matches(tmp_path, monkeypatch):
+    path = tmp_path / 'settings.py'
+    path.write_text('api_key = "k1"\n')
+    entry = SecurityValidator._scan_file(path, None)
+    assert entry['matches'] == [[1, 1, 'api_key = "k1']]
+
+    calls = []
+    monkeypatch.setattr(SecurityValidator, '_scan_content', classmethod(lambda cls, content: calls.append(1) or []))
+
+    # 修改时间和大小不变：不读取文件
+    assert SecurityValidator._scan_file(path, entry) is entry
+    # 只更新了修改时间：内容哈希相同，不重新匹配
+    os.utime(path, ns=(entry['mtime_ns'] + 10 ** 9, entry['mtime_ns'] + 10 ** 9))
+    assert SecurityValidator._scan_file(path, entry)['matches'] == entry['matches']
+    assert calls == []
+    # 内容变化：重新匹配
+    path.write_text('api_key = "k2"\n')
+    os.utime(path, ns=(entry['mtime_ns'] + 2 * 10 ** 9, entry['mtime_ns'] + 2 * 10 ** 9))
+    assert SecurityValidator._scan_file(path, entry)['matches'] == []
+    assert calls == [1]
+
+
+def test_scan_skips_ignored_directories_and_persists_cache(tmp_path):
+    (tmp_path / '.gitignore').write_text('/data/\n*.secret\n!keep.secret\n')
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'token.txt').write_text('token=abc\n')
+    (tmp_path / 'a.secret').write_text('token=abc\n')
+    (tmp_path / 'keep.secret').write_text('token=abc\n')
+    (tmp_path / 'app.py').write_text('x = 1\npassword = "p"\n')
+    cache_file = tmp_path / 'data' / 'scan_cache.json'
+
+    issues = SecurityValidator.scan_sensitive_files(str(tmp_path), cache_file=str(cache_file))
+
+    assert sorted((os.path.basename(issue['file']), issue['line_number']) for issue in issues) == [
+        ('app.py', 2), ('keep.secret', 1)
+    ]
+    assert cache_file.exists()
+    assert SecurityValidator.scan_sensitive_files(str(tmp_path), cache_file=str(cache_file)) == issues
+
+
+@pytest.mark.parametrize('path, is_dir, ignored', [
+    ('logs', True, True),
+    ('app/logs', True, True),
+    ('logs', False, False),
+    ('build/out.pyc', False, True),
+    ('docs/a/b/readme.md', False, True),
+    ('docs/keep.md', False, False),
+    ('src/docs/readme.md', False, False),
+])
+def test_gitignore_rules(path, is_dir, ignored):
+    gitignore = GitIgnore(['# 注释', 'logs/', '*.py[co]', '/docs/**/*.md', '!/docs/keep.md'])
+    assert gitignore.ignored(path, is_dir) is ignored
@@ -0,0 +1,119 @@
+"""
+哨兵单元格：每次写入参数附带新的nonce，只有哨兵单元格回显本次nonce后才读取结果，旧值或上一次写入的nonce不算完成
+"""
+import asyncio
+
+import pytest
+
+from app.services.combination_timing import CombinationTiming
+from app.services.google_sheet_async_service import AsyncGoogleSheetService
+from app.services.google_sheet_service import GoogleSheetService
+
+CONFIG = {
+    'parameter_positions': ['B6', 'B7'],
+    'result_positions': ['I15', 'I16'],
+    'nonce_cell': 'Z1',
+    'sentinel_cell': 'Z2',
+}
+
+
+class _SentinelSheet:
+    """哨兵单元格先返回stale_reads次旧值，之后回显最近一次写入的nonce"""
+
+    def __init__(self, stale_reads):
+        self.stale_reads = stale_reads
+        self.writes = []
+        self.single_writes = []
+        self.sentinel_reads = 0
+        self.result_reads = 0
+
+    def update_jumped_cells(self, updates):
+        self.writes.append(dict(updates))
+
+    def update_cell(self, position, value):
+        self.single_writes.append(position)
+
+    def get_cell(self, position):
+        assert position == 'Z2'
+        self.sentinel_reads += 1
+        if self.sentinel_reads <= self.stale_reads:
+            # 上一个组合的nonce（模型尚未重新计算）
+            return 'n-previous'
+        return self.writes[-1]['Z1']
+
+    def get_cells_batch(self, positions):
+        self.result_reads += 1
+        return {position: '0.3' for position in positions}
+
+
+class _AsyncSentinelSheet(_SentinelSheet):
+    async def update_jumped_cells(self, updates):
+        super().update_jumped_cells(updates)
+
+    async def update_cell(self, position, value):
+        super().update_cell(position, value)
+
+    async def get_cell(self, position):
+        return super().get_cell(position)
+
+    async def get_cells_batch(self, positions):
+        return super().get_cells_batch(positions)
+
+
+@pytest.fixture
+def no_delay(set_config):
+    set_config(execution_delay_min=0, execution_delay_max=0,
+               parameter_positions=CONFIG['parameter_positions'], result_positions=CONFIG['result_positions'])
+
+
+def _service(cls, sheet):
+    service = cls({}, 'task', app=None)
+    service._log = lambda *args, **kwargs: None
+    service._heartbeat = lambda: None
+    service.google_sheet = sheet
+    return service
+
+
+def test_results_are_read_only_after_the_nonce_is_echoed(no_delay):
+    sheet = _SentinelSheet(stale_reads=12)
+    timing = CombinationTiming()
+
+    success, results = _service(GoogleSheetService, sheet)._execute_parameter_combination([1, 2], CONFIG, timing)
+
+    assert success
+    assert results['B6'] == 1
+    assert sheet.sentinel_reads == 13
+    assert sheet.result_reads == 1
+    # 每10轮用新的nonce重写参数，不做随机单元格重写
+    assert len(sheet.writes) == 2
+    assert sheet.writes[0]['Z1'] != sheet.writes[1]['Z1']
+    assert all(write['Z1'].startswith('n-') for write in sheet.writes)
+    assert sheet.single_writes == []
+    assert timing.polls == 13
+
+
+def test_async_engine_waits_for_the_nonce(no_delay):
+    sheet = _AsyncSentinelSheet(stale_reads=2)
+    service = _service(AsyncGoogleSheetService, sheet)
+
+    success, _ = asyncio.run(service._evaluate_combination_async([1, 2], CONFIG, CombinationTiming()))
+
+    assert success
+    assert sheet.sentinel_reads == 3
+    assert sheet.result_reads == 1
+    assert len(sheet.writes) == 1
+
+
+@pytest.mark.parametrize('config, expected', [
+    (CONFIG, ('Z1', 'Z2')),
+    (dict(CONFIG, sentinel_cell=''), None),
+    ({'nonce_cell': 'Z1'}, None),
+])
+def test_sentinel_needs_both_cells(config, expected):
+    assert GoogleSheetService._get_sentinel(config) == expected
+
+
+def test_sentinel_mode_refreshes_less_often():
+    refreshed = [attempt for attempt in range(25) if GoogleSheetService._should_refresh_params(attempt, True)]
+    assert refreshed == [10, 20]
+    assert GoogleSheetService._should_refresh_params(3)
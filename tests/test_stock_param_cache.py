@@ -0,0 +1,107 @@
+"""
+股票模板参数缓存：只刷新排队任务需要的股票，批量拉取时取每只股票最新的记录；
+过期后在容忍期内返回旧值并后台刷新，超出容忍期或早于not_before视为未缓存
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.stock_param_cache import MISSING, StockParamCache
+
+
+class _FakeClient:
+    def __init__(self, rows, fail_at_offset=None):
+        self.rows = rows
+        self.fail_at_offset = fail_at_offset
+        self.single_requests = []
+
+    def get_stock_template_params(self, limit, offset):
+        if offset == self.fail_at_offset:
+            raise ConnectionError("connection reset")
+        return {'data': self.rows[offset:offset + limit]}
+
+    def get_single_stock_template_param(self, stock_no):
+        self.single_requests.append(stock_no)
+        return {'stock_no': stock_no, 'multiplier_index': 9}
+
+
+@pytest.fixture
+def cache(set_config, monkeypatch):
+    set_config(stock_param_cache_ttl=60, stock_param_stale_seconds=600)
+    cache = StockParamCache()
+    client = _FakeClient([])
+    monkeypatch.setattr(cache, '_client', lambda: client)
+    cache.client = client
+    return cache
+
+
+def _age(cache, stock_no, seconds):
+    """把缓存条目的获取时间往前推"""
+    fetched_mono, fetched_at, value = cache._entries[stock_no]
+    cache._entries[stock_no] = (fetched_mono - seconds, fetched_at - timedelta(seconds=seconds), value)
+
+
+def test_refresh_all_keeps_the_latest_row_per_stock(cache):
+    # 上游每推送一个组合记录一行，恢复位置为multiplier_index最大的一行
+    cache.client.rows = [{'stock_no': f"60000{index}", 'multiplier_index': 0} for index in range(5)]
+    cache.client.rows += [{'stock_no': '600000', 'multiplier_index': 7}, {'stock_no': '600000', 'multiplier_index': 3}]
+
+    assert cache.refresh_all(page_size=2) == 5
+    assert cache.get('600000')['multiplier_index'] == 7
+    assert cache.last_refresh_at is not None
+
+
+def test_refresh_all_keeps_pages_fetched_before_failure(cache):
+    cache.client.rows = [{'stock_no': f"60000{index}"} for index in range(5)]
+    cache.client.fail_at_offset = 4
+
+    assert cache.refresh_all(page_size=2) == 4
+    assert cache.get('600004') is MISSING
+
+
+def test_fresh_stale_and_expired_entries(cache):
+    cache.put('600000', {'multiplier_index': 1})
+    assert cache.get('600000') == {'multiplier_index': 1}
+    assert cache.client.single_requests == []
+
+    _age(cache, '600000', 120)
+    assert cache.get('600000') == {'multiplier_index': 1}
+    deadline = time.monotonic() + 2
+    while cache.get('600000') != {'stock_no': '600000', 'multiplier_index': 9} and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.client.single_requests == ['600000']
+    assert cache.is_fresh('600000')
+
+    _age(cache, '600000', 3600)
+    assert cache.get('600000') is MISSING
+
+
+def test_entries_fetched_before_not_before_are_missing(cache):
+    cache.put('600000', None)
+    assert cache.get('600000') is None
+    assert cache.get('600000', not_before=datetime.now() + timedelta(seconds=1)) is MISSING
+
+
+def test_refresh_needed_fetches_only_stale_stocks(cache, set_config):
+    set_config(stock_param_bulk_threshold=3)
+    cache.put('600000', {'multiplier_index': 1})
+
+    assert cache.refresh_needed(['600000', '600001', '600001']) == 1
+    assert cache.client.single_requests == ['600001']
+
+    cache.client.rows = [{'stock_no': f"60010{index}"} for index in range(3)]
+    assert cache.refresh_needed([f"60010{index}" for index in range(3)]) == 3
+    assert cache.client.single_requests == ['600001']
+
+
+def test_refresher_only_refreshes_queued_stocks(cache, make_task, monkeypatch):
+    from app.services import stock_param_cache as module
+
+    make_task(name='600000', status='queued')
+    make_task(name='600001', status='completed')
+    monkeypatch.setattr(module, 'stock_param_cache', cache)
+
+    module.stock_param_refresher.run_once()
+
+    assert cache.client.single_requests == ['600000']
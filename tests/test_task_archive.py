@@ -0,0 +1,88 @@
+"""
+任务归档：过期任务的日志和结果写入归档文件后删除，读取时从归档还原，重启前原样写回数据库
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Task, TaskLog, TaskResult, db
+from app.services import task_archive
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_archive, 'ARCHIVE_DIR', tmp_path)
+    return tmp_path
+
+
+def _finished_task(make_task, days_ago=10):
+    end_time = datetime.now() - timedelta(days=days_ago)
+    task_id = make_task(status='completed', end_time=end_time)
+    db.session.add_all([TaskLog(task_id=task_id, level='info', message=f"log {index}") for index in range(3)])
+    db.session.add_all([TaskResult(task_id=task_id, step_index=index, result='{}', success=True)
+                        for index in range(2)])
+    db.session.commit()
+    return task_id
+
+
+def _counts(task_id):
+    return (TaskLog.query.filter_by(task_id=task_id).count(), TaskResult.query.filter_by(task_id=task_id).count())
+
+
+def test_archive_and_restore_round_trip(archive_dir, make_task, set_config):
+    old = _finished_task(make_task)
+    recent = _finished_task(make_task, days_ago=0)
+    log_ids = [log.id for log in TaskLog.query.filter_by(task_id=old).order_by(TaskLog.id)]
+
+    assert task_archive.task_archiver.archive_expired(retention_days=1) == 1
+
+    assert _counts(old) == (0, 0)
+    assert _counts(recent) == (3, 2)
+    assert task_archive.is_archived(Task.query.get(old))
+    assert [log.message for log in task_archive.archived_logs(old)] == ['log 0', 'log 1', 'log 2']
+    assert [result.step_index for result in task_archive.archived_results(old)] == [0, 1]
+
+    assert task_archive.restore_task(old)
+
+    db.session.expire_all()
+    assert _counts(old) == (3, 2)
+    assert [log.id for log in TaskLog.query.filter_by(task_id=old).order_by(TaskLog.id)] == log_ids
+    assert Task.query.get(old).archived_at is None
+    assert not task_archive.archive_path(old).exists()
+
+
+def test_interrupted_archive_resumes_without_rewriting(archive_dir, make_task):
+    task_id = _finished_task(make_task)
+    task_archive.write_archive(task_id)
+    # 上一轮认领并写入文件后、删除完成前退出，部分日志已删除
+    Task.query.filter_by(id=task_id).update({'archived_at': datetime.now()})
+    TaskLog.query.filter_by(task_id=task_id, message='log 0').delete()
+    db.session.commit()
+
+    assert task_archive.find_archivable_tasks(retention_days=30) == [task_id]
+    assert task_archive.archive_task(task_id)
+
+    assert _counts(task_id) == (0, 0)
+    assert len(task_archive.archived_logs(task_id)) == 3
+
+
+def test_restore_before_file_is_written_only_clears_claim(archive_dir, make_task):
+    task_id = _finished_task(make_task)
+    Task.query.filter_by(id=task_id).update({'archived_at': datetime.now()})
+    db.session.commit()
+
+    assert not task_archive.restore_task(task_id)
+
+    db.session.expire_all()
+    assert Task.query.get(task_id).archived_at is None
+    assert _counts(task_id) == (3, 2)
+
+
+def test_archiving_is_disabled_by_default(archive_dir, make_task, set_config):
+    task_id = _finished_task(make_task, days_ago=365)
+
+    assert task_archive.task_archiver.archive_expired() == 0
+
+    set_config(archive_retention_days=30)
+    assert task_archive.task_archiver.archive_expired() == 1
+    assert _counts(task_id) == (0, 0)
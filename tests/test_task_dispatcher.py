@@ -0,0 +1,129 @@
+"""
+任务队列调度：全局和电子表格并发上限按数据库统计，多个进程（TaskManager实例）共享同一份上限；不支持的任务类型不进入队列，已排队的置为error
+"""
+import pytest
+
+from app.models import Task, db
+from app.services.task_manager import TaskManager
+
+
+@pytest.fixture
+def managers(app_ctx, monkeypatch):
+    """两个互不共享内存状态的任务管理器，模拟gunicorn的两个工作进程；执行线程不做任何事"""
+    monkeypatch.setattr(TaskManager, '_execute_google_sheet_task', lambda self, task_id, app: None)
+    return TaskManager(), TaskManager()
+
+
+def _running_ids():
+    return {task.id for task in Task.query.filter_by(status='running').all()}
+
+
+def test_global_cap_is_shared_across_processes(managers, make_task, set_config):
+    set_config(max_concurrent_tasks=2)
+    for index in range(4):
+        make_task(name=f"60000{index}")
+    first, second = managers
+
+    assert first._dispatch_once() == 2
+    assert second._dispatch_once() == 0
+    assert len(_running_ids()) == 2
+
+
+def test_spreadsheet_cap_is_shared_across_processes(managers, make_task, set_config):
+    set_config(max_concurrent_tasks=10, max_tasks_per_spreadsheet=1)
+    sheet_a = [make_task(config={'spreadsheet_id': 'A', 'parameters': [[1]]}) for _ in range(2)]
+    sheet_b = make_task(config={'spreadsheet_id': 'B', 'parameters': [[1]]})
+    first, second = managers
+
+    assert first._dispatch_once() == 2
+    assert second._dispatch_once() == 0
+    running = _running_ids()
+    assert sheet_b in running
+    assert len(running & set(sheet_a)) == 1
+    assert {task.spreadsheet_id for task in Task.query.filter_by(status='running')} == {'A', 'B'}
+
+
+def test_task_spreadsheet_concurrency_overrides_default(managers, make_task, set_config):
+    set_config(max_concurrent_tasks=10, max_tasks_per_spreadsheet=1)
+    for _ in range(3):
+        make_task(config={'spreadsheet_id': 'A', 'spreadsheet_concurrency': 2, 'parameters': [[1]]})
+
+    assert managers[0]._dispatch_once() == 2
+
+
+def test_claim_is_conditional(managers, make_task, set_config):
+    set_config(max_concurrent_tasks=5)
+    task_id = make_task()
+    first, second = managers
+
+    assert first.start_task(task_id, from_status='queued')
+    # 其他进程看到的仍是旧的排队列表，认领失败且不改变任务
+    assert not second.start_task(task_id, from_status='queued')
+    assert task_id in first.running_tasks
+    assert task_id not in second.running_tasks
+
+
+def test_direct_start_respects_global_cap(managers, make_task, set_config):
+    set_config(max_concurrent_tasks=1)
+    make_task(status='running')
+    pending_id = make_task(status='pending')
+
+    assert not managers[0].start_task(pending_id)
+    assert Task.query.get(pending_id).status == 'pending'
+
+
+def test_priority_then_fair_rotation_between_submitters(managers, make_task, set_config):
+    set_config(max_concurrent_tasks=3)
+    urgent = make_task(submitter='alice', priority=5)
+    alice = [make_task(submitter='alice') for _ in range(3)]
+    bob = make_task(submitter='bob')
+
+    assert managers[0]._dispatch_once() == 3
+    running = _running_ids()
+    assert urgent in running
+    assert bob in running
+    assert len(running & set(alice)) == 1
+
+
+def test_requeue_backoff_is_not_dispatched_early(managers, make_task, set_config):
+    from datetime import datetime, timedelta
+    set_config(max_concurrent_tasks=5)
+    make_task(queued_at=datetime.now() + timedelta(minutes=5))
+
+    assert managers[0]._dispatch_once() == 0
+
+
+def _set_task_type(task_id, task_type):
+    Task.query.filter_by(id=task_id).update({'task_type': task_type})
+    db.session.commit()
+
+
+def test_unsupported_task_type_is_not_enqueued(managers, make_task):
+    task_id = make_task(status='pending')
+    _set_task_type(task_id, 'excel')
+
+    assert not managers[0].enqueue_task(task_id)
+
+    task = Task.query.get(task_id)
+    assert task.status == 'error'
+    assert 'excel' in task.error_message
+
+
+def test_queued_unsupported_task_is_marked_error(managers, make_task, set_config):
+    set_config(max_concurrent_tasks=5)
+    stuck = make_task()
+    _set_task_type(stuck, 'excel')
+    runnable = make_task()
+
+    assert managers[0]._dispatch_once() == 1
+
+    assert _running_ids() == {runnable}
+    assert Task.query.get(stuck).status == 'error'
+    assert managers[0]._dispatch_once() == 0
+
+
+def test_api_rejects_unsupported_task_type(app_ctx):
+    response = app_ctx.test_client().post('/api/tasks', json={'name': '600000', 'task_type': 'excel', 'config': {}})
+
+    assert response.status_code == 400
+    assert Task.query.count() == 0
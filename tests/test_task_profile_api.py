@@ -0,0 +1,27 @@
+"""
+采样剖析接口：请求未分配到执行任务的工作进程时返回明确的原因
+"""
+
+
+def test_profile_task_in_other_worker(app_ctx, make_task):
+    task_id = make_task(status='running')
+
+    response = app_ctx.test_client().post(f'/api/tasks/{task_id}/profile?seconds=1')
+
+    assert response.status_code == 409
+    assert response.get_json()['reason'] == 'other_worker'
+
+
+def test_profile_task_not_running(app_ctx, make_task):
+    task_id = make_task(status='completed')
+
+    response = app_ctx.test_client().post(f'/api/tasks/{task_id}/profile?seconds=1')
+
+    assert response.status_code == 409
+    assert response.get_json()['reason'] == 'not_running'
+
+
+def test_profile_missing_task(app_ctx):
+    response = app_ctx.test_client().post('/api/tasks/missing/profile?seconds=1')
+
+    assert response.status_code == 404
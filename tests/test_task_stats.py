@@ -0,0 +1,76 @@
+"""
+任务统计：各状态任务数一次分组查询，吞吐量按时间窗口统计成功结果，平均单步耗时取耗时分解；结果在TTL内复用
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import TaskResult, db
+from app.services import task_stats as module
+from app.services.task_stats import TaskStatsCache, _step_ms, compute_task_stats
+
+
+def _result(task_id, minutes_ago, success=True, timing=None):
+    db.session.add(TaskResult(task_id=task_id, step_index=0, success=success,
+                              timestamp=datetime.now() - timedelta(minutes=minutes_ago),
+                              timing=json.dumps(timing) if timing is not None else None))
+
+
+def test_counts_and_throughput(app_ctx, make_task):
+    task_id = make_task(status='running')
+    make_task(status='queued')
+    make_task(status='queued')
+    make_task(status='deleting')
+    _result(task_id, 10, timing={'sheet': 3000, 'upstream': 500, 'persist': 100})
+    _result(task_id, 20, timing={'write': 1000, 'wait': 1000})
+    _result(task_id, 30, success=False, timing={'sheet': 9000})
+    _result(task_id, 120)
+    _result(task_id, 60 * 30)
+    db.session.commit()
+
+    stats = compute_task_stats()
+
+    assert stats['counts'] == {'pending': 0, 'queued': 2, 'running': 1, 'completed': 0, 'cancelled': 0, 'error': 0,
+                               'deleting': 1, 'total': 4}
+    assert stats['throughput']['1h'] == {'combinations': 2, 'per_hour': 2}
+    assert stats['throughput']['24h'] == {'combinations': 3, 'per_hour': 0.1}
+    # 失败的结果也计入单步耗时
+    assert stats['latency_samples'] == 3
+    assert stats['avg_step_ms'] == round((3600 + 2000 + 9000) / 3)
+
+
+@pytest.mark.parametrize('timing, expected', [
+    ({'sheet': 1000, 'upstream': 200, 'persist': 50, 'write': 400}, 1250),
+    ({'write': 100, 'wait': 200, 'persist': 10}, 310),
+    ({}, None),
+])
+def test_step_ms(timing, expected):
+    assert _step_ms(timing) == expected
+
+
+def test_cache_reuses_results_within_ttl(app_ctx, set_config, monkeypatch):
+    set_config(task_stats_ttl=60)
+    calls = []
+    monkeypatch.setattr(module, 'compute_task_stats', lambda: calls.append(1) or {'call': len(calls)})
+    cache = TaskStatsCache()
+
+    assert cache.get() == {'call': 1}
+    assert cache.get() == {'call': 1}
+    assert cache.get(force=True) == {'call': 2}
+    cache.invalidate()
+    assert cache.get() == {'call': 3}
+
+    set_config(task_stats_ttl=0)
+    cache.invalidate()
+    cache.get()
+    assert cache.get() == {'call': 5}
+
+
+def test_stats_endpoint(app_ctx, make_task):
+    make_task(status='error')
+
+    response = app_ctx.test_client().get('/api/tasks/stats?refresh=true')
+
+    assert response.status_code == 200
+    assert response.get_json()['stats']['counts']['error'] == 1
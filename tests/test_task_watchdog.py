@@ -0,0 +1,74 @@
+"""
+心跳看门狗：心跳超时的任务按指数退避重新排队，超过上限标记为错误；接管以执行器令牌为条件
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Task, db
+from app.services.task_manager import TaskManager
+from app.services.task_watchdog import TaskWatchdog
+
+
+@pytest.fixture
+def watchdog(app_ctx, set_config):
+    set_config(task_status_check_timeout=600, watchdog_max_requeues=2, watchdog_backoff_base=60)
+    return TaskWatchdog(TaskManager())
+
+
+def _running(make_task, heartbeat_age, **fields):
+    heartbeat = datetime.now() - timedelta(seconds=heartbeat_age)
+    return make_task(status='running', start_time=heartbeat, last_heartbeat=heartbeat, run_token='token',
+                     **fields)
+
+
+def test_stale_task_is_requeued_with_backoff(watchdog, make_task):
+    stale = _running(make_task, 900, restart_count=1, current_step=5)
+    fresh = _running(make_task, 10)
+
+    assert watchdog.scan() == 1
+
+    db.session.expire_all()
+    task = Task.query.get(stale)
+    assert task.status == 'queued'
+    assert task.restart_count == 2
+    assert task.run_token is None
+    # 第二次重新排队等待 60 * 2 秒
+    assert task.queued_at - datetime.now() > timedelta(seconds=110)
+    assert task.current_step == 5
+    assert Task.query.get(fresh).status == 'running'
+
+
+def test_requeue_limit_marks_task_as_error(watchdog, make_task):
+    task_id = _running(make_task, 900, restart_count=2)
+
+    assert watchdog.scan() == 1
+
+    db.session.expire_all()
+    task = Task.query.get(task_id)
+    assert task.status == 'error'
+    assert '上限' in task.error_message
+
+
+def test_takeover_skips_task_claimed_by_another_executor(watchdog, make_task):
+    task_id = _running(make_task, 900)
+    stale = [(task, task.run_token) for task in watchdog.find_stale_tasks()]
+    # 扫描之后任务已被其他进程接管并重新启动
+    Task.query.filter_by(id=task_id).update({'run_token': 'other'})
+    db.session.commit()
+
+    task, run_token = stale[0]
+    assert not watchdog._recover(task, run_token, 'test')
+    db.session.expire_all()
+    assert Task.query.get(task_id).status == 'running'
+
+
+def test_orphaned_tasks_are_requeued_immediately(watchdog, make_task):
+    task_id = _running(make_task, 10)
+
+    assert watchdog.recover_orphaned_tasks() == 1
+
+    db.session.expire_all()
+    task = Task.query.get(task_id)
+    assert task.status == 'queued'
+    assert task.queued_at <= datetime.now()